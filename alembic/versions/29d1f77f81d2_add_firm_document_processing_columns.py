@@ -0,0 +1,41 @@
+"""add firm document processing columns
+
+Revision ID: 29d1f77f81d2
+Revises: 3c5c51a7660a
+Create Date: 2026-10-18 23:58:41.602917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '29d1f77f81d2'
+down_revision: Union[str, None] = '3c5c51a7660a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('firm_documents', sa.Column('checksum_sha256', sa.String(length=64), nullable=True))
+    # Documents uploaded before background processing are treated as already
+    # processed; new rows get 'pending' from the model
+    op.add_column('firm_documents', sa.Column('processing_status', sa.String(length=20), server_default='ready', nullable=False))
+    op.alter_column('firm_documents', 'processing_status', server_default=None)
+    op.add_column('firm_documents', sa.Column('processing_error', sa.Text(), nullable=True))
+    op.add_column('firm_documents', sa.Column('detected_mime_type', sa.String(length=100), nullable=True))
+    op.add_column('firm_documents', sa.Column('page_count', sa.Integer(), nullable=True))
+    op.add_column('firm_documents', sa.Column('duplicate_of_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column('firm_documents', sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('firm_documents', 'processed_at')
+    op.drop_column('firm_documents', 'duplicate_of_id')
+    op.drop_column('firm_documents', 'page_count')
+    op.drop_column('firm_documents', 'detected_mime_type')
+    op.drop_column('firm_documents', 'processing_error')
+    op.drop_column('firm_documents', 'processing_status')
+    op.drop_column('firm_documents', 'checksum_sha256')
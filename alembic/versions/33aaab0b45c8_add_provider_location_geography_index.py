@@ -0,0 +1,30 @@
+"""add provider location geography index
+
+Revision ID: 33aaab0b45c8
+Revises: 523f13444851
+Create Date: 2026-10-19 00:31:15.204538
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '33aaab0b45c8'
+down_revision: Union[str, None] = '523f13444851'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # find_nearest_providers filters with ST_DWithin on the geography cast,
+    # which the geometry index on current_location can't serve
+    op.create_index(
+        'ix_emergency_providers_current_location_geography', 'emergency_providers',
+        [sa.text('(current_location::geography)')], unique=False, postgresql_using='gist'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_emergency_providers_current_location_geography', table_name='emergency_providers', postgresql_using='gist')
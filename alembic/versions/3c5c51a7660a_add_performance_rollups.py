@@ -0,0 +1,88 @@
+"""add performance rollups
+
+Revision ID: 3c5c51a7660a
+Revises:
+Create Date: 2026-10-18 23:52:14.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5c51a7660a'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'request_rollup_keys',
+        sa.Column('request_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('firm_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('zone_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('zone_name', sa.String(length=255), nullable=False),
+        sa.Column('service_type', sa.String(length=20), nullable=False),
+        sa.Column('submitted_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['firm_id'], ['security_firms.id'], name=op.f('fk_request_rollup_keys_firm_id_security_firms')),
+        sa.ForeignKeyConstraint(['request_id'], ['panic_requests.id'], name=op.f('fk_request_rollup_keys_request_id_panic_requests')),
+        sa.ForeignKeyConstraint(['zone_id'], ['coverage_areas.id'], name=op.f('fk_request_rollup_keys_zone_id_coverage_areas')),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_request_rollup_keys')),
+        sa.UniqueConstraint('request_id', name=op.f('uq_request_rollup_keys_request_id'))
+    )
+    op.create_table(
+        'performance_rollups',
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('firm_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('zone_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('zone_name', sa.String(length=255), nullable=False),
+        sa.Column('service_type', sa.String(length=20), nullable=False),
+        sa.Column('submitted_count', sa.Integer(), nullable=False),
+        sa.Column('accepted_count', sa.Integer(), nullable=False),
+        sa.Column('response_time_sum', sa.Float(), nullable=False),
+        sa.Column('completed_count', sa.Integer(), nullable=False),
+        sa.Column('completion_time_sum', sa.Float(), nullable=False),
+        sa.Column('prank_count', sa.Integer(), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['firm_id'], ['security_firms.id'], name=op.f('fk_performance_rollups_firm_id_security_firms')),
+        sa.ForeignKeyConstraint(['zone_id'], ['coverage_areas.id'], name=op.f('fk_performance_rollups_zone_id_coverage_areas')),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_performance_rollups')),
+        sa.UniqueConstraint('bucket_start', 'firm_id', 'zone_name', 'service_type', name='uq_performance_rollups_bucket')
+    )
+    op.create_index(op.f('ix_performance_rollups_bucket_start'), 'performance_rollups', ['bucket_start'], unique=False)
+    op.create_table(
+        'performance_rollup_histograms',
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('firm_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('zone_name', sa.String(length=255), nullable=False),
+        sa.Column('service_type', sa.String(length=20), nullable=False),
+        sa.Column('metric', sa.String(length=20), nullable=False),
+        sa.Column('upper_bound', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['firm_id'], ['security_firms.id'], name=op.f('fk_performance_rollup_histograms_firm_id_security_firms')),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_performance_rollup_histograms')),
+        sa.UniqueConstraint(
+            'bucket_start', 'firm_id', 'zone_name', 'service_type', 'metric', 'upper_bound',
+            name='uq_performance_rollup_histograms_bucket'
+        )
+    )
+    op.create_index(op.f('ix_performance_rollup_histograms_bucket_start'), 'performance_rollup_histograms', ['bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_performance_rollup_histograms_bucket_start'), table_name='performance_rollup_histograms')
+    op.drop_table('performance_rollup_histograms')
+    op.drop_index(op.f('ix_performance_rollups_bucket_start'), table_name='performance_rollups')
+    op.drop_table('performance_rollups')
+    op.drop_table('request_rollup_keys')
@@ -0,0 +1,71 @@
+"""add subscription expiry scheduling
+
+Revision ID: 5099cf50fe7c
+Revises: bcc005b5688a
+Create Date: 2026-10-19 00:17:52.130946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5099cf50fe7c'
+down_revision: Union[str, None] = 'bcc005b5688a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_groups', sa.Column('subscription_firm_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column('user_groups', sa.Column('subscription_reminder_sent_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_foreign_key(
+        op.f('fk_user_groups_subscription_firm_id_security_firms'),
+        'user_groups', 'security_firms',
+        ['subscription_firm_id'], ['id']
+    )
+    op.create_index(
+        'ix_user_groups_subscription_due', 'user_groups', ['subscription_expires_at'],
+        unique=False, postgresql_where=sa.text('subscription_firm_id IS NOT NULL')
+    )
+    op.create_table(
+        'firm_subscription_counts',
+        sa.Column('firm_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('active_count', sa.Integer(), nullable=False),
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['firm_id'], ['security_firms.id'], name=op.f('fk_firm_subscription_counts_firm_id_security_firms')),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_firm_subscription_counts')),
+        sa.UniqueConstraint('firm_id', name=op.f('uq_firm_subscription_counts_firm_id'))
+    )
+    
+    # Attribute the subscriptions applied before the scheduler existed and
+    # seed the counts from them, as SubscriptionExpiryService.reconcile_counts
+    # does, so existing firms don't report 0 active subscriptions
+    op.execute("""
+        UPDATE user_groups ug
+        SET subscription_firm_id = sp.firm_id
+        FROM stored_subscriptions ss
+        JOIN subscription_products sp ON sp.id = ss.product_id
+        WHERE ss.id = ug.subscription_id
+          AND ug.subscription_firm_id IS NULL
+          AND ug.subscription_expires_at > NOW()
+    """)
+    op.execute("""
+        INSERT INTO firm_subscription_counts (id, firm_id, active_count)
+        SELECT gen_random_uuid(), subscription_firm_id, count(*)
+        FROM user_groups
+        WHERE subscription_firm_id IS NOT NULL
+        GROUP BY subscription_firm_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('firm_subscription_counts')
+    op.drop_index('ix_user_groups_subscription_due', table_name='user_groups', postgresql_where=sa.text('subscription_firm_id IS NOT NULL'))
+    op.drop_constraint(op.f('fk_user_groups_subscription_firm_id_security_firms'), 'user_groups', type_='foreignkey')
+    op.drop_column('user_groups', 'subscription_reminder_sent_at')
+    op.drop_column('user_groups', 'subscription_firm_id')
@@ -0,0 +1,53 @@
+"""add provider location tracking
+
+Revision ID: 523f13444851
+Revises: 5099cf50fe7c
+Create Date: 2026-10-19 00:24:39.857104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from geoalchemy2 import Geometry
+
+# revision identifiers, used by Alembic.
+revision: str = '523f13444851'
+down_revision: Union[str, None] = '5099cf50fe7c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'emergency_providers',
+        sa.Column('current_location', Geometry('POINT', srid=4326, spatial_index=False), nullable=True)
+    )
+    op.execute("""
+        UPDATE emergency_providers
+        SET current_location = ST_SetSRID(ST_MakePoint(current_longitude, current_latitude), 4326)
+    """)
+    op.create_index(
+        'idx_emergency_providers_current_location', 'emergency_providers', ['current_location'],
+        unique=False, postgresql_using='gist'
+    )
+    op.create_table(
+        'provider_location_points',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('provider_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('accuracy_m', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['provider_id'], ['emergency_providers.id'], name=op.f('fk_provider_location_points_provider_id_emergency_providers')),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_provider_location_points'))
+    )
+    op.create_index('ix_provider_location_points_provider_time', 'provider_location_points', ['provider_id', 'recorded_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_provider_location_points_provider_time', table_name='provider_location_points')
+    op.drop_table('provider_location_points')
+    op.drop_index('idx_emergency_providers_current_location', table_name='emergency_providers', postgresql_using='gist')
+    op.drop_column('emergency_providers', 'current_location')
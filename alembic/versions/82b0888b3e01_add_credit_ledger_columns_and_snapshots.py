@@ -0,0 +1,57 @@
+"""add credit ledger columns and snapshots
+
+Revision ID: 82b0888b3e01
+Revises: 29d1f77f81d2
+Create Date: 2026-10-19 00:04:27.915360
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '82b0888b3e01'
+down_revision: Union[str, None] = '29d1f77f81d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'credit_balance_snapshots',
+        sa.Column('firm_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('balance', sa.Integer(), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('entries', sa.Integer(), nullable=False),
+        sa.Column('drift', sa.Integer(), nullable=True),
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['firm_id'], ['security_firms.id'], name=op.f('fk_credit_balance_snapshots_firm_id_security_firms')),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_credit_balance_snapshots'))
+    )
+    op.create_index(op.f('ix_credit_balance_snapshots_firm_id'), 'credit_balance_snapshots', ['firm_id'], unique=False)
+
+    op.add_column('credit_transactions', sa.Column('balance_after', sa.Integer(), nullable=True))
+    op.add_column('credit_transactions', sa.Column('idempotency_key', sa.String(length=255), nullable=True))
+    op.add_column('credit_transactions', sa.Column('snapshot_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_unique_constraint(op.f('uq_credit_transactions_idempotency_key'), 'credit_transactions', ['idempotency_key'])
+    op.create_foreign_key(
+        op.f('fk_credit_transactions_snapshot_id_credit_balance_snapshots'),
+        'credit_transactions', 'credit_balance_snapshots',
+        ['snapshot_id'], ['id']
+    )
+    op.create_index(op.f('ix_credit_transactions_snapshot_id'), 'credit_transactions', ['snapshot_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_credit_transactions_snapshot_id'), table_name='credit_transactions')
+    op.drop_constraint(op.f('fk_credit_transactions_snapshot_id_credit_balance_snapshots'), 'credit_transactions', type_='foreignkey')
+    op.drop_constraint(op.f('uq_credit_transactions_idempotency_key'), 'credit_transactions', type_='unique')
+    op.drop_column('credit_transactions', 'snapshot_id')
+    op.drop_column('credit_transactions', 'idempotency_key')
+    op.drop_column('credit_transactions', 'balance_after')
+    op.drop_index(op.f('ix_credit_balance_snapshots_firm_id'), table_name='credit_balance_snapshots')
+    op.drop_table('credit_balance_snapshots')
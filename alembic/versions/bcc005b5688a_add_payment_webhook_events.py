@@ -0,0 +1,46 @@
+"""add payment webhook events
+
+Revision ID: bcc005b5688a
+Revises: 82b0888b3e01
+Create Date: 2026-10-19 00:11:06.482713
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'bcc005b5688a'
+down_revision: Union[str, None] = '82b0888b3e01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'payment_webhook_events',
+        sa.Column('provider', sa.String(length=20), nullable=False),
+        sa.Column('event_key', sa.String(length=255), nullable=False),
+        sa.Column('transaction_id', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('processing_status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_payment_webhook_events')),
+        sa.UniqueConstraint('event_key', name=op.f('uq_payment_webhook_events_event_key'))
+    )
+    op.create_index(op.f('ix_payment_webhook_events_processing_status'), 'payment_webhook_events', ['processing_status'], unique=False)
+    op.create_index(op.f('ix_payment_webhook_events_transaction_id'), 'payment_webhook_events', ['transaction_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_payment_webhook_events_transaction_id'), table_name='payment_webhook_events')
+    op.drop_index(op.f('ix_payment_webhook_events_processing_status'), table_name='payment_webhook_events')
+    op.drop_table('payment_webhook_events')
@@ -7,6 +7,7 @@ from typing import Optional
 import structlog
 
 from app.services.attestation import attestation_service, AttestationError
+from app.core.auth import UserContext, require_admin
 from app.core.exceptions import APIError, ErrorCodes
 
 logger = structlog.get_logger()
@@ -46,6 +47,13 @@ class IOSAssertionRequest(BaseModel):
     client_data_hash: str = Field(..., description="Hash of client request data")
 
 
+class RevokeVerdictsRequest(BaseModel):
+    """Request model for revoking cached attestation verdicts"""
+    platform: str = Field(..., pattern="^(android|ios)$", description="Platform: 'android' or 'ios'")
+    device_id: Optional[str] = Field(None, description="Device whose verdicts should be revoked")
+    key_id: Optional[str] = Field(None, description="iOS only: revoke a single App Attest key")
+
+
 class AttestationResponse(BaseModel):
     """Response model for attestation verification"""
     verified: bool = Field(..., description="Whether attestation was successful")
@@ -242,4 +250,39 @@ async def verify_ios_assertion(
         raise HTTPException(
             status_code=500,
             detail="Internal error during iOS assertion verification"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/verdicts/revoke")
+async def revoke_attestation_verdicts(
+    request: RevokeVerdictsRequest,
+    current_user: UserContext = Depends(require_admin)
+):
+    """
+    Revoke cached attestation verdicts for a device
+    
+    Subsequent requests from the device are fully re-verified. Other API
+    workers may honour their in-process copy for up to
+    ATTESTATION_LOCAL_CACHE_TTL_SECONDS.
+    """
+    try:
+        await attestation_service.revoke_verdicts(
+            request.platform,
+            device_id=request.device_id,
+            key_id=request.key_id
+        )
+    except Exception as e:
+        logger.error("Failed to revoke attestation verdicts", error=str(e))
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to revoke attestation verdicts"
+        )
+    
+    logger.info(
+        "attestation_verdicts_revoked",
+        platform=request.platform,
+        device_id=request.device_id,
+        revoked_by=str(current_user.user_id)
+    )
+    
+    return {"revoked": True, "platform": request.platform, "device_id": request.device_id}
@@ -12,6 +12,7 @@ from app.core.database import get_db
 from app.core.auth import get_current_user, require_admin
 from app.models.payment import CreditTier
 from app.services.auth import UserContext
+from app.services.credit_pricing import credit_tier_cache
 
 
 router = APIRouter()
@@ -225,6 +226,7 @@ async def create_credit_tier(
         
         db.add(new_tier)
         await db.commit()
+        credit_tier_cache.invalidate()
         await db.refresh(new_tier)
         
         return CreditTierResponse(
@@ -295,6 +297,7 @@ async def update_credit_tier(
             setattr(tier, field, value)
         
         await db.commit()
+        credit_tier_cache.invalidate()
         await db.refresh(tier)
         
         return CreditTierResponse(
@@ -347,6 +350,7 @@ async def delete_credit_tier(
         
         await db.delete(tier)
         await db.commit()
+        credit_tier_cache.invalidate()
         
         return {"message": "Credit tier deleted successfully"}
         
@@ -3,18 +3,22 @@ Emergency Provider API endpoints for managing ambulances, tow trucks, etc.
 """
 from typing import List, Optional, Dict, Any
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from pydantic import BaseModel, Field, validator
 from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.auth import require_emergency_provider_crud, require_emergency_provider_read
 from app.services.auth import UserContext
 from app.services.emergency_provider import EmergencyProviderService
+from app.services.provider_location import LocationFix, provider_location_ingestor
 from app.models.emergency_provider import ProviderType, ProviderStatus
 
 router = APIRouter()
+logger = structlog.get_logger()
 
 
 class ProviderCreateRequest(BaseModel):
@@ -86,6 +90,31 @@ class LocationUpdateRequest(BaseModel):
     longitude: float = Field(..., ge=-180, le=180, description="Current longitude")
 
 
+class LocationFixRequest(BaseModel):
+    """A GPS point in a batch location upload"""
+    provider_id: UUID = Field(..., description="Provider the point was reported by")
+    latitude: float = Field(..., ge=-90, le=90, description="Latitude")
+    longitude: float = Field(..., ge=-180, le=180, description="Longitude")
+    recorded_at: datetime = Field(..., description="Device time of the fix; future times are clamped to server time")
+    accuracy_m: Optional[float] = Field(None, ge=0, description="GPS accuracy in meters")
+
+
+class LocationBatchRequest(BaseModel):
+    """Batch provider location upload"""
+    points: List[LocationFixRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.PROVIDER_LOCATION_MAX_POINTS,
+        description="Points from one or more providers, in any order"
+    )
+
+
+class LocationBatchResponse(BaseModel):
+    """Batch provider location upload result"""
+    accepted: int
+    rejected_provider_ids: List[str]
+
+
 class ProviderResponse(BaseModel):
     """Emergency provider response"""
     id: str
@@ -495,6 +524,53 @@ async def update_provider(
         )
 
 
+@router.post("/locations", response_model=LocationBatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_provider_locations(
+    request: LocationBatchRequest,
+    current_user: UserContext = Depends(require_emergency_provider_crud),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Upload provider locations in bulk
+    
+    High-rate telemetry path for tracking devices. Points are buffered and
+    only each provider's newest position is written, every few seconds, so
+    current locations lag by up to the flush interval. Points for providers
+    outside the user's firm are rejected without failing the upload, and
+    points dated ahead of server time are taken as recorded now.
+    """
+    try:
+        fixes = [
+            LocationFix(
+                provider_id=point.provider_id,
+                latitude=point.latitude,
+                longitude=point.longitude,
+                recorded_at=point.recorded_at if point.recorded_at.tzinfo else point.recorded_at.replace(tzinfo=timezone.utc),
+                accuracy_m=point.accuracy_m
+            )
+            for point in request.points
+        ]
+        accepted, rejected = await provider_location_ingestor.ingest(db, current_user.firm_id, fixes)
+        
+        return LocationBatchResponse(
+            accepted=accepted,
+            rejected_provider_ids=sorted(str(provider_id) for provider_id in rejected)
+        )
+        
+    except Exception as e:
+        logger.error(
+            "provider_location_upload_error",
+            firm_id=str(current_user.firm_id),
+            points=len(request.points),
+            error=str(e),
+            exc_info=True
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Failed to accept provider locations"
+        )
+
+
 @router.patch("/{provider_id}/location", response_model=ProviderResponse)
 async def update_provider_location(
     provider_id: str,
@@ -630,6 +706,7 @@ async def find_nearest_providers(
     provider_type: ProviderType = Query(..., description="Type of provider to search for"),
     max_distance_km: float = Query(100.0, gt=0, le=500, description="Maximum search distance"),
     limit: int = Query(10, gt=0, le=50, description="Maximum number of results"),
+    rank_by: str = Query("distance", pattern="^(distance|eta)$", description="Sort by distance or estimated arrival time"),
     current_user: UserContext = Depends(require_emergency_provider_read),
     db: AsyncSession = Depends(get_db)
 ):
@@ -637,7 +714,8 @@ async def find_nearest_providers(
     Find nearest available providers
     
     Searches for the nearest available emergency providers of the specified type
-    within the maximum distance. Results are sorted by distance.
+    within the maximum distance. Results are sorted by distance, or by
+    estimated arrival time when rank_by is "eta".
     """
     try:
         service = EmergencyProviderService(db)
@@ -649,7 +727,8 @@ async def find_nearest_providers(
             provider_type=provider_type,
             max_distance_km=max_distance_km,
             limit=limit,
-            firm_id=current_user.firm_id
+            firm_id=current_user.firm_id,
+            rank_by=rank_by
         )
         
         # Convert to response format
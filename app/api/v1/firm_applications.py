@@ -2,23 +2,18 @@
 Firm Applications API endpoints - Complete CRUD operations
 """
 from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from uuid import UUID
 from datetime import datetime
 import structlog
-import base64
 import os
-import boto3
-from botocore.exceptions import ClientError
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
 
 from app.core.auth import get_current_user, require_admin
 from app.core.database import get_db
 from app.services.auth import UserContext
+from app.services.document_delivery import content_disposition, document_delivery_service, is_local
 from app.services.security_firm import SecurityFirmService
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -27,84 +22,6 @@ logger = structlog.get_logger()
 router = APIRouter()
 
 
-
-async def get_file_content_base64(file_path: str) -> str:
-    """
-    Get file content as base64 encoded string from S3 bucket.
-    Raises HTTPException if file cannot be retrieved.
-    """
-    try:
-        # Get S3 configuration from environment
-        aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
-        aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-        aws_region_name = os.getenv("AWS_REGION_NAME", "af-south-1")
-        bucket_name = os.getenv("AWS_S3_BUCKET")
-        
-        # Log configuration status for debugging
-        logger.info(f"S3 Config - Bucket: {bucket_name}, Region: {aws_region_name}, "
-                   f"Access Key: {'***' if aws_access_key_id else 'None'}, "
-                   f"Secret Key: {'***' if aws_secret_access_key else 'None'}")
-        
-        if not bucket_name:
-            logger.error("AWS_S3_BUCKET environment variable not set")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="S3 bucket configuration missing"
-            )
-            
-        if not aws_access_key_id or not aws_secret_access_key:
-            logger.error("AWS credentials not properly configured")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="S3 credentials configuration missing"
-            )
-        
-        # Create S3 client
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name=aws_region_name
-        )
-        
-        try:
-            logger.info(f"Downloading file from S3: bucket={bucket_name}, key={file_path}")
-            response = s3_client.get_object(Bucket=bucket_name, Key=file_path)
-            file_content = response['Body'].read()
-            base64_content = base64.b64encode(file_content).decode('utf-8')
-            logger.info(f"Successfully converted file to base64, size: {len(base64_content)} characters")
-            return base64_content
-            
-        except ClientError as e:
-            error_code = e.response['Error']['Code']
-            logger.error(f"S3 ClientError for file {file_path}: {error_code} - {e}")
-            
-            if error_code == 'NoSuchKey':
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Document file not found in storage"
-                )
-            elif error_code == 'AccessDenied':
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Access denied to document storage"
-                )
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to retrieve document from storage"
-                )
-                
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error reading file {file_path}: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to process document"
-        )
-
-
 class FirmApplicationCreateRequest(BaseModel):
     """Create firm application request"""
     firm_id: str = Field(..., description="Security firm ID")
@@ -129,7 +46,12 @@ class DocumentResponse(BaseModel):
     is_verified: bool = Field(..., description="Verification status")
     verified_by: Optional[str] = Field(None, description="Admin user ID who verified")
     verified_at: Optional[str] = Field(None, description="Verification timestamp")
-    content_base64: str = Field(..., description="Base64 encoded file content")
+    processing_status: Optional[str] = Field(None, description="Background processing status")
+    processing_error: Optional[str] = Field(None, description="Why processing rejected or failed the file")
+    page_count: Optional[int] = Field(None, description="Number of pages")
+    download_url: Optional[str] = Field(None, description="URL to download the file from")
+    preview_url: Optional[str] = Field(None, description="URL to view the file inline, if it can be previewed")
+    url_expires_at: Optional[str] = Field(None, description="Expiry of signed URLs")
     created_at: str = Field(..., description="Upload timestamp")
     updated_at: str = Field(..., description="Last update timestamp")
 
@@ -175,6 +97,50 @@ class FirmApplicationListResponse(BaseModel):
     total_pages: int
 
 
+def build_document_response(application_id: str, doc) -> DocumentResponse:
+    """
+    Build a document response with links to the file instead of its content
+    
+    Link failures are logged and leave the links empty, so one missing file
+    doesn't fail the whole application response.
+    """
+    content_url = f"/api/v1/firm-applications/{application_id}/documents/{doc.id}/content"
+    link = None
+    try:
+        link = document_delivery_service.get_link(
+            doc.file_path,
+            content_url,
+            file_name=getattr(doc, 'file_name', None),
+            mime_type=doc.mime_type
+        )
+    except Exception as e:
+        logger.warning(
+            "document_link_failed",
+            document_id=str(doc.id),
+            error=str(e)
+        )
+    
+    return DocumentResponse(
+        id=str(doc.id),
+        document_type=doc.document_type,
+        file_name=getattr(doc, 'file_name', None),
+        file_size=getattr(doc, 'file_size', None),
+        mime_type=doc.mime_type,
+        uploaded_by=str(doc.uploaded_by),
+        is_verified=doc.is_verified,
+        verified_by=str(doc.verified_by) if doc.verified_by else None,
+        verified_at=doc.verified_at.isoformat() if doc.verified_at else None,
+        processing_status=getattr(doc, 'processing_status', None),
+        processing_error=getattr(doc, 'processing_error', None),
+        page_count=getattr(doc, 'page_count', None),
+        download_url=link.download_url if link else None,
+        preview_url=link.preview_url if link else None,
+        url_expires_at=link.expires_at.isoformat() if link and link.expires_at else None,
+        created_at=doc.created_at.isoformat(),
+        updated_at=doc.updated_at.isoformat()
+    )
+
+
 @router.post("/", response_model=FirmApplicationResponse)
 async def create_firm_application(
     request: FirmApplicationCreateRequest,
@@ -212,24 +178,7 @@ async def create_firm_application(
         # Get documents for this firm
         documents = []
         if firm and hasattr(firm, 'documents'):
-            for doc in firm.documents:
-                # Get base64 content
-                content_base64 = await get_file_content_base64(doc.file_path)
-                
-                documents.append(DocumentResponse(
-                    id=str(doc.id),
-                    document_type=doc.document_type,
-                    file_name=getattr(doc, 'file_name', None),
-                    file_size=getattr(doc, 'file_size', None),
-                    mime_type=doc.mime_type,
-                    uploaded_by=str(doc.uploaded_by),
-                    is_verified=doc.is_verified,
-                    verified_by=str(doc.verified_by) if doc.verified_by else None,
-                    verified_at=doc.verified_at.isoformat() if doc.verified_at else None,
-                    content_base64=content_base64,
-                    created_at=doc.created_at.isoformat(),
-                    updated_at=doc.updated_at.isoformat()
-                ))
+            documents = [build_document_response(str(application.id), doc) for doc in firm.documents]
         
         logger.info(
             "firm_application_created",
@@ -458,24 +407,7 @@ async def get_firm_application(
         # Build documents list
         documents = []
         if application.firm and application.firm.documents:
-            for doc in application.firm.documents:
-                # Get base64 content
-                content_base64 = await get_file_content_base64(doc.file_path)
-                
-                documents.append(DocumentResponse(
-                    id=str(doc.id),
-                    document_type=doc.document_type,
-                    file_name=getattr(doc, 'file_name', None),
-                    file_size=getattr(doc, 'file_size', None),
-                    mime_type=doc.mime_type,
-                    uploaded_by=str(doc.uploaded_by),
-                    is_verified=doc.is_verified,
-                    verified_by=str(doc.verified_by) if doc.verified_by else None,
-                    verified_at=doc.verified_at.isoformat() if doc.verified_at else None,
-                    content_base64=content_base64,
-                    created_at=doc.created_at.isoformat(),
-                    updated_at=doc.updated_at.isoformat()
-                ))
+            documents = [build_document_response(str(application.id), doc) for doc in application.firm.documents]
         
         return FirmApplicationResponse(
             id=str(application.id),
@@ -613,24 +545,7 @@ async def update_firm_application(
         # Build documents list
         documents = []
         if application.firm and application.firm.documents:
-            for doc in application.firm.documents:
-                # Get base64 content
-                content_base64 = await get_file_content_base64(doc.file_path)
-                
-                documents.append(DocumentResponse(
-                    id=str(doc.id),
-                    document_type=doc.document_type,
-                    file_name=getattr(doc, 'file_name', None),
-                    file_size=getattr(doc, 'file_size', None),
-                    mime_type=doc.mime_type,
-                    uploaded_by=str(doc.uploaded_by),
-                    is_verified=doc.is_verified,
-                    verified_by=str(doc.verified_by) if doc.verified_by else None,
-                    verified_at=doc.verified_at.isoformat() if doc.verified_at else None,
-                    content_base64=content_base64,
-                    created_at=doc.created_at.isoformat(),
-                    updated_at=doc.updated_at.isoformat()
-                ))
+            documents = [build_document_response(str(application.id), doc) for doc in application.firm.documents]
         
         logger.info(
             "firm_application_updated",
@@ -833,4 +748,106 @@ async def submit_firm_application(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to submit firm application"
-        )
\ No newline at end of file
+        )
+
+@router.get("/{application_id}/documents/{document_id}/content")
+async def get_firm_application_document_content(
+    application_id: str,
+    document_id: str,
+    inline: bool = Query(False, description="Display in the browser instead of downloading"),
+    current_user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream a document attached to a firm application
+    
+    The file is sent in chunks rather than loaded into memory, so large
+    documents don't hold up the worker.
+    """
+    try:
+        from app.models.security_firm import FirmApplication, FirmDocument, FirmUser
+        from sqlalchemy import select, and_
+        
+        application = await db.get(FirmApplication, application_id)
+        if not application:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Firm application not found"
+            )
+        
+        if not current_user.has_permission("admin:all"):
+            user_firm_query = select(FirmUser).where(
+                and_(
+                    FirmUser.user_id == current_user.user_id,
+                    FirmUser.firm_id == application.firm_id,
+                    FirmUser.status == "active"
+                )
+            )
+            user_firm = (await db.execute(user_firm_query)).scalar_one_or_none()
+            
+            if not user_firm:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Not authorized to access this application"
+                )
+        
+        document_query = select(FirmDocument).where(
+            and_(
+                FirmDocument.id == document_id,
+                FirmDocument.firm_id == application.firm_id
+            )
+        )
+        document = (await db.execute(document_query)).scalar_one_or_none()
+        if not document:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        
+        media_type = document.mime_type or 'application/octet-stream'
+        disposition = content_disposition(document.file_name, inline)
+        
+        if is_local(document.file_path):
+            if not os.path.exists(document.file_path):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Document file not found in storage"
+                )
+            return FileResponse(
+                path=document.file_path,
+                media_type=media_type,
+                headers={"Content-Disposition": disposition}
+            )
+        
+        chunks = await document_delivery_service.stream(document.file_path)
+        return StreamingResponse(
+            chunks,
+            media_type=media_type,
+            headers={"Content-Disposition": disposition}
+        )
+        
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document file not found in storage"
+        )
+    except PermissionError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to document storage"
+        )
+    except Exception as e:
+        logger.error(
+            "get_firm_application_document_error",
+            application_id=application_id,
+            document_id=document_id,
+            user_id=str(current_user.user_id),
+            error=str(e),
+            exc_info=True
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve document"
+        )
@@ -1,7 +1,8 @@
 """
 Log management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
 from typing import Optional, List
 from datetime import datetime, timedelta
@@ -207,13 +208,14 @@ async def get_log_statistics(
 @router.post("/export")
 async def export_logs(
     search_request: LogSearchRequest,
-    format: str = Query("json", pattern="^(json|csv)$", description="Export format"),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$", description="Export format"),
     current_user: dict = Depends(get_current_user),
     _: dict = Depends(require_admin)
 ):
     """
     Export logs matching search criteria
     
+    The export is streamed in chunks rather than built in memory.
     Requires admin role for log export functionality.
     """
     try:
@@ -241,19 +243,21 @@ async def export_logs(
             sort_order=search_request.sort_order
         )
         
-        # Export logs
-        export_data = await log_aggregation_service.export_logs(query, format)
-        
         # Set appropriate content type and filename
+        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
         if format == "json":
             media_type = "application/json"
-            filename = f"logs_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+            filename = f"logs_export_{timestamp}.json"
+        elif format == "ndjson":
+            media_type = "application/x-ndjson"
+            filename = f"logs_export_{timestamp}.ndjson"
         else:  # csv
             media_type = "text/csv"
-            filename = f"logs_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+            filename = f"logs_export_{timestamp}.csv"
         
-        return Response(
-            content=export_data,
+        # Stream the export
+        return StreamingResponse(
+            log_aggregation_service.stream_export(query, format),
             media_type=media_type,
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
@@ -1,12 +1,13 @@
 """
 Metrics API endpoints for Prometheus scraping and monitoring
 """
-from fastapi import APIRouter, Response, Depends, HTTPException
+from fastapi import APIRouter, Request, Response, Depends, HTTPException
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
-from app.core.metrics import metrics_collector
+from app.core.metrics import OPENMETRICS_CONTENT_TYPE, metrics_collector
 from app.core.config import settings
 from app.core.database import get_db
+from app.services.metrics_rollup import PerformanceRollupService
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 import asyncio
@@ -15,13 +16,22 @@ router = APIRouter(prefix="/metrics", tags=["metrics"])
 
 
 @router.get("/prometheus", response_class=Response)
-async def get_prometheus_metrics():
+async def get_prometheus_metrics(request: Request):
     """
     Get metrics in Prometheus format for scraping
+    
+    Scrapers that accept OpenMetrics also receive exemplars, which carry the
+    user and request IDs kept out of metric labels.
     """
     if not settings.METRICS_ENABLED:
         raise HTTPException(status_code=404, detail="Metrics disabled")
     
+    if "application/openmetrics-text" in request.headers.get("accept", ""):
+        return Response(
+            content=metrics_collector.get_metrics(openmetrics=True),
+            media_type=OPENMETRICS_CONTENT_TYPE
+        )
+    
     metrics_data = metrics_collector.get_metrics()
     return Response(
         content=metrics_data,
@@ -29,6 +39,20 @@ async def get_prometheus_metrics():
     )
 
 
+@router.get("/cardinality")
+async def get_metrics_cardinality():
+    """
+    Get the number of series each labelled metric holds
+    """
+    series = metrics_collector.get_series_counts()
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "total_series": sum(series.values()),
+        "label_value_limit": settings.METRICS_LABEL_VALUE_LIMIT,
+        "series_by_metric": dict(sorted(series.items(), key=lambda item: item[1], reverse=True))
+    }
+
+
 @router.get("/health")
 async def get_system_health(db: AsyncSession = Depends(get_db)):
     """
@@ -102,13 +126,17 @@ async def get_business_metrics(
                 "avg_completion_time_seconds": row.avg_completion_time
             })
         
-        # Get subscription metrics
+        # Get subscription metrics from the counts maintained by the expiry
+        # scheduler, and members of the groups it still counts as active
         subscription_query = text("""
             SELECT 
-                COUNT(*) as active_subscriptions,
-                COUNT(DISTINCT user_id) as unique_users
-            FROM user_groups 
-            WHERE subscription_expires_at > NOW()
+                (SELECT COALESCE(SUM(active_count), 0) FROM firm_subscription_counts) as active_subscriptions,
+                (
+                    SELECT COUNT(DISTINCT m.user_id)
+                    FROM user_group_memberships m
+                    JOIN user_groups ug ON ug.id = m.group_id
+                    WHERE ug.subscription_firm_id IS NOT NULL AND m.is_active
+                ) as unique_users
         """)
         
         subscription_result = await db.execute(subscription_query)
@@ -157,48 +185,20 @@ async def get_performance_metrics(
     try:
         since = datetime.utcnow() - timedelta(hours=hours)
         
-        # Build query with optional firm filter
-        where_clause = "WHERE pr.created_at >= :since"
-        params = {"since": since}
-        
-        if firm_id:
-            where_clause += " AND ug.subscription_id IN (SELECT id FROM subscription_products WHERE firm_id = :firm_id)"
-            params["firm_id"] = firm_id
-        
-        performance_query = text(f"""
-            SELECT 
-                ca.name as zone_name,
-                pr.service_type,
-                COUNT(*) as total_requests,
-                AVG(EXTRACT(EPOCH FROM (pr.accepted_at - pr.created_at))) as avg_response_time,
-                AVG(EXTRACT(EPOCH FROM (pr.completed_at - pr.created_at))) as avg_completion_time,
-                COUNT(CASE WHEN pr.status = 'completed' THEN 1 END) as completed_requests,
-                COUNT(CASE WHEN rf.is_prank = true THEN 1 END) as prank_requests
-            FROM panic_requests pr
-            JOIN user_groups ug ON pr.group_id = ug.id
-            JOIN subscription_products sp ON ug.subscription_id = sp.id
-            JOIN coverage_areas ca ON ST_Contains(ca.boundary, pr.location)
-            LEFT JOIN request_feedback rf ON pr.id = rf.request_id
-            {where_clause}
-            GROUP BY ca.name, pr.service_type
-            ORDER BY ca.name, pr.service_type
-        """)
-        
-        results = await db.execute(performance_query, params)
+        summaries = await PerformanceRollupService(db).summarize(
+            since, group_by=("zone_name", "service_type"), firm_id=firm_id
+        )
         performance_metrics = []
         
-        for row in results:
-            completion_rate = (row.completed_requests / row.total_requests * 100) if row.total_requests > 0 else 0
-            prank_rate = (row.prank_requests / row.total_requests * 100) if row.total_requests > 0 else 0
-            
+        for summary in summaries:
             performance_metrics.append({
-                "zone_name": row.zone_name,
-                "service_type": row.service_type,
-                "total_requests": row.total_requests,
-                "avg_response_time_seconds": row.avg_response_time,
-                "avg_completion_time_seconds": row.avg_completion_time,
-                "completion_rate_percent": round(completion_rate, 2),
-                "prank_rate_percent": round(prank_rate, 2)
+                "zone_name": summary.key["zone_name"],
+                "service_type": summary.key["service_type"],
+                "total_requests": summary.submitted,
+                "avg_response_time_seconds": summary.avg_response_time,
+                "avg_completion_time_seconds": summary.avg_completion_time,
+                "completion_rate_percent": round(summary.completion_rate, 2),
+                "prank_rate_percent": round(summary.prank_rate, 2)
             })
         
         return {
@@ -219,68 +219,41 @@ async def get_active_alerts(db: AsyncSession = Depends(get_db)):
     """
     try:
         alerts = []
+        rollups = PerformanceRollupService(db)
+        now = datetime.utcnow()
+        threshold = settings.RESPONSE_TIME_ALERT_THRESHOLD_SECONDS
         
         # Check for zones with poor response times
-        slow_zones_query = text("""
-            SELECT 
-                ca.name as zone_name,
-                pr.service_type,
-                AVG(EXTRACT(EPOCH FROM (pr.accepted_at - pr.created_at))) as avg_response_time,
-                COUNT(*) as request_count
-            FROM panic_requests pr
-            JOIN user_groups ug ON pr.group_id = ug.id
-            JOIN coverage_areas ca ON ST_Contains(ca.boundary, pr.location)
-            WHERE pr.created_at >= NOW() - INTERVAL '1 hour'
-            AND pr.accepted_at IS NOT NULL
-            GROUP BY ca.name, pr.service_type
-            HAVING AVG(EXTRACT(EPOCH FROM (pr.accepted_at - pr.created_at))) > :threshold
-            AND COUNT(*) >= 3
-        """)
-        
-        slow_results = await db.execute(slow_zones_query, {
-            "threshold": settings.RESPONSE_TIME_ALERT_THRESHOLD_SECONDS
-        })
-        
-        for row in slow_results:
+        for summary in await rollups.summarize(now - timedelta(hours=1), group_by=("zone_name", "service_type")):
+            if summary.accepted < 3 or summary.avg_response_time <= threshold:
+                continue
+            
+            zone_name, service_type = summary.key["zone_name"], summary.key["service_type"]
             alerts.append({
                 "type": "slow_response_time",
                 "severity": "warning",
-                "zone": row.zone_name,
-                "service_type": row.service_type,
-                "avg_response_time": round(row.avg_response_time, 2),
-                "threshold": settings.RESPONSE_TIME_ALERT_THRESHOLD_SECONDS,
-                "request_count": row.request_count,
-                "message": f"Zone {row.zone_name} has slow {row.service_type} response times"
+                "zone": zone_name,
+                "service_type": service_type,
+                "avg_response_time": round(summary.avg_response_time, 2),
+                "threshold": threshold,
+                "request_count": summary.accepted,
+                "message": f"Zone {zone_name} has slow {service_type} response times"
             })
         
         # Check for high prank rates
-        prank_rate_query = text("""
-            SELECT 
-                ca.name as zone_name,
-                COUNT(*) as total_requests,
-                COUNT(CASE WHEN rf.is_prank = true THEN 1 END) as prank_requests
-            FROM panic_requests pr
-            JOIN user_groups ug ON pr.group_id = ug.id
-            JOIN coverage_areas ca ON ST_Contains(ca.boundary, pr.location)
-            LEFT JOIN request_feedback rf ON pr.id = rf.request_id
-            WHERE pr.created_at >= NOW() - INTERVAL '24 hours'
-            GROUP BY ca.name
-            HAVING COUNT(*) >= 10
-            AND (COUNT(CASE WHEN rf.is_prank = true THEN 1 END)::float / COUNT(*) * 100) > 20
-        """)
-        
-        prank_results = await db.execute(prank_rate_query)
-        
-        for row in prank_results:
-            prank_rate = (row.prank_requests / row.total_requests * 100) if row.total_requests > 0 else 0
+        for summary in await rollups.summarize(now - timedelta(hours=24), group_by=("zone_name",)):
+            if summary.submitted < 10 or summary.prank_rate <= 20:
+                continue
+            
+            zone_name = summary.key["zone_name"]
             alerts.append({
                 "type": "high_prank_rate",
                 "severity": "warning",
-                "zone": row.zone_name,
-                "prank_rate_percent": round(prank_rate, 2),
-                "total_requests": row.total_requests,
-                "prank_requests": row.prank_requests,
-                "message": f"Zone {row.zone_name} has high prank request rate: {prank_rate:.1f}%"
+                "zone": zone_name,
+                "prank_rate_percent": round(summary.prank_rate, 2),
+                "total_requests": summary.submitted,
+                "prank_requests": summary.pranks,
+                "message": f"Zone {zone_name} has high prank request rate: {summary.prank_rate:.1f}%"
             })
         
         return {
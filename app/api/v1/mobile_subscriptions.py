@@ -362,7 +362,7 @@ async def get_group_subscription_status(
             )
         
         subscription_service = SubscriptionService(db)
-        status_info = await subscription_service.validate_subscription_status(group_id)
+        status_info = await subscription_service.validate_subscription_status(group_id, group=group)
         
         return SubscriptionStatusResponse(**status_info)
         
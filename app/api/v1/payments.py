@@ -6,7 +6,7 @@ from datetime import datetime
 from decimal import Decimal
 from typing import List
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 
@@ -32,6 +32,8 @@ from app.schemas.payment import (
     OzowPaymentDataRequest
 )
 from app.services.ozow_service import OzowService
+from app.services.credit_pricing import credit_tier_cache
+from app.services.payment_webhooks import InvalidWebhookSignature, PaymentWebhookService
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
@@ -360,13 +362,7 @@ async def get_credit_tiers(
     db: AsyncSession = Depends(get_db)
 ):
     """Get available credit pricing tiers"""
-    result = await db.execute(
-        select(CreditTier)
-        .where(CreditTier.is_active == True)
-        .order_by(CreditTier.min_credits)
-    )
-    tiers = result.scalars().all()
-    return tiers
+    return await credit_tier_cache.get_tiers(db)
 
 
 @router.post("/test-purchase-credits", response_model=PaymentInitiationResponse)
@@ -766,34 +762,26 @@ async def get_credit_transactions(
 @router.post("/ozow/webhooks")
 async def ozow_webhook(
     request: Request,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
-    """Handle OZOW payment webhooks"""
+    """
+    Receive OZOW payment webhooks
+    
+    The notification is verified and stored, then processed by a worker.
+    A non-2xx response means it was not stored, so OZOW delivers it again.
+    """
+    form_data = await request.form()
+    webhook_data = dict(form_data)
     
     try:
-        # Get raw form data
-        form_data = await request.form()
-        webhook_data = dict(form_data)
-        
-        # Process webhook in background
-        background_tasks.add_task(
-            process_ozow_webhook,
-            webhook_data,
-            db
-        )
-        
-        return {"status": "received"}
-        
+        event_id, created = await PaymentWebhookService(db).receive(webhook_data)
+    except InvalidWebhookSignature:
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
     except Exception as e:
         print(f"Webhook error: {str(e)}")
-        return {"status": "error", "message": str(e)}
-
+        raise HTTPException(status_code=503, detail="Webhook could not be stored")
 
-async def process_ozow_webhook(webhook_data: dict, db: AsyncSession):
-    """Background task to process OZOW webhook"""
-    ozow_service = OzowService()
-    await ozow_service.process_webhook(db, webhook_data)
+    return {"status": "received" if created else "duplicate", "event_id": event_id}
 
 
 @router.get("/ozow/success")
@@ -178,6 +178,10 @@ class DocumentUploadResponse(BaseModel):
     file_size: int
     uploaded_at: str
     is_verified: bool
+    processing_status: str = "pending"
+    processing_error: Optional[str] = None
+    page_count: Optional[int] = None
+    duplicate_of_id: Optional[str] = None
 
 
 class FirmApplicationResponse(BaseModel):
@@ -759,7 +763,11 @@ async def upload_firm_document(
             file_name=document.file_name,
             file_size=document.file_size,
             uploaded_at=document.created_at.isoformat(),
-            is_verified=document.is_verified
+            is_verified=document.is_verified,
+            processing_status=document.processing_status,
+            processing_error=document.processing_error,
+            page_count=document.page_count,
+            duplicate_of_id=str(document.duplicate_of_id) if document.duplicate_of_id else None
         )
     except ValueError as e:
         raise HTTPException(
@@ -791,7 +799,11 @@ async def get_firm_documents(
                 file_name=doc.file_name,
                 file_size=doc.file_size,
                 uploaded_at=doc.created_at.isoformat(),
-                is_verified=doc.is_verified
+                is_verified=doc.is_verified,
+                processing_status=doc.processing_status,
+                processing_error=doc.processing_error,
+                page_count=doc.page_count,
+                duplicate_of_id=str(doc.duplicate_of_id) if doc.duplicate_of_id else None
             )
             for doc in documents
         ]
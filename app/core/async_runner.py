@@ -0,0 +1,101 @@
+"""
+Persistent event loop for running async code from synchronous workers
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Any, Coroutine, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+class AsyncRunner:
+    """
+    One long-lived event loop per process, running on a daemon thread
+    
+    Celery tasks are synchronous. Creating and closing an event loop per task
+    also throws away everything bound to that loop, including the database
+    pool's connections, so every run reconnects. Submitting coroutines to a
+    loop that outlives the task keeps those connections pooled. A forked
+    child process starts its own loop on first use.
+    """
+    
+    def __init__(self, name: str = "async-runner"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The runner's event loop, started on first use in each process"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                # A loop inherited through fork has no thread running it
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_loop, args=(loop, started), name=self.name, daemon=True
+                )
+                thread.start()
+                started.wait()
+                
+                self._loop, self._thread, self._pid = loop, thread, os.getpid()
+                logger.debug("async_runner_started", name=self.name, pid=self._pid)
+            
+            return self._loop
+    
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, started: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        loop.run_forever()
+    
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the runner's loop without waiting for it"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the runner's loop and wait for its result
+        
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait before cancelling it
+        
+        Returns:
+            The coroutine's result; its exceptions propagate
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AsyncRunner.run() can't block its own event loop")
+        
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop this process's loop; a later call starts a new one"""
+        with self._lock:
+            loop, thread, pid = self._loop, self._thread, self._pid
+            self._loop = self._thread = self._pid = None
+        
+        if loop is None or pid != os.getpid():
+            return
+        
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+
+
+# Global runner for background jobs
+async_runner = AsyncRunner()
@@ -6,6 +6,7 @@ import functools
 import hashlib
 import json
 import pickle
+import time
 from datetime import datetime, timedelta
 from typing import Any, Callable, Dict, List, Optional, Set, Union
 import uuid
@@ -241,6 +242,49 @@ class CacheWarmer:
             await self.warm_cache()
 
 
+class LocalTTLCache:
+    """Bounded in-process cache used as the first tier in front of Redis"""
+    
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}
+    
+    def get(self, key: str) -> Any:
+        """Get a value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+    
+    def set(self, key: str, value: Any, ttl_seconds: float = None):
+        """Store a value; the local TTL never exceeds ttl_seconds"""
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            # Dicts keep insertion order, so this drops the oldest entry
+            self._entries.pop(next(iter(self._entries)))
+        
+        self._entries[key] = (time.monotonic() + ttl, value)
+    
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+    
+    def delete_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+    
+    def clear(self):
+        self._entries.clear()
+
+
 class EnhancedCacheService:
     """Enhanced Redis caching service with advanced features"""
     
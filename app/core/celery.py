@@ -2,6 +2,9 @@
 Celery configuration for background tasks
 """
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.core.async_runner import async_runner
 from app.core.config import settings
 
 # Create Celery instance
@@ -12,6 +15,11 @@ celery_app = Celery(
     include=[
         "app.tasks.notifications",
         "app.tasks.metrics",
+        "app.tasks.log_maintenance",
+        "app.tasks.documents",
+        "app.tasks.credits",
+        "app.tasks.payments",
+        "app.tasks.subscriptions",
     ]
 )
 
@@ -27,4 +35,70 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-)
\ No newline at end of file
+    beat_schedule={
+        "update-metrics-every-minute": {
+            "task": "app.tasks.metrics.update_all_metrics",
+            "schedule": 60.0,  # Every minute
+        },
+        "update-performance-metrics-every-5-minutes": {
+            "task": "app.tasks.metrics.update_performance_metrics",
+            "schedule": 300.0,  # Every 5 minutes
+        },
+        "cleanup-old-metrics-daily": {
+            "task": "app.tasks.metrics.cleanup_old_metrics",
+            "schedule": 86400.0,  # Daily
+        },
+        "reconcile-credit-balances-hourly": {
+            "task": "app.tasks.credits.reconcile_credit_balances",
+            "schedule": 3600.0,  # Hourly
+        },
+        "requeue-payment-webhooks-every-minute": {
+            "task": "app.tasks.payments.requeue_payment_webhooks",
+            "schedule": 60.0,  # Every minute
+        },
+        "process-subscription-expiries-every-bucket": {
+            "task": "app.tasks.subscriptions.process_subscription_expiries",
+            "schedule": float(settings.SUBSCRIPTION_EXPIRY_BUCKET_SECONDS),
+        },
+        "reconcile-subscription-counts-daily": {
+            "task": "app.tasks.subscriptions.reconcile_subscription_counts",
+            "schedule": 86400.0,  # Daily
+        },
+        "requeue-stale-documents-every-5-minutes": {
+            "task": "app.tasks.documents.requeue_stale_documents",
+            "schedule": 300.0,  # Every 5 minutes
+        },
+    },
+)
+
+
+@worker_process_init.connect
+def _reset_inherited_connections(**kwargs):
+    """Drop database connections a forked worker inherited from its parent"""
+    from app.core.database import engine
+    engine.sync_engine.dispose(close=False)
+
+
+@worker_process_shutdown.connect
+def _stop_async_runner(**kwargs):
+    """Close pooled database connections and stop the worker's event loop"""
+    from app.core.database import engine
+    try:
+        async_runner.run(engine.dispose(), timeout=10)
+    except Exception:
+        pass
+    async_runner.stop()
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_worker_dead(**kwargs):
+    """Drop the exiting worker's live gauges from multiprocess metrics"""
+    from app.core.metrics_multiprocess import mark_worker_dead
+    mark_worker_dead()
+
+
+@worker_process_shutdown.connect
+def _flush_worker_logs(**kwargs):
+    """Write records still queued in the worker's log pipeline before it exits"""
+    from app.core.logging import shutdown_logging
+    shutdown_logging()
\ No newline at end of file
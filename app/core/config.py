@@ -3,7 +3,7 @@ Application configuration settings
 """
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 import os
 
 
@@ -51,6 +51,10 @@ class Settings(BaseSettings):
     
     # Mobile App Attestation  
     REQUIRE_MOBILE_ATTESTATION: bool = False  # Set to True in production
+    ATTESTATION_VERDICT_TTL_SECONDS: int = 300  # How long a successful verification is reused
+    ATTESTATION_LOCAL_CACHE_TTL_SECONDS: int = 30  # In-process tier; bounds revocation lag
+    ATTESTATION_LOCAL_CACHE_MAX_ENTRIES: int = 10000
+    ATTESTATION_NONCE_TTL_SECONDS: int = 600  # How long used nonces/challenges are remembered
     
     # Metrics and Monitoring
     METRICS_ENABLED: bool = True
@@ -84,12 +88,51 @@ class Settings(BaseSettings):
     SMS_API_KEY: Optional[str] = None
     SMS_API_URL: Optional[str] = None
     
+    # Notification Dispatch
+    NOTIFICATION_DISPATCHER_ENABLED: bool = True
+    NOTIFICATION_BATCH_SIZE: int = 200  # Stream entries read per dispatch cycle
+    NOTIFICATION_BLOCK_MS: int = 1000
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 2.0
+    NOTIFICATION_RETRY_MAX_SECONDS: float = 300.0
+    NOTIFICATION_CLAIM_IDLE_MS: int = 60000  # Reclaim entries left pending by a dead worker
+    NOTIFICATION_STREAM_MAXLEN: int = 100000
+    NOTIFICATION_RENDER_CACHE_SIZE: int = 1024  # Distinct renders cached per template
+    NOTIFICATION_LANE_WEIGHTS: Dict[str, int] = {"urgent": 4, "high": 1, "normal": 3, "low": 1}  # Read share within a worker pool
+    NOTIFICATION_PRIORITY_WORKERS: int = 2  # Consumers for the urgent/high lanes
+    NOTIFICATION_BULK_WORKERS: int = 1  # Consumers for the normal/low lanes
+    FCM_MULTICAST_BATCH_SIZE: int = 500
+    FCM_TIMEOUT_SECONDS: float = 10.0
+    SMS_MAX_CONCURRENCY: int = 10
+    SMS_RATE_LIMIT_PER_SECOND: float = 10.0  # Per SMS provider
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_PRIORITY_RESERVED: int = 1  # Connections bulk email can never occupy
+    SMTP_TIMEOUT_SECONDS: float = 30.0
+    
     # Security
     ACCOUNT_LOCKOUT_DURATION_MINUTES: int = 30
     MAX_FAILED_LOGIN_ATTEMPTS: int = 5
     OTP_EXPIRY_MINUTES: int = 10
     OTP_MAX_ATTEMPTS: int = 3
     
+    # Silent Mode
+    SILENT_MODE_SWEEP_INTERVAL_SECONDS: float = 5.0
+    SILENT_MODE_SWEEP_BATCH_SIZE: int = 100
+    
+    # Provider Location Ingestion
+    PROVIDER_LOCATION_FLUSH_SECONDS: float = 5.0  # Cadence at which the latest buffered position per provider is written
+    PROVIDER_LOCATION_FLUSH_BATCH_SIZE: int = 500  # Providers per bulk UPDATE
+    PROVIDER_LOCATION_MAX_CLOCK_SKEW_SECONDS: float = 30.0  # Fixes dated further ahead of server time are clamped to it
+    PROVIDER_LOCATION_MAX_POINTS: int = 1000  # Points accepted per upload
+    PROVIDER_TRAJECTORY_ENABLED: bool = False  # Also keep every point in provider_location_points
+    PROVIDER_TRAJECTORY_BUFFER_MAXLEN: int = 100000  # Buffered trajectory points kept while flushing falls behind
+    
+    # Dispatch Scoring
+    DISPATCH_SPEED_PROFILE_TTL_SECONDS: int = 3600  # Age before speed profiles are relearned from arrivals
+    DISPATCH_SPEED_PROFILE_LOOKBACK_DAYS: int = 90  # Arrivals older than this are not used for speed profiles
+    DISPATCH_SPEED_PROFILE_MIN_SAMPLES: int = 5  # Arrivals needed before a region/hour speed replaces the default
+    DISPATCH_FALLBACK_ETA_MINUTES: int = 15  # ETA sent when a service provider's location is unknown
+    
     # File Storage
     FILE_STORAGE_PATH: str = "./uploads"
     MAX_FILE_SIZE_MB: int = 10
@@ -100,6 +143,17 @@ class Settings(BaseSettings):
     AWS_REGION_NAME: str = "us-east-1"
     AWS_S3_BUCKET: Optional[str] = None
     USE_S3_STORAGE: bool = False
+    STORAGE_BACKEND: str = "auto"  # s3, local, or auto (S3 when configured, else local disk)
+    STORAGE_CHUNK_BYTES: int = 1048576  # Read size when streaming uploads and stored objects
+    STORAGE_MULTIPART_PART_BYTES: int = 8388608  # Multipart part size for S3 uploads (minimum 5 MiB)
+    STORAGE_S3_MAX_CONNECTIONS: int = 20  # Connection pool size of the shared S3 client
+    STORAGE_EXECUTOR_WORKERS: int = 8  # Threads running blocking storage calls
+    DOCUMENT_URL_EXPIRY_SECONDS: int = 3600  # Lifetime of presigned document URLs
+    DOCUMENT_URL_REFRESH_MARGIN_SECONDS: int = 600  # Re-sign cached URLs with less than this left
+    DOCUMENT_URL_CACHE_SIZE: int = 2048  # Presigned URLs kept per process
+    DOCUMENT_STREAM_CHUNK_BYTES: int = 262144  # Chunk size when streaming documents from S3
+    DOCUMENT_PROCESSING_SWEEP_DELAY_SECONDS: int = 300  # Re-queue documents pending or processing longer than this
+    DOCUMENT_PROCESSING_SWEEP_BATCH_SIZE: int = 100  # Documents re-queued per sweep
     
     # Logging Configuration
     LOG_LEVEL: str = "INFO"
@@ -109,6 +163,12 @@ class Settings(BaseSettings):
     LOG_COMPRESS_AFTER_DAYS: int = 7
     LOG_MAX_FILE_SIZE_MB: int = 50
     LOG_MAX_BACKUP_COUNT: int = 10
+    LOG_QUEUE_MAX_SIZE: int = 10000  # Records buffered before new ones are dropped
+    LOG_BATCH_SIZE: int = 256  # Records written per flush by the log listener
+    LOG_REQUEST_SAMPLE_RATE: float = 1.0  # Fraction of request_started events kept
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0  # Fraction of debug events kept
+    LOG_INDEX_BLOCK_LINES: int = 1000  # Lines summarised per block in segment indexes
+    LOG_INDEX_BLOOM_FALSE_POSITIVE_RATE: float = 0.01
     
     # Security Log Retention (longer for compliance)
     SECURITY_LOG_RETENTION_DAYS: int = 365
@@ -119,7 +179,12 @@ class Settings(BaseSettings):
     METRICS_ENABLED: bool = True
     METRICS_PORT: int = 8001
     METRICS_PATH: str = "/metrics"
-    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None  # Share metrics between workers; wipe it before the server starts
+    METRICS_EXPOSITION_CACHE_SECONDS: float = 2.0  # Reuse generated /metrics/prometheus output this long
+    METRICS_ROLLUP_BUCKET_MINUTES: int = 15  # Width of performance rollup buckets
+    METRICS_ROLLUP_DURATION_BOUNDS: List[float] = [30, 60, 120, 300, 600, 900, 1800, 3600]  # Histogram upper bounds, seconds
+    METRICS_LABEL_VALUE_LIMIT: int = 200  # Distinct values kept per high-cardinality label
+    METRICS_LABEL_OVERFLOW_BUCKETS: int = 16  # Hashed buckets shared by values beyond the limit
     
     # Alerting Configuration
     ALERT_WEBHOOK_URL: Optional[str] = None
@@ -135,6 +200,21 @@ class Settings(BaseSettings):
     RATE_LIMIT_ENABLED: bool = True
     CACHE_ENABLED: bool = True
     
+    # Cache Warming
+    CACHE_WARMING_STARTUP_MODE: str = "background"  # eager, background or lazy
+    CACHE_WARMING_INTERVAL_HOURS: int = 24  # Full rewarm safety net, 0 disables
+    CACHE_CHANGE_DEBOUNCE_SECONDS: float = 0.5
+    
+    # Credits
+    CREDIT_RECONCILE_BATCH_SIZE: int = 500  # Firms snapshotted per reconcile run
+    CREDIT_TIER_CACHE_TTL_SECONDS: int = 300  # Max age of the in-memory credit tier table in each worker
+    
+    # Subscriptions
+    SUBSCRIPTION_STATUS_CACHE_SECONDS: int = 30  # In-process cache of active group subscriptions
+    SUBSCRIPTION_EXPIRY_BUCKET_SECONDS: int = 60  # Expiry bucket width; the scheduler runs once per bucket
+    SUBSCRIPTION_EXPIRY_BATCH_SIZE: int = 500  # Groups expired or reminded per transaction
+    SUBSCRIPTION_REMINDER_DAYS: int = 7  # Renewal reminder lead time before expiry
+    
     # OZOW Payment Configuration - using live API
     OZOW_BASE_URL: str = "https://great-utterly-owl.ngrok-free.app"
     OZOW_SITE_CODE: str = "MOF-MOF-002"
@@ -149,7 +229,13 @@ class Settings(BaseSettings):
     OZOW_NOTIFY_URL: str = OZOW_BASE_URL + "/api/v1/payments/ozow/webhooks"
     OZOW_VERIFY_TRANS_URL: str = "https://api.ozow.com"
     OZOW_VERIFY_TRANS_LIVE_URL: str = "https://api.ozow.com"
-
+    OZOW_VERIFY_WEBHOOK_HASH: bool = True  # Reject webhooks whose Hash doesn't match OZOW_PRIVATE_KEY
+    
+    # Payment Webhooks
+    PAYMENT_WEBHOOK_MAX_ATTEMPTS: int = 5  # Failed events are re-queued until this many attempts
+    PAYMENT_WEBHOOK_SWEEP_DELAY_SECONDS: int = 120  # Age before a pending or failed event is re-queued
+    PAYMENT_WEBHOOK_SWEEP_BATCH_SIZE: int = 200  # Events re-queued per sweep
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,426 @@
+"""
+Sidecar indexes for rotated log segments
+
+Every rotated (or compressed) log file gets a small JSON index describing
+fixed-size blocks of lines: their byte offset, time range, levels, event
+types and bloom filters over request_id/user_id/client_ip. Searches use the
+index to skip whole segments and seek straight to candidate blocks instead
+of parsing every line.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import math
+import os
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+INDEX_VERSION = 1
+INDEX_DIR_NAME = ".index"
+BLOOM_FIELDS = ("request_id", "user_id", "client_ip")
+
+
+class BloomFilter:
+    """Fixed-size bloom filter using double hashing over blake2b"""
+    
+    def __init__(self, size_bits: int, hash_count: int, bits: Optional[bytearray] = None):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self.bits = bits if bits is not None else bytearray((size_bits + 7) // 8)
+    
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float) -> 'BloomFilter':
+        """Create a filter sized for the expected number of distinct values"""
+        capacity = max(capacity, 1)
+        size_bits = max(64, math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        hash_count = max(1, round(size_bits / capacity * math.log(2)))
+        return cls(size_bits, hash_count)
+    
+    def _positions(self, value: str) -> Iterator[int]:
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size_bits
+    
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "m": self.size_bits,
+            "k": self.hash_count,
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii")
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'BloomFilter':
+        return cls(data["m"], data["k"], bytearray(base64.b64decode(data["bits"])))
+
+
+@dataclass
+class IndexBlock:
+    """Summary of a contiguous run of lines within a segment"""
+    offset: int
+    lines: int
+    min_ts: Optional[float] = None
+    max_ts: Optional[float] = None
+    untimed: bool = False  # Contains lines whose timestamp could not be parsed
+    levels: List[str] = field(default_factory=list)
+    event_types: List[str] = field(default_factory=list)
+    blooms: Dict[str, BloomFilter] = field(default_factory=dict)
+    
+    def may_match(
+        self,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        level: Optional[str] = None,
+        event_type: Optional[str] = None,
+        **values: Optional[str]
+    ) -> bool:
+        """Return False only when no line in the block can match"""
+        if not self.untimed and self.min_ts is not None:
+            if start_ts is not None and self.max_ts < start_ts:
+                return False
+            if end_ts is not None and self.min_ts > end_ts:
+                return False
+        
+        if level is not None and level not in self.levels:
+            return False
+        if event_type is not None and event_type not in self.event_types:
+            return False
+        
+        for field_name, value in values.items():
+            if value is None:
+                continue
+            bloom = self.blooms.get(field_name)
+            if bloom is None or str(value) not in bloom:
+                return False
+        
+        return True
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "lines": self.lines,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "untimed": self.untimed,
+            "levels": self.levels,
+            "event_types": self.event_types,
+            "blooms": {name: bloom.to_dict() for name, bloom in self.blooms.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'IndexBlock':
+        return cls(
+            offset=data["offset"],
+            lines=data["lines"],
+            min_ts=data.get("min_ts"),
+            max_ts=data.get("max_ts"),
+            untimed=data.get("untimed", False),
+            levels=data.get("levels", []),
+            event_types=data.get("event_types", []),
+            blooms={name: BloomFilter.from_dict(bloom) for name, bloom in data.get("blooms", {}).items()}
+        )
+
+
+@dataclass
+class SegmentIndex:
+    """Sidecar index for a single rotated log segment"""
+    segment: str
+    size: int
+    entries: int
+    blocks: List[IndexBlock]
+    version: int = INDEX_VERSION
+    
+    @property
+    def min_ts(self) -> Optional[float]:
+        timestamps = [block.min_ts for block in self.blocks if block.min_ts is not None]
+        return min(timestamps) if timestamps else None
+    
+    @property
+    def max_ts(self) -> Optional[float]:
+        timestamps = [block.max_ts for block in self.blocks if block.max_ts is not None]
+        return max(timestamps) if timestamps else None
+    
+    def matching_blocks(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        level: Optional[str] = None,
+        event_type: Optional[str] = None,
+        request_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        client_ip: Optional[str] = None
+    ) -> List[IndexBlock]:
+        """Return blocks that may contain lines matching the given filters"""
+        start_ts = to_epoch(start_time) if start_time else None
+        end_ts = to_epoch(end_time) if end_time else None
+        
+        return [
+            block for block in self.blocks
+            if block.may_match(
+                start_ts,
+                end_ts,
+                level,
+                event_type,
+                request_id=request_id,
+                user_id=user_id,
+                client_ip=client_ip
+            )
+        ]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "segment": self.segment,
+            "size": self.size,
+            "entries": self.entries,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "blocks": [block.to_dict() for block in self.blocks]
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SegmentIndex':
+        return cls(
+            segment=data["segment"],
+            size=data["size"],
+            entries=data["entries"],
+            blocks=[IndexBlock.from_dict(block) for block in data["blocks"]],
+            version=data.get("version", INDEX_VERSION)
+        )
+
+
+def to_epoch(value: datetime) -> float:
+    """Convert a datetime to epoch seconds, treating naive values as UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def index_path_for(segment: Path) -> Path:
+    """Location of the sidecar index for a log segment"""
+    segment = Path(segment)
+    return segment.parent / INDEX_DIR_NAME / f"{segment.name}.json"
+
+
+def open_segment(segment: Path):
+    """Open a plain or gzip-compressed segment for binary reading"""
+    segment = Path(segment)
+    if segment.suffix == ".gz":
+        return gzip.open(segment, "rb")
+    return open(segment, "rb")
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return to_epoch(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        return None
+
+
+class _BlockBuilder:
+    """Accumulates line summaries until a block is complete"""
+    
+    def __init__(self, offset: int):
+        self.offset = offset
+        self.lines = 0
+        self.min_ts: Optional[float] = None
+        self.max_ts: Optional[float] = None
+        self.untimed = False
+        self.levels = set()
+        self.event_types = set()
+        self.values = {name: set() for name in BLOOM_FIELDS}
+    
+    def add(self, log_data: Optional[Dict[str, Any]]):
+        self.lines += 1
+        if log_data is None:
+            return
+        
+        timestamp = _parse_timestamp(log_data.get("timestamp"))
+        if timestamp is None:
+            self.untimed = True
+        else:
+            self.min_ts = timestamp if self.min_ts is None else min(self.min_ts, timestamp)
+            self.max_ts = timestamp if self.max_ts is None else max(self.max_ts, timestamp)
+        
+        self.levels.add(log_data.get("level", ""))
+        if log_data.get("event_type") is not None:
+            self.event_types.add(log_data["event_type"])
+        
+        for name in BLOOM_FIELDS:
+            value = log_data.get(name)
+            if value is not None:
+                self.values[name].add(str(value))
+    
+    def build(self, false_positive_rate: float) -> IndexBlock:
+        blooms = {}
+        for name, values in self.values.items():
+            bloom = BloomFilter.for_capacity(len(values), false_positive_rate)
+            for value in values:
+                bloom.add(value)
+            blooms[name] = bloom
+        
+        return IndexBlock(
+            offset=self.offset,
+            lines=self.lines,
+            min_ts=self.min_ts,
+            max_ts=self.max_ts,
+            untimed=self.untimed,
+            levels=sorted(self.levels),
+            event_types=sorted(self.event_types),
+            blooms=blooms
+        )
+
+
+def build_segment_index(
+    segment: Path,
+    block_lines: Optional[int] = None,
+    false_positive_rate: Optional[float] = None
+) -> SegmentIndex:
+    """Scan a segment once and summarise it block by block"""
+    segment = Path(segment)
+    block_lines = block_lines or settings.LOG_INDEX_BLOCK_LINES
+    false_positive_rate = false_positive_rate or settings.LOG_INDEX_BLOOM_FALSE_POSITIVE_RATE
+    
+    blocks = []
+    entries = 0
+    offset = 0
+    builder = _BlockBuilder(offset)
+    
+    with open_segment(segment) as f:
+        for raw_line in f:
+            try:
+                log_data = json.loads(raw_line)
+                if not isinstance(log_data, dict):
+                    log_data = None
+            except ValueError:
+                log_data = None
+            
+            if log_data is not None:
+                entries += 1
+            builder.add(log_data)
+            offset += len(raw_line)
+            
+            if builder.lines >= block_lines:
+                blocks.append(builder.build(false_positive_rate))
+                builder = _BlockBuilder(offset)
+    
+    if builder.lines:
+        blocks.append(builder.build(false_positive_rate))
+    
+    return SegmentIndex(
+        segment=segment.name,
+        size=segment.stat().st_size,
+        entries=entries,
+        blocks=blocks
+    )
+
+
+def save_segment_index(segment: Path, index: SegmentIndex):
+    """Atomically write the sidecar index for a segment"""
+    path = index_path_for(segment)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def write_segment_index(segment: Path) -> SegmentIndex:
+    """Build and persist the sidecar index for a segment"""
+    index = build_segment_index(segment)
+    save_segment_index(segment, index)
+    return index
+
+
+@lru_cache(maxsize=256)
+def _read_index(path: str, mtime_ns: int, size: int) -> Optional[SegmentIndex]:
+    # Keyed on the sidecar's mtime/size so rewritten indexes are picked up
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = SegmentIndex.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+    return index if index.version == INDEX_VERSION else None
+
+
+def load_segment_index(segment: Path) -> Optional[SegmentIndex]:
+    """Load a segment's index, or None if it is missing or stale"""
+    segment = Path(segment)
+    path = index_path_for(segment)
+    try:
+        index_stat = path.stat()
+        segment_size = segment.stat().st_size
+    except OSError:
+        return None
+    
+    index = _read_index(str(path), index_stat.st_mtime_ns, index_stat.st_size)
+    if index is None or index.segment != segment.name or index.size != segment_size:
+        return None
+    return index
+
+
+def relocate_segment_index(source: Path, destination: Path) -> Optional[SegmentIndex]:
+    """Carry an index over to a rewritten copy of the same lines (e.g. after gzip)"""
+    index = load_segment_index(source)
+    if index is None:
+        index = build_segment_index(destination)
+    else:
+        # Cached indexes are shared, so never mutate the loaded instance
+        index = replace(index, segment=Path(destination).name, size=Path(destination).stat().st_size)
+    
+    save_segment_index(destination, index)
+    remove_segment_index(source)
+    return index
+
+
+def remove_segment_index(segment: Path):
+    """Delete a segment's sidecar index if present"""
+    try:
+        index_path_for(segment).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def shift_segment_indexes(base_filename: str, backup_count: int):
+    """Mirror RotatingFileHandler's .N renames for the sidecar indexes"""
+    for i in range(backup_count - 1, 0, -1):
+        source = index_path_for(Path(f"{base_filename}.{i}"))
+        destination = index_path_for(Path(f"{base_filename}.{i + 1}"))
+        if destination.exists():
+            destination.unlink()
+        if source.exists():
+            os.replace(source, destination)
+    
+    remove_segment_index(Path(f"{base_filename}.1"))
+
+
+def iter_segment_lines(segment: Path, blocks: Optional[List[IndexBlock]] = None) -> Iterator[bytes]:
+    """Yield raw lines from a segment, restricted to the given blocks if any"""
+    with open_segment(segment) as f:
+        if blocks is None:
+            yield from f
+            return
+        
+        for block in blocks:
+            f.seek(block.offset)
+            for _ in range(block.lines):
+                line = f.readline()
+                if not line:
+                    break
+                yield line
@@ -4,15 +4,22 @@ Structured logging configuration and utilities for the Panic System Platform
 import structlog
 import logging
 import logging.handlers
+import atexit
+import copy
+import functools
 import json
+import queue
+import random
 import sys
+import threading
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 from pathlib import Path
 from enum import Enum
 
 from app.core.config import settings
+from app.core.log_index import shift_segment_indexes, write_segment_index
 
 
 class LogLevel(str, Enum):
@@ -92,41 +99,77 @@ def add_service_context(logger, method_name, event_dict):
     return event_dict
 
 
+SENSITIVE_KEYS = (
+    'password', 'token', 'secret', 'key', 'authorization',
+    'credit_card', 'ssn', 'phone', 'email', 'address'
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def _sensitive_key_kind(key: str) -> Optional[str]:
+    """Classify a log key as not sensitive (None), 'partial' or 'full' masking"""
+    lowered = key.lower()
+    if not any(sensitive in lowered for sensitive in SENSITIVE_KEYS):
+        return None
+    return 'partial' if lowered in ('phone', 'email') else 'full'
+
+
+def _mask_value(kind: str, value: Any) -> str:
+    """Mask a sensitive value"""
+    if kind == 'partial' and isinstance(value, str):
+        if '@' in value:  # Email
+            parts = value.split('@')
+            return f"{parts[0][:2]}***@{parts[1]}"
+        if len(value) >= 4:  # Phone
+            return f"***{value[-4:]}"
+    return "***"
+
+
+def _filter_value(value: Any) -> Any:
+    """Filter nested containers, returning the same object when nothing changed"""
+    if isinstance(value, dict):
+        return _filter_dict(value)
+    if isinstance(value, list):
+        filtered = [_filter_dict(item) if isinstance(item, dict) else item for item in value]
+        if all(new is old for new, old in zip(filtered, value)):
+            return value
+        return filtered
+    return value
+
+
+def _filter_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Mask sensitive keys, copying only the dicts that actually change"""
+    filtered = None
+    for key, value in data.items():
+        kind = _sensitive_key_kind(key) if isinstance(key, str) else None
+        new_value = _mask_value(kind, value) if kind else _filter_value(value)
+        if new_value is not value:
+            if filtered is None:
+                filtered = dict(data)
+            filtered[key] = new_value
+    return data if filtered is None else filtered
+
+
 def filter_sensitive_data(logger, method_name, event_dict):
     """Filter sensitive data from log entries"""
-    sensitive_keys = {
-        'password', 'token', 'secret', 'key', 'authorization',
-        'credit_card', 'ssn', 'phone', 'email', 'address'
-    }
+    return _filter_dict(event_dict)
+
+
+def sample_log_events(logger, method_name, event_dict):
+    """Drop a configurable fraction of high-volume, low-value events"""
+    if method_name == 'debug':
+        rate = settings.LOG_DEBUG_SAMPLE_RATE
+    elif event_dict.get('event') == 'request_started':
+        rate = settings.LOG_REQUEST_SAMPLE_RATE
+    else:
+        return event_dict
     
-    def _filter_dict(data: Dict[str, Any]) -> Dict[str, Any]:
-        filtered = {}
-        for key, value in data.items():
-            if any(sensitive in key.lower() for sensitive in sensitive_keys):
-                if key.lower() in ['phone', 'email']:
-                    # Partially mask phone and email
-                    if isinstance(value, str):
-                        if '@' in value:  # Email
-                            parts = value.split('@')
-                            filtered[key] = f"{parts[0][:2]}***@{parts[1]}"
-                        elif len(value) >= 4:  # Phone
-                            filtered[key] = f"***{value[-4:]}"
-                        else:
-                            filtered[key] = "***"
-                    else:
-                        filtered[key] = "***"
-                else:
-                    filtered[key] = "***"
-            elif isinstance(value, dict):
-                filtered[key] = _filter_dict(value)
-            elif isinstance(value, list):
-                filtered[key] = [_filter_dict(item) if isinstance(item, dict) else item for item in value]
-            else:
-                filtered[key] = value
-        return filtered
+    if rate < 1.0 and random.random() >= rate:
+        if _log_pipeline is not None:
+            _log_pipeline.sampled_records += 1
+        raise structlog.DropEvent
     
-    # Filter the event_dict itself
-    return _filter_dict(event_dict)
+    return event_dict
 
 
 class JSONFormatter(logging.Formatter):
@@ -146,6 +189,8 @@ class JSONFormatter(logging.Formatter):
         # Add exception info if present
         if record.exc_info:
             log_entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_entry['exception'] = record.exc_text
         
         # Add extra fields from record
         for key, value in record.__dict__.items():
@@ -159,40 +204,334 @@ class JSONFormatter(logging.Formatter):
         return json.dumps(log_entry)
 
 
+class BatchedStreamHandler(logging.StreamHandler):
+    """Stream handler that writes pre-rendered lines in batches"""
+    
+    def write_batch(self, lines: List[str]):
+        """Write rendered lines and flush once"""
+        self.acquire()
+        try:
+            self.stream.write("".join(line + self.terminator for line in lines))
+            self.flush()
+        finally:
+            self.release()
+
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that writes pre-rendered lines in batches"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._indexer: Optional[threading.Thread] = None
+    
+    def write_batch(self, lines: List[str]):
+        """Write rendered lines, rolling over when the size limit is reached"""
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            
+            for line in lines:
+                if (
+                    self.maxBytes > 0
+                    and self.stream.tell() > 0
+                    and self.stream.tell() + len(line) + 1 >= self.maxBytes
+                ):
+                    self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                self.stream.write(line + self.terminator)
+            
+            self.stream.flush()
+        finally:
+            self.release()
+    
+    def doRollover(self):
+        """Rotate the file and index the segment that was just closed"""
+        if self.backupCount > 0:
+            # The previous segment must be indexed before it is renamed
+            self._wait_for_indexer()
+            shift_segment_indexes(self.baseFilename, self.backupCount)
+        
+        super().doRollover()
+        
+        if self.backupCount > 0:
+            # Indexing reads the whole segment, so it runs off the pipeline thread
+            self._indexer = threading.Thread(
+                target=self._index_segment,
+                args=(Path(f"{self.baseFilename}.1"),),
+                name="log-index",
+                daemon=True
+            )
+            self._indexer.start()
+    
+    def close(self):
+        """Finish indexing the last closed segment, then close the file"""
+        self._wait_for_indexer()
+        super().close()
+    
+    def _wait_for_indexer(self):
+        if self._indexer is not None:
+            self._indexer.join()
+            self._indexer = None
+    
+    @staticmethod
+    def _index_segment(segment: Path):
+        try:
+            write_segment_index(segment)
+        except Exception:
+            # An unindexed segment is still searchable by a full scan
+            pass
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Non-blocking handler that hands records to the log pipeline"""
+    
+    def __init__(self, pipeline: 'LogPipeline', route: str):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.route = route
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Make the record safe to render on another thread without rendering it"""
+        record = copy.copy(record)
+        
+        # structlog records carry their event dict and are rendered by the listener
+        if not isinstance(record.msg, dict):
+            record.msg = record.getMessage()
+            record.args = None
+        
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        """Enqueue without blocking, dropping the record if the queue is full"""
+        try:
+            # The pipeline's queue, not our own reference, which is stale after fork
+            self.pipeline.queue.put_nowait((self.route, record))
+        except queue.Full:
+            self.pipeline.dropped_records += 1
+
+
+class LogPipeline:
+    """
+    Queue-backed log sink
+    
+    Request-path code only enqueues records. A background thread drains the
+    queue in batches, renders each record once and writes the rendered line
+    to every handler on the record's route with a single flush per batch.
+    """
+    
+    _STOP = object()
+    
+    def __init__(
+        self,
+        routes: Dict[str, List[logging.Handler]],
+        max_size: int = 10000,
+        batch_size: int = 256
+    ):
+        self.routes = routes
+        self.queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.dropped_records = 0
+        self.sampled_records = 0
+        self.written_records = 0
+        self.batches_written = 0
+        self.json_formatter = JSONFormatter()
+        self.structlog_formatter = structlog.stdlib.ProcessorFormatter(
+            processor=structlog.processors.JSONRenderer()
+        )
+        self._thread: Optional[threading.Thread] = None
+    
+    def handler(self, route: str) -> LogQueueHandler:
+        """Create a queue handler feeding the given route"""
+        return LogQueueHandler(self, route)
+    
+    def start(self):
+        """Start the listener thread"""
+        self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self._thread is None:
+            return
+        
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+        
+        for handlers in self.routes.values():
+            for handler in handlers:
+                try:
+                    handler.flush()
+                except (OSError, ValueError):
+                    # Stream already closed, e.g. stdout at interpreter exit
+                    pass
+    
+    def restart_after_fork(self):
+        """
+        Give a forked child its own queue and listener thread
+        
+        The child inherits the queue but not the thread draining it. Records
+        already queued belong to the parent, which writes them itself.
+        """
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self._thread = None
+        self.start()
+    
+    def stats(self) -> Dict[str, int]:
+        """Get queue depth and record counters"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "dropped_records": self.dropped_records,
+            "sampled_records": self.sampled_records,
+            "written_records": self.written_records,
+            "batches_written": self.batches_written,
+        }
+    
+    def render(self, record: logging.LogRecord) -> str:
+        """Render a record to a JSON line"""
+        if isinstance(record.msg, dict):
+            return self.structlog_formatter.format(record)
+        return self.json_formatter.format(record)
+    
+    def _run(self):
+        """Drain the queue in batches until stopped"""
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            
+            batch = [item]
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            self._write_batch(batch)
+            if stopping:
+                return
+    
+    def _write_batch(self, batch: List[tuple]):
+        """Render each record once and write it to its route's handlers"""
+        pending: Dict[logging.Handler, List[str]] = {}
+        
+        for route, record in batch:
+            try:
+                line = self.render(record)
+            except Exception:
+                self.dropped_records += 1
+                continue
+            
+            for handler in self.routes.get(route, ()):
+                if record.levelno >= handler.level and handler.filter(record):
+                    pending.setdefault(handler, []).append(line)
+        
+        for handler, lines in pending.items():
+            try:
+                handler.write_batch(lines)
+            except Exception:
+                self.dropped_records += len(lines)
+        
+        self.written_records += len(batch)
+        self.batches_written += 1
+
+
+# Active log pipeline, replaced whenever setup_logging runs
+_log_pipeline: Optional[LogPipeline] = None
+_log_queue_handlers: List[tuple] = []
+
+
+def get_log_pipeline_stats() -> Dict[str, int]:
+    """Get statistics for the active log pipeline"""
+    if _log_pipeline is None:
+        return {
+            "queue_depth": 0,
+            "queue_capacity": 0,
+            "dropped_records": 0,
+            "sampled_records": 0,
+            "written_records": 0,
+            "batches_written": 0,
+        }
+    return _log_pipeline.stats()
+
+
+def shutdown_logging():
+    """Detach queue handlers and flush the active log pipeline"""
+    global _log_pipeline
+    
+    for logger_name, handler in _log_queue_handlers:
+        logging.getLogger(logger_name).removeHandler(handler)
+    _log_queue_handlers.clear()
+    
+    if _log_pipeline is not None:
+        _log_pipeline.stop()
+        for handlers in _log_pipeline.routes.values():
+            for handler in handlers:
+                if isinstance(handler, logging.FileHandler):
+                    handler.close()
+        _log_pipeline = None
+
+
+atexit.register(shutdown_logging)
+
+
+def _restart_log_pipeline_in_child():
+    """Restart the active pipeline in a forked child, e.g. a Celery prefork worker"""
+    if _log_pipeline is not None and _log_pipeline._thread is not None:
+        _log_pipeline.restart_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_log_pipeline_in_child)
+
+
 def setup_logging():
     """Configure structured logging for the application"""
+    global _log_pipeline
     
     # Create logs directory
     log_dir = Path(settings.LOG_DIR)
     log_dir.mkdir(exist_ok=True)
     
-    # Configure structlog
+    # Configure structlog. Events are handed to the stdlib queue handlers as
+    # dicts and rendered to JSON once, on the log pipeline thread.
     structlog.configure(
         processors=[
+            sample_log_events,
             structlog.contextvars.merge_contextvars,
             add_service_context,
             add_request_context,
             add_timestamp,
             filter_sensitive_data,
             structlog.processors.add_log_level,
+            structlog.stdlib.add_logger_name,
             structlog.processors.StackInfoRenderer(),
             structlog.dev.set_exc_info,
-            structlog.processors.JSONRenderer()
+            structlog.processors.format_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter
         ],
         wrapper_class=structlog.make_filtering_bound_logger(
             logging.DEBUG if settings.DEBUG else logging.INFO
         ),
-        logger_factory=structlog.WriteLoggerFactory(),
+        logger_factory=structlog.stdlib.LoggerFactory(),
         cache_logger_on_first_use=True,
     )
     
     # Configure standard library logging
     log_level = getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=log_level,
-    )
+    logging.getLogger().setLevel(log_level)
     
     # Suppress verbose AWS/boto3 debug logging to improve performance
     logging.getLogger('botocore').setLevel(logging.WARNING)
@@ -205,58 +544,72 @@ def setup_logging():
     logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
     logging.getLogger('sqlalchemy.pool').setLevel(logging.WARNING)
     
-    # Create file handlers for different log types
+    # Replace any pipeline from a previous call so handlers are not duplicated
+    shutdown_logging()
+    
+    # Create file handlers for different log types. They open lazily on the
+    # pipeline thread and are only ever written to from there.
+    
+    # Console output
+    console_handler = BatchedStreamHandler(sys.stdout)
     
     # Application logs
-    app_handler = logging.handlers.RotatingFileHandler(
+    app_handler = BatchedRotatingFileHandler(
         log_dir / "application.log",
         maxBytes=settings.LOG_MAX_FILE_SIZE_MB * 1024 * 1024,
-        backupCount=settings.LOG_MAX_BACKUP_COUNT
+        backupCount=settings.LOG_MAX_BACKUP_COUNT,
+        delay=True
     )
-    app_handler.setFormatter(JSONFormatter())
     
     # Security logs
-    security_handler = logging.handlers.RotatingFileHandler(
+    security_handler = BatchedRotatingFileHandler(
         log_dir / "security.log",
         maxBytes=settings.LOG_MAX_FILE_SIZE_MB * 1024 * 1024,
-        backupCount=settings.SECURITY_LOG_MAX_BACKUP_COUNT
+        backupCount=settings.SECURITY_LOG_MAX_BACKUP_COUNT,
+        delay=True
     )
-    security_handler.setFormatter(JSONFormatter())
     
     # Business logs
-    business_handler = logging.handlers.RotatingFileHandler(
+    business_handler = BatchedRotatingFileHandler(
         log_dir / "business.log",
         maxBytes=settings.LOG_MAX_FILE_SIZE_MB * 1024 * 1024,
-        backupCount=settings.LOG_MAX_BACKUP_COUNT
+        backupCount=settings.LOG_MAX_BACKUP_COUNT,
+        delay=True
     )
-    business_handler.setFormatter(JSONFormatter())
     
     # Error logs
-    error_handler = logging.handlers.RotatingFileHandler(
+    error_handler = BatchedRotatingFileHandler(
         log_dir / "errors.log",
         maxBytes=settings.LOG_MAX_FILE_SIZE_MB * 1024 * 1024,
-        backupCount=settings.LOG_MAX_BACKUP_COUNT
+        backupCount=settings.LOG_MAX_BACKUP_COUNT,
+        delay=True
     )
-    error_handler.setFormatter(JSONFormatter())
     error_handler.setLevel(logging.ERROR)
     
-    # Add handlers to root logger
-    root_logger = logging.getLogger()
-    root_logger.addHandler(app_handler)
-    root_logger.addHandler(security_handler)
-    root_logger.addHandler(business_handler)
-    root_logger.addHandler(error_handler)
+    _log_pipeline = LogPipeline(
+        routes={
+            "application": [console_handler, app_handler, error_handler],
+            "security": [security_handler],
+            "business": [business_handler],
+        },
+        max_size=settings.LOG_QUEUE_MAX_SIZE,
+        batch_size=settings.LOG_BATCH_SIZE
+    )
+    _log_pipeline.start()
     
-    # Configure specific loggers
+    # Attach queue handlers: root feeds the application route, the security
+    # and business loggers feed their own files only
+    for logger_name, route in (("", "application"), ("security", "security"), ("business", "business")):
+        handler = _log_pipeline.handler(route)
+        logging.getLogger(logger_name).addHandler(handler)
+        _log_queue_handlers.append((logger_name, handler))
     
     # Security logger
     security_logger = logging.getLogger("security")
-    security_logger.addHandler(security_handler)
     security_logger.setLevel(logging.INFO)
     
     # Business logger
     business_logger = logging.getLogger("business")
-    business_logger.addHandler(business_handler)
     business_logger.setLevel(logging.INFO)
     
     # Disable propagation to avoid duplicate logs
@@ -1,15 +1,28 @@
 """
 Prometheus metrics collection and monitoring
 """
+# Must come first: it configures prometheus_client for multiple workers
+from app.core import metrics_multiprocess
 from prometheus_client import Counter, Histogram, Gauge, Info, CollectorRegistry, generate_latest
-from prometheus_client.multiprocess import MultiProcessCollector
-from typing import Dict, Any, Optional
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.openmetrics.exposition import (
+    CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE,
+    generate_latest as generate_latest_openmetrics
+)
+from typing import Dict, Any, Optional, Tuple
+import threading
 import time
 import functools
 import asyncio
+import zlib
 from contextlib import asynccontextmanager
 
-# Create a custom registry for the application
+from app.core.config import settings
+
+# Create a custom registry for the application. Gauges set a multiprocess_mode
+# that says how to combine workers' values when PROMETHEUS_MULTIPROC_DIR is set:
+# "livesum" for per-process state, "mostrecent" for values computed from the
+# database by whichever process ran the update.
 REGISTRY = CollectorRegistry()
 
 # Application Info
@@ -27,10 +40,41 @@ http_requests_total = Counter(
     registry=REGISTRY
 )
 
+# Fine-grained below 100ms so latency regressions show against SLOs
+HTTP_DURATION_BUCKETS = [
+    0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0
+]
+HTTP_SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
 http_request_duration_seconds = Histogram(
     'http_request_duration_seconds',
     'HTTP request duration in seconds',
     ['method', 'endpoint'],
+    buckets=HTTP_DURATION_BUCKETS,
+    registry=REGISTRY
+)
+
+http_requests_in_flight = Gauge(
+    'http_requests_in_flight',
+    'HTTP requests currently being handled',
+    ['method', 'endpoint'],
+    multiprocess_mode='livesum',
+    registry=REGISTRY
+)
+
+http_request_size_bytes = Histogram(
+    'http_request_size_bytes',
+    'HTTP request body size in bytes',
+    ['method', 'endpoint'],
+    buckets=HTTP_SIZE_BUCKETS,
+    registry=REGISTRY
+)
+
+http_response_size_bytes = Histogram(
+    'http_response_size_bytes',
+    'HTTP response body size in bytes',
+    ['method', 'endpoint'],
+    buckets=HTTP_SIZE_BUCKETS,
     registry=REGISTRY
 )
 
@@ -85,6 +129,7 @@ active_subscriptions = Gauge(
     'active_subscriptions_total',
     'Total active subscriptions',
     ['firm_id'],
+    multiprocess_mode='mostrecent',
     registry=REGISTRY
 )
 
@@ -102,18 +147,18 @@ credit_transactions_total = Counter(
     registry=REGISTRY
 )
 
-# Prank Detection Metrics
+# Prank Detection Metrics; user IDs are attached as exemplars, not labels
 prank_flags_total = Counter(
     'prank_flags_total',
     'Total prank flags',
-    ['user_id', 'firm_id'],
+    ['firm_id'],
     registry=REGISTRY
 )
 
 user_fines_total = Counter(
     'user_fines_total',
     'Total user fines issued',
-    ['user_id', 'fine_amount'],
+    ['fine_amount'],
     registry=REGISTRY
 )
 
@@ -121,12 +166,14 @@ user_fines_total = Counter(
 database_connections = Gauge(
     'database_connections_active',
     'Active database connections',
+    multiprocess_mode='mostrecent',
     registry=REGISTRY
 )
 
 redis_connections = Gauge(
     'redis_connections_active',
     'Active Redis connections',
+    multiprocess_mode='mostrecent',
     registry=REGISTRY
 )
 
@@ -134,6 +181,7 @@ cache_hit_rate = Gauge(
     'cache_hit_rate',
     'Cache hit rate percentage',
     ['cache_type'],
+    multiprocess_mode='mostrecent',
     registry=REGISTRY
 )
 
@@ -142,6 +190,7 @@ websocket_connections = Gauge(
     'websocket_connections_active',
     'Active WebSocket connections',
     ['connection_type'],
+    multiprocess_mode='livesum',
     registry=REGISTRY
 )
 
@@ -153,11 +202,59 @@ notifications_sent_total = Counter(
     registry=REGISTRY
 )
 
+notification_queue_latency_seconds = Histogram(
+    'notification_queue_latency_seconds',
+    'Time notifications wait in their priority lane before dispatch',
+    ['lane'],
+    buckets=[0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300],
+    registry=REGISTRY
+)
+
+notification_queue_backlog = Gauge(
+    'notification_queue_backlog',
+    'Notifications queued or in flight per priority lane',
+    ['lane'],
+    multiprocess_mode='livesum',
+    registry=REGISTRY
+)
+
+# Payment Webhook Metrics
+payment_webhooks_received_total = Counter(
+    'payment_webhooks_received_total',
+    'Payment webhooks received, by intake outcome (accepted, duplicate, rejected)',
+    ['provider', 'outcome'],
+    registry=REGISTRY
+)
+
+payment_webhook_events_processed_total = Counter(
+    'payment_webhook_events_processed_total',
+    'Stored payment webhook events processed, by result (applied, unmatched, failed)',
+    ['provider', 'result'],
+    registry=REGISTRY
+)
+
+payment_webhook_processing_seconds = Histogram(
+    'payment_webhook_processing_seconds',
+    'Time to apply a stored payment webhook event',
+    ['provider'],
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    registry=REGISTRY
+)
+
+payment_webhook_lag_seconds = Histogram(
+    'payment_webhook_lag_seconds',
+    'Time from receiving a payment webhook to applying it',
+    ['provider'],
+    buckets=[0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900],
+    registry=REGISTRY
+)
+
 # Performance Metrics
 zone_performance = Gauge(
     'zone_average_response_time_seconds',
     'Average response time per zone',
     ['zone_id', 'service_type'],
+    multiprocess_mode='mostrecent',
     registry=REGISTRY
 )
 
@@ -165,18 +262,189 @@ firm_performance = Gauge(
     'firm_average_response_time_seconds',
     'Average response time per firm',
     ['firm_id', 'service_type'],
+    multiprocess_mode='mostrecent',
+    registry=REGISTRY
+)
+
+
+# Cardinality Metrics
+metrics_label_overflow_total = Counter(
+    'metrics_label_overflow_total',
+    'Label values beyond their budget, folded into overflow buckets or dropped',
+    ['metric', 'label'],
     registry=REGISTRY
 )
 
 
+class LabelBudget:
+    """
+    Caps the distinct values one label of one metric may take
+    
+    The first `limit` values seen are kept as they are. Later values share
+    `overflow_buckets` hashed buckets, which keeps counter totals correct, or
+    are dropped when there are no buckets; a gauge can't be shared.
+    """
+    
+    def __init__(self, metric: str, label: str, limit: int, overflow_buckets: int = 0):
+        self.metric = metric
+        self.label = label
+        self.limit = limit
+        self.overflow_buckets = overflow_buckets
+        self._values = set()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._values)
+    
+    def resolve(self, value: str) -> Optional[str]:
+        """
+        Label value to record for a raw value
+        
+        Returns:
+            The value itself, its overflow bucket, or None to skip recording
+        """
+        value = str(value)
+        if value in self._values:
+            return value
+        
+        with self._lock:
+            if value in self._values or len(self._values) < self.limit:
+                self._values.add(value)
+                return value
+        
+        metrics_label_overflow_total.labels(metric=self.metric, label=self.label).inc()
+        if not self.overflow_buckets:
+            return None
+        return f"overflow_{zlib.crc32(value.encode()) % self.overflow_buckets}"
+
+
+def _budget(metric: str, label: str, limit: Optional[int] = None, overflow: bool = True) -> LabelBudget:
+    return LabelBudget(
+        metric,
+        label,
+        limit if limit is not None else settings.METRICS_LABEL_VALUE_LIMIT,
+        settings.METRICS_LABEL_OVERFLOW_BUCKETS if overflow else 0
+    )
+
+
+# Budgets for labels whose values grow with the customer base
+LABEL_BUDGETS: Dict[Tuple[str, str], LabelBudget] = {
+    budget_key: _budget(*budget_key, **options)
+    for budget_key, options in {
+        ('panic_requests_total', 'firm_id'): {},
+        ('panic_request_response_time_seconds', 'zone'): {},
+        ('panic_request_completion_time_seconds', 'zone'): {},
+        ('active_subscriptions_total', 'firm_id'): {'overflow': False},
+        ('subscription_purchases_total', 'product_id'): {},
+        ('subscription_purchases_total', 'firm_id'): {},
+        ('credit_transactions_total', 'firm_id'): {},
+        ('prank_flags_total', 'firm_id'): {},
+        ('user_fines_total', 'fine_amount'): {'limit': 50},
+        ('zone_average_response_time_seconds', 'zone_id'): {'overflow': False},
+        ('firm_average_response_time_seconds', 'firm_id'): {'overflow': False},
+    }.items()
+}
+
+
+def bounded(metric: str, label: str, value: str) -> Optional[str]:
+    """Resolve a label value against its budget"""
+    return LABEL_BUDGETS[(metric, label)].resolve(value)
+
+
+def _exemplar(**ids: Optional[str]) -> Optional[Dict[str, str]]:
+    exemplar = {name: str(value) for name, value in ids.items() if value}
+    return exemplar or None
+
+
+class CardinalityCollector:
+    """Expose the number of series each labelled metric holds at scrape time"""
+    
+    def __init__(self, registry: CollectorRegistry):
+        self.registry = registry
+    
+    def series_counts(self) -> Dict[str, int]:
+        """Child series per labelled metric"""
+        counts = {}
+        # prometheus_client keeps a metric's labelled children in `_metrics`
+        for collector in list(self.registry._collector_to_names):
+            children = getattr(collector, '_metrics', None)
+            if children is not None and getattr(collector, '_labelnames', None):
+                counts[collector._name] = len(children)
+        return counts
+    
+    def collect(self):
+        series = GaugeMetricFamily(
+            'metrics_series',
+            'Labelled series held per metric',
+            labels=['metric']
+        )
+        for name, count in sorted(self.series_counts().items()):
+            series.add_metric([name], count)
+        yield series
+
+
+cardinality_collector = CardinalityCollector(REGISTRY)
+REGISTRY.register(cardinality_collector)
+
+
+class LogPipelineCollector:
+    """Expose log pipeline queue depth and record counters at scrape time"""
+    
+    def collect(self):
+        from app.core.logging import get_log_pipeline_stats
+        
+        stats = get_log_pipeline_stats()
+        yield GaugeMetricFamily(
+            'log_queue_depth',
+            'Log records waiting to be written',
+            value=stats['queue_depth']
+        )
+        yield CounterMetricFamily(
+            'log_records_dropped',
+            'Log records dropped because the queue was full or writing failed',
+            value=stats['dropped_records']
+        )
+        yield CounterMetricFamily(
+            'log_records_sampled_out',
+            'Log records discarded by event sampling',
+            value=stats['sampled_records']
+        )
+        yield CounterMetricFamily(
+            'log_records_written',
+            'Log records written by the log pipeline',
+            value=stats['written_records']
+        )
+
+
+log_pipeline_collector = LogPipelineCollector()
+REGISTRY.register(log_pipeline_collector)
+
+
 class MetricsCollector:
     """Centralized metrics collection service"""
     
     def __init__(self):
         self.registry = REGISTRY
+        # What a scrape exposes: every worker's values in multiprocess mode
+        if metrics_multiprocess.is_multiprocess():
+            self.exposition_registry = metrics_multiprocess.build_exposition_registry(
+                app_info, cardinality_collector, log_pipeline_collector
+            )
+        else:
+            self.exposition_registry = REGISTRY
+        self._exposition_cache: Dict[bool, Tuple[float, str]] = {}
+        self._exposition_lock = threading.Lock()
     
-    def record_http_request(self, method: str, endpoint: str, status_code: int, duration: float):
-        """Record HTTP request metrics"""
+    def record_http_request(
+        self,
+        method: str,
+        endpoint: str,
+        status_code: int,
+        duration: float,
+        request_size: Optional[int] = None,
+        response_size: Optional[int] = None
+    ):
+        """Record HTTP request metrics; endpoint should be the route template"""
         http_requests_total.labels(
             method=method,
             endpoint=endpoint,
@@ -187,6 +455,15 @@ class MetricsCollector:
             method=method,
             endpoint=endpoint
         ).observe(duration)
+        
+        if request_size is not None:
+            http_request_size_bytes.labels(method=method, endpoint=endpoint).observe(request_size)
+        if response_size is not None:
+            http_response_size_bytes.labels(method=method, endpoint=endpoint).observe(response_size)
+    
+    def update_http_in_flight(self, method: str, endpoint: str, delta: int):
+        """Adjust the number of in-flight requests for a route"""
+        http_requests_in_flight.labels(method=method, endpoint=endpoint).inc(delta)
     
     def record_auth_attempt(self, status: str, user_type: str):
         """Record authentication attempt"""
@@ -203,59 +480,59 @@ class MetricsCollector:
         """Record account lockout"""
         account_lockouts_total.labels(user_type=user_type).inc()
     
-    def record_panic_request(self, service_type: str, status: str, firm_id: str):
+    def record_panic_request(self, service_type: str, status: str, firm_id: str, request_id: Optional[str] = None):
         """Record panic request"""
         panic_requests_total.labels(
             service_type=service_type,
             status=status,
-            firm_id=firm_id
-        ).inc()
+            firm_id=bounded('panic_requests_total', 'firm_id', firm_id)
+        ).inc(exemplar=_exemplar(request_id=request_id))
     
     def record_panic_response_time(self, service_type: str, zone: str, response_time: float):
         """Record panic request response time"""
         panic_request_response_time.labels(
             service_type=service_type,
-            zone=zone
+            zone=bounded('panic_request_response_time_seconds', 'zone', zone)
         ).observe(response_time)
     
     def record_panic_completion_time(self, service_type: str, zone: str, completion_time: float):
         """Record panic request completion time"""
         panic_request_completion_time.labels(
             service_type=service_type,
-            zone=zone
+            zone=bounded('panic_request_completion_time_seconds', 'zone', zone)
         ).observe(completion_time)
     
     def update_active_subscriptions(self, firm_id: str, count: int):
-        """Update active subscriptions count"""
-        active_subscriptions.labels(firm_id=firm_id).set(count)
+        """Update active subscriptions count; firms beyond the label budget are skipped"""
+        firm_label = bounded('active_subscriptions_total', 'firm_id', firm_id)
+        if firm_label is not None:
+            active_subscriptions.labels(firm_id=firm_label).set(count)
     
     def record_subscription_purchase(self, product_id: str, firm_id: str):
         """Record subscription purchase"""
         subscription_purchases_total.labels(
-            product_id=product_id,
-            firm_id=firm_id
+            product_id=bounded('subscription_purchases_total', 'product_id', product_id),
+            firm_id=bounded('subscription_purchases_total', 'firm_id', firm_id)
         ).inc()
     
     def record_credit_transaction(self, transaction_type: str, firm_id: str):
         """Record credit transaction"""
         credit_transactions_total.labels(
             transaction_type=transaction_type,
-            firm_id=firm_id
+            firm_id=bounded('credit_transactions_total', 'firm_id', firm_id)
         ).inc()
     
     def record_prank_flag(self, user_id: str, firm_id: str):
-        """Record prank flag"""
+        """Record prank flag, with the user as an exemplar"""
         prank_flags_total.labels(
-            user_id=user_id,
-            firm_id=firm_id
-        ).inc()
+            firm_id=bounded('prank_flags_total', 'firm_id', firm_id)
+        ).inc(exemplar=_exemplar(user_id=user_id))
     
     def record_user_fine(self, user_id: str, fine_amount: str):
-        """Record user fine"""
+        """Record user fine, with the user as an exemplar"""
         user_fines_total.labels(
-            user_id=user_id,
-            fine_amount=fine_amount
-        ).inc()
+            fine_amount=bounded('user_fines_total', 'fine_amount', fine_amount)
+        ).inc(exemplar=_exemplar(user_id=user_id))
     
     def update_database_connections(self, count: int):
         """Update database connections count"""
@@ -280,23 +557,81 @@ class MetricsCollector:
             status=status
         ).inc()
     
+    def record_notification_queue_latency(self, lane: str, seconds: float):
+        """Record how long a notification waited in its priority lane"""
+        notification_queue_latency_seconds.labels(lane=lane).observe(seconds)
+    
+    def update_notification_queue_backlog(self, lane: str, count: int):
+        """Update queued and in-flight notifications for a priority lane"""
+        notification_queue_backlog.labels(lane=lane).set(count)
+    
+    def record_payment_webhook_received(self, provider: str, outcome: str):
+        """Record a payment webhook at intake"""
+        payment_webhooks_received_total.labels(provider=provider, outcome=outcome).inc()
+    
+    def record_payment_webhook_processed(
+        self,
+        provider: str,
+        result: str,
+        duration: float,
+        lag: Optional[float] = None
+    ):
+        """Record processing of a stored payment webhook event"""
+        payment_webhook_events_processed_total.labels(provider=provider, result=result).inc()
+        payment_webhook_processing_seconds.labels(provider=provider).observe(duration)
+        if lag is not None:
+            payment_webhook_lag_seconds.labels(provider=provider).observe(max(0.0, lag))
+    
     def update_zone_performance(self, zone_id: str, service_type: str, avg_response_time: float):
-        """Update zone performance metrics"""
-        zone_performance.labels(
-            zone_id=zone_id,
-            service_type=service_type
-        ).set(avg_response_time)
+        """Update zone performance metrics; zones beyond the label budget are skipped"""
+        zone_label = bounded('zone_average_response_time_seconds', 'zone_id', zone_id)
+        if zone_label is not None:
+            zone_performance.labels(
+                zone_id=zone_label,
+                service_type=service_type
+            ).set(avg_response_time)
     
     def update_firm_performance(self, firm_id: str, service_type: str, avg_response_time: float):
-        """Update firm performance metrics"""
-        firm_performance.labels(
-            firm_id=firm_id,
-            service_type=service_type
-        ).set(avg_response_time)
-    
-    def get_metrics(self) -> str:
-        """Get all metrics in Prometheus format"""
-        return generate_latest(self.registry).decode('utf-8')
+        """Update firm performance metrics; firms beyond the label budget are skipped"""
+        firm_label = bounded('firm_average_response_time_seconds', 'firm_id', firm_id)
+        if firm_label is not None:
+            firm_performance.labels(
+                firm_id=firm_label,
+                service_type=service_type
+            ).set(avg_response_time)
+    
+    def get_series_counts(self) -> Dict[str, int]:
+        """Get the number of labelled series each metric holds"""
+        return cardinality_collector.series_counts()
+    
+    def get_metrics(self, openmetrics: bool = False) -> str:
+        """
+        Get all metrics in Prometheus format
+        
+        The output is reused for METRICS_EXPOSITION_CACHE_SECONDS, so
+        frequent or concurrent scrapes serialize the registry once.
+        
+        Args:
+            openmetrics: Use the OpenMetrics format, which carries exemplars
+        """
+        max_age = settings.METRICS_EXPOSITION_CACHE_SECONDS
+        with self._exposition_lock:
+            cached = self._exposition_cache.get(openmetrics)
+            if cached and time.monotonic() - cached[0] < max_age:
+                return cached[1]
+            
+            output = self._generate(openmetrics)
+            if max_age > 0:
+                self._exposition_cache[openmetrics] = (time.monotonic(), output)
+            return output
+    
+    def _generate(self, openmetrics: bool) -> str:
+        generate = generate_latest_openmetrics if openmetrics else generate_latest
+        if self.exposition_registry is REGISTRY:
+            return generate(self.exposition_registry).decode('utf-8')
+        
+        with metrics_multiprocess.directory_lock():
+            return generate(self.exposition_registry).decode('utf-8')
 
 
 # Global metrics collector instance
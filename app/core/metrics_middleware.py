@@ -4,12 +4,17 @@ Metrics middleware for automatic HTTP request tracking
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
-from typing import Callable
+from typing import Callable, Optional
 from app.core.metrics import metrics_collector
 
 
 class MetricsMiddleware(BaseHTTPMiddleware):
-    """Middleware to automatically collect HTTP request metrics"""
+    """
+    Middleware to automatically collect HTTP request metrics
+    
+    RequestPipelineMiddleware records the same metrics, plus in-flight
+    requests, for the application itself.
+    """
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Skip metrics endpoint to avoid recursion
@@ -17,10 +22,8 @@ class MetricsMiddleware(BaseHTTPMiddleware):
             return await call_next(request)
         
         start_time = time.time()
-        
-        # Extract endpoint pattern for better grouping
-        endpoint = self._get_endpoint_pattern(request)
         method = request.method
+        response = None
         
         try:
             response = await call_next(request)
@@ -34,18 +37,37 @@ class MetricsMiddleware(BaseHTTPMiddleware):
             # Calculate request duration
             duration = time.time() - start_time
             
+            # The router has matched by now, so prefer its route template
+            endpoint = self._get_route_template(request) or self._get_endpoint_pattern(request)
+            
             # Record metrics
             metrics_collector.record_http_request(
                 method=method,
                 endpoint=endpoint,
                 status_code=status_code,
-                duration=duration
+                duration=duration,
+                request_size=self._content_length(getattr(request, "headers", None)),
+                response_size=self._content_length(getattr(response, "headers", None))
             )
         
         return response
     
+    def _get_route_template(self, request: Request) -> Optional[str]:
+        """Return the matched route's path template, if the router set one"""
+        scope = getattr(request, "scope", None)
+        route = scope.get("route") if isinstance(scope, dict) else None
+        return getattr(route, "path_format", None)
+    
+    def _content_length(self, headers) -> Optional[int]:
+        """Body size from a Content-Length header"""
+        try:
+            value = headers.get("content-length") if headers is not None else None
+            return int(value) if value is not None else None
+        except (TypeError, ValueError, AttributeError):
+            return None
+    
     def _get_endpoint_pattern(self, request: Request) -> str:
-        """Extract endpoint pattern from request for better metric grouping"""
+        """Approximate the endpoint pattern from the path when no route matched"""
         path = request.url.path
         
         # Group common patterns to avoid high cardinality
@@ -0,0 +1,173 @@
+"""
+Multiprocess Prometheus metrics
+
+Each uvicorn or gunicorn worker keeps its own metric values, so without
+this a scrape only sees the worker that answered it. When
+PROMETHEUS_MULTIPROC_DIR is set, prometheus_client writes every process's
+values to files in that directory and exposition merges them.
+
+prometheus_client picks its value storage when it is first imported, so
+this module must be imported before anything else imports it.
+"""
+import fcntl
+import glob
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+if settings.PROMETHEUS_MULTIPROC_DIR and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.PROMETHEUS_MULTIPROC_DIR
+
+MULTIPROC_DIR: Optional[str] = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import CollectorRegistry, values  # noqa: E402
+from prometheus_client.mmap_dict import MmapedDict  # noqa: E402
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead  # noqa: E402
+
+logger = structlog.get_logger()
+
+# Dead workers' values are folded into these files, so counters keep their totals
+# while the number of files a scrape merges stays bounded
+ARCHIVE_ID = "archive"
+_ADDITIVE_PREFIXES = ("counter", "histogram", "summary")
+_MOSTRECENT_PREFIX = "gauge_mostrecent"
+
+_LOCK_FILE = ".lock"
+
+
+def is_multiprocess() -> bool:
+    """Whether metric values are shared between worker processes"""
+    return MULTIPROC_DIR is not None
+
+
+if is_multiprocess() and values.ValueClass is values.MutexValue:
+    logger.warning(
+        "prometheus_multiprocess_inactive",
+        reason="prometheus_client was imported before app.core.metrics_multiprocess",
+        path=MULTIPROC_DIR
+    )
+
+
+@contextmanager
+def directory_lock(exclusive: bool = False) -> Iterator[None]:
+    """
+    Lock the multiprocess directory across processes
+    
+    Exposition takes a shared lock and compaction an exclusive one, so a
+    scrape never sees a dead worker's values both in its own file and in
+    the archive.
+    """
+    with open(os.path.join(MULTIPROC_DIR, _LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def build_exposition_registry(*collectors) -> CollectorRegistry:
+    """
+    Registry that merges every process's values
+    
+    Args:
+        collectors: Process-local custom collectors to expose alongside them
+    """
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=MULTIPROC_DIR)
+    for collector in collectors:
+        registry.register(collector)
+    return registry
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _split_filename(path: str) -> Tuple[str, str]:
+    """Split a value file's name into its prefix and process ID"""
+    prefix, _, pid = os.path.basename(path)[:-len(".db")].rpartition("_")
+    return prefix, pid
+
+
+def _archive(prefix: str, paths: List[str]):
+    """Fold dead processes' value files into the prefix's archive file"""
+    totals: Dict[str, Tuple[float, float]] = {}
+    for path in paths:
+        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(path):
+            current_value, current_timestamp = totals.get(key, (0.0, 0.0))
+            if prefix == _MOSTRECENT_PREFIX:
+                if timestamp >= current_timestamp:
+                    totals[key] = (value, timestamp)
+            else:
+                totals[key] = (current_value + value, max(timestamp, current_timestamp))
+    
+    archive = MmapedDict(os.path.join(MULTIPROC_DIR, f"{prefix}_{ARCHIVE_ID}.db"))
+    try:
+        for key, (value, timestamp) in totals.items():
+            archived_value, archived_timestamp = archive.read_value(key)
+            if prefix == _MOSTRECENT_PREFIX:
+                if archived_timestamp > timestamp:
+                    continue
+            else:
+                value += archived_value
+            archive.write_value(key, value, timestamp)
+    finally:
+        archive.close()
+    
+    for path in paths:
+        os.remove(path)
+
+
+def mark_worker_dead(pid: Optional[int] = None):
+    """Drop an exiting worker's live gauges from exposition"""
+    if is_multiprocess():
+        mark_process_dead(pid or os.getpid(), MULTIPROC_DIR)
+
+
+def cleanup_dead_workers() -> int:
+    """
+    Clean up value files left behind by workers that have exited
+    
+    Live gauges of dead workers are removed. Counters, histograms,
+    summaries and most-recent gauges are folded into archive files so
+    their totals survive while their per-process files go away.
+    
+    Returns:
+        Number of dead workers cleaned up
+    """
+    if not is_multiprocess():
+        return 0
+    
+    with directory_lock(exclusive=True):
+        dead: Dict[int, List[str]] = {}
+        for path in glob.glob(os.path.join(MULTIPROC_DIR, "*.db")):
+            prefix, pid = _split_filename(path)
+            if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                dead.setdefault(int(pid), []).append(path)
+        
+        archivable: Dict[str, List[str]] = {}
+        for pid, paths in dead.items():
+            mark_process_dead(pid, MULTIPROC_DIR)
+            for path in paths:
+                prefix, _ = _split_filename(path)
+                if os.path.exists(path) and (prefix in _ADDITIVE_PREFIXES or prefix == _MOSTRECENT_PREFIX):
+                    archivable.setdefault(prefix, []).append(path)
+        
+        for prefix, paths in archivable.items():
+            _archive(prefix, paths)
+    
+    if dead:
+        logger.info("prometheus_dead_workers_cleaned", workers=len(dead), path=MULTIPROC_DIR)
+    return len(dead)
@@ -3,8 +3,11 @@ Middleware for request processing and security
 """
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
+from starlette.convertors import PathConvertor
 from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Callable, Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+import json
 import time
 import uuid
 
@@ -12,6 +15,8 @@ from app.services.attestation import attestation_service, AttestationError
 from app.core.exceptions import create_error_response, ErrorCodes
 from app.core.logging import get_logger, set_request_context, clear_request_context, SecurityEventType
 from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.core.rate_limiter import MobileAuthRateLimiter, rate_limit_response
 
 logger = get_logger(__name__)
 
@@ -78,8 +83,8 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             clear_request_context()
 
 
-class MobileAttestationMiddleware(BaseHTTPMiddleware):
-    """Middleware to validate mobile app attestation on mobile endpoints"""
+class AttestationGate:
+    """Mobile attestation rules shared by the attestation middlewares"""
     
     MOBILE_ENDPOINTS = [
         "/api/v1/mobile/",
@@ -128,79 +133,46 @@ class MobileAttestationMiddleware(BaseHTTPMiddleware):
                 except (ValueError, IndexError):
                     pass
     
-    async def dispatch(self, request: Request, call_next: Callable):
-        # Always allow OPTIONS requests (CORS preflight) to pass through
-        if request.method == "OPTIONS":
-            return await call_next(request)
-            
-        # Check if this is a mobile endpoint that requires attestation
-        if not self._requires_attestation(request):
-            return await call_next(request)
-        
-        try:
-            # Verify attestation based on platform
-            await self._verify_request_attestation(request)
-            return await call_next(request)
-            
-        except AttestationError as e:
-            # Log security event
-            logger.security_event(
-                SecurityEventType.ATTESTATION_FAILURE,
-                path=request.url.path,
-                error=str(e),
-                client_ip=request.client.host if request.client else None,
-                user_agent=request.headers.get("user-agent"),
-                platform=request.headers.get("X-Platform")
-            )
-            
-            logger.warning(
-                "attestation_verification_failed",
-                path=request.url.path,
-                error=str(e),
-                client_ip=request.client.host if request.client else None
-            )
-            
-            response = JSONResponse(
-                status_code=401,
-                content=create_error_response(
-                    error_code=ErrorCodes.INVALID_ATTESTATION,
-                    message="Mobile app attestation verification failed",
-                    details={"reason": str(e)},
-                    request_id=getattr(request.state, 'request_id', None)
-                )
+    def _attestation_failure_response(self, request: Request, reason: str) -> JSONResponse:
+        """Build the 401 returned when attestation fails"""
+        response = JSONResponse(
+            status_code=401,
+            content=create_error_response(
+                error_code=ErrorCodes.INVALID_ATTESTATION,
+                message="Mobile app attestation verification failed",
+                details={"reason": reason},
+                request_id=getattr(request.state, 'request_id', None)
             )
-            
-            # Add CORS headers to error response
-            self._add_cors_headers(request, response)
-            return response
+        )
         
-        except Exception as e:
-            logger.error(
-                "attestation_middleware_error",
-                path=request.url.path,
-                error=str(e),
-                exc_info=True
-            )
-            
-            # Convert general exceptions to AttestationError for consistency
-            response = JSONResponse(
-                status_code=401,
-                content=create_error_response(
-                    error_code=ErrorCodes.INVALID_ATTESTATION,
-                    message="Mobile app attestation verification failed",
-                    details={"reason": str(e)},
-                    request_id=getattr(request.state, 'request_id', None)
-                )
-            )
-            
-            # Add CORS headers to error response
-            self._add_cors_headers(request, response)
-            return response
+        # Add CORS headers to error response
+        self._add_cors_headers(request, response)
+        return response
+    
+    def _log_attestation_failure(self, request: Request, error: AttestationError):
+        """Record a failed attestation as a security event"""
+        logger.security_event(
+            SecurityEventType.ATTESTATION_FAILURE,
+            path=request.url.path,
+            error=str(error),
+            client_ip=request.client.host if request.client else None,
+            user_agent=request.headers.get("user-agent"),
+            platform=request.headers.get("X-Platform")
+        )
+        
+        logger.warning(
+            "attestation_verification_failed",
+            path=request.url.path,
+            error=str(error),
+            client_ip=request.client.host if request.client else None
+        )
     
     def _requires_attestation(self, request: Request) -> bool:
         """Check if the request path requires attestation"""
-        path = request.url.path
-        
+        return self._path_requires_attestation(request.url.path)
+    
+    def _path_requires_attestation(self, path: str) -> bool:
+        """Check if a path requires attestation"""
         # Check if path is exempt
         if any(path.startswith(exempt) for exempt in self.EXEMPT_PATHS):
             return False
@@ -242,8 +214,10 @@ class MobileAttestationMiddleware(BaseHTTPMiddleware):
         # Get optional nonce
         nonce = request.headers.get("X-Nonce")
         
-        # Verify with Google Play Integrity API
-        is_valid = await attestation_service.verify_android_integrity(integrity_token, nonce)
+        # Verify with Google Play Integrity API, reusing a recent verdict when possible
+        is_valid = await attestation_service.check_android_request(
+            integrity_token, nonce, request.headers.get("X-Device-ID")
+        )
         
         if not is_valid:
             raise AttestationError("Android integrity verification failed")
@@ -280,8 +254,8 @@ class MobileAttestationMiddleware(BaseHTTPMiddleware):
             raise AttestationError("Missing iOS attestation parameters")
         
         # Verify with Apple App Attest
-        is_valid = await attestation_service.verify_ios_attestation(
-            attestation_object, key_id, challenge
+        is_valid = await attestation_service.check_ios_attestation_request(
+            attestation_object, key_id, challenge, request.headers.get("X-Device-ID")
         )
         
         if not is_valid:
@@ -296,14 +270,51 @@ class MobileAttestationMiddleware(BaseHTTPMiddleware):
             raise AttestationError("Missing iOS assertion parameters")
         
         # Verify with Apple App Attest
-        is_valid = await attestation_service.verify_ios_assertion(
-            assertion, key_id, client_data_hash
+        is_valid = await attestation_service.check_ios_assertion_request(
+            assertion,
+            key_id,
+            client_data_hash,
+            request.headers.get("X-Device-ID"),
+            request.headers.get("X-Nonce")
         )
         
         if not is_valid:
             raise AttestationError("iOS assertion verification failed")
 
 
+class MobileAttestationMiddleware(AttestationGate, BaseHTTPMiddleware):
+    """Middleware to validate mobile app attestation on mobile endpoints"""
+    
+    async def dispatch(self, request: Request, call_next: Callable):
+        # Always allow OPTIONS requests (CORS preflight) to pass through
+        if request.method == "OPTIONS":
+            return await call_next(request)
+            
+        # Check if this is a mobile endpoint that requires attestation
+        if not self._requires_attestation(request):
+            return await call_next(request)
+        
+        try:
+            # Verify attestation based on platform
+            await self._verify_request_attestation(request)
+            return await call_next(request)
+            
+        except AttestationError as e:
+            self._log_attestation_failure(request, e)
+            return self._attestation_failure_response(request, str(e))
+        
+        except Exception as e:
+            logger.error(
+                "attestation_middleware_error",
+                path=request.url.path,
+                error=str(e),
+                exc_info=True
+            )
+            
+            # Convert general exceptions to AttestationError for consistency
+            return self._attestation_failure_response(request, str(e))
+
+
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     """Middleware to add security headers"""
     
@@ -324,6 +335,259 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         return response
 
 
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+]
+
+
+class RoutePatternResolver:
+    """Maps request paths to route templates using tables built once from the app routes"""
+    
+    UNMATCHED = "unmatched"
+    
+    def __init__(self, routes: List):
+        self.static: Dict[str, str] = {}
+        self.by_segments: Dict[int, List[Tuple[Pattern, str]]] = {}
+        self.catch_all: List[Tuple[Pattern, str]] = []
+        
+        for route in routes:
+            path_regex = getattr(route, "path_regex", None)
+            path_format = getattr(route, "path_format", None)
+            if path_regex is None or path_format is None:
+                continue
+            
+            convertors = getattr(route, "param_convertors", {}) or {}
+            if not convertors:
+                self.static.setdefault(path_format, path_format)
+            elif any(isinstance(c, PathConvertor) for c in convertors.values()):
+                # {param:path} may span several segments
+                self.catch_all.append((path_regex, path_format))
+            else:
+                self.by_segments.setdefault(path_format.count("/"), []).append((path_regex, path_format))
+    
+    def resolve(self, path: str) -> str:
+        """Return the route template for a path, or 'unmatched'"""
+        template = self.static.get(path)
+        if template is not None:
+            return template
+        
+        for path_regex, path_format in self.by_segments.get(path.count("/"), ()):
+            if path_regex.match(path):
+                return path_format
+        
+        for path_regex, path_format in self.catch_all:
+            if path_regex.match(path):
+                return path_format
+        
+        return self.UNMATCHED
+
+
+class RequestPipelineMiddleware(AttestationGate):
+    """
+    Pure ASGI middleware that handles request IDs, timing, logging, metrics,
+    security headers, rate limiting and attestation gating in one pass
+    
+    Unlike the BaseHTTPMiddleware stack it replaces, it never buffers the
+    response body, so streaming responses and background tasks behave as
+    they would without middleware.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        metrics: bool = True,
+        rate_limiting: bool = False,
+        attestation: bool = False
+    ):
+        self.app = app
+        self.metrics = metrics
+        self.rate_limiting = rate_limiting
+        self.attestation = attestation
+        self._resolver: Optional[RoutePatternResolver] = None
+    
+    def _resolve_endpoint(self, scope: Scope) -> str:
+        if self._resolver is None:
+            # Routes are final once the app serves requests
+            app = scope.get("app")
+            self._resolver = RoutePatternResolver(getattr(app, "routes", []))
+        return self._resolver.resolve(scope["path"])
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        request_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
+        set_request_context(request_id)
+        
+        method = scope["method"]
+        path = scope["path"]
+        status_code = 500
+        response_size = None
+        request_bytes = 0
+        response_bytes = 0
+        
+        # Labelled by route template, resolved up front so in-flight requests count against it
+        endpoint = self._resolve_endpoint(scope) if self.metrics and path != "/metrics" else None
+        if endpoint is not None:
+            metrics_collector.update_http_in_flight(method, endpoint, 1)
+        
+        async def receive_wrapper() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+        
+        request = Request(scope, receive_wrapper)
+        
+        request_logger = logger.bind(
+            request_id=request_id,
+            method=method,
+            path=path,
+            client_ip=request.client.host if request.client else None,
+            user_agent=request.headers.get("user-agent"),
+            content_length=request.headers.get("content-length")
+        )
+        request_logger.info("request_started")
+        
+        async def send_wrapper(message: Message):
+            nonlocal status_code, response_size, response_bytes
+            if message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            elif message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"server"]
+                for key, value in headers:
+                    if key.lower() == b"content-length":
+                        response_size = value.decode("latin-1")
+                headers.extend(SECURITY_HEADERS)
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.append((b"x-process-time", str(time.perf_counter() - start_time).encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+        
+        try:
+            response = None
+            if method != "OPTIONS":
+                if self.rate_limiting:
+                    request, response = await self._check_rate_limits(request)
+                if response is None and self.attestation:
+                    response = await self._check_attestation(request)
+            
+            if response is not None:
+                await response(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, request.receive, send_wrapper)
+            
+            process_time = time.perf_counter() - start_time
+            request_logger.info(
+                "request_completed",
+                status_code=status_code,
+                process_time=process_time,
+                response_size=response_size
+            )
+        
+        except Exception as e:
+            process_time = time.perf_counter() - start_time
+            status_code = 500
+            request_logger.error(
+                "request_failed",
+                error=str(e),
+                error_type=type(e).__name__,
+                process_time=process_time,
+                exc_info=True
+            )
+            raise
+        
+        finally:
+            if endpoint is not None:
+                metrics_collector.update_http_in_flight(method, endpoint, -1)
+                metrics_collector.record_http_request(
+                    method=method,
+                    endpoint=endpoint,
+                    status_code=status_code,
+                    duration=time.perf_counter() - start_time,
+                    request_size=request_bytes,
+                    response_size=response_bytes
+                )
+            clear_request_context()
+    
+    async def _check_rate_limits(self, request: Request) -> Tuple[Request, Optional[JSONResponse]]:
+        """Apply the mobile auth rate limits, returning a 429 response when exceeded"""
+        path = request.url.path
+        client_ip = request.headers.get("X-Real-IP") or (request.client.host if request.client else None)
+        
+        if request.method == "POST" and "/auth/mobile/" in path:
+            # The limiter keys on the device id in the body, so buffer and replay it
+            body = await request.body()
+            replayed = False
+            
+            async def receive() -> Message:
+                nonlocal replayed
+                if not replayed:
+                    replayed = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                return await request.receive()
+            
+            request = Request(request.scope, receive)
+            try:
+                request._json = json.loads(body.decode()) if body else None
+            except ValueError:
+                request._json = None
+        
+        global_limit_result = await MobileAuthRateLimiter.check_global_rate_limits(request)
+        if not global_limit_result["allowed"]:
+            logger.warning(
+                "global_rate_limit_exceeded",
+                path=path,
+                client_ip=client_ip,
+                limit_info=global_limit_result
+            )
+            return request, rate_limit_response(global_limit_result, "Global rate limit exceeded")
+        
+        if "/auth/mobile/" in path:
+            endpoint_limit_result = await MobileAuthRateLimiter.check_endpoint_rate_limit(request, path)
+            if not endpoint_limit_result["allowed"]:
+                logger.warning(
+                    "endpoint_rate_limit_exceeded",
+                    path=path,
+                    client_ip=client_ip,
+                    limit_info=endpoint_limit_result
+                )
+                return request, rate_limit_response(endpoint_limit_result, f"Rate limit exceeded for {path}")
+        
+        return request, None
+    
+    async def _check_attestation(self, request: Request) -> Optional[JSONResponse]:
+        """Verify attestation for mobile endpoints, returning a 401 response on failure"""
+        if not self._path_requires_attestation(request.url.path):
+            return None
+        
+        try:
+            await self._verify_request_attestation(request)
+            return None
+        
+        except AttestationError as e:
+            self._log_attestation_failure(request, e)
+            return self._attestation_failure_response(request, str(e))
+        
+        except Exception as e:
+            logger.error(
+                "attestation_middleware_error",
+                path=request.url.path,
+                error=str(e),
+                exc_info=True
+            )
+            return self._attestation_failure_response(request, str(e))
+
+
 async def require_mobile_attestation(request: Request) -> dict:
     """
     Dependency function to require mobile attestation for endpoints
@@ -208,6 +208,27 @@ class MobileAuthRateLimiter:
         return {"allowed": True}
 
 
+def rate_limit_response(limit_result: Dict[str, Any], message: str) -> StarletteResponse:
+    """Build the 429 response for a failed rate limit check"""
+    return StarletteResponse(
+        content=json.dumps({
+            "error": "Too many requests",
+            "message": message,
+            "retry_after": limit_result.get("retry_after", 60),
+            "limit": limit_result.get("limit"),
+            "window": limit_result.get("window")
+        }),
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={
+            "Content-Type": "application/json",
+            "Retry-After": str(limit_result.get("retry_after", 60)),
+            "X-RateLimit-Limit": str(limit_result.get("limit", 0)),
+            "X-RateLimit-Remaining": str(limit_result.get("remaining", 0)),
+            "X-RateLimit-Reset": str(limit_result.get("window", 60))
+        }
+    )
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """Rate limiting middleware for FastAPI"""
     
@@ -250,23 +271,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 limit_info=global_limit_result
             )
             
-            return StarletteResponse(
-                content=json.dumps({
-                    "error": "Too many requests",
-                    "message": "Global rate limit exceeded",
-                    "retry_after": global_limit_result.get("retry_after", 60),
-                    "limit": global_limit_result.get("limit"),
-                    "window": global_limit_result.get("window")
-                }),
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                headers={
-                    "Content-Type": "application/json",
-                    "Retry-After": str(global_limit_result.get("retry_after", 60)),
-                    "X-RateLimit-Limit": str(global_limit_result.get("limit", 0)),
-                    "X-RateLimit-Remaining": str(global_limit_result.get("remaining", 0)),
-                    "X-RateLimit-Reset": str(global_limit_result.get("window", 60))
-                }
-            )
+            return rate_limit_response(global_limit_result, "Global rate limit exceeded")
         
         # Check endpoint-specific rate limits for mobile auth endpoints
         if "/auth/mobile/" in path:
@@ -280,23 +285,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                     limit_info=endpoint_limit_result
                 )
                 
-                return StarletteResponse(
-                    content=json.dumps({
-                        "error": "Too many requests",
-                        "message": f"Rate limit exceeded for {path}",
-                        "retry_after": endpoint_limit_result.get("retry_after", 60),
-                        "limit": endpoint_limit_result.get("limit"),
-                        "window": endpoint_limit_result.get("window")
-                    }),
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Retry-After": str(endpoint_limit_result.get("retry_after", 60)),
-                        "X-RateLimit-Limit": str(endpoint_limit_result.get("limit", 0)),
-                        "X-RateLimit-Remaining": str(endpoint_limit_result.get("remaining", 0)),
-                        "X-RateLimit-Reset": str(endpoint_limit_result.get("window", 60))
-                    }
-                )
+                return rate_limit_response(endpoint_limit_result, f"Rate limit exceeded for {path}")
         
         # Proceed with request
         response = await call_next(request)
@@ -2,7 +2,7 @@
 Redis configuration and connection management
 """
 import redis.asyncio as redis
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List, Union
 import json
 import structlog
 
@@ -84,6 +84,154 @@ class CacheService:
         """Check if key exists"""
         client = await self.get_client()
         return bool(await client.exists(key))
+    
+    async def set_if_absent(self, key: str, value: Any, expire: int) -> bool:
+        """Set value only if the key does not exist yet"""
+        client = await self.get_client()
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        return bool(await client.set(key, value, ex=expire, nx=True))
+    
+    async def expire(self, key: str, seconds: int) -> bool:
+        """Set a key's time to live"""
+        client = await self.get_client()
+        return bool(await client.expire(key, seconds))
+    
+    async def hget(self, key: str, field: str) -> Optional[Any]:
+        """Get a hash field"""
+        client = await self.get_client()
+        value = await client.hget(key, field)
+        if value:
+            try:
+                return json.loads(value)
+            except json.JSONDecodeError:
+                return value
+        return None
+    
+    async def hset(self, key: str, field: str, value: Any) -> int:
+        """Set a hash field"""
+        client = await self.get_client()
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        return await client.hset(key, field, value)
+    
+    async def hmget(self, key: str, fields: List[str]) -> List[Optional[Any]]:
+        """Get several hash fields in one round trip"""
+        if not fields:
+            return []
+        client = await self.get_client()
+        values = []
+        for value in await client.hmget(key, fields):
+            try:
+                values.append(json.loads(value) if value else None)
+            except json.JSONDecodeError:
+                values.append(value)
+        return values
+    
+    async def hdel(self, key: str, *fields: str) -> int:
+        """Delete hash fields"""
+        client = await self.get_client()
+        return await client.hdel(key, *fields)
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """Get raw values for several keys in one round trip"""
+        if not keys:
+            return []
+        client = await self.get_client()
+        return await client.mget(keys)
+    
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        """Add or update members of a sorted set"""
+        client = await self.get_client()
+        return await client.zadd(key, mapping)
+    
+    async def zrem(self, key: str, *members: str) -> int:
+        """Remove members from a sorted set"""
+        client = await self.get_client()
+        return await client.zrem(key, *members)
+    
+    async def zrangebyscore(
+        self,
+        key: str,
+        min_score: Union[float, str],
+        max_score: Union[float, str],
+        start: Optional[int] = None,
+        num: Optional[int] = None
+    ) -> List[str]:
+        """Get sorted set members with scores in the given range"""
+        client = await self.get_client()
+        return await client.zrangebyscore(key, min_score, max_score, start=start, num=num)
+    
+    async def xadd_many(
+        self,
+        key: str,
+        entries: List[Dict[str, str]],
+        maxlen: Optional[int] = None
+    ) -> List[str]:
+        """Append entries to a stream in one round trip, returning their IDs"""
+        if not entries:
+            return []
+        client = await self.get_client()
+        async with client.pipeline(transaction=False) as pipe:
+            for fields in entries:
+                pipe.xadd(key, fields, maxlen=maxlen, approximate=True)
+            return await pipe.execute()
+    
+    async def xgroup_create(self, key: str, group: str) -> bool:
+        """Create a consumer group (and the stream) if it does not exist"""
+        client = await self.get_client()
+        try:
+            await client.xgroup_create(key, group, id="0", mkstream=True)
+            return True
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+            return False
+    
+    async def xreadgroup(
+        self,
+        group: str,
+        consumer: str,
+        keys: Union[str, List[str]],
+        count: int,
+        block_ms: Optional[int] = None
+    ) -> Dict[str, List[tuple]]:
+        """Read new entries from one or more streams, as (entry_id, fields) pairs per stream"""
+        if isinstance(keys, str):
+            keys = [keys]
+        client = await self.get_client()
+        response = await client.xreadgroup(group, consumer, {key: ">" for key in keys}, count=count, block=block_ms)
+        return {key: entries for key, entries in response or [] if entries}
+    
+    async def xinfo_groups(self, key: str) -> List[Dict[str, Any]]:
+        """Get consumer group details for a stream"""
+        client = await self.get_client()
+        return await client.xinfo_groups(key)
+    
+    async def xautoclaim(
+        self,
+        key: str,
+        group: str,
+        consumer: str,
+        min_idle_ms: int,
+        count: int
+    ) -> List[tuple]:
+        """Claim entries other consumers left pending for at least min_idle_ms"""
+        client = await self.get_client()
+        response = await client.xautoclaim(key, group, consumer, min_idle_ms, start_id="0-0", count=count)
+        return [entry for entry in response[1] if entry[1]]
+    
+    async def eval(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        """Run a Lua script atomically"""
+        client = await self.get_client()
+        return await client.eval(script, len(keys), *keys, *args)
+    
+    async def xack(self, key: str, group: str, *entry_ids: str) -> int:
+        """Acknowledge processed stream entries"""
+        if not entry_ids:
+            return 0
+        client = await self.get_client()
+        return await client.xack(key, group, *entry_ids)
 
 
 # Global cache service instance
@@ -0,0 +1,145 @@
+"""
+Pooled SMTP connections for outbound email
+"""
+import asyncio
+import ssl
+from email.message import Message
+from typing import List, Optional, Sequence
+
+import aiosmtplib
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class SMTPConnectionPool:
+    """
+    Pool of persistent, authenticated SMTP connections
+    
+    Connecting, STARTTLS and login happen once per connection instead of once
+    per message. At most `size` messages are in flight at a time, and bulk
+    messages can never occupy the last SMTP_POOL_PRIORITY_RESERVED of them.
+    """
+    
+    def __init__(self, size: Optional[int] = None):
+        self.size = size or settings.SMTP_POOL_SIZE
+        self._idle: List[aiosmtplib.SMTP] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bulk_semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _bind_loop(self):
+        """Reset pool state when used from a different event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sockets and semaphores belong to the loop that created them
+            self._idle = []
+            self._semaphore = asyncio.Semaphore(self.size)
+            self._bulk_semaphore = asyncio.Semaphore(max(1, self.size - settings.SMTP_POOL_PRIORITY_RESERVED))
+            self._loop = loop
+    
+    def _tls_context(self) -> ssl.SSLContext:
+        # Matches the certificate handling the mail relay has always been used with
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=settings.SMTP_SERVER,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USERNAME,
+            password=settings.SMTP_PASSWORD,
+            start_tls=True,
+            tls_context=self._tls_context(),
+            timeout=settings.SMTP_TIMEOUT_SECONDS
+        )
+        await client.connect()
+        logger.debug("SMTP connection opened", server=settings.SMTP_SERVER)
+        return client
+    
+    async def _acquire(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            client = self._idle.pop()
+            if client.is_connected:
+                return client
+        return await self._connect()
+    
+    def _release(self, client: aiosmtplib.SMTP):
+        if client.is_connected and len(self._idle) < self.size:
+            self._idle.append(client)
+        else:
+            self._discard(client)
+    
+    def _discard(self, client: aiosmtplib.SMTP):
+        try:
+            client.close()
+        except Exception:
+            pass
+    
+    async def send_message(
+        self,
+        message: Message,
+        recipients: Optional[Sequence[str]] = None,
+        bulk: bool = False
+    ):
+        """
+        Send a message over a pooled connection
+        
+        A connection the server has dropped while idle is replaced once
+        before giving up.
+        
+        Args:
+            message: Email message to send
+            recipients: Envelope recipients; defaults to the message headers
+            bulk: Whether the message may wait behind time-sensitive mail
+        
+        Raises:
+            aiosmtplib.SMTPException: If the message cannot be sent
+        """
+        self._bind_loop()
+        
+        if not bulk:
+            async with self._semaphore:
+                return await self._send(message, recipients)
+        
+        async with self._bulk_semaphore:
+            async with self._semaphore:
+                return await self._send(message, recipients)
+    
+    async def _send(self, message: Message, recipients: Optional[Sequence[str]]):
+        for attempt in range(2):
+            client = await self._acquire()
+            try:
+                await client.send_message(
+                    message,
+                    sender=settings.FROM_EMAIL,
+                    recipients=recipients
+                )
+            except aiosmtplib.SMTPServerDisconnected:
+                self._discard(client)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._discard(client)
+                raise
+            
+            self._release(client)
+            return
+    
+    async def close(self):
+        """Close all idle connections"""
+        idle, self._idle = self._idle, []
+        for client in idle:
+            try:
+                await client.quit()
+            except Exception:
+                self._discard(client)
+
+
+# Global SMTP connection pool
+smtp_pool = SMTPConnectionPool()
@@ -10,19 +10,19 @@ from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
+# Configures prometheus_client, so it is imported before anything that records metrics
+from app.core.metrics_multiprocess import cleanup_dead_workers, mark_worker_dead
 from app.core.database import init_db
 from app.core.redis import init_redis
 from app.core.cache import initialize_cache_system
-from app.services.cache_warming import warm_critical_caches, start_cache_warming_background_task
+from app.services.cache_warming import start_cache_warming, stop_cache_warming
+from app.services.silent_mode import silent_mode_service
+from app.services.provider_location import provider_location_ingestor
+from app.services.notification_dispatch import notification_dispatcher
+from app.core.smtp import smtp_pool
 from app.api.v1.router import api_router
 from app.core.exceptions import setup_exception_handlers
-from app.core.middleware import (
-    RequestLoggingMiddleware,
-    MobileAttestationMiddleware,
-    SecurityHeadersMiddleware
-)
-from app.core.rate_limiter import RateLimitMiddleware, SecurityHeadersMiddleware as RateLimitSecurityMiddleware
-from app.core.metrics_middleware import MetricsMiddleware
+from app.core.middleware import RequestPipelineMiddleware
 from app.core.logging import get_logger, setup_logging
 
 # Initialize logging system
@@ -35,17 +35,27 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     logger.info("Starting Panic System Platform API")
+    cleanup_dead_workers()
     await init_db()
     await init_redis()
     await initialize_cache_system()
-    await warm_critical_caches()
-    await start_cache_warming_background_task()
+    await start_cache_warming()
+    silent_mode_service.start_expiry_sweeper()
+    provider_location_ingestor.start_flusher()
+    if settings.NOTIFICATION_DISPATCHER_ENABLED:
+        notification_dispatcher.start()
     logger.info("API startup complete")
 
     yield
 
     # Shutdown
     logger.info("Shutting down Panic System Platform API")
+    await silent_mode_service.stop_expiry_sweeper()
+    await provider_location_ingestor.stop_flusher()
+    await notification_dispatcher.stop()
+    await smtp_pool.close()
+    await stop_cache_warming()
+    mark_worker_dead()
 
 
 def create_app() -> FastAPI:
@@ -190,16 +200,14 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
-    # Security and rate limiting middleware  
-    # app.add_middleware(RateLimitSecurityMiddleware)
-    # app.add_middleware(RateLimitMiddleware)
-    app.add_middleware(SecurityHeadersMiddleware)
-    # app.add_middleware(MobileAttestationMiddleware)  # Disable for CORS testing
-    app.add_middleware(RequestLoggingMiddleware)
-    
-    # Metrics middleware (if enabled)
-    if settings.METRICS_ENABLED:
-        app.add_middleware(MetricsMiddleware)
+    # Request IDs, logging, metrics, security headers, rate limiting and
+    # attestation gating run in a single pure ASGI layer
+    app.add_middleware(
+        RequestPipelineMiddleware,
+        metrics=settings.METRICS_ENABLED,
+        rate_limiting=False,
+        attestation=False  # Disable for CORS testing
+    )
 
     # Exception handlers
     setup_exception_handlers(app)
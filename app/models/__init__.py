@@ -4,12 +4,15 @@ Database models
 from app.models.base import BaseModel
 from app.models.security_firm import SecurityFirm, CoverageArea, FirmPersonnel, Team
 from app.models.user import RegisteredUser, UserGroup, GroupMobileNumber, UserFine
-from app.models.subscription import SubscriptionProduct, StoredSubscription, CreditTransaction
-from app.models.payment import CreditTier, Invoice, PaymentNotification
+from app.models.subscription import SubscriptionProduct, StoredSubscription, CreditTransaction, CreditBalanceSnapshot, FirmSubscriptionCount
+from app.models.payment import CreditTier, Invoice, PaymentNotification, PaymentWebhookEvent
 from app.models.emergency import PanicRequest, ServiceProvider, RequestFeedback, RequestStatusUpdate
-from app.models.emergency_provider import EmergencyProvider, EmergencyProviderType, ProviderAssignment
+from app.models.emergency_provider import EmergencyProvider, EmergencyProviderType, ProviderAssignment, ProviderLocationPoint
 from app.models.capability import ProviderCapability
-from app.models.metrics import ResponseTimeMetric, PerformanceAlert, ZonePerformanceReport
+from app.models.metrics import (
+    ResponseTimeMetric, PerformanceAlert, ZonePerformanceReport,
+    RequestRollupKey, PerformanceRollup, PerformanceRollupHistogram
+)
 
 __all__ = [
     "BaseModel",
@@ -24,9 +27,12 @@ __all__ = [
     "SubscriptionProduct",
     "StoredSubscription",
     "CreditTransaction",
+    "CreditBalanceSnapshot",
+    "FirmSubscriptionCount",
     "CreditTier",
     "Invoice",
     "PaymentNotification",
+    "PaymentWebhookEvent",
     "PanicRequest",
     "ServiceProvider",
     "RequestFeedback",
@@ -34,8 +40,12 @@ __all__ = [
     "EmergencyProvider",
     "EmergencyProviderType",
     "ProviderAssignment",
+    "ProviderLocationPoint",
     "ProviderCapability",
     "ResponseTimeMetric",
     "PerformanceAlert",
     "ZonePerformanceReport",
+    "RequestRollupKey",
+    "PerformanceRollup",
+    "PerformanceRollupHistogram",
 ]
\ No newline at end of file
@@ -1,10 +1,11 @@
 """
 Emergency Provider models for ambulances, tow trucks, etc.
 """
-from sqlalchemy import Column, String, Float, Boolean, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, String, Float, Boolean, DateTime, Text, ForeignKey, Enum, BigInteger, Index
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
+from geoalchemy2 import Geometry
 import uuid
 import enum
 
@@ -62,6 +63,15 @@ class ProviderStatus(str, enum.Enum):
 class EmergencyProvider(Base):
     """Emergency service provider model"""
     __tablename__ = "emergency_providers"
+    __table_args__ = (
+        # Radius searches compare on the spheroid, so they need the geography
+        # cast indexed rather than the geometry column itself
+        Index(
+            "ix_emergency_providers_current_location_geography",
+            text("(current_location::geography)"),
+            postgresql_using="gist"
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     firm_id = Column(UUID(as_uuid=True), ForeignKey("security_firms.id"), nullable=False)
@@ -84,6 +94,7 @@ class EmergencyProvider(Base):
     # Location information
     current_latitude = Column(Float, nullable=False)
     current_longitude = Column(Float, nullable=False)
+    current_location = Column(Geometry("POINT", srid=4326), nullable=True)  # Spatially indexed copy of current_latitude/current_longitude
     base_latitude = Column(Float, nullable=False)  # Home base location
     base_longitude = Column(Float, nullable=False)
     coverage_radius_km = Column(Float, nullable=False, default=50.0)
@@ -110,6 +121,21 @@ class EmergencyProvider(Base):
     provider_capabilities = relationship("ProviderCapability", back_populates="provider")
 
 
+class ProviderLocationPoint(Base):
+    """Append-only trajectory point reported by a provider"""
+    __tablename__ = "provider_location_points"
+    __table_args__ = (
+        Index("ix_provider_location_points_provider_time", "provider_id", "recorded_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("emergency_providers.id"), nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)  # Device time of the fix
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    accuracy_m = Column(Float, nullable=True)
+
+
 class ProviderAssignment(Base):
     """Assignment of providers to emergency requests"""
     __tablename__ = "provider_assignments"
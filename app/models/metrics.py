@@ -1,7 +1,7 @@
 """
 Metrics and performance tracking models
 """
-from sqlalchemy import Column, String, ForeignKey, Integer, DECIMAL, DateTime, Text, Boolean
+from sqlalchemy import Column, String, ForeignKey, Integer, DECIMAL, DateTime, Text, Boolean, Float, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
@@ -68,4 +68,57 @@ class ZonePerformanceReport(BaseModel):
     prank_percentage = Column(DECIMAL(5, 2), nullable=True)
     
     # Relationships
-    firm = relationship("SecurityFirm")
\ No newline at end of file
+    firm = relationship("SecurityFirm")
+
+
+class RequestRollupKey(BaseModel):
+    """Firm and zone a panic request is attributed to, resolved once at submission"""
+    __tablename__ = "request_rollup_keys"
+    
+    request_id = Column(UUID(as_uuid=True), ForeignKey("panic_requests.id"), nullable=False, unique=True)
+    firm_id = Column(UUID(as_uuid=True), ForeignKey("security_firms.id"), nullable=False)
+    zone_id = Column(UUID(as_uuid=True), ForeignKey("coverage_areas.id"), nullable=True)
+    zone_name = Column(String(255), nullable=False)
+    service_type = Column(String(20), nullable=False)
+    submitted_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class PerformanceRollup(BaseModel):
+    """Request counts and duration totals per time bucket, firm, zone and service type"""
+    __tablename__ = "performance_rollups"
+    __table_args__ = (
+        UniqueConstraint("bucket_start", "firm_id", "zone_name", "service_type", name="uq_performance_rollups_bucket"),
+    )
+    
+    bucket_start = Column(DateTime(timezone=True), nullable=False, index=True)
+    firm_id = Column(UUID(as_uuid=True), ForeignKey("security_firms.id"), nullable=False)
+    zone_id = Column(UUID(as_uuid=True), ForeignKey("coverage_areas.id"), nullable=True)
+    zone_name = Column(String(255), nullable=False)
+    service_type = Column(String(20), nullable=False)
+    
+    # Requests are counted in the bucket they were submitted in
+    submitted_count = Column(Integer, default=0, nullable=False)
+    accepted_count = Column(Integer, default=0, nullable=False)
+    response_time_sum = Column(Float, default=0, nullable=False)  # Seconds from submission to acceptance
+    completed_count = Column(Integer, default=0, nullable=False)
+    completion_time_sum = Column(Float, default=0, nullable=False)  # Seconds from submission to completion
+    prank_count = Column(Integer, default=0, nullable=False)
+
+
+class PerformanceRollupHistogram(BaseModel):
+    """Duration histogram counts for a performance rollup bucket"""
+    __tablename__ = "performance_rollup_histograms"
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket_start", "firm_id", "zone_name", "service_type", "metric", "upper_bound",
+            name="uq_performance_rollup_histograms_bucket"
+        ),
+    )
+    
+    bucket_start = Column(DateTime(timezone=True), nullable=False, index=True)
+    firm_id = Column(UUID(as_uuid=True), ForeignKey("security_firms.id"), nullable=False)
+    zone_name = Column(String(255), nullable=False)
+    service_type = Column(String(20), nullable=False)
+    metric = Column(String(20), nullable=False)  # response, completion
+    upper_bound = Column(Float, nullable=False)  # Seconds; Infinity for the overflow bucket
+    count = Column(Integer, default=0, nullable=False)
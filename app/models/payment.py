@@ -72,4 +72,21 @@ class PaymentNotification(BaseModel):
     processed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Relationships
-    invoice = relationship("Invoice", back_populates="payment_notifications")
\ No newline at end of file
+    invoice = relationship("Invoice", back_populates="payment_notifications")
+
+
+class PaymentWebhookEvent(BaseModel):
+    """Verified payment webhook, stored on receipt and processed from a queue"""
+    __tablename__ = "payment_webhook_events"
+    
+    provider = Column(String(20), default="ozow", nullable=False)
+    event_key = Column(String(255), unique=True, nullable=False)  # Provider transaction and status; redeliveries share it
+    transaction_id = Column(String(100), nullable=True, index=True)
+    status = Column(String(50), nullable=True)
+    payload = Column(Text, nullable=False)  # JSON string of the webhook fields as received
+    
+    # Processing
+    processing_status = Column(String(20), default="pending", nullable=False, index=True)  # pending, processed, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -118,11 +118,20 @@ class FirmDocument(BaseModel):
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer, nullable=False)
     mime_type = Column(String(100), nullable=False)
+    checksum_sha256 = Column(String(64), nullable=True)  # Hex SHA-256 of the stored content
     uploaded_by = Column(UUID(as_uuid=True), nullable=False)  # User ID who uploaded
     is_verified = Column(Boolean, default=False, nullable=False)
     verified_by = Column(UUID(as_uuid=True), nullable=True)  # Admin user ID
     verified_at = Column(DateTime(timezone=True), nullable=True)
     
+    # Background processing results
+    processing_status = Column(String(20), default="pending", nullable=False)  # pending, processing, ready, rejected, failed
+    processing_error = Column(Text, nullable=True)
+    detected_mime_type = Column(String(100), nullable=True)  # MIME type from the content's magic bytes
+    page_count = Column(Integer, nullable=True)
+    duplicate_of_id = Column(UUID(as_uuid=True), nullable=True)  # Earlier upload of the same content by this firm
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    
     # Relationships
     firm = relationship("SecurityFirm", back_populates="documents")
 
@@ -50,6 +50,28 @@ class CreditTransaction(BaseModel):
     amount = Column(Integer, nullable=False)
     description = Column(Text, nullable=False)
     reference_id = Column(String(255), nullable=True)  # Payment reference or product ID
+    balance_after = Column(Integer, nullable=True)  # Firm balance once this entry was applied
+    idempotency_key = Column(String(255), nullable=True, unique=True)  # Set for entries that may be replayed, e.g. payment webhooks
+    snapshot_id = Column(UUID(as_uuid=True), ForeignKey("credit_balance_snapshots.id"), nullable=True, index=True)  # Snapshot that has counted this entry
     
     # Relationships
-    firm = relationship("SecurityFirm")
\ No newline at end of file
+    firm = relationship("SecurityFirm")
+
+
+class CreditBalanceSnapshot(BaseModel):
+    """Periodic snapshot of a firm's credit balance, reconciled against the ledger"""
+    __tablename__ = "credit_balance_snapshots"
+    
+    firm_id = Column(UUID(as_uuid=True), ForeignKey("security_firms.id"), nullable=False, index=True)
+    balance = Column(Integer, nullable=False)  # credit_balance when the snapshot was taken
+    delta = Column(Integer, default=0, nullable=False)  # Sum of ledger entries since the previous snapshot
+    entries = Column(Integer, default=0, nullable=False)  # Number of those entries
+    drift = Column(Integer, nullable=True)  # balance minus (previous balance + delta); None for a firm's first snapshot
+
+
+class FirmSubscriptionCount(BaseModel):
+    """Maintained number of groups with an active subscription per firm"""
+    __tablename__ = "firm_subscription_counts"
+    
+    firm_id = Column(UUID(as_uuid=True), ForeignKey("security_firms.id"), nullable=False, unique=True)
+    active_count = Column(Integer, default=0, nullable=False)
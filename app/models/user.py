@@ -2,7 +2,7 @@
 User and group related models
 """
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, Integer, DECIMAL, ForeignKey, Text, DateTime, UniqueConstraint
+from sqlalchemy import Column, String, Boolean, Integer, DECIMAL, ForeignKey, Text, DateTime, UniqueConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
@@ -40,12 +40,23 @@ class RegisteredUser(BaseModel):
 class UserGroup(BaseModel):
     """User group model"""
     __tablename__ = "user_groups"
+    __table_args__ = (
+        # Due queue of the subscription expiry scheduler: only groups still
+        # counted as active are indexed, so processed expiries drop out
+        Index(
+            "ix_user_groups_subscription_due",
+            "subscription_expires_at",
+            postgresql_where=text("subscription_firm_id IS NOT NULL")
+        ),
+    )
     
     name = Column(String(255), nullable=False)
     address = Column(Text, nullable=False)
     location = Column(Geometry("POINT", srid=4326), nullable=False)
     subscription_id = Column(UUID(as_uuid=True), nullable=True)
     subscription_expires_at = Column(DateTime(timezone=True), nullable=True)
+    subscription_firm_id = Column(UUID(as_uuid=True), ForeignKey("security_firms.id"), nullable=True)  # Firm counting this group as active; cleared once the expiry is processed
+    subscription_reminder_sent_at = Column(DateTime(timezone=True), nullable=True)  # Renewal reminder sent for the current expiry
     
     # Relationships
     memberships = relationship("UserGroupMembership", back_populates="group", cascade="all, delete-orphan")
@@ -5,6 +5,7 @@ import json
 import base64
 import hashlib
 import hmac
+import time
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 import httpx
@@ -14,8 +15,10 @@ from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.exceptions import InvalidSignature
 import jwt
 
+from app.core.cache import LocalTTLCache
 from app.core.config import settings
 from app.core.exceptions import APIError, ErrorCodes
+from app.core.redis import cache
 
 logger = structlog.get_logger()
 
@@ -266,12 +269,133 @@ class AppleAppAttestService:
         }
 
 
+def _digest(*parts: str) -> str:
+    """Hash credential material so raw tokens never end up in cache keys"""
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class AttestationVerdictCache:
+    """
+    Short-lived cache of successful attestation verdicts
+    
+    Verdicts live in a per-device Redis hash (field = credential hash) with an
+    in-process tier in front of it. Revocation deletes from Redis immediately;
+    other processes stop honouring a revoked verdict once their local entry
+    expires (ATTESTATION_LOCAL_CACHE_TTL_SECONDS).
+    """
+    
+    VERDICT_PREFIX = "attestation:verdict"
+    NONCE_PREFIX = "attestation:nonce"
+    
+    def __init__(self):
+        self.local = LocalTTLCache(
+            settings.ATTESTATION_LOCAL_CACHE_TTL_SECONDS,
+            settings.ATTESTATION_LOCAL_CACHE_MAX_ENTRIES
+        )
+    
+    def _device_key(self, platform: str, device_id: Optional[str]) -> str:
+        return f"{self.VERDICT_PREFIX}:{platform}:{device_id or '-'}"
+    
+    async def get(self, platform: str, credential_hash: str, device_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached verdict
+        
+        Returns:
+            The cached verdict, or None on a miss or cache failure
+        """
+        device_key = self._device_key(platform, device_id)
+        local_key = f"{device_key}:{credential_hash}"
+        
+        verdict = self.local.get(local_key)
+        if verdict is not None:
+            return verdict
+        
+        try:
+            verdict = await cache.hget(device_key, credential_hash)
+        except Exception as e:
+            # Fall back to full verification rather than rejecting the request
+            logger.warning("Attestation verdict lookup failed", platform=platform, error=str(e))
+            return None
+        
+        if not isinstance(verdict, dict):
+            return None
+        
+        remaining = verdict.get("expires_at", 0) - time.time()
+        if remaining <= 0:
+            return None
+        
+        self.local.set(local_key, verdict, remaining)
+        return verdict
+    
+    async def store(self, platform: str, credential_hash: str, device_id: Optional[str] = None) -> Dict[str, Any]:
+        """Record a successful verification"""
+        ttl = settings.ATTESTATION_VERDICT_TTL_SECONDS
+        device_key = self._device_key(platform, device_id)
+        verdict = {
+            "platform": platform,
+            "device_id": device_id,
+            "verified_at": time.time(),
+            "expires_at": time.time() + ttl
+        }
+        
+        self.local.set(f"{device_key}:{credential_hash}", verdict, ttl)
+        
+        try:
+            await cache.hset(device_key, credential_hash, verdict)
+            await cache.expire(device_key, ttl)
+        except Exception as e:
+            logger.warning("Failed to cache attestation verdict", platform=platform, error=str(e))
+        
+        return verdict
+    
+    async def revoke(self, platform: str, device_id: Optional[str] = None, credential_hash: Optional[str] = None):
+        """
+        Revoke cached verdicts for a device, or a single credential on it
+        
+        Args:
+            platform: "android" or "ios"
+            device_id: Device the verdicts were issued for
+            credential_hash: Limit revocation to one credential
+        """
+        device_key = self._device_key(platform, device_id)
+        
+        if credential_hash:
+            self.local.delete(f"{device_key}:{credential_hash}")
+            await cache.hdel(device_key, credential_hash)
+        else:
+            self.local.delete_prefix(f"{device_key}:")
+            await cache.delete(device_key)
+        
+        logger.info("Attestation verdicts revoked", platform=platform, device_id=device_id)
+    
+    async def consume_nonce(self, platform: str, nonce: str):
+        """
+        Mark a nonce or challenge as used
+        
+        Raises:
+            AttestationError: If the nonce was already used or cannot be recorded
+        """
+        key = f"{self.NONCE_PREFIX}:{platform}:{_digest(nonce)}"
+        
+        try:
+            is_new = await cache.set_if_absent(key, "1", settings.ATTESTATION_NONCE_TTL_SECONDS)
+        except Exception as e:
+            # Without a record of used nonces, replays can't be ruled out
+            logger.error("Failed to record attestation nonce", platform=platform, error=str(e))
+            raise AttestationError("Attestation nonce could not be verified")
+        
+        if not is_new:
+            logger.warning("Attestation nonce replay rejected", platform=platform)
+            raise AttestationError("Attestation nonce has already been used")
+
+
 class AppAttestationService:
     """Main app attestation service that handles both platforms"""
     
     def __init__(self):
         self.google_service = GooglePlayIntegrityService()
         self.apple_service = AppleAppAttestService()
+        self.verdicts = AttestationVerdictCache()
     
     async def verify_android_integrity(self, integrity_token: str, nonce: str = None) -> bool:
         """
@@ -341,6 +465,91 @@ class AppAttestationService:
             logger.error("iOS assertion verification error", error=str(e))
             raise AttestationError("iOS assertion verification failed")
     
+    async def check_android_request(self, integrity_token: str, nonce: str = None, device_id: str = None) -> bool:
+        """
+        Verify an Android request, reusing a recent verdict for the same token
+        
+        Nonce-bound tokens are always verified in full, since the nonce is part
+        of what the token attests; the nonce is consumed first so a captured
+        request can't be replayed.
+        
+        Args:
+            integrity_token: The integrity token from Android app
+            nonce: Optional per-request nonce
+            device_id: Optional device identifier the verdict is bound to
+            
+        Returns:
+            bool: True if verification passes
+        """
+        credential_hash = _digest(integrity_token)
+        
+        if nonce:
+            await self.verdicts.consume_nonce("android", nonce)
+        elif await self.verdicts.get("android", credential_hash, device_id):
+            return True
+        
+        is_valid = await self.verify_android_integrity(integrity_token, nonce)
+        if is_valid:
+            await self.verdicts.store("android", credential_hash, device_id)
+        return is_valid
+    
+    async def check_ios_attestation_request(
+        self,
+        attestation_object: str,
+        key_id: str,
+        challenge: str,
+        device_id: str = None
+    ) -> bool:
+        """
+        Verify an initial iOS attestation and cache the verdict for its key
+        
+        Challenges are single use, so the attestation itself is always verified.
+        
+        Returns:
+            bool: True if verification passes
+        """
+        await self.verdicts.consume_nonce("ios", challenge)
+        
+        is_valid = await self.verify_ios_attestation(attestation_object, key_id, challenge)
+        if is_valid:
+            await self.verdicts.store("ios", _digest(key_id), device_id)
+        return is_valid
+    
+    async def check_ios_assertion_request(
+        self,
+        assertion: str,
+        key_id: str,
+        client_data_hash: str,
+        device_id: str = None,
+        nonce: str = None
+    ) -> bool:
+        """
+        Verify an iOS assertion
+        
+        The key ID and device ID are client supplied, so a cached verdict for
+        them proves nothing about this request; the assertion's signature and
+        counter are verified every time.
+        
+        Returns:
+            bool: True if verification passes
+        """
+        if nonce:
+            await self.verdicts.consume_nonce("ios", nonce)
+        
+        return await self.verify_ios_assertion(assertion, key_id, client_data_hash)
+    
+    async def revoke_verdicts(self, platform: str, device_id: str = None, key_id: str = None):
+        """
+        Revoke cached verdicts so the next request is fully re-verified
+        
+        Args:
+            platform: "android" or "ios"
+            device_id: Device the verdicts were issued for
+            key_id: For iOS, limit revocation to a single App Attest key
+        """
+        credential_hash = _digest(key_id) if key_id else None
+        await self.verdicts.revoke(platform, device_id, credential_hash)
+    
     def generate_challenge(self) -> str:
         """Generate a cryptographic challenge for attestation"""
         import secrets
@@ -1,13 +1,21 @@
 """
 Cache warming service for pre-populating critical data
+
+Besides the full warming passes, writes in the subscription, security firm
+and user services emit change events through ``emit_cache_change``. A single
+background consumer coalesces those events and refreshes only the affected
+keys, so the periodic full rewarm is just a safety net.
 """
 import asyncio
-from typing import List, Dict, Any
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Set, Union
+import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
 from app.core.cache import enhanced_cache, CacheKey
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.security_firm import SecurityFirm, CoverageArea
 from app.models.subscription import SubscriptionProduct
@@ -17,6 +25,17 @@ import structlog
 logger = structlog.get_logger()
 
 
+class CacheChange:
+    """Change event kinds emitted by write paths"""
+    
+    FIRM_PRODUCTS = "firm_products"
+    COVERAGE_AREAS = "coverage_areas"
+    USER_GROUPS = "user_groups"
+
+
+STARTUP_MODES = ("eager", "background", "lazy")
+
+
 class CacheWarmingService:
     """Service for warming critical cache data"""
     
@@ -27,6 +46,14 @@ class CacheWarmingService:
             "user_groups": self._warm_user_groups,
             "subscription_products": self._warm_subscription_products
         }
+        self.change_handlers = {
+            CacheChange.FIRM_PRODUCTS: self._refresh_firm_products,
+            CacheChange.COVERAGE_AREAS: self._refresh_firm_coverage,
+            CacheChange.USER_GROUPS: self._refresh_user_groups,
+        }
+        self._pending_changes: Dict[str, Set[str]] = defaultdict(set)
+        self._change_signal: Optional[asyncio.Event] = None
+        self._background_tasks: Dict[str, asyncio.Task] = {}
     
     async def warm_all_caches(self):
         """Warm all registered caches"""
@@ -96,16 +123,7 @@ class CacheWarmingService:
         firms = result.scalars().all()
         
         for firm in firms:
-            cache_key = CacheKey.coverage_areas(firm.id)
-            coverage_data = [
-                {
-                    "id": str(area.id),
-                    "name": area.name,
-                    "boundary": str(area.boundary)  # Convert geometry to string
-                }
-                for area in firm.coverage_areas
-            ]
-            await enhanced_cache.set(cache_key, coverage_data, expire=3600)
+            await self._cache_firm_coverage(firm)
         
         logger.info("Coverage areas cache warmed", firms_count=len(firms))
     
@@ -122,17 +140,7 @@ class CacheWarmingService:
         
         for user in users:
             if user.groups:
-                cache_key = CacheKey.generate("user_groups", str(user.id))
-                groups_data = [
-                    {
-                        "id": str(group.id),
-                        "name": group.name,
-                        "address": group.address,
-                        "subscription_expires_at": group.subscription_expires_at.isoformat() if group.subscription_expires_at else None
-                    }
-                    for group in user.groups
-                ]
-                await enhanced_cache.set(cache_key, groups_data, expire=1800)
+                await self._cache_user_groups(user.id, user.groups)
         
         logger.info("User groups cache warmed", users_count=len(users))
     
@@ -146,24 +154,164 @@ class CacheWarmingService:
         firms = result.scalars().all()
         
         for firm in firms:
-            cache_key = CacheKey.generate("firm_products", str(firm.id))
-            products_data = [
-                {
-                    "id": str(product.id),
-                    "name": product.name,
-                    "description": product.description,
-                    "max_users": product.max_users,
-                    "price": float(product.price),
-                    "is_active": product.is_active
-                }
-                for product in firm.subscription_products
-            ]
-            await enhanced_cache.set(cache_key, products_data, expire=1800)
+            await self._cache_firm_products(firm)
         
         logger.info("Subscription products cache warmed", firms_count=len(firms))
     
-    async def schedule_periodic_warming(self, interval_hours: int = 6):
+    async def _cache_firm_coverage(self, firm: SecurityFirm):
+        """Write the coverage areas entry for a single firm"""
+        cache_key = CacheKey.coverage_areas(firm.id)
+        coverage_data = [
+            {
+                "id": str(area.id),
+                "name": area.name,
+                "boundary": str(area.boundary)  # Convert geometry to string
+            }
+            for area in firm.coverage_areas
+        ]
+        await enhanced_cache.set(cache_key, coverage_data, expire=3600)
+    
+    async def _cache_firm_products(self, firm: SecurityFirm):
+        """Write the subscription products entry for a single firm"""
+        cache_key = CacheKey.generate("firm_products", str(firm.id))
+        products_data = [
+            {
+                "id": str(product.id),
+                "name": product.name,
+                "description": product.description,
+                "max_users": product.max_users,
+                "price": float(product.price),
+                "is_active": product.is_active
+            }
+            for product in firm.subscription_products
+        ]
+        await enhanced_cache.set(cache_key, products_data, expire=1800)
+    
+    async def _cache_user_groups(self, user_id: Union[str, uuid.UUID], groups: List[UserGroup]):
+        """Write the groups entry for a single user"""
+        cache_key = CacheKey.generate("user_groups", str(user_id))
+        groups_data = [
+            {
+                "id": str(group.id),
+                "name": group.name,
+                "address": group.address,
+                "subscription_expires_at": group.subscription_expires_at.isoformat() if group.subscription_expires_at else None
+            }
+            for group in groups
+        ]
+        await enhanced_cache.set(cache_key, groups_data, expire=1800)
+    
+    async def _refresh_firm_coverage(self, db: AsyncSession, firm_id: str):
+        """Refresh the coverage areas entry for one firm"""
+        result = await db.execute(
+            select(SecurityFirm)
+            .options(selectinload(SecurityFirm.coverage_areas))
+            .where(SecurityFirm.id == firm_id)
+        )
+        firm = result.scalar_one_or_none()
+        
+        if firm is None or firm.verification_status != "approved":
+            await enhanced_cache.delete(CacheKey.coverage_areas(firm_id))
+            return
+        
+        await self._cache_firm_coverage(firm)
+    
+    async def _refresh_firm_products(self, db: AsyncSession, firm_id: str):
+        """Refresh the subscription products entry for one firm"""
+        result = await db.execute(
+            select(SecurityFirm)
+            .options(selectinload(SecurityFirm.subscription_products))
+            .where(SecurityFirm.id == firm_id)
+        )
+        firm = result.scalar_one_or_none()
+        
+        if firm is None or firm.verification_status != "approved":
+            await enhanced_cache.delete(CacheKey.generate("firm_products", str(firm_id)))
+            return
+        
+        await self._cache_firm_products(firm)
+    
+    async def _refresh_user_groups(self, db: AsyncSession, user_id: str):
+        """Refresh the groups entry for one user"""
+        result = await db.execute(
+            select(UserGroup).where(UserGroup.user_id == user_id)
+        )
+        groups = result.scalars().all()
+        
+        if not groups:
+            await enhanced_cache.delete(CacheKey.generate("user_groups", str(user_id)))
+            return
+        
+        await self._cache_user_groups(user_id, groups)
+    
+    def emit_change(self, kind: str, entity_id: Union[str, uuid.UUID]):
+        """
+        Record that an entity changed so its cache entries get refreshed
+        
+        Events are coalesced per (kind, entity_id) until the consumer runs.
+        When no consumer is running (scripts, tests, workers) this is a no-op
+        and the existing invalidation-on-write behaviour applies.
+        """
+        if kind not in self.change_handlers:
+            raise ValueError(f"Unknown cache change: {kind}")
+        
+        consumer = self._background_tasks.get("changes")
+        if consumer is None or consumer.done():
+            return
+        
+        self._pending_changes[kind].add(str(entity_id))
+        self._change_signal.set()
+    
+    async def refresh_changed(self, changes: Dict[str, Set[str]]):
+        """Refresh only the cache entries affected by the given changes"""
+        async for db in get_db():
+            try:
+                for kind, entity_ids in changes.items():
+                    handler = self.change_handlers[kind]
+                    for entity_id in entity_ids:
+                        try:
+                            await handler(db, entity_id)
+                        except Exception as e:
+                            logger.error("Incremental cache refresh failed",
+                                       change=kind,
+                                       entity_id=entity_id,
+                                       error=str(e))
+                
+                # The active products list spans all firms, rebuild it once per batch
+                if changes.get(CacheChange.FIRM_PRODUCTS):
+                    await self._warm_active_products(db)
+                
+                logger.info("Incremental cache refresh completed",
+                          changes={kind: len(ids) for kind, ids in changes.items()})
+            except Exception as e:
+                logger.error("Incremental cache refresh failed", error=str(e))
+            finally:
+                await db.close()
+    
+    async def process_changes(self, debounce_seconds: float = None):
+        """Consume change events, coalescing bursts into a single refresh"""
+        if debounce_seconds is None:
+            debounce_seconds = settings.CACHE_CHANGE_DEBOUNCE_SECONDS
+        
+        while True:
+            await self._change_signal.wait()
+            await asyncio.sleep(debounce_seconds)
+            
+            self._change_signal.clear()
+            changes, self._pending_changes = self._pending_changes, defaultdict(set)
+            if not changes:
+                continue
+            
+            try:
+                await self.refresh_changed(dict(changes))
+            except Exception as e:
+                logger.error("Cache change processing failed", error=str(e))
+    
+    async def schedule_periodic_warming(self, interval_hours: int = None):
         """Schedule periodic cache warming"""
+        if interval_hours is None:
+            interval_hours = settings.CACHE_WARMING_INTERVAL_HOURS
+        
         logger.info("Starting periodic cache warming", interval_hours=interval_hours)
         
         while True:
@@ -193,6 +341,47 @@ class CacheWarmingService:
             finally:
                 await db.close()
     
+    async def start(self, startup_mode: str = None):
+        """
+        Start cache warming for the application lifetime
+        
+        ``eager`` warms critical data before returning, ``background`` warms it
+        in a task so the API can serve requests immediately, and ``lazy`` skips
+        startup warming and lets entries fill on first read.
+        """
+        if startup_mode is None:
+            startup_mode = settings.CACHE_WARMING_STARTUP_MODE
+        if startup_mode not in STARTUP_MODES:
+            raise ValueError(f"Unknown cache warming startup mode: {startup_mode}")
+        
+        if startup_mode == "eager":
+            await self.warm_critical_data_on_startup()
+        elif startup_mode == "background":
+            self._background_tasks["startup"] = asyncio.create_task(
+                self.warm_critical_data_on_startup()
+            )
+        
+        self._change_signal = asyncio.Event()
+        self._background_tasks["changes"] = asyncio.create_task(self.process_changes())
+        
+        if settings.CACHE_WARMING_INTERVAL_HOURS > 0:
+            self._background_tasks["periodic"] = asyncio.create_task(
+                self.schedule_periodic_warming()
+            )
+        
+        logger.info("Cache warming started", startup_mode=startup_mode)
+    
+    async def stop(self):
+        """Cancel background warming tasks"""
+        tasks = list(self._background_tasks.values())
+        self._background_tasks.clear()
+        
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        self._pending_changes = defaultdict(set)
+    
     async def get_cache_statistics(self) -> Dict[str, Any]:
         """Get cache statistics and health information"""
         stats = {
@@ -234,4 +423,22 @@ async def start_cache_warming_background_task():
 
 async def warm_critical_caches():
     """Warm critical caches on application startup"""
-    await cache_warming_service.warm_critical_data_on_startup()
\ No newline at end of file
+    await cache_warming_service.warm_critical_data_on_startup()
+
+
+async def start_cache_warming(startup_mode: str = None):
+    """Start startup, change-driven and periodic cache warming"""
+    await cache_warming_service.start(startup_mode)
+
+
+async def stop_cache_warming():
+    """Stop all cache warming background tasks"""
+    await cache_warming_service.stop()
+
+
+def emit_cache_change(kind: str, entity_id: Union[str, uuid.UUID]):
+    """Notify the cache warmer that an entity changed"""
+    try:
+        cache_warming_service.emit_change(kind, entity_id)
+    except Exception as e:
+        logger.warning("Failed to emit cache change", change=kind, error=str(e))
@@ -9,6 +9,7 @@ from sqlalchemy.orm import selectinload
 
 from app.models.security_firm import SecurityFirm
 from app.models.subscription import CreditTransaction
+from app.services.credit_ledger import CreditLedger, InsufficientCreditsError  # noqa: F401
 
 
 class PaymentGatewayError(Exception):
@@ -16,16 +17,12 @@ class PaymentGatewayError(Exception):
     pass
 
 
-class InsufficientCreditsError(Exception):
-    """Insufficient credits error"""
-    pass
-
-
 class CreditService:
     """Service for managing credit operations"""
     
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.ledger = CreditLedger(db)
     
     async def purchase_credits(
         self,
@@ -62,28 +59,23 @@ class CreditService:
             raise PaymentGatewayError(f"Payment failed: {payment_result['error']}")
         
         # Add credits to firm balance
-        firm.credit_balance += amount
-        
-        # Create transaction record
-        transaction = CreditTransaction(
+        posting = await self.ledger.post(
             firm_id=firm_id,
-            transaction_type="purchase",
             amount=amount,
+            transaction_type="purchase",
             description=f"Credit purchase - {amount} credits",
-            reference_id=payment_result["transaction_id"]
+            reference_id=payment_result["transaction_id"],
+            idempotency_key=f"payment:{payment_result['transaction_id']}"
         )
-        
-        self.db.add(transaction)
         await self.db.commit()
-        await self.db.refresh(firm)
-        await self.db.refresh(transaction)
+        transaction = posting.transaction
         
         return {
             "success": True,
             "transaction_id": str(transaction.id),
             "payment_reference": payment_result["transaction_id"],
             "credits_purchased": amount,
-            "new_balance": firm.credit_balance,
+            "new_balance": posting.balance,
             "amount_paid": float(total_cost)
         }
     
@@ -106,39 +98,22 @@ class CreditService:
         Returns:
             Transaction result with updated balance
         """
-        # Verify firm exists
-        firm = await self.db.get(SecurityFirm, firm_id)
-        if not firm:
-            raise ValueError("Security firm not found")
-        
-        # Check if firm has sufficient credits
-        if firm.credit_balance < amount:
-            raise InsufficientCreditsError(
-                f"Insufficient credits. Current balance: {firm.credit_balance}, Required: {amount}"
-            )
-        
-        # Deduct credits
-        firm.credit_balance -= amount
-        
-        # Create transaction record
-        transaction = CreditTransaction(
+        # Deduct credits only if the balance covers them, in one statement
+        posting = await self.ledger.post(
             firm_id=firm_id,
-            transaction_type="deduction",
             amount=-amount,  # Negative for deduction
+            transaction_type="deduction",
             description=description,
             reference_id=reference_id
         )
-        
-        self.db.add(transaction)
         await self.db.commit()
-        await self.db.refresh(firm)
-        await self.db.refresh(transaction)
+        transaction = posting.transaction
         
         return {
             "success": True,
             "transaction_id": str(transaction.id),
             "credits_deducted": amount,
-            "new_balance": firm.credit_balance,
+            "new_balance": posting.balance,
             "description": description
         }
     
@@ -0,0 +1,213 @@
+"""
+Credit ledger for security firms
+
+Every balance change is an append-only CreditTransaction entry, and the
+firm's credit_balance is moved by a single conditional UPDATE instead of a
+read-modify-write in Python, so concurrent purchases and deductions can
+neither lose updates nor overdraw a firm. Periodic snapshots reconcile the
+running balance against the ledger.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+import structlog
+from sqlalchemy import desc, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.security_firm import SecurityFirm
+from app.models.subscription import CreditBalanceSnapshot, CreditTransaction
+
+logger = structlog.get_logger()
+
+
+class InsufficientCreditsError(Exception):
+    """Insufficient credits error"""
+    pass
+
+
+@dataclass
+class LedgerPosting:
+    """Result of posting an entry to the ledger"""
+    transaction: CreditTransaction
+    balance: int
+    replayed: bool = False  # The idempotency key had already been posted
+
+
+class CreditLedger:
+    """Posts credit movements and reconciles balances"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def post(
+        self,
+        firm_id: str,
+        amount: int,
+        transaction_type: str,
+        description: str,
+        reference_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None
+    ) -> LedgerPosting:
+        """
+        Apply a credit movement and record it in the ledger
+        
+        Runs in a savepoint and does not commit, so the caller can make it
+        part of a larger unit of work.
+        
+        Args:
+            firm_id: Security firm ID
+            amount: Credits to add, negative to deduct
+            transaction_type: purchase, deduction, adjustment, ...
+            description: Description of the movement
+            reference_id: Optional payment reference or product ID
+            idempotency_key: Key making replays of the same movement no-ops
+        
+        Returns:
+            The ledger entry and the firm's balance after it
+        
+        Raises:
+            InsufficientCreditsError: If a deduction would overdraw the firm
+            ValueError: If the firm does not exist
+        """
+        if idempotency_key:
+            existing = await self._find(idempotency_key)
+            if existing:
+                return LedgerPosting(existing, existing.balance_after, replayed=True)
+        
+        try:
+            async with self.db.begin_nested():
+                return await self._apply(
+                    firm_id, amount, transaction_type, description, reference_id, idempotency_key
+                )
+        except IntegrityError:
+            # A concurrent replay posted the same key first
+            existing = await self._find(idempotency_key) if idempotency_key else None
+            if existing is None:
+                raise
+            return LedgerPosting(existing, existing.balance_after, replayed=True)
+    
+    async def _apply(
+        self,
+        firm_id: str,
+        amount: int,
+        transaction_type: str,
+        description: str,
+        reference_id: Optional[str],
+        idempotency_key: Optional[str]
+    ) -> LedgerPosting:
+        statement = (
+            update(SecurityFirm)
+            .where(SecurityFirm.id == firm_id)
+            .values(credit_balance=SecurityFirm.credit_balance + amount)
+            .returning(SecurityFirm.credit_balance)
+            .execution_options(synchronize_session="fetch")
+        )
+        if amount < 0:
+            statement = statement.where(SecurityFirm.credit_balance >= -amount)
+        
+        balance = (await self.db.execute(statement)).scalar_one_or_none()
+        if balance is None:
+            current = (await self.db.execute(
+                select(SecurityFirm.credit_balance).where(SecurityFirm.id == firm_id)
+            )).scalar_one_or_none()
+            if current is None:
+                raise ValueError("Security firm not found")
+            raise InsufficientCreditsError(
+                f"Insufficient credits. Current balance: {current}, Required: {-amount}"
+            )
+        
+        transaction = CreditTransaction(
+            firm_id=firm_id,
+            transaction_type=transaction_type,
+            amount=amount,
+            description=description,
+            reference_id=reference_id,
+            balance_after=balance,
+            idempotency_key=idempotency_key
+        )
+        self.db.add(transaction)
+        await self.db.flush()
+        
+        return LedgerPosting(transaction, balance)
+    
+    async def _find(self, idempotency_key: str) -> Optional[CreditTransaction]:
+        result = await self.db.execute(
+            select(CreditTransaction).where(CreditTransaction.idempotency_key == idempotency_key)
+        )
+        return result.scalar_one_or_none()
+    
+    async def snapshot(self, firm_id: str) -> CreditBalanceSnapshot:
+        """
+        Snapshot a firm's balance and reconcile it against the ledger
+        
+        The firm row is locked while entries are claimed, so a posting is
+        either in both the balance and this snapshot's delta or in neither.
+        Drift means credit_balance was changed outside the ledger.
+        """
+        balance = (await self.db.execute(
+            select(SecurityFirm.credit_balance).where(SecurityFirm.id == firm_id).with_for_update()
+        )).scalar_one_or_none()
+        if balance is None:
+            raise ValueError("Security firm not found")
+        
+        previous = (await self.db.execute(
+            select(CreditBalanceSnapshot)
+            .where(CreditBalanceSnapshot.firm_id == firm_id)
+            .order_by(desc(CreditBalanceSnapshot.created_at))
+            .limit(1)
+        )).scalar_one_or_none()
+        
+        snapshot = CreditBalanceSnapshot(id=uuid4(), firm_id=firm_id, balance=balance)
+        self.db.add(snapshot)
+        await self.db.flush()
+        
+        amounts = (await self.db.execute(
+            update(CreditTransaction)
+            .where(CreditTransaction.firm_id == firm_id, CreditTransaction.snapshot_id.is_(None))
+            .values(snapshot_id=snapshot.id)
+            .returning(CreditTransaction.amount)
+            .execution_options(synchronize_session=False)
+        )).scalars().all()
+        
+        snapshot.delta = sum(amounts)
+        snapshot.entries = len(amounts)
+        if previous is not None:
+            snapshot.drift = balance - (previous.balance + snapshot.delta)
+        
+        return snapshot
+    
+    async def reconcile(self) -> Dict[str, Any]:
+        """
+        Snapshot firms with new ledger entries or no snapshot yet
+        
+        Each firm is committed separately so its row is locked only briefly.
+        
+        Returns:
+            Counts of firms snapshotted and firms whose balance drifted
+        """
+        unsnapshotted = select(CreditTransaction.firm_id).where(CreditTransaction.snapshot_id.is_(None))
+        never_snapshotted = select(SecurityFirm.id).where(
+            ~SecurityFirm.id.in_(select(CreditBalanceSnapshot.firm_id))
+        )
+        firm_ids = (await self.db.execute(
+            unsnapshotted.union(never_snapshotted).limit(settings.CREDIT_RECONCILE_BATCH_SIZE)
+        )).scalars().all()
+        
+        drifted = 0
+        for firm_id in firm_ids:
+            snapshot = await self.snapshot(firm_id)
+            await self.db.commit()
+            
+            if snapshot.drift:
+                drifted += 1
+                logger.warning(
+                    "credit_balance_drift",
+                    firm_id=str(firm_id),
+                    balance=snapshot.balance,
+                    drift=snapshot.drift
+                )
+        
+        return {"firms": len(firm_ids), "drifted": drifted}
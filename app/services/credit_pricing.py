@@ -0,0 +1,143 @@
+"""
+In-memory credit tier pricing
+
+Active credit tiers change rarely but are read on every pricing call, so
+they are loaded once into sorted arrays and looked up with bisect. The
+credit_tiers API invalidates the table when tiers change; other worker
+processes pick changes up within CREDIT_TIER_CACHE_TTL_SECONDS.
+"""
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.payment import CreditTier
+
+
+@dataclass(frozen=True)
+class PricingTier:
+    """Detached copy of an active credit tier"""
+    id: UUID
+    name: str
+    min_credits: int
+    max_credits: int
+    price: Decimal
+    is_active: bool
+    created_at: Optional[datetime]
+
+
+class TierTable:
+    """Immutable sorted views over the active tiers"""
+    
+    def __init__(self, tiers: List[PricingTier]):
+        self.by_credits = sorted(tiers, key=lambda tier: (tier.min_credits, tier.max_credits))
+        self.min_credits = [tier.min_credits for tier in self.by_credits]
+        self.by_price = sorted(tiers, key=lambda tier: (tier.price, tier.min_credits))
+        self.prices = [tier.price for tier in self.by_price]
+        self.loaded_at = time.monotonic()
+    
+    def tier_for_credits(self, credits: int) -> Optional[PricingTier]:
+        """Tier whose credit range contains credits"""
+        index = bisect_right(self.min_credits, credits) - 1
+        if index >= 0 and self.by_credits[index].max_credits >= credits:
+            return self.by_credits[index]
+        return None
+    
+    def tier_for_amount(self, amount: Decimal) -> Optional[PricingTier]:
+        """Cheapest tier costing at least amount, or the most expensive tier"""
+        if not self.by_price:
+            return None
+        index = bisect_left(self.prices, amount)
+        return self.by_price[min(index, len(self.by_price) - 1)]
+
+
+class CreditTierCache:
+    """Process-wide cache of the active credit tier table"""
+    
+    def __init__(self):
+        self._table: Optional[TierTable] = None
+        self._lock = asyncio.Lock()
+    
+    def invalidate(self):
+        """Drop the table so the next lookup reloads it"""
+        self._table = None
+    
+    def _fresh(self, table: Optional[TierTable]) -> bool:
+        return table is not None and time.monotonic() - table.loaded_at < settings.CREDIT_TIER_CACHE_TTL_SECONDS
+    
+    async def get_table(self, db: AsyncSession) -> TierTable:
+        """Current tier table, loading it if missing or expired"""
+        table = self._table
+        if self._fresh(table):
+            return table
+        
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if self._fresh(self._table):
+                return self._table
+            
+            result = await db.execute(select(CreditTier).where(CreditTier.is_active == True))
+            table = TierTable([
+                PricingTier(
+                    id=tier.id,
+                    name=tier.name,
+                    min_credits=tier.min_credits,
+                    max_credits=tier.max_credits,
+                    price=tier.price,
+                    is_active=tier.is_active,
+                    created_at=tier.created_at
+                )
+                for tier in result.scalars().all()
+            ])
+            self._table = table
+            return table
+    
+    async def get_tiers(self, db: AsyncSession) -> List[PricingTier]:
+        """Active tiers ordered by minimum credits"""
+        return list((await self.get_table(db)).by_credits)
+    
+    async def get_price(self, db: AsyncSession, credits: int) -> Decimal:
+        """
+        Price of the tier covering a number of credits
+        
+        Raises:
+            ValueError: If no active tier covers the credits
+        """
+        tier = (await self.get_table(db)).tier_for_credits(credits)
+        if not tier:
+            raise ValueError(f"No pricing tier found for {credits} credits")
+        return tier.price
+    
+    async def get_credits_for_amount(self, db: AsyncSession, amount: Decimal) -> Tuple[int, Decimal]:
+        """
+        Credits bought by an amount
+        
+        The amount buys the credits of the cheapest tier priced at or above
+        it, or of the most expensive tier when it exceeds every price.
+        
+        Returns:
+            Credits and the amount charged (the amount itself)
+        
+        Raises:
+            ValueError: If there are no active tiers
+        """
+        tier = (await self.get_table(db)).tier_for_amount(amount)
+        if not tier:
+            raise ValueError("No credit tiers available")
+        return tier.max_credits, amount
+    
+    async def get_available_amounts(self, db: AsyncSession) -> List[Decimal]:
+        """Tier prices in ascending order"""
+        return list((await self.get_table(db)).prices)
+
+
+# Global credit tier cache
+credit_tier_cache = CreditTierCache()
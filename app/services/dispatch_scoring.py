@@ -0,0 +1,227 @@
+"""
+Distance and ETA scoring for dispatch
+
+Candidates are scored in one vectorized pass: great-circle distance from
+the request to every candidate, then ETA from a speed profile learned from
+past arrivals. Speeds are kept per region (the provider's province) and
+hour of day (UTC) as total distance over total travel time of completed
+arrivals; cells with too few arrivals fall back to the hour's speed across
+all regions, then to the fixed city/suburban/highway speeds.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.emergency_provider import EmergencyProvider, ProviderAssignment
+
+EARTH_RADIUS_KM = 6371.0
+HOURS = 24
+
+# Learned speeds outside this range come from bad data, not real traffic
+MIN_SPEED_KMH = 5.0
+MAX_SPEED_KMH = 130.0
+
+
+def haversine_km(latitude: float, longitude: float, latitudes, longitudes) -> np.ndarray:
+    """Great-circle distance in km from one point to many"""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+    
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def default_speed_kmh(distance_km: np.ndarray) -> np.ndarray:
+    """City, suburban and highway speeds by trip length"""
+    return np.select([distance_km <= 10, distance_km <= 50], [40.0, 60.0], 80.0)
+
+
+@dataclass
+class SpeedProfile:
+    """Learned speeds per region and hour of day"""
+    regions: Dict[str, int] = field(default_factory=dict)  # Region -> row; row 0 is all regions
+    speeds: np.ndarray = field(default_factory=lambda: np.full((1, HOURS), np.nan))  # km/h, NaN if unknown
+    loaded_at: float = field(default_factory=time.monotonic)
+    
+    @classmethod
+    def from_samples(cls, samples: Iterable[Tuple[Optional[str], int, float, float, int]]) -> "SpeedProfile":
+        """
+        Build a profile from aggregated arrivals
+        
+        Args:
+            samples: (region, hour, total km, total travel hours, arrivals)
+        """
+        rows = list(samples)
+        regions = {region: index + 1 for index, region in enumerate(sorted({r[0] for r in rows if r[0]}))}
+        distance = np.zeros((len(regions) + 1, HOURS))
+        hours = np.zeros_like(distance)
+        count = np.zeros_like(distance)
+        
+        for region, hour, total_km, total_hours, arrivals in rows:
+            for row in {0, regions.get(region, 0)}:
+                distance[row, int(hour)] += total_km
+                hours[row, int(hour)] += total_hours
+                count[row, int(hour)] += arrivals
+        
+        known = (count >= settings.DISPATCH_SPEED_PROFILE_MIN_SAMPLES) & (hours > 0)
+        speeds = np.full_like(distance, np.nan)
+        speeds[known] = np.clip(distance[known] / hours[known], MIN_SPEED_KMH, MAX_SPEED_KMH)
+        return cls(regions=regions, speeds=speeds)
+    
+    def region_rows(self, regions: Sequence[Optional[str]]) -> np.ndarray:
+        """Profile row of each region; unknown regions use the all-regions row"""
+        return np.fromiter((self.regions.get(region, 0) for region in regions), dtype=np.intp, count=len(regions))
+    
+    def speed_kmh(self, region_rows: np.ndarray, hour: int, distance_km: np.ndarray) -> np.ndarray:
+        """Expected speed for each candidate at an hour of day"""
+        speeds = self.speeds[region_rows, hour]
+        speeds = np.where(np.isnan(speeds), self.speeds[0, hour], speeds)
+        return np.where(np.isnan(speeds), default_speed_kmh(distance_km), speeds)
+
+
+@dataclass
+class DispatchScores:
+    """Distance and ETA of each candidate, in candidate order"""
+    distance_km: np.ndarray
+    eta_minutes: np.ndarray
+    eligible: np.ndarray
+    
+    def ranked(self, limit: Optional[int] = None, by: str = "eta") -> np.ndarray:
+        """Indices of eligible candidates, best first"""
+        keys = self.eta_minutes if by == "eta" else self.distance_km
+        indices = np.flatnonzero(self.eligible)
+        if limit is not None and limit < len(indices):
+            indices = indices[np.argpartition(keys[indices], limit)[:limit]]
+        return indices[np.argsort(keys[indices], kind="stable")]
+
+
+class DispatchScorer:
+    """Scores dispatch candidates against a cached speed profile"""
+    
+    def __init__(self):
+        self._profile: Optional[SpeedProfile] = None
+        self._lock = asyncio.Lock()
+    
+    def invalidate(self):
+        """Drop the profile so the next lookup relearns it"""
+        self._profile = None
+    
+    def _fresh(self, profile: Optional[SpeedProfile]) -> bool:
+        return profile is not None and time.monotonic() - profile.loaded_at < settings.DISPATCH_SPEED_PROFILE_TTL_SECONDS
+    
+    async def get_profile(self, db: AsyncSession) -> SpeedProfile:
+        """Current speed profile, learning it if missing or expired"""
+        profile = self._profile
+        if self._fresh(profile):
+            return profile
+        
+        async with self._lock:
+            if self._fresh(self._profile):
+                return self._profile
+            
+            since = datetime.now(timezone.utc) - timedelta(days=settings.DISPATCH_SPEED_PROFILE_LOOKBACK_DAYS)
+            hour = func.extract("hour", ProviderAssignment.assigned_at)
+            travel_hours = func.extract(
+                "epoch", ProviderAssignment.actual_arrival_time - ProviderAssignment.assigned_at
+            ) / 3600.0
+            result = await db.execute(
+                select(
+                    EmergencyProvider.province,
+                    hour,
+                    func.sum(ProviderAssignment.distance_km),
+                    func.sum(travel_hours),
+                    func.count()
+                )
+                .join(EmergencyProvider, EmergencyProvider.id == ProviderAssignment.provider_id)
+                .where(
+                    and_(
+                        ProviderAssignment.actual_arrival_time.isnot(None),
+                        ProviderAssignment.actual_arrival_time > ProviderAssignment.assigned_at,
+                        ProviderAssignment.distance_km > 0,
+                        ProviderAssignment.assigned_at >= since
+                    )
+                )
+                .group_by(EmergencyProvider.province, hour)
+            )
+            self._profile = SpeedProfile.from_samples(
+                (region, int(hour), float(km), float(hours), count)
+                for region, hour, km, hours, count in result.all()
+            )
+            return self._profile
+    
+    def score(
+        self,
+        profile: SpeedProfile,
+        latitude: float,
+        longitude: float,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        regions: Sequence[Optional[str]],
+        at: Optional[datetime] = None,
+        coverage_radius_km: Optional[Sequence[float]] = None,
+        max_distance_km: Optional[float] = None
+    ) -> DispatchScores:
+        """
+        Score candidates for a request location
+        
+        Args:
+            profile: Speed profile from get_profile
+            latitude: Request latitude
+            longitude: Request longitude
+            latitudes: Candidate latitudes
+            longitudes: Candidate longitudes
+            regions: Candidate regions (province)
+            at: Dispatch time, defaults to now
+            coverage_radius_km: Candidate coverage radii; farther requests are ineligible
+            max_distance_km: Distance beyond which candidates are ineligible
+        
+        Returns:
+            Distance, ETA and eligibility per candidate
+        """
+        hour = (at or datetime.now(timezone.utc)).astimezone(timezone.utc).hour
+        distance = haversine_km(latitude, longitude, latitudes, longitudes)
+        speed = profile.speed_kmh(profile.region_rows(regions), hour, distance)
+        
+        eligible = np.ones(len(distance), dtype=bool)
+        if coverage_radius_km is not None:
+            eligible &= distance <= np.asarray(coverage_radius_km, dtype=np.float64)
+        if max_distance_km is not None:
+            eligible &= distance <= max_distance_km
+        
+        return DispatchScores(distance_km=distance, eta_minutes=distance / speed * 60, eligible=eligible)
+    
+    async def estimate(
+        self,
+        db: AsyncSession,
+        from_latitude: float,
+        from_longitude: float,
+        to_latitude: float,
+        to_longitude: float,
+        region: Optional[str] = None,
+        at: Optional[datetime] = None
+    ) -> Tuple[float, float]:
+        """
+        Distance and ETA of a single trip
+        
+        Returns:
+            Distance in km and ETA in minutes
+        """
+        scores = self.score(
+            await self.get_profile(db),
+            to_latitude, to_longitude,
+            [from_latitude], [from_longitude], [region],
+            at=at
+        )
+        return float(scores.distance_km[0]), float(scores.eta_minutes[0])
+
+
+# Global dispatch scorer
+dispatch_scorer = DispatchScorer()
@@ -0,0 +1,216 @@
+"""
+Document delivery service
+
+Firm documents are returned by reference rather than inline: responses carry
+a short-lived download URL, and the bytes are fetched straight from S3 or
+streamed through the API in chunks when the file is stored locally.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+
+import structlog
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+from app.services.storage import LocalStorageBackend, get_s3_client, run_blocking
+
+logger = structlog.get_logger()
+
+PREVIEWABLE_MIME_PREFIXES = ("image/",)
+PREVIEWABLE_MIME_TYPES = {"application/pdf", "text/plain"}
+
+
+@dataclass(frozen=True)
+class DocumentLink:
+    """Where a client can fetch a document from"""
+    download_url: str
+    preview_url: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
+
+def is_local(file_path: str) -> bool:
+    """Whether a document is stored on local disk rather than S3"""
+    return LocalStorageBackend().holds(file_path)
+
+
+def content_disposition(file_name: Optional[str], inline: bool = False) -> str:
+    """
+    Content-Disposition header value for a document
+    
+    The quoted filename is an ASCII fallback with quotes, backslashes and
+    control characters replaced; filename* carries the full name per RFC 5987.
+    """
+    if inline:
+        return "inline"
+    if not file_name:
+        return "attachment"
+    
+    fallback = "".join(c for c in unicodedata.normalize("NFKD", file_name) if not unicodedata.combining(c))
+    fallback = re.sub(r'[^\x20-\x7e]|["\\/]', "_", fallback).strip() or "document"
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+
+def is_previewable(mime_type: Optional[str]) -> bool:
+    """Whether browsers can render a document inline"""
+    if not mime_type:
+        return False
+    return mime_type.startswith(PREVIEWABLE_MIME_PREFIXES) or mime_type in PREVIEWABLE_MIME_TYPES
+
+
+def _raise_for_client_error(file_path: str, error: ClientError):
+    code = error.response.get('Error', {}).get('Code')
+    logger.error("document_storage_error", file_path=file_path, code=code)
+    if code in ('NoSuchKey', '404', 'NotFound'):
+        raise FileNotFoundError(file_path) from error
+    if code in ('AccessDenied', '403'):
+        raise PermissionError(file_path) from error
+    raise ValueError(f"Failed to retrieve document from storage: {code}") from error
+
+
+class SignedURLCache:
+    """
+    LRU cache of presigned URLs
+    
+    A cached URL is handed out again until less than the refresh margin of
+    its lifetime remains, so repeated reads of an application don't sign
+    every document again and clients always get a usable window.
+    """
+    
+    def __init__(self, max_size: int, refresh_margin: int):
+        self.max_size = max_size
+        self.refresh_margin = refresh_margin
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple[str, str]) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] - time.time() < self.refresh_margin:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+    
+    def put(self, key: Tuple[str, str], url: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (url, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DocumentDeliveryService:
+    """Service for handing out document download links and streams"""
+    
+    def __init__(self):
+        self.url_cache = SignedURLCache(
+            max_size=settings.DOCUMENT_URL_CACHE_SIZE,
+            refresh_margin=settings.DOCUMENT_URL_REFRESH_MARGIN_SECONDS
+        )
+    
+    def _sign(self, file_path: str, file_name: Optional[str], disposition: str) -> Tuple[str, float]:
+        cache_key = (file_path, disposition)
+        cached = self.url_cache.get(cache_key)
+        if cached:
+            return cached
+        
+        params = {'Bucket': settings.AWS_S3_BUCKET, 'Key': file_path}
+        if disposition == "inline" or file_name:
+            params['ResponseContentDisposition'] = content_disposition(file_name, disposition == "inline")
+        
+        expires_in = settings.DOCUMENT_URL_EXPIRY_SECONDS
+        try:
+            url = get_s3_client().generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+        except ClientError as e:
+            _raise_for_client_error(file_path, e)
+        
+        expires_at = time.time() + expires_in
+        self.url_cache.put(cache_key, url, expires_at)
+        return url, expires_at
+    
+    def get_link(
+        self,
+        file_path: str,
+        content_url: str,
+        file_name: Optional[str] = None,
+        mime_type: Optional[str] = None
+    ) -> DocumentLink:
+        """
+        Get download and preview links for a document
+        
+        Signing is a local HMAC computation, so this does no network I/O.
+        
+        Args:
+            file_path: Storage path or S3 key of the document
+            content_url: API route that streams the document
+            file_name: Original file name offered on download
+            mime_type: Document MIME type
+        
+        Returns:
+            Links to the document
+        """
+        previewable = is_previewable(mime_type)
+        if is_local(file_path):
+            return DocumentLink(
+                download_url=content_url,
+                preview_url=f"{content_url}?inline=true" if previewable else None
+            )
+        
+        download_url, expires_at = self._sign(file_path, file_name, "attachment")
+        preview_url = self._sign(file_path, file_name, "inline")[0] if previewable else None
+        return DocumentLink(
+            download_url=download_url,
+            preview_url=preview_url,
+            expires_at=datetime.fromtimestamp(expires_at, tz=timezone.utc)
+        )
+    
+    async def stream(self, file_path: str) -> AsyncIterator[bytes]:
+        """
+        Stream a document from S3 in chunks
+        
+        Blocking reads run in a worker thread so a slow object never stalls
+        the event loop, and only one chunk is held in memory at a time.
+        
+        Raises:
+            FileNotFoundError: If the object does not exist
+            PermissionError: If access to the object is denied
+        """
+        client = get_s3_client()
+        try:
+            response = await run_blocking(
+                client.get_object, Bucket=settings.AWS_S3_BUCKET, Key=file_path
+            )
+        except ClientError as e:
+            _raise_for_client_error(file_path, e)
+        
+        return self._iter_body(response['Body'])
+    
+    async def _iter_body(self, body) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await run_blocking(body.read, settings.DOCUMENT_STREAM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+
+# Global document delivery service instance
+document_delivery_service = DocumentDeliveryService()
@@ -0,0 +1,251 @@
+"""
+Background processing of uploaded firm documents
+
+Uploads only stream the file to storage and create the FirmDocument record.
+Checking the content against its declared type, counting pages and finding
+duplicates happen afterwards in a Celery worker process, with progress
+recorded in FirmDocument.processing_status.
+"""
+import hashlib
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import structlog
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.security_firm import FirmDocument
+from app.services.storage import storage_for
+
+logger = structlog.get_logger()
+
+
+class ProcessingStatus:
+    PENDING = "pending"
+    PROCESSING = "processing"
+    READY = "ready"
+    REJECTED = "rejected"
+    FAILED = "failed"
+
+
+# Leading bytes identifying each accepted document format
+MAGIC_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+]
+MIME_ALIASES = {"image/jpg": "image/jpeg"}
+
+# PDF producers may put a little junk before the header
+_HEAD_BYTES = 1024
+
+
+def normalize_mime_type(mime_type: Optional[str]) -> Optional[str]:
+    """Canonical form of a MIME type, e.g. image/jpg -> image/jpeg"""
+    if not mime_type:
+        return None
+    mime_type = mime_type.split(";")[0].strip().lower()
+    return MIME_ALIASES.get(mime_type, mime_type)
+
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    """Identify a document format from its leading bytes"""
+    for signature, mime_type in MAGIC_SIGNATURES:
+        if signature == b"%PDF-":
+            if signature in head[:_HEAD_BYTES]:
+                return mime_type
+        elif head.startswith(signature):
+            return mime_type
+    return None
+
+
+class DocumentInspector:
+    """
+    Incremental inspection of a document's content
+    
+    Content is fed chunk by chunk, so a document of any size is inspected
+    with one chunk in memory. Pages are counted from PDF page objects; a
+    match split across two chunks is found through a short overlap.
+    """
+    
+    _PAGE_OBJECT = re.compile(rb"/Type\s{0,8}/Page(?![A-Za-z])")
+    _OVERLAP = 32
+    
+    def __init__(self):
+        self.head = b""
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._pages = 0
+        self._tail = b""
+    
+    @property
+    def mime_type(self) -> Optional[str]:
+        return sniff_mime_type(self.head)
+    
+    @property
+    def checksum_sha256(self) -> str:
+        return self._digest.hexdigest()
+    
+    def feed(self, chunk: bytes):
+        """Inspect the next chunk of content"""
+        if len(self.head) < _HEAD_BYTES:
+            self.head += chunk[:_HEAD_BYTES - len(self.head)]
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        
+        if self.mime_type == "application/pdf":
+            data = self._tail + chunk
+            # Matches ending at the last byte wait for the next chunk, which
+            # decides whether "/Page" is really "/Pages"
+            counted_up_to = len(self._tail) - 1
+            self._pages += sum(
+                1 for match in self._PAGE_OBJECT.finditer(data)
+                if counted_up_to < match.end() < len(data)
+            )
+            self._tail = data[-self._OVERLAP:]
+    
+    def page_count(self) -> Optional[int]:
+        """
+        Number of pages, once all content has been fed
+        
+        Returns:
+            Page count for PDFs whose page objects are readable, 1 for
+            images, otherwise None
+        """
+        mime_type = self.mime_type
+        if mime_type == "application/pdf":
+            pages = self._pages + sum(
+                1 for match in self._PAGE_OBJECT.finditer(self._tail)
+                if match.end() == len(self._tail)
+            )
+            # Page objects inside compressed object streams can't be counted
+            return pages or None
+        if mime_type and mime_type.startswith("image/"):
+            return 1
+        return None
+
+
+def enqueue_document_processing(document_id) -> bool:
+    """
+    Queue a document for background processing
+    
+    A broker outage doesn't fail the upload; the document stays pending
+    and the periodic sweep queues it again.
+    
+    Returns:
+        Whether the task was queued
+    """
+    from app.tasks.documents import process_document
+    
+    try:
+        process_document.delay(str(document_id))
+        return True
+    except Exception as e:
+        logger.warning("document_processing_enqueue_failed", document_id=str(document_id), error=str(e))
+        return False
+
+
+class DocumentProcessingService:
+    """Service for processing uploaded firm documents"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def process(self, document_id: str) -> Optional[FirmDocument]:
+        """
+        Validate and inspect a stored document
+        
+        Documents that are already processed or rejected are left alone,
+        so redelivered tasks are harmless.
+        
+        Args:
+            document_id: ID of the document to process
+        
+        Returns:
+            The processed document, or None if it doesn't exist
+        """
+        document = await self.db.get(FirmDocument, document_id)
+        if not document:
+            return None
+        if document.processing_status in (ProcessingStatus.READY, ProcessingStatus.REJECTED):
+            return document
+        
+        document.processing_status = ProcessingStatus.PROCESSING
+        await self.db.commit()
+        
+        try:
+            inspector = DocumentInspector()
+            async for chunk in storage_for(document.file_path).open(document.file_path):
+                inspector.feed(chunk)
+            
+            self._apply(document, inspector)
+            if document.processing_status == ProcessingStatus.READY:
+                document.duplicate_of_id = await self._find_duplicate(document)
+        except Exception as e:
+            document.processing_status = ProcessingStatus.FAILED
+            document.processing_error = str(e)
+            await self.db.commit()
+            logger.error("document_processing_failed", document_id=str(document.id), error=str(e))
+            raise
+        
+        document.processed_at = datetime.utcnow()
+        await self.db.commit()
+        
+        logger.info(
+            "document_processed",
+            document_id=str(document.id),
+            status=document.processing_status,
+            detected_mime_type=document.detected_mime_type,
+            page_count=document.page_count,
+            duplicate_of_id=str(document.duplicate_of_id) if document.duplicate_of_id else None
+        )
+        return document
+    
+    def _apply(self, document: FirmDocument, inspector: DocumentInspector):
+        document.detected_mime_type = inspector.mime_type
+        document.page_count = inspector.page_count()
+        document.processing_error = None
+        
+        if document.checksum_sha256 and document.checksum_sha256 != inspector.checksum_sha256:
+            document.processing_status = ProcessingStatus.REJECTED
+            document.processing_error = "Stored content does not match the uploaded checksum"
+        elif not inspector.mime_type:
+            document.processing_status = ProcessingStatus.REJECTED
+            document.processing_error = "File content is not a supported document format"
+        elif inspector.mime_type != normalize_mime_type(document.mime_type):
+            document.processing_status = ProcessingStatus.REJECTED
+            document.processing_error = (
+                f"File content is {inspector.mime_type} but was uploaded as {document.mime_type}"
+            )
+        else:
+            document.processing_status = ProcessingStatus.READY
+        
+        document.checksum_sha256 = inspector.checksum_sha256
+    
+    async def _find_duplicate(self, document: FirmDocument):
+        result = await self.db.execute(
+            select(FirmDocument.id).where(
+                and_(
+                    FirmDocument.firm_id == document.firm_id,
+                    FirmDocument.checksum_sha256 == document.checksum_sha256,
+                    FirmDocument.id != document.id,
+                    FirmDocument.processing_status != ProcessingStatus.REJECTED
+                )
+            ).order_by(FirmDocument.created_at).limit(1)
+        )
+        return result.scalar_one_or_none()
+    
+    async def get_stale_document_ids(self) -> List[str]:
+        """IDs of documents never queued or left mid-processing by a dead worker"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.DOCUMENT_PROCESSING_SWEEP_DELAY_SECONDS)
+        result = await self.db.execute(
+            select(FirmDocument.id).where(
+                and_(
+                    FirmDocument.processing_status.in_([ProcessingStatus.PENDING, ProcessingStatus.PROCESSING]),
+                    FirmDocument.updated_at < cutoff
+                )
+            ).order_by(FirmDocument.created_at).limit(settings.DOCUMENT_PROCESSING_SWEEP_BATCH_SIZE)
+        )
+        return [str(document_id) for document_id in result.scalars().all()]
@@ -8,20 +8,24 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func, desc
 from sqlalchemy.orm import selectinload
 from geoalchemy2.functions import ST_GeomFromText, ST_Within
+from geoalchemy2.shape import to_shape
 import structlog
 
+from app.core.config import settings
 from app.core.redis import cache
 from app.core.exceptions import APIError, ErrorCodes
 from app.models.emergency import PanicRequest, RequestStatusUpdate, ServiceProvider
 from app.models.user import UserGroup, GroupMobileNumber, RegisteredUser
 from app.models.security_firm import SecurityFirm, CoverageArea, Team
 from app.models.subscription import StoredSubscription, SubscriptionProduct
+from app.services.dispatch_scoring import dispatch_scorer
 from app.services.geolocation import GeolocationService
 from app.services.subscription import SubscriptionService
 from app.services.websocket import websocket_service
 from app.services.notification import notification_service, NotificationRecipient
 from app.services.silent_mode import silent_mode_service, SilentModeRequest, Platform
 from app.services.metrics import MetricsService
+from app.services.metrics_rollup import PerformanceRollupService
 
 logger = structlog.get_logger()
 
@@ -77,6 +81,7 @@ class EmergencyService:
         self.geolocation_service = GeolocationService(db)
         self.subscription_service = SubscriptionService(db)
         self.metrics_service = MetricsService()
+        self.rollup_service = PerformanceRollupService(db)
     
     async def submit_panic_request(
         self,
@@ -162,14 +167,14 @@ class EmergencyService:
         # 9. Update rate limiting cache
         await self._update_rate_limiting_cache(requester_phone)
         
+        # 10. Attribute the request to its firm and zone for performance rollups
+        await self.rollup_service.record_submission(
+            panic_request.id, firm_id, service_type, latitude, longitude
+        )
+        
         await self.db.commit()
         await self.db.refresh(panic_request)
         
-        # Record initial submission event for metrics
-        await self.metrics_service.record_request_lifecycle_event(
-            panic_request.id, "submitted", panic_request.created_at
-        )
-        
         # Send real-time confirmation to requester
         await websocket_service.send_request_confirmation(
             panic_request.id,
@@ -193,7 +198,8 @@ class EmergencyService:
         await notification_service.send_emergency_confirmation(
             notification_recipient,
             panic_request.id,
-            service_type
+            service_type,
+            queued=True
         )
         
         # Activate silent mode for call service requests
@@ -370,7 +376,6 @@ class EmergencyService:
         # Check if any existing request is for a similar location (within 100m)
         for existing_request in existing_requests:
             # Extract coordinates from existing request
-            from geoalchemy2.shape import to_shape
             existing_point = to_shape(existing_request.location)
             existing_lat = existing_point.y
             existing_lon = existing_point.x
@@ -411,7 +416,7 @@ class EmergencyService:
             raise EmergencyRequestError("User group not found")
         
         # Check subscription status
-        subscription_status = await self.subscription_service.validate_subscription_status(str(group_id))
+        subscription_status = await self.subscription_service.validate_subscription_status(str(group_id), group=group)
         
         if not subscription_status["is_active"]:
             raise SubscriptionExpiredError(
@@ -623,14 +628,16 @@ class EmergencyService:
         # Update request status
         panic_request.status = new_status
         
-        # Set timestamps based on status
+        # Set timestamps based on status, rolling up the first acceptance and completion
         now = datetime.utcnow()
         if new_status == "accepted" and not panic_request.accepted_at:
             panic_request.accepted_at = now
+            await self.rollup_service.record_acceptance(request_id, now)
         elif new_status == "arrived" and not panic_request.arrived_at:
             panic_request.arrived_at = now
         elif new_status == "completed" and not panic_request.completed_at:
             panic_request.completed_at = now
+            await self.rollup_service.record_completion(request_id, now)
         
         # Create status update record
         location_geom = None
@@ -649,17 +656,6 @@ class EmergencyService:
         self.db.add(status_update)
         await self.db.commit()
         
-        # Record metrics for lifecycle events based on status
-        if new_status == "accepted":
-            # We would need firm_id and zone info for this, but they're not available in this context
-            # For now, we'll skip detailed metrics for status updates
-            pass
-        elif new_status == "completed":
-            # We would need firm_id, zone, and timing info for this
-            # For now, we'll skip detailed metrics for status updates  
-            pass
-        # Note: Consider implementing a simpler metrics method for status updates
-        
         # Send real-time status update to all subscribers
         additional_data = {}
         if location:
@@ -893,6 +889,31 @@ class EmergencyService:
         
         return True
     
+    async def _estimate_arrival_minutes(self, panic_request: PanicRequest, service_provider: ServiceProvider) -> int:
+        """
+        Minutes for a service provider to reach a request
+        
+        Uses the road distance estimate from the dispatch speed profile, and
+        the configured fallback if either location is unusable.
+        """
+        try:
+            request_point = to_shape(panic_request.location)
+            provider_point = to_shape(service_provider.location)
+            _, eta_minutes = await dispatch_scorer.estimate(
+                self.db,
+                provider_point.y, provider_point.x,
+                request_point.y, request_point.x
+            )
+            return max(1, round(eta_minutes))
+        except Exception as e:
+            logger.warning(
+                "service_provider_eta_failed",
+                request_id=str(panic_request.id),
+                service_provider_id=str(service_provider.id),
+                error=str(e)
+            )
+            return settings.DISPATCH_FALLBACK_ETA_MINUTES
+    
     async def allocate_request_to_service_provider(
         self,
         request_id: UUID,
@@ -956,7 +977,7 @@ class EmergencyService:
         await self.db.commit()
         
         # Send real-time provider assignment notification
-        estimated_arrival_time = 15  # Default ETA, should be calculated based on location
+        estimated_arrival_time = await self._estimate_arrival_minutes(panic_request, service_provider)
         await websocket_service.send_provider_assignment(
             request_id,
             {
@@ -977,7 +998,8 @@ class EmergencyService:
             requester_recipient,
             service_provider.name,
             estimated_arrival_time,
-            f"{service_provider.service_type} vehicle"
+            f"{service_provider.service_type} vehicle",
+            queued=True
         )
         
         # Notify the service provider about the new assignment
@@ -990,7 +1012,8 @@ class EmergencyService:
             provider_recipient,
             panic_request.service_type,
             panic_request.address,
-            panic_request.description
+            panic_request.description,
+            queued=True
         )
         
         await websocket_service.notify_field_agent_assignment(
@@ -1388,8 +1411,11 @@ class EmergencyService:
             raise EmergencyRequestError("Agent is not part of the assigned team")
         
         # Update request status
+        now = datetime.utcnow()
         panic_request.status = "accepted"
-        panic_request.accepted_at = datetime.utcnow()
+        if not panic_request.accepted_at:
+            await self.rollup_service.record_acceptance(request_id, now)
+        panic_request.accepted_at = now
         
         # Create status update
         message = f"Request accepted by field agent {agent.first_name} {agent.last_name}"
@@ -1677,8 +1703,11 @@ class EmergencyService:
             raise EmergencyRequestError("Performance rating must be between 1 and 5")
         
         # Update request status
+        now = datetime.utcnow()
         panic_request.status = "completed"
-        panic_request.completed_at = datetime.utcnow()
+        if not panic_request.completed_at:
+            await self.rollup_service.record_completion(request_id, now, is_prank)
+        panic_request.completed_at = now
         
         # Create feedback record
         from app.models.emergency import RequestFeedback
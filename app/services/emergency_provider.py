@@ -3,20 +3,29 @@ Emergency Provider service for managing ambulances, tow trucks, etc.
 """
 from typing import List, Optional, Dict, Any
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, text, exists
+from sqlalchemy import select, and_, func, text, exists, cast
 from sqlalchemy.orm import selectinload
+from geoalchemy2 import Geography
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import Point
 import math
 
 from app.models.emergency_provider import EmergencyProvider, ProviderAssignment, ProviderType, ProviderStatus, EmergencyProviderType
 from app.models.capability import ProviderCapability
 from app.models.emergency import PanicRequest
 from app.core.logging import get_logger
+from app.services.dispatch_scoring import dispatch_scorer
 
 logger = get_logger(__name__)
 
 
+def location_point(latitude: float, longitude: float):
+    """PostGIS point for a provider's current_location"""
+    return from_shape(Point(longitude, latitude), srid=4326)
+
+
 class EmergencyProviderService:
     """Service for managing emergency providers"""
 
@@ -86,6 +95,7 @@ class EmergencyProviderService:
             postal_code=postal_code,
             current_latitude=current_latitude,
             current_longitude=current_longitude,
+            current_location=location_point(current_latitude, current_longitude),
             base_latitude=base_latitude,
             base_longitude=base_longitude,
             coverage_radius_km=coverage_radius_km,
@@ -206,6 +216,8 @@ class EmergencyProviderService:
         if current_longitude is not None:
             provider.current_longitude = current_longitude
             provider.last_location_update = datetime.utcnow()
+        if current_latitude is not None or current_longitude is not None:
+            provider.current_location = location_point(provider.current_latitude, provider.current_longitude)
         if base_latitude is not None:
             provider.base_latitude = base_latitude
         if base_longitude is not None:
@@ -250,6 +262,7 @@ class EmergencyProviderService:
             
         provider.current_latitude = latitude
         provider.current_longitude = longitude
+        provider.current_location = location_point(latitude, longitude)
         provider.last_location_update = datetime.utcnow()
         
         await self.db.commit()
@@ -317,16 +330,32 @@ class EmergencyProviderService:
         provider_type: ProviderType,
         max_distance_km: float = 100.0,
         limit: int = 10,
-        firm_id: Optional[UUID] = None
+        firm_id: Optional[UUID] = None,
+        rank_by: str = "distance"
     ) -> List[Dict[str, Any]]:
-        """Find nearest available providers to a location"""
+        """
+        Find nearest available providers to a location
+        
+        Candidates are scored in one vectorized pass; the ETA comes from the
+        speed profile learned from past arrivals.
+        
+        Args:
+            rank_by: "distance" or "eta"
+        """
         
-        # Build base query
+        # Build base query; the geography index narrows candidates to the
+        # search radius (with slack for the spheroid)
+        search_point = cast(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326), Geography)
         query = select(EmergencyProvider).where(
             and_(
                 EmergencyProvider.provider_type == provider_type,
                 EmergencyProvider.status == ProviderStatus.AVAILABLE,
-                EmergencyProvider.is_active == True
+                EmergencyProvider.is_active == True,
+                func.ST_DWithin(
+                    cast(EmergencyProvider.current_location, Geography),
+                    search_point,
+                    max_distance_km * 1010
+                )
             )
         )
         
@@ -336,25 +365,28 @@ class EmergencyProviderService:
         
         result = await self.db.execute(query)
         providers = result.scalars().all()
+        if not providers:
+            return []
+        
+        # Score every candidate at once and keep the best eligible ones
+        scores = dispatch_scorer.score(
+            await dispatch_scorer.get_profile(self.db),
+            latitude, longitude,
+            [provider.current_latitude for provider in providers],
+            [provider.current_longitude for provider in providers],
+            [provider.province for provider in providers],
+            coverage_radius_km=[provider.coverage_radius_km for provider in providers],
+            max_distance_km=max_distance_km
+        )
         
-        # Calculate distances and filter by max distance
-        provider_distances = []
-        for provider in providers:
-            distance = self.calculate_distance(
-                latitude, longitude,
-                provider.current_latitude, provider.current_longitude
-            )
-            
-            if distance <= max_distance_km and distance <= provider.coverage_radius_km:
-                provider_distances.append({
-                    "provider": provider,
-                    "distance_km": distance,
-                    "estimated_duration_minutes": self.estimate_travel_time(distance)
-                })
-        
-        # Sort by distance and limit results
-        provider_distances.sort(key=lambda x: x["distance_km"])
-        return provider_distances[:limit]
+        return [
+            {
+                "provider": providers[index],
+                "distance_km": float(scores.distance_km[index]),
+                "estimated_duration_minutes": float(scores.eta_minutes[index])
+            }
+            for index in scores.ranked(limit, by=rank_by)
+        ]
 
     def estimate_travel_time(self, distance_km: float) -> float:
         """Estimate travel time based on distance (simple calculation)"""
@@ -392,11 +424,19 @@ class EmergencyProviderService:
         if not request:
             raise ValueError("Request not found")
         
-        # Calculate distance (assuming request.location is a PostGIS point)
-        # For now, we'll need to extract lat/lon from the geometry
-        # This would typically be done with PostGIS functions
-        distance_km = 0.0  # Placeholder - would calculate from PostGIS geometry
-        estimated_duration = self.estimate_travel_time(distance_km)
+        # Distance from the provider's position to the request, and ETA from
+        # the learned speed profile
+        request_point = to_shape(request.location)
+        now = datetime.now(timezone.utc)
+        distance_km, estimated_duration = await dispatch_scorer.estimate(
+            self.db,
+            provider.current_latitude, provider.current_longitude,
+            request_point.y, request_point.x,
+            region=provider.province,
+            at=now
+        )
+        if estimated_arrival_time is None:
+            estimated_arrival_time = now + timedelta(minutes=estimated_duration)
         
         # Create assignment
         assignment = ProviderAssignment(
@@ -419,7 +459,8 @@ class EmergencyProviderService:
             "provider_assigned_to_request",
             provider_id=str(provider_id),
             request_id=str(request_id),
-            distance_km=distance_km
+            distance_km=distance_km,
+            estimated_duration_minutes=estimated_duration
         )
         
         return assignment
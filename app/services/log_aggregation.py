@@ -3,15 +3,20 @@ Log aggregation and search service for the Panic System Platform
 """
 import json
 import asyncio
+import csv
+import heapq
+import io
+import itertools
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Iterator, AsyncIterator
 from pathlib import Path
 from dataclasses import dataclass
 from enum import Enum
 import re
-import gzip
 
 from app.core.logging import get_logger, LogLevel, SecurityEventType, BusinessEventType
+from app.core.log_index import iter_segment_lines, load_segment_index, to_epoch
 
 logger = get_logger(__name__)
 
@@ -89,23 +94,22 @@ class LogAggregationService:
             # Get relevant log files
             log_files = await self._get_relevant_log_files(query)
             
-            # Search through log files
-            entries = []
+            # Scan files off the event loop; each keeps at most one page of entries
+            entries_per_file = []
             total_count = 0
             
             for log_file in log_files:
                 file_entries, file_count = await self._search_log_file(log_file, query)
-                entries.extend(file_entries)
+                entries_per_file.append(file_entries)
                 total_count += file_count
             
-            # Sort entries by timestamp
-            entries.sort(
-                key=lambda x: x.timestamp,
+            # Each file's entries are already ordered, so a k-way merge replaces a full sort
+            merged = heapq.merge(
+                *entries_per_file,
+                key=self._sort_key,
                 reverse=(query.sort_order == "desc")
             )
-            
-            # Apply pagination
-            paginated_entries = entries[query.offset:query.offset + query.limit]
+            paginated_entries = list(itertools.islice(merged, query.offset, query.offset + query.limit))
             
             execution_time = (datetime.now() - start_time).total_seconds() * 1000
             
@@ -155,6 +159,14 @@ class LogAggregationService:
         if query.start_time or query.end_time:
             filtered_files = []
             for log_file in log_files:
+                index = load_segment_index(log_file)
+                if index is not None and index.entries:
+                    # Indexed segments know their exact time span
+                    if not index.matching_blocks(start_time=query.start_time, end_time=query.end_time):
+                        continue
+                    filtered_files.append(log_file)
+                    continue
+                
                 file_time = datetime.fromtimestamp(log_file.stat().st_mtime)
                 if query.start_time and file_time < query.start_time:
                     continue
@@ -169,36 +181,60 @@ class LogAggregationService:
         return log_files
     
     async def _search_log_file(self, log_file: Path, query: LogSearchQuery) -> tuple[List[LogEntry], int]:
-        """Search a single log file"""
-        entries = []
+        """Search a single log file in a worker thread"""
+        return await asyncio.to_thread(self._scan_log_file, log_file, query)
+    
+    def _scan_log_file(self, log_file: Path, query: LogSearchQuery) -> tuple[List[LogEntry], int]:
+        """Count matches in a file, keeping only the entries a page could need"""
+        keep = query.offset + query.limit
         total_count = 0
         
+        if query.sort_order == "desc":
+            # Lines are appended in time order, so the newest matches are the last ones
+            newest = deque(maxlen=keep)
+            for entry in self._iter_file_entries(log_file, query):
+                total_count += 1
+                newest.append(entry)
+            return list(reversed(newest)), total_count
+        
+        entries = []
+        for entry in self._iter_file_entries(log_file, query):
+            total_count += 1
+            if len(entries) < keep:
+                entries.append(entry)
+        return entries, total_count
+    
+    def _iter_file_entries(self, log_file: Path, query: LogSearchQuery) -> Iterator[LogEntry]:
+        """Yield matching entries from a file in file (oldest first) order"""
         try:
-            # Handle compressed files
-            if log_file.suffix == '.gz':
-                file_opener = gzip.open
-                mode = 'rt'
-            else:
-                file_opener = open
-                mode = 'r'
+            # Rotated segments carry a sidecar index; the live file is scanned in full
+            blocks = None
+            index = load_segment_index(log_file)
+            if index is not None:
+                blocks = index.matching_blocks(
+                    start_time=query.start_time,
+                    end_time=query.end_time,
+                    level=query.level.value if query.level else None,
+                    event_type=query.event_type,
+                    request_id=query.request_id,
+                    user_id=query.user_id,
+                    client_ip=query.client_ip
+                )
+                if not blocks:
+                    return
             
-            with file_opener(log_file, mode, encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        # Parse JSON log entry
-                        log_data = json.loads(line.strip())
-                        entry = self._parse_log_entry(log_data)
-                        
-                        # Apply filters
-                        if self._matches_query(entry, query):
-                            total_count += 1
-                            # Only add to results if within pagination range
-                            if len(entries) < query.limit + query.offset:
-                                entries.append(entry)
-                    
-                    except (json.JSONDecodeError, KeyError) as e:
-                        # Skip malformed log entries
-                        continue
+            for line in iter_segment_lines(log_file, blocks):
+                try:
+                    # Parse JSON log entry
+                    log_data = json.loads(line)
+                    entry = self._parse_log_entry(log_data)
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError) as e:
+                    # Skip malformed log entries
+                    continue
+                
+                # Apply filters
+                if self._matches_query(entry, query):
+                    yield entry
         
         except Exception as e:
             self.logger.error(
@@ -206,8 +242,58 @@ class LogAggregationService:
                 log_file=str(log_file),
                 error=str(e)
             )
+    
+    def _iter_file_entries_newest_first(self, log_file: Path, query: LogSearchQuery) -> Iterator[LogEntry]:
+        """Yield the newest page of matches from a file, newest first"""
+        # Files can only be read forwards, so buffer the last page of matches
+        newest = deque(self._iter_file_entries(log_file, query), maxlen=query.offset + query.limit)
+        yield from reversed(newest)
+    
+    def _iter_merged_entries(self, log_files: List[Path], query: LogSearchQuery) -> Iterator[LogEntry]:
+        """Lazily merge matching entries from all files in the requested order"""
+        if query.sort_order == "desc":
+            iterators = [self._iter_file_entries_newest_first(log_file, query) for log_file in log_files]
+            return heapq.merge(*iterators, key=self._sort_key, reverse=True)
         
-        return entries, total_count
+        iterators = [self._iter_file_entries(log_file, query) for log_file in log_files]
+        return heapq.merge(*iterators, key=self._sort_key)
+    
+    async def stream_logs(self, query: LogSearchQuery, batch_size: int = 500) -> AsyncIterator[List[LogEntry]]:
+        """
+        Stream the requested page of matching entries in batches
+        
+        Reading stops as soon as the page is filled. File reads and
+        decompression run in worker threads.
+        
+        Args:
+            query: Search parameters; offset/limit bound the streamed window
+            batch_size: Number of entries pulled per worker-thread hop
+            
+        Yields:
+            Lists of log entries in the requested sort order
+        """
+        log_files = await self._get_relevant_log_files(query)
+        merged = self._iter_merged_entries(log_files, query)
+        
+        page = itertools.islice(merged, query.offset, query.offset + query.limit)
+        streamed = 0
+        
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(page, batch_size)))
+            if not batch:
+                break
+            streamed += len(batch)
+            yield batch
+        
+        self.logger.info(
+            "log_stream_completed",
+            query_params=query.__dict__,
+            results_count=streamed
+        )
+    
+    @staticmethod
+    def _sort_key(entry: LogEntry) -> float:
+        return to_epoch(entry.timestamp)
     
     def _parse_log_entry(self, log_data: Dict[str, Any]) -> LogEntry:
         """Parse log data into LogEntry object"""
@@ -383,106 +469,132 @@ class LogAggregationService:
             )
             raise
     
-    def _export_to_json(self, entries: List[LogEntry]) -> str:
-        """Export log entries to JSON format"""
-        export_data = []
+    async def stream_export(self, query: LogSearchQuery, format: str = "ndjson") -> AsyncIterator[str]:
+        """
+        Stream logs matching query as JSON, NDJSON or CSV text chunks
+        
+        Args:
+            query: Search parameters; limit caps the number of exported entries
+            format: One of json, ndjson or csv
+            
+        Yields:
+            Encoded chunks, one per batch of entries
+        """
+        format = format.lower()
+        if format not in ("json", "ndjson", "csv"):
+            raise ValueError(f"Unsupported export format: {format}")
+        
+        if format == "csv":
+            yield self._csv_chunk([], header=True)
+        elif format == "json":
+            yield "["
+        
+        first = True
+        async for batch in self.stream_logs(query):
+            if format == "csv":
+                yield self._csv_chunk(batch)
+            elif format == "ndjson":
+                yield "".join(json.dumps(self._entry_to_dict(entry), default=str) + "\n" for entry in batch)
+            else:
+                chunk = ",".join(json.dumps(self._entry_to_dict(entry), default=str) for entry in batch)
+                yield chunk if first else "," + chunk
+                first = False
+        
+        if format == "json":
+            yield "]"
+    
+    def _entry_to_dict(self, entry: LogEntry) -> Dict[str, Any]:
+        """Flatten a log entry into an export record"""
+        entry_dict = {
+            'timestamp': entry.timestamp.isoformat(),
+            'level': entry.level,
+            'logger': entry.logger,
+            'message': entry.message,
+            'service': entry.service,
+            'version': entry.version,
+            'environment': entry.environment
+        }
+        
+        # Add optional fields
+        if entry.request_id:
+            entry_dict['request_id'] = entry.request_id
+        if entry.user_id:
+            entry_dict['user_id'] = entry.user_id
+        if entry.client_ip:
+            entry_dict['client_ip'] = entry.client_ip
+        if entry.event_type:
+            entry_dict['event_type'] = entry.event_type
+        if entry.category:
+            entry_dict['category'] = entry.category
+        if entry.error_type:
+            entry_dict['error_type'] = entry.error_type
+        if entry.exception:
+            entry_dict['exception'] = entry.exception
+        if entry.extra_fields:
+            entry_dict.update(entry.extra_fields)
+        
+        return entry_dict
+    
+    # Streamed CSV cannot see every row up front, so extra fields share one JSON column
+    STREAM_CSV_FIELDS = [
+        'timestamp', 'level', 'logger', 'message', 'service', 'version', 'environment',
+        'request_id', 'user_id', 'client_ip', 'event_type', 'category', 'error_type',
+        'exception', 'extra_fields'
+    ]
+    
+    def _csv_chunk(self, entries: List[LogEntry], header: bool = False) -> str:
+        """Render a batch of entries as CSV rows with the fixed streaming columns"""
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=self.STREAM_CSV_FIELDS)
+        
+        if header:
+            writer.writeheader()
+        
         for entry in entries:
-            entry_dict = {
+            row = {
                 'timestamp': entry.timestamp.isoformat(),
                 'level': entry.level,
                 'logger': entry.logger,
                 'message': entry.message,
                 'service': entry.service,
                 'version': entry.version,
-                'environment': entry.environment
+                'environment': entry.environment,
+                'request_id': entry.request_id,
+                'user_id': entry.user_id,
+                'client_ip': entry.client_ip,
+                'event_type': entry.event_type,
+                'category': entry.category,
+                'error_type': entry.error_type,
+                'exception': entry.exception,
+                'extra_fields': json.dumps(entry.extra_fields, default=str) if entry.extra_fields else None
             }
-            
-            # Add optional fields
-            if entry.request_id:
-                entry_dict['request_id'] = entry.request_id
-            if entry.user_id:
-                entry_dict['user_id'] = entry.user_id
-            if entry.client_ip:
-                entry_dict['client_ip'] = entry.client_ip
-            if entry.event_type:
-                entry_dict['event_type'] = entry.event_type
-            if entry.category:
-                entry_dict['category'] = entry.category
-            if entry.error_type:
-                entry_dict['error_type'] = entry.error_type
-            if entry.exception:
-                entry_dict['exception'] = entry.exception
-            if entry.extra_fields:
-                entry_dict.update(entry.extra_fields)
-            
-            export_data.append(entry_dict)
+            writer.writerow(row)
         
+        return output.getvalue()
+    
+    def _export_to_json(self, entries: List[LogEntry]) -> str:
+        """Export log entries to JSON format"""
+        export_data = [self._entry_to_dict(entry) for entry in entries]
         return json.dumps(export_data, indent=2, default=str)
     
     def _export_to_csv(self, entries: List[LogEntry]) -> str:
         """Export log entries to CSV format"""
-        import csv
-        import io
-        
         output = io.StringIO()
         
         if not entries:
             return ""
         
+        rows = [self._entry_to_dict(entry) for entry in entries]
+        
         # Determine all possible fields
-        all_fields = set(['timestamp', 'level', 'logger', 'message', 'service', 'version', 'environment'])
-        for entry in entries:
-            if entry.request_id:
-                all_fields.add('request_id')
-            if entry.user_id:
-                all_fields.add('user_id')
-            if entry.client_ip:
-                all_fields.add('client_ip')
-            if entry.event_type:
-                all_fields.add('event_type')
-            if entry.category:
-                all_fields.add('category')
-            if entry.error_type:
-                all_fields.add('error_type')
-            if entry.exception:
-                all_fields.add('exception')
-            if entry.extra_fields:
-                all_fields.update(entry.extra_fields.keys())
+        all_fields = set()
+        for row in rows:
+            all_fields.update(row.keys())
         
         fieldnames = sorted(all_fields)
         writer = csv.DictWriter(output, fieldnames=fieldnames)
         writer.writeheader()
-        
-        for entry in entries:
-            row = {
-                'timestamp': entry.timestamp.isoformat(),
-                'level': entry.level,
-                'logger': entry.logger,
-                'message': entry.message,
-                'service': entry.service,
-                'version': entry.version,
-                'environment': entry.environment
-            }
-            
-            # Add optional fields
-            if entry.request_id:
-                row['request_id'] = entry.request_id
-            if entry.user_id:
-                row['user_id'] = entry.user_id
-            if entry.client_ip:
-                row['client_ip'] = entry.client_ip
-            if entry.event_type:
-                row['event_type'] = entry.event_type
-            if entry.category:
-                row['category'] = entry.category
-            if entry.error_type:
-                row['error_type'] = entry.error_type
-            if entry.exception:
-                row['exception'] = entry.exception
-            if entry.extra_fields:
-                row.update(entry.extra_fields)
-            
-            writer.writerow(row)
+        writer.writerows(rows)
         
         return output.getvalue()
 
@@ -12,6 +12,7 @@ from enum import Enum
 
 from app.core.logging import get_logger
 from app.core.config import settings
+from app.core.log_index import relocate_segment_index, remove_segment_index
 
 logger = get_logger(__name__)
 
@@ -215,6 +216,16 @@ class LogRetentionService:
             
             # Verify compression was successful
             if compressed_path.exists() and compressed_path.stat().st_size > 0:
+                # Carry the segment index over to the compressed file
+                try:
+                    relocate_segment_index(log_file, compressed_path)
+                except Exception as e:
+                    self.logger.warning(
+                        "log_index_relocation_failed",
+                        log_file=str(log_file),
+                        error=str(e)
+                    )
+                
                 log_file.unlink()  # Remove original file
                 self.logger.info(
                     "log_file_compressed",
@@ -254,8 +265,9 @@ class LogRetentionService:
             if archive_path.exists():
                 return False
             
-            # Move file to archive
+            # Move file to archive; archived files are no longer searched
             shutil.move(str(log_file), str(archive_path))
+            remove_segment_index(log_file)
             
             # Compress archived file if not already compressed
             if not archive_path.suffix.endswith('.gz'):
@@ -288,6 +300,7 @@ class LogRetentionService:
         try:
             file_size = log_file.stat().st_size
             log_file.unlink()
+            remove_segment_index(log_file)
             
             self.logger.info(
                 "log_file_deleted",
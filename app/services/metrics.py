@@ -4,9 +4,11 @@ Business metrics tracking service
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text, func
+from sqlalchemy import func
 from app.core.metrics import metrics_collector
 from app.core.database import get_db
+from app.services.metrics_rollup import PerformanceRollupService
+from app.services.subscription_expiry import get_active_subscription_counts
 from app.models.emergency import PanicRequest
 from app.models.user import UserGroup
 from app.models.subscription import SubscriptionProduct
@@ -145,54 +147,28 @@ class MetricsService:
             logger.error(f"Error updating system health metrics: {e}")
     
     async def update_performance_metrics(self, db: AsyncSession):
-        """Update zone and firm performance metrics"""
+        """Update zone and firm performance metrics from the last hour's rollups"""
         try:
-            # Calculate zone performance metrics
-            zone_performance_query = text("""
-                SELECT 
-                    ca.id as zone_id,
-                    ca.name as zone_name,
-                    pr.service_type,
-                    AVG(EXTRACT(EPOCH FROM (pr.accepted_at - pr.created_at))) as avg_response_time
-                FROM panic_requests pr
-                JOIN user_groups ug ON pr.group_id = ug.id
-                JOIN coverage_areas ca ON ST_Contains(ca.boundary, pr.location)
-                WHERE pr.created_at >= NOW() - INTERVAL '1 hour'
-                AND pr.accepted_at IS NOT NULL
-                GROUP BY ca.id, ca.name, pr.service_type
-            """)
-            
-            zone_results = await db.execute(zone_performance_query)
+            rollups = PerformanceRollupService(db)
+            since = datetime.utcnow() - timedelta(hours=1)
             
-            for row in zone_results:
-                self.metrics_collector.update_zone_performance(
-                    zone_id=str(row.zone_id),
-                    service_type=row.service_type,
-                    avg_response_time=row.avg_response_time or 0
-                )
+            # Calculate zone performance metrics
+            for summary in await rollups.summarize(since, group_by=("zone_name", "service_type")):
+                if summary.accepted:
+                    self.metrics_collector.update_zone_performance(
+                        zone_id=summary.zone_id or summary.key["zone_name"],
+                        service_type=summary.key["service_type"],
+                        avg_response_time=summary.avg_response_time
+                    )
             
             # Calculate firm performance metrics
-            firm_performance_query = text("""
-                SELECT 
-                    sp.firm_id,
-                    pr.service_type,
-                    AVG(EXTRACT(EPOCH FROM (pr.accepted_at - pr.created_at))) as avg_response_time
-                FROM panic_requests pr
-                JOIN user_groups ug ON pr.group_id = ug.id
-                JOIN subscription_products sp ON ug.subscription_id = sp.id
-                WHERE pr.created_at >= NOW() - INTERVAL '1 hour'
-                AND pr.accepted_at IS NOT NULL
-                GROUP BY sp.firm_id, pr.service_type
-            """)
-            
-            firm_results = await db.execute(firm_performance_query)
-            
-            for row in firm_results:
-                self.metrics_collector.update_firm_performance(
-                    firm_id=str(row.firm_id),
-                    service_type=row.service_type,
-                    avg_response_time=row.avg_response_time or 0
-                )
+            for summary in await rollups.summarize(since, group_by=("firm_id", "service_type")):
+                if summary.accepted:
+                    self.metrics_collector.update_firm_performance(
+                        firm_id=str(summary.key["firm_id"]),
+                        service_type=summary.key["service_type"],
+                        avg_response_time=summary.avg_response_time
+                    )
             
             logger.debug("Updated performance metrics")
             
@@ -202,22 +178,14 @@ class MetricsService:
     async def update_subscription_metrics(self, db: AsyncSession):
         """Update active subscription counts per firm"""
         try:
-            subscription_query = text("""
-                SELECT 
-                    sp.firm_id,
-                    COUNT(*) as active_count
-                FROM user_groups ug
-                JOIN subscription_products sp ON ug.subscription_id = sp.id
-                WHERE ug.subscription_expires_at > NOW()
-                GROUP BY sp.firm_id
-            """)
-            
-            results = await db.execute(subscription_query)
+            # Maintained by the subscription expiry scheduler, so firms whose
+            # last subscription expired are reported as zero
+            counts = await get_active_subscription_counts(db)
             
-            for row in results:
+            for firm_id, count in counts.items():
                 self.metrics_collector.update_active_subscriptions(
-                    firm_id=str(row.firm_id),
-                    count=row.active_count
+                    firm_id=firm_id,
+                    count=count
                 )
             
             logger.debug("Updated subscription metrics")
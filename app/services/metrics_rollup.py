@@ -0,0 +1,374 @@
+"""
+Incrementally maintained performance rollups
+
+Each panic request is attributed to a firm and coverage area once, when it
+is submitted. Acceptance and completion then add their durations to the
+submission's time bucket, so gauges and reports sum a few precomputed
+buckets instead of spatially joining every request against coverage areas.
+"""
+import math
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID, uuid4
+
+import structlog
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.metrics import RequestRollupKey
+
+logger = structlog.get_logger()
+
+UNKNOWN_ZONE = "unknown"
+
+GROUP_COLUMNS = ("firm_id", "zone_name", "service_type")
+
+_ZONE_LOOKUP = text("""
+    SELECT id, name
+    FROM coverage_areas
+    WHERE firm_id = :firm_id
+    AND ST_Contains(boundary, ST_SetSRID(ST_MakePoint(:longitude, :latitude), 4326))
+    ORDER BY ST_Area(boundary)
+    LIMIT 1
+""")
+
+_ROLLUP_UPSERT = text("""
+    INSERT INTO performance_rollups (
+        id, bucket_start, firm_id, zone_id, zone_name, service_type,
+        submitted_count, accepted_count, response_time_sum,
+        completed_count, completion_time_sum, prank_count,
+        created_at, updated_at
+    ) VALUES (
+        :id, :bucket_start, :firm_id, :zone_id, :zone_name, :service_type,
+        :submitted, :accepted, :response_time,
+        :completed, :completion_time, :pranks,
+        NOW(), NOW()
+    )
+    ON CONFLICT (bucket_start, firm_id, zone_name, service_type) DO UPDATE SET
+        submitted_count = performance_rollups.submitted_count + EXCLUDED.submitted_count,
+        accepted_count = performance_rollups.accepted_count + EXCLUDED.accepted_count,
+        response_time_sum = performance_rollups.response_time_sum + EXCLUDED.response_time_sum,
+        completed_count = performance_rollups.completed_count + EXCLUDED.completed_count,
+        completion_time_sum = performance_rollups.completion_time_sum + EXCLUDED.completion_time_sum,
+        prank_count = performance_rollups.prank_count + EXCLUDED.prank_count,
+        updated_at = NOW()
+""")
+
+_HISTOGRAM_UPSERT = text("""
+    INSERT INTO performance_rollup_histograms (
+        id, bucket_start, firm_id, zone_name, service_type, metric, upper_bound, count,
+        created_at, updated_at
+    ) VALUES (
+        :id, :bucket_start, :firm_id, :zone_name, :service_type, :metric, :upper_bound, 1,
+        NOW(), NOW()
+    )
+    ON CONFLICT (bucket_start, firm_id, zone_name, service_type, metric, upper_bound) DO UPDATE SET
+        count = performance_rollup_histograms.count + 1,
+        updated_at = NOW()
+""")
+
+
+def _as_utc(timestamp: datetime) -> datetime:
+    """Treat naive timestamps as UTC"""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def bucket_start(timestamp: datetime) -> datetime:
+    """Start of the rollup bucket containing a timestamp"""
+    width = settings.METRICS_ROLLUP_BUCKET_MINUTES * 60
+    epoch = int(_as_utc(timestamp).timestamp())
+    return datetime.fromtimestamp(epoch - epoch % width, tz=timezone.utc)
+
+
+def histogram_bound(seconds: float) -> float:
+    """Upper bound of the histogram bucket a duration falls in"""
+    bounds = settings.METRICS_ROLLUP_DURATION_BOUNDS
+    index = bisect_left(bounds, seconds)
+    return float(bounds[index]) if index < len(bounds) else math.inf
+
+
+def histogram_quantile(q: float, counts: Sequence[tuple]) -> Optional[float]:
+    """
+    Estimate a quantile from histogram bucket counts
+    
+    Interpolates linearly within the bucket the quantile falls in, the way
+    Prometheus' histogram_quantile does.
+    
+    Args:
+        q: Quantile between 0 and 1
+        counts: (upper_bound, count) pairs sorted by upper bound
+    
+    Returns:
+        Estimated duration in seconds, or None without observations
+    """
+    total = sum(count for _, count in counts)
+    if not total:
+        return None
+    
+    rank = q * total
+    lower, seen = 0.0, 0
+    for upper, count in counts:
+        if count and seen + count >= rank:
+            if math.isinf(upper):
+                return lower
+            return lower + (upper - lower) * (rank - seen) / count
+        lower, seen = upper, seen + count
+    
+    return lower
+
+
+@dataclass
+class RollupSummary:
+    """Rollup totals for one group over a time range"""
+    key: Dict[str, Any] = field(default_factory=dict)
+    zone_id: Optional[str] = None
+    submitted: int = 0
+    accepted: int = 0
+    response_time_sum: float = 0.0
+    completed: int = 0
+    completion_time_sum: float = 0.0
+    pranks: int = 0
+    
+    @property
+    def avg_response_time(self) -> Optional[float]:
+        return self.response_time_sum / self.accepted if self.accepted else None
+    
+    @property
+    def avg_completion_time(self) -> Optional[float]:
+        return self.completion_time_sum / self.completed if self.completed else None
+    
+    @property
+    def completion_rate(self) -> float:
+        return self.completed / self.submitted * 100 if self.submitted else 0.0
+    
+    @property
+    def prank_rate(self) -> float:
+        return self.pranks / self.submitted * 100 if self.submitted else 0.0
+
+
+class PerformanceRollupService:
+    """Records request lifecycle events into performance rollups and reads them back"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def record_submission(
+        self,
+        request_id: UUID,
+        firm_id: UUID,
+        service_type: str,
+        latitude: float,
+        longitude: float,
+        submitted_at: Optional[datetime] = None
+    ) -> bool:
+        """
+        Attribute a new request to its firm and zone and count it
+        
+        Runs in a savepoint of the caller's transaction, so a rollup failure
+        never fails the request itself.
+        
+        Returns:
+            True if the submission was recorded
+        """
+        submitted_at = _as_utc(submitted_at or datetime.utcnow())
+        
+        try:
+            async with self.db.begin_nested():
+                zone = (await self.db.execute(_ZONE_LOOKUP, {
+                    "firm_id": str(firm_id),
+                    "latitude": latitude,
+                    "longitude": longitude
+                })).first()
+                
+                key = RequestRollupKey(
+                    request_id=request_id,
+                    firm_id=firm_id,
+                    zone_id=zone.id if zone else None,
+                    zone_name=zone.name if zone else UNKNOWN_ZONE,
+                    service_type=service_type,
+                    submitted_at=submitted_at
+                )
+                self.db.add(key)
+                await self.db.flush()
+                
+                await self._add(key, submitted=1)
+        except Exception as e:
+            logger.error("performance_rollup_failed", transition="submitted", request_id=str(request_id), error=str(e))
+            return False
+        
+        return True
+    
+    async def record_acceptance(self, request_id: UUID, accepted_at: Optional[datetime] = None) -> bool:
+        """Add a request's response time to its rollup bucket"""
+        return await self._record_transition(request_id, "accepted", accepted_at)
+    
+    async def record_completion(
+        self,
+        request_id: UUID,
+        completed_at: Optional[datetime] = None,
+        is_prank: bool = False
+    ) -> bool:
+        """Add a request's completion time, and prank flag, to its rollup bucket"""
+        return await self._record_transition(request_id, "completed", completed_at, is_prank)
+    
+    async def _record_transition(
+        self,
+        request_id: UUID,
+        event: str,
+        at: Optional[datetime],
+        is_prank: bool = False
+    ) -> bool:
+        try:
+            async with self.db.begin_nested():
+                key = (await self.db.execute(
+                    select(RequestRollupKey).where(RequestRollupKey.request_id == request_id)
+                )).scalar_one_or_none()
+                if not key:
+                    logger.debug("performance_rollup_key_missing", transition=event, request_id=str(request_id))
+                    return False
+                
+                duration = max((_as_utc(at or datetime.utcnow()) - _as_utc(key.submitted_at)).total_seconds(), 0.0)
+                if event == "accepted":
+                    await self._add(key, accepted=1, response_time=duration)
+                    await self._observe(key, "response", duration)
+                else:
+                    await self._add(key, completed=1, completion_time=duration, pranks=int(is_prank))
+                    await self._observe(key, "completion", duration)
+        except Exception as e:
+            logger.error("performance_rollup_failed", transition=event, request_id=str(request_id), error=str(e))
+            return False
+        
+        return True
+    
+    async def _add(self, key: RequestRollupKey, **increments):
+        params = {
+            "submitted": 0,
+            "accepted": 0,
+            "response_time": 0.0,
+            "completed": 0,
+            "completion_time": 0.0,
+            "pranks": 0,
+        }
+        params.update(increments)
+        params.update(
+            id=uuid4(),
+            bucket_start=bucket_start(key.submitted_at),
+            firm_id=key.firm_id,
+            zone_id=key.zone_id,
+            zone_name=key.zone_name,
+            service_type=key.service_type
+        )
+        await self.db.execute(_ROLLUP_UPSERT, params)
+    
+    async def _observe(self, key: RequestRollupKey, metric: str, seconds: float):
+        await self.db.execute(_HISTOGRAM_UPSERT, {
+            "id": uuid4(),
+            "bucket_start": bucket_start(key.submitted_at),
+            "firm_id": key.firm_id,
+            "zone_name": key.zone_name,
+            "service_type": key.service_type,
+            "metric": metric,
+            "upper_bound": histogram_bound(seconds)
+        })
+    
+    async def summarize(
+        self,
+        since: datetime,
+        group_by: Sequence[str] = ("zone_name", "service_type"),
+        firm_id: Optional[str] = None
+    ) -> List[RollupSummary]:
+        """
+        Sum rollup buckets from `since` onwards
+        
+        Args:
+            since: Earliest submission time to include; rounded down to its bucket
+            group_by: Columns to group on, from GROUP_COLUMNS
+            firm_id: Optional firm filter
+        
+        Returns:
+            One summary per group
+        """
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Can't group performance rollups by {', '.join(sorted(unknown))}")
+        
+        columns = ", ".join(group_by)
+        where = "WHERE bucket_start >= :since"
+        params: Dict[str, Any] = {"since": bucket_start(since)}
+        if firm_id:
+            where += " AND firm_id = :firm_id"
+            params["firm_id"] = str(firm_id)
+        
+        query = text(f"""
+            SELECT
+                {columns},
+                MAX(CAST(zone_id AS TEXT)) AS zone_id,
+                SUM(submitted_count) AS submitted,
+                SUM(accepted_count) AS accepted,
+                SUM(response_time_sum) AS response_time_sum,
+                SUM(completed_count) AS completed,
+                SUM(completion_time_sum) AS completion_time_sum,
+                SUM(prank_count) AS pranks
+            FROM performance_rollups
+            {where}
+            GROUP BY {columns}
+            ORDER BY {columns}
+        """)
+        
+        results = await self.db.execute(query, params)
+        return [
+            RollupSummary(
+                key={column: getattr(row, column) for column in group_by},
+                zone_id=row.zone_id,
+                submitted=int(row.submitted or 0),
+                accepted=int(row.accepted or 0),
+                response_time_sum=float(row.response_time_sum or 0),
+                completed=int(row.completed or 0),
+                completion_time_sum=float(row.completion_time_sum or 0),
+                pranks=int(row.pranks or 0)
+            )
+            for row in results
+        ]
+    
+    async def duration_quantile(
+        self,
+        q: float,
+        since: datetime,
+        metric: str = "response",
+        **filters: str
+    ) -> Optional[float]:
+        """
+        Estimate a response or completion time quantile from rollup histograms
+        
+        Args:
+            q: Quantile between 0 and 1
+            since: Earliest submission time to include
+            metric: "response" or "completion"
+            **filters: Optional firm_id, zone_name and service_type filters
+        
+        Returns:
+            Estimated duration in seconds, or None without observations
+        """
+        where = "WHERE bucket_start >= :since AND metric = :metric"
+        params: Dict[str, Any] = {"since": bucket_start(since), "metric": metric}
+        for column, value in filters.items():
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"Can't filter performance rollups by {column}")
+            if value is not None:
+                where += f" AND {column} = :{column}"
+                params[column] = str(value)
+        
+        results = await self.db.execute(text(f"""
+            SELECT upper_bound, SUM(count) AS count
+            FROM performance_rollup_histograms
+            {where}
+            GROUP BY upper_bound
+            ORDER BY upper_bound
+        """), params)
+        
+        return histogram_quantile(q, [(float(row.upper_bound), int(row.count)) for row in results])
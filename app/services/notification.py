@@ -3,15 +3,20 @@ Notification service for push notifications, SMS, and email
 """
 import asyncio
 import json
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
 from typing import Dict, List, Optional, Any, Union
 from uuid import UUID
 from datetime import datetime
 from enum import Enum
+import httpx
 from pydantic import BaseModel, EmailStr
 import structlog
 
 from app.core.config import settings
 from app.core.exceptions import APIError, ErrorCodes
+from app.core.smtp import smtp_pool
+from app.services.notification_templates import CompiledNotificationTemplate
 
 logger = structlog.get_logger()
 
@@ -67,7 +72,7 @@ class NotificationResult(BaseModel):
     """Notification delivery result"""
     recipient_id: Optional[str] = None
     type: NotificationType
-    status: str  # "sent", "failed", "pending"
+    status: str  # "sent", "failed", "rejected" (permanent, not retried), "pending"
     message: Optional[str] = None
     sent_at: Optional[datetime] = None
     external_id: Optional[str] = None  # External service message ID
@@ -82,10 +87,181 @@ class NotificationError(APIError):
 class PushNotificationService:
     """Push notification service using Firebase Cloud Messaging (FCM)"""
     
+    # FCM errors that will never succeed on retry
+    PERMANENT_ERRORS = {"NotRegistered", "InvalidRegistration", "MismatchSenderId", "MissingRegistration"}
+    
     def __init__(self):
         self.fcm_server_key = settings.FCM_SERVER_KEY
         self.fcm_url = "https://fcm.googleapis.com/fcm/send"
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _build_payload(
+        self,
+        title: str,
+        body: str,
+        data: Optional[Dict[str, Any]],
+        priority: NotificationPriority,
+        platform: Optional[str]
+    ) -> Dict[str, Any]:
+        """Build the FCM payload shared by single and multicast sends"""
+        payload = {
+            "notification": {
+                "title": title,
+                "body": body,
+                "sound": "default"
+            },
+            "priority": self._get_fcm_priority(priority),
+            "data": data or {}
+        }
+        
+        # Add platform-specific settings
+        if platform == "android":
+            payload["android"] = {
+                "priority": "high" if priority in [NotificationPriority.HIGH, NotificationPriority.URGENT] else "normal",
+                "notification": {
+                    "channel_id": "emergency_notifications"
+                }
+            }
+        elif platform == "ios":
+            payload["apns"] = {
+                "headers": {
+                    "apns-priority": "10" if priority in [NotificationPriority.HIGH, NotificationPriority.URGENT] else "5"
+                },
+                "payload": {
+                    "aps": {
+                        "alert": {
+                            "title": title,
+                            "body": body
+                        },
+                        "sound": "default",
+                        "badge": 1
+                    }
+                }
+            }
+        
+        return payload
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Keep-alive HTTP client shared by all FCM requests on this event loop"""
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_loop is not loop:
+            self._http_client = httpx.AsyncClient(timeout=settings.FCM_TIMEOUT_SECONDS)
+            self._http_loop = loop
+        return self._http_client
+    
+    async def send_push_multicast(
+        self,
+        recipients: List[NotificationRecipient],
+        title: str,
+        body: str,
+        data: Optional[Dict[str, Any]] = None,
+        priority: NotificationPriority = NotificationPriority.NORMAL
+    ) -> List[NotificationResult]:
+        """
+        Send the same push notification to many devices
+        
+        Recipients are grouped by platform and sent in FCM multicast batches of
+        up to FCM_MULTICAST_BATCH_SIZE tokens, one request per batch.
+        
+        Args:
+            recipients: Notification recipients
+            title: Notification title
+            body: Notification body
+            data: Additional data payload
+            priority: Notification priority
+            
+        Returns:
+            NotificationResult for each recipient, in recipient order
+        """
+        results: List[Optional[NotificationResult]] = [None] * len(recipients)
+        by_platform: Dict[Optional[str], List[int]] = {}
         
+        for index, recipient in enumerate(recipients):
+            if not recipient.push_token:
+                results[index] = NotificationResult(
+                    recipient_id=str(recipient.user_id) if recipient.user_id else None,
+                    type=NotificationType.PUSH,
+                    status="rejected",
+                    message="No push token available"
+                )
+                continue
+            by_platform.setdefault(recipient.platform, []).append(index)
+        
+        batch_size = settings.FCM_MULTICAST_BATCH_SIZE
+        chunks = []
+        sends = []
+        for platform, indexes in by_platform.items():
+            payload = self._build_payload(title, body, data, priority, platform)
+            for start in range(0, len(indexes), batch_size):
+                chunk = indexes[start:start + batch_size]
+                chunks.append(chunk)
+                sends.append(self._send_multicast_batch(payload, [recipients[i] for i in chunk]))
+        
+        for chunk, batch_results in zip(chunks, await asyncio.gather(*sends)):
+            for index, result in zip(chunk, batch_results):
+                results[index] = result
+        
+        return results
+    
+    async def _send_multicast_batch(
+        self,
+        payload: Dict[str, Any],
+        recipients: List[NotificationRecipient]
+    ) -> List[NotificationResult]:
+        """Send one multicast request and map per-token results back to recipients"""
+        tokens = [recipient.push_token for recipient in recipients]
+        
+        try:
+            if self.fcm_server_key:
+                response = await self._get_http_client().post(
+                    self.fcm_url,
+                    json={**payload, "registration_ids": tokens},
+                    headers={"Authorization": f"key={self.fcm_server_key}"}
+                )
+                response.raise_for_status()
+                token_results = response.json().get("results", [])
+            else:
+                # Without FCM credentials the send is only recorded, as for single sends
+                token_results = [{"message_id": f"fcm_{datetime.utcnow().timestamp()}"} for _ in tokens]
+            
+            logger.info(
+                "push_multicast_sent",
+                token_count=len(tokens),
+                title=payload["notification"]["title"],
+                priority=payload["priority"]
+            )
+            
+        except Exception as e:
+            logger.error("push_multicast_failed", token_count=len(tokens), error=str(e))
+            token_results = [{"error": str(e)} for _ in tokens]
+        
+        results = []
+        for position, recipient in enumerate(recipients):
+            token_result = token_results[position] if position < len(token_results) else {"error": "Missing FCM result"}
+            recipient_id = str(recipient.user_id) if recipient.user_id else None
+            error = token_result.get("error")
+            
+            if error:
+                results.append(NotificationResult(
+                    recipient_id=recipient_id,
+                    type=NotificationType.PUSH,
+                    status="rejected" if error in self.PERMANENT_ERRORS else "failed",
+                    message=f"Push notification failed: {error}"
+                ))
+            else:
+                results.append(NotificationResult(
+                    recipient_id=recipient_id,
+                    type=NotificationType.PUSH,
+                    status="sent",
+                    message="Push notification sent successfully",
+                    sent_at=datetime.utcnow(),
+                    external_id=token_result.get("message_id")
+                ))
+        
+        return results
+    
+    
     async def send_push_notification(
         self,
         recipient: NotificationRecipient,
@@ -115,43 +291,6 @@ class PushNotificationService:
             )
             
         try:
-            # Prepare FCM payload
-            payload = {
-                "to": recipient.push_token,
-                "notification": {
-                    "title": title,
-                    "body": body,
-                    "sound": "default"
-                },
-                "priority": self._get_fcm_priority(priority),
-                "data": data or {}
-            }
-            
-            # Add platform-specific settings
-            if recipient.platform == "android":
-                payload["android"] = {
-                    "priority": "high" if priority in [NotificationPriority.HIGH, NotificationPriority.URGENT] else "normal",
-                    "notification": {
-                        "channel_id": "emergency_notifications"
-                    }
-                }
-            elif recipient.platform == "ios":
-                payload["apns"] = {
-                    "headers": {
-                        "apns-priority": "10" if priority in [NotificationPriority.HIGH, NotificationPriority.URGENT] else "5"
-                    },
-                    "payload": {
-                        "aps": {
-                            "alert": {
-                                "title": title,
-                                "body": body
-                            },
-                            "sound": "default",
-                            "badge": 1
-                        }
-                    }
-                }
-            
             # In a real implementation, you would use the FCM SDK or HTTP client
             # For now, we'll simulate the API call
             logger.info(
@@ -199,6 +338,7 @@ class SMSNotificationService:
         self.twilio_account_sid = settings.TWILIO_ACCOUNT_SID
         self.twilio_auth_token = settings.TWILIO_AUTH_TOKEN
         self.twilio_phone_number = settings.TWILIO_PHONE_NUMBER
+        self.provider = "twilio"
         
     async def send_sms_notification(
         self,
@@ -261,12 +401,30 @@ class SMSNotificationService:
 
 
 class EmailNotificationService:
-    """Email notification service using SendGrid"""
+    """Email notification service sending over pooled SMTP connections"""
     
     def __init__(self):
         self.sendgrid_api_key = settings.SENDGRID_API_KEY
         self.from_email = settings.FROM_EMAIL
         self.from_name = settings.FROM_NAME
+        self.smtp_enabled = bool(settings.SMTP_USERNAME)
+    
+    def _build_message(
+        self,
+        to_email: str,
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None
+    ) -> MIMEMultipart:
+        """Build a plain text (and optional HTML) email message"""
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = f"{self.from_name} <{self.from_email}>"
+        message["To"] = to_email
+        message.attach(MIMEText(body, "plain"))
+        if html_body:
+            message.attach(MIMEText(html_body, "html"))
+        return message
         
     async def send_email_notification(
         self,
@@ -277,7 +435,7 @@ class EmailNotificationService:
         priority: NotificationPriority = NotificationPriority.NORMAL
     ) -> NotificationResult:
         """
-        Send email notification via SendGrid
+        Send email notification
         
         Args:
             recipient: Notification recipient
@@ -297,8 +455,14 @@ class EmailNotificationService:
             )
             
         try:
-            # In a real implementation, you would use the SendGrid SDK
-            # For now, we'll simulate the API call
+            if self.smtp_enabled:
+                message = self._build_message(str(recipient.email), subject, body, html_body)
+                await smtp_pool.send_message(
+                    message,
+                    [str(recipient.email)],
+                    bulk=priority in [NotificationPriority.NORMAL, NotificationPriority.LOW]
+                )
+            
             logger.info(
                 "email_notification_sent",
                 recipient_id=str(recipient.user_id) if recipient.user_id else None,
@@ -333,11 +497,21 @@ class EmailNotificationService:
 
 
 class NotificationTemplateManager:
-    """Manages notification templates"""
+    """
+    Manages notification templates
+    
+    Templates are compiled once when registered, and renders are cached per
+    distinct set of variable values, so a broadcast to many recipients with
+    the same variables formats the template a single time.
+    """
     
     def __init__(self):
         self.templates: Dict[str, NotificationTemplate] = {}
+        self._compiled: Dict[str, tuple] = {}
         self._load_default_templates()
+        
+        for template in self.templates.values():
+            self._compile(template)
     
     def _load_default_templates(self):
         """Load default notification templates"""
@@ -423,6 +597,16 @@ class NotificationTemplateManager:
             priority=NotificationPriority.HIGH
         )
         
+        # Subscription templates
+        self.templates["subscription_expiring_sms"] = NotificationTemplate(
+            id="subscription_expiring_sms",
+            name="Subscription Expiring (SMS)",
+            type=NotificationType.SMS,
+            body="The security subscription for {group_name} expires on {expires_on} ({days_remaining} days). Renew in the app to stay covered.",
+            variables=["group_name", "expires_on", "days_remaining"],
+            priority=NotificationPriority.NORMAL
+        )
+        
         # Email templates
         self.templates["emergency_summary_email"] = NotificationTemplate(
             id="emergency_summary_email",
@@ -439,26 +623,54 @@ class NotificationTemplateManager:
         return self.templates.get(template_id)
     
     def add_template(self, template: NotificationTemplate):
-        """Add or update notification template"""
+        """
+        Add or update notification template
+        
+        Raises:
+            TemplateError: If the template can't be compiled or uses undeclared variables
+        """
+        self._compile(template)
         self.templates[template.id] = template
     
+    def _compile(self, template: NotificationTemplate) -> CompiledNotificationTemplate:
+        """Compile a template, replacing any previous version and its cached renders"""
+        compiled = CompiledNotificationTemplate(
+            template.id,
+            {"title": template.title, "subject": template.subject, "body": template.body},
+            template.variables,
+            cache_size=settings.NOTIFICATION_RENDER_CACHE_SIZE
+        )
+        self._compiled[template.id] = (template, compiled)
+        return compiled
+    
     def render_template(self, template_id: str, variables: Dict[str, Any]) -> Optional[Dict[str, str]]:
-        """Render template with variables"""
-        template = self.get_template(template_id)
-        if not template:
-            return None
+        """
+        Render template with variables
         
-        rendered = {}
+        Missing variables are logged and left as placeholders in the output.
+        
+        Args:
+            template_id: Template identifier
+            variables: Template variables
         
-        if template.title:
-            rendered["title"] = self._render_string(template.title, variables)
+        Returns:
+            Rendered title/subject/body, or None if the template doesn't exist
+        """
+        template = self.templates.get(template_id)
+        if not template:
+            return None
         
-        if template.subject:
-            rendered["subject"] = self._render_string(template.subject, variables)
+        source, compiled = self._compiled.get(template_id, (None, None))
+        if source is not template:
+            # Template was replaced directly in self.templates
+            compiled = self._compile(template)
         
-        rendered["body"] = self._render_string(template.body, variables)
+        rendered, missing = compiled.render(variables)
+        if missing:
+            logger.warning("template_variable_missing", variable=", ".join(missing), template=template_id)
         
-        return rendered
+        # Cached renders are shared, so hand out a copy
+        return dict(rendered)
     
     def _render_string(self, template_string: str, variables: Dict[str, Any]) -> str:
         """Render template string with variables"""
@@ -497,64 +709,107 @@ class NotificationService:
         if not rendered:
             raise NotificationError(f"Failed to render template: {request.template_id}")
         
-        results = []
-        
-        # Send to all recipients
-        for recipient in request.recipients:
-            try:
-                if template.type == NotificationType.PUSH:
-                    result = await self.push_service.send_push_notification(
-                        recipient,
-                        rendered.get("title", ""),
-                        rendered["body"],
-                        request.metadata,
-                        request.priority
-                    )
-                elif template.type == NotificationType.SMS:
-                    result = await self.sms_service.send_sms_notification(
-                        recipient,
-                        rendered["body"],
-                        request.priority
-                    )
-                elif template.type == NotificationType.EMAIL:
-                    result = await self.email_service.send_email_notification(
-                        recipient,
-                        rendered.get("subject", ""),
-                        rendered["body"],
-                        None,  # HTML body could be added
-                        request.priority
-                    )
-                else:
-                    result = NotificationResult(
-                        type=template.type,
-                        status="failed",
-                        message=f"Unsupported notification type: {template.type}"
-                    )
-                
-                results.append(result)
-                
-            except Exception as e:
-                logger.error(
-                    "notification_send_error",
-                    template_id=request.template_id,
-                    recipient_id=str(recipient.user_id) if recipient.user_id else None,
-                    error=str(e)
+        # Providers are independent per recipient, so send to all of them at once
+        return list(await asyncio.gather(*(
+            self._send_to_recipient(template, rendered, request, recipient)
+            for recipient in request.recipients
+        )))
+    
+    async def _send_to_recipient(
+        self,
+        template: NotificationTemplate,
+        rendered: Dict[str, str],
+        request: NotificationRequest,
+        recipient: NotificationRecipient
+    ) -> NotificationResult:
+        """Send a rendered notification to a single recipient"""
+        try:
+            if template.type == NotificationType.PUSH:
+                return await self.push_service.send_push_notification(
+                    recipient,
+                    rendered.get("title", ""),
+                    rendered["body"],
+                    request.metadata,
+                    request.priority
                 )
-                
-                results.append(NotificationResult(
-                    recipient_id=str(recipient.user_id) if recipient.user_id else None,
+            elif template.type == NotificationType.SMS:
+                return await self.sms_service.send_sms_notification(
+                    recipient,
+                    rendered["body"],
+                    request.priority
+                )
+            elif template.type == NotificationType.EMAIL:
+                return await self.email_service.send_email_notification(
+                    recipient,
+                    rendered.get("subject", ""),
+                    rendered["body"],
+                    None,  # HTML body could be added
+                    request.priority
+                )
+            else:
+                return NotificationResult(
                     type=template.type,
                     status="failed",
-                    message=f"Notification failed: {str(e)}"
-                ))
+                    message=f"Unsupported notification type: {template.type}"
+                )
+            
+        except Exception as e:
+            logger.error(
+                "notification_send_error",
+                template_id=request.template_id,
+                recipient_id=str(recipient.user_id) if recipient.user_id else None,
+                error=str(e)
+            )
+            
+            return NotificationResult(
+                recipient_id=str(recipient.user_id) if recipient.user_id else None,
+                type=template.type,
+                status="failed",
+                message=f"Notification failed: {str(e)}"
+            )
+    
+    async def enqueue_notification(self, request: NotificationRequest) -> List[NotificationResult]:
+        """
+        Queue a notification for background delivery
         
-        return results
+        Returns "pending" results as soon as the notification is durably
+        queued, so callers don't wait on provider latency. Falls back to
+        sending directly if the queue is disabled or unavailable.
+        
+        Args:
+            request: Notification request with template and recipients
+            
+        Returns:
+            List of notification results for each recipient
+        """
+        if not settings.NOTIFICATION_DISPATCHER_ENABLED:
+            return await self.send_notification(request)
+        
+        from app.services.notification_dispatch import notification_dispatcher
+        
+        try:
+            return await notification_dispatcher.enqueue(request)
+        except NotificationError:
+            raise
+        except Exception as e:
+            logger.warning(
+                "notification_enqueue_failed",
+                template_id=request.template_id,
+                error=str(e)
+            )
+            return await self.send_notification(request)
+    
+    async def _deliver(self, request: NotificationRequest, queued: bool) -> List[NotificationResult]:
+        if queued:
+            return await self.enqueue_notification(request)
+        return await self.send_notification(request)
     
     async def send_emergency_confirmation(
         self,
         recipient: NotificationRecipient,
         request_id: UUID,
-        service_type: str
+        service_type: str,
+        queued: bool = False
     ) -> List[NotificationResult]:
         """Send emergency request confirmation notifications"""
         results = []
@@ -570,7 +825,7 @@ class NotificationService:
                 },
                 priority=NotificationPriority.HIGH
             )
-            push_results = await self.send_notification(push_request)
+            push_results = await self._deliver(push_request, queued)
             results.extend(push_results)
         
         # Send SMS backup
@@ -584,7 +839,7 @@ class NotificationService:
                 },
                 priority=NotificationPriority.HIGH
             )
-            sms_results = await self.send_notification(sms_request)
+            sms_results = await self._deliver(sms_request, queued)
             results.extend(sms_results)
         
         return results
@@ -594,7 +849,8 @@ class NotificationService:
         recipient: NotificationRecipient,
         provider_name: str,
         eta_minutes: int,
-        vehicle_details: str
+        vehicle_details: str,
+        queued: bool = False
     ) -> List[NotificationResult]:
         """Send service provider assignment notifications"""
         results = []
@@ -613,7 +869,7 @@ class NotificationService:
                 variables=variables,
                 priority=NotificationPriority.HIGH
             )
-            push_results = await self.send_notification(push_request)
+            push_results = await self._deliver(push_request, queued)
             results.extend(push_results)
         
         # Send SMS backup
@@ -624,7 +880,7 @@ class NotificationService:
                 variables=variables,
                 priority=NotificationPriority.HIGH
             )
-            sms_results = await self.send_notification(sms_request)
+            sms_results = await self._deliver(sms_request, queued)
             results.extend(sms_results)
         
         return results
@@ -633,7 +889,8 @@ class NotificationService:
         self,
         recipient: NotificationRecipient,
         vehicle_description: str,
-        license_plate: str
+        license_plate: str,
+        queued: bool = False
     ) -> List[NotificationResult]:
         """Send service provider arrival notifications"""
         results = []
@@ -651,7 +908,7 @@ class NotificationService:
                 variables=variables,
                 priority=NotificationPriority.URGENT
             )
-            push_results = await self.send_notification(push_request)
+            push_results = await self._deliver(push_request, queued)
             results.extend(push_results)
         
         # Send SMS backup
@@ -662,7 +919,7 @@ class NotificationService:
                 variables=variables,
                 priority=NotificationPriority.URGENT
             )
-            sms_results = await self.send_notification(sms_request)
+            sms_results = await self._deliver(sms_request, queued)
             results.extend(sms_results)
         
         return results
@@ -672,7 +929,8 @@ class NotificationService:
         recipient: NotificationRecipient,
         service_type: str,
         address: str,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        queued: bool = False
     ) -> List[NotificationResult]:
         """Send field agent assignment notification"""
         push_request = NotificationRequest(
@@ -686,7 +944,7 @@ class NotificationService:
             priority=NotificationPriority.HIGH
         )
         
-        return await self.send_notification(push_request)
+        return await self._deliver(push_request, queued)
 
 
 # Global notification service instance
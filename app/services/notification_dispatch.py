@@ -0,0 +1,580 @@
+"""
+Durable, batched notification dispatch
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import time
+import uuid
+from itertools import chain
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, Union
+
+import structlog
+
+from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.core.redis import cache
+from app.services.notification import (
+    NotificationError,
+    NotificationPriority,
+    NotificationRecipient,
+    NotificationRequest,
+    NotificationResult,
+    NotificationService,
+    NotificationType,
+    notification_service
+)
+
+logger = structlog.get_logger()
+
+# Recipient field each channel delivers to, and the result when it is missing
+CONTACT_FIELDS = {
+    NotificationType.PUSH: ("push_token", "No push token available"),
+    NotificationType.SMS: ("phone_number", "No phone number available"),
+    NotificationType.EMAIL: ("email", "No email address available"),
+}
+
+# Each pool has its own consumers, so a slow bulk batch never holds up emergency delivery
+LANE_POOLS = {
+    "priority": [NotificationPriority.URGENT, NotificationPriority.HIGH],
+    "bulk": [NotificationPriority.NORMAL, NotificationPriority.LOW],
+}
+PRIORITY_LANES = {lane.value for lane in LANE_POOLS["priority"]}
+
+# Moves due retries back onto the stream; atomic so no two workers requeue the same job
+PROMOTE_RETRIES_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'job', job)
+    redis.call('ZREM', KEYS[1], job)
+end
+return #due
+"""
+
+
+def build_job(
+    channel: NotificationType,
+    recipient: Dict[str, Any],
+    body: str,
+    title: Optional[str] = None,
+    subject: Optional[str] = None,
+    data: Optional[Dict[str, Any]] = None,
+    priority: NotificationPriority = NotificationPriority.NORMAL,
+    template_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Build a queued notification job
+    
+    Args:
+        channel: Delivery channel
+        recipient: Recipient fields, as NotificationRecipient JSON
+        body: Rendered message body
+        title: Push notification title
+        subject: Email subject
+        data: Push data payload
+        priority: Notification priority
+        template_id: Template the message was rendered from
+    
+    Returns:
+        JSON-serialisable job
+    """
+    return {
+        "id": uuid.uuid4().hex,
+        "channel": NotificationType(channel).value,
+        "recipient": recipient,
+        "title": title,
+        "subject": subject,
+        "body": body,
+        "data": data or {},
+        "priority": NotificationPriority(priority).value,
+        "template_id": template_id,
+        "attempt": 0,
+        "queued_at": time.time()
+    }
+
+
+class AsyncRateLimiter:
+    """Token bucket limiting calls to a provider, serving priority callers first"""
+    
+    def __init__(self, rate_per_second: float, burst: Optional[float] = None):
+        self.rate = rate_per_second
+        self.capacity = burst or max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._priority_waiters = 0
+    
+    async def acquire(self, priority: bool = False):
+        """
+        Wait until a call is allowed
+        
+        Args:
+            priority: Take tokens ahead of any waiting non-priority callers
+        """
+        if priority:
+            self._priority_waiters += 1
+        
+        try:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                if self._tokens >= 1 and (priority or not self._priority_waiters):
+                    self._tokens -= 1
+                    return
+                
+                await asyncio.sleep(max(1 - self._tokens, 0.1) / self.rate)
+        finally:
+            if priority:
+                self._priority_waiters -= 1
+
+
+class NotificationDispatcher:
+    """
+    Delivers queued notifications in per-channel batches
+    
+    Notifications are appended to a Redis stream and consumed through a
+    consumer group, so every API worker shares the load and entries survive
+    restarts. Each read is grouped per channel: push goes out as FCM
+    multicasts, email over pooled SMTP connections and SMS concurrently under
+    a per-provider rate limit. Failed sends are retried with exponential
+    backoff and dead-lettered after NOTIFICATION_MAX_ATTEMPTS.
+    
+    Every priority has its own stream (lane). Urgent and high lanes are served
+    by a separate worker pool from normal and low ones, and priority traffic
+    goes first at shared providers.
+    """
+    
+    STREAM_PREFIX = "notifications:outbox"
+    GROUP = "notification-dispatchers"
+    RETRY_PREFIX = "notifications:retry"
+    DEAD_LETTER_KEY = "notifications:dead"
+    BACKLOG_SAMPLE_SECONDS = 5.0
+    
+    def __init__(self, service: Optional[NotificationService] = None):
+        self.service = service or notification_service
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.sms_limiters: Dict[str, AsyncRateLimiter] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._last_claim: Dict[str, float] = {}
+        self._last_backlog_sample = 0.0
+    
+    @classmethod
+    def stream_key(cls, lane: Union[NotificationPriority, str]) -> str:
+        """Stream holding queued notifications for a priority lane"""
+        return f"{cls.STREAM_PREFIX}:{NotificationPriority(lane).value}"
+    
+    @classmethod
+    def retry_key(cls, lane: Union[NotificationPriority, str]) -> str:
+        """Sorted set holding scheduled retries for a priority lane"""
+        return f"{cls.RETRY_PREFIX}:{NotificationPriority(lane).value}"
+    
+    async def enqueue(self, request: NotificationRequest) -> List[NotificationResult]:
+        """
+        Render a notification and queue one job per recipient
+        
+        Args:
+            request: Notification request with template and recipients
+        
+        Returns:
+            "pending" results for queued recipients, "rejected" for recipients
+            without contact details for the template's channel
+        
+        Raises:
+            NotificationError: If the template is missing or cannot be rendered
+        """
+        template_manager = self.service.template_manager
+        template = template_manager.get_template(request.template_id)
+        if not template:
+            raise NotificationError(f"Template not found: {request.template_id}")
+        
+        rendered = template_manager.render_template(request.template_id, request.variables)
+        if not rendered:
+            raise NotificationError(f"Failed to render template: {request.template_id}")
+        
+        contact_field, missing_message = CONTACT_FIELDS[template.type]
+        results: List[Optional[NotificationResult]] = []
+        queued: List[Tuple[int, NotificationRecipient]] = []
+        jobs = []
+        
+        for recipient in request.recipients:
+            if not getattr(recipient, contact_field):
+                results.append(NotificationResult(
+                    recipient_id=str(recipient.user_id) if recipient.user_id else None,
+                    type=template.type,
+                    status="rejected",
+                    message=missing_message
+                ))
+                continue
+            
+            queued.append((len(results), recipient))
+            results.append(None)
+            jobs.append(build_job(
+                template.type,
+                recipient.model_dump(mode="json"),
+                rendered["body"],
+                title=rendered.get("title"),
+                subject=rendered.get("subject"),
+                data=request.metadata,
+                priority=request.priority,
+                template_id=request.template_id
+            ))
+        
+        entry_ids = await cache.xadd_many(
+            self.stream_key(request.priority),
+            [{"job": json.dumps(job)} for job in jobs],
+            maxlen=settings.NOTIFICATION_STREAM_MAXLEN
+        )
+        
+        for (position, recipient), entry_id in zip(queued, entry_ids):
+            results[position] = NotificationResult(
+                recipient_id=str(recipient.user_id) if recipient.user_id else None,
+                type=template.type,
+                status="pending",
+                message="Notification queued for delivery",
+                external_id=entry_id
+            )
+        
+        logger.info(
+            "notifications_enqueued",
+            template_id=request.template_id,
+            lane=request.priority.value,
+            queued=len(jobs),
+            rejected=len(results) - len(jobs)
+        )
+        
+        return results
+    
+    async def process_entries(self, entries_by_lane: Dict[str, List[tuple]]) -> int:
+        """
+        Deliver a batch of stream entries and acknowledge them
+        
+        Failed sends are scheduled for retry before the entries are
+        acknowledged, so a crash in between redelivers rather than loses them.
+        
+        Args:
+            entries_by_lane: (entry_id, fields) pairs read from each lane's stream
+            
+        Returns:
+            Number of notifications sent
+        """
+        now = time.time()
+        by_channel: Dict[str, List[Dict[str, Any]]] = {}
+        
+        for lane, entries in entries_by_lane.items():
+            for entry_id, fields in entries:
+                # Entry IDs start with the millisecond the entry was appended
+                queued_at = int(entry_id.split("-")[0]) / 1000
+                metrics_collector.record_notification_queue_latency(lane, max(0.0, now - queued_at))
+                
+                try:
+                    job = json.loads(fields["job"])
+                except (KeyError, TypeError, ValueError):
+                    logger.error("notification_entry_invalid", lane=lane, entry_id=entry_id)
+                    continue
+                by_channel.setdefault(job.get("channel"), []).append(job)
+        
+        handlers = {
+            NotificationType.PUSH.value: self._dispatch_push,
+            NotificationType.SMS.value: self._dispatch_sms,
+            NotificationType.EMAIL.value: self._dispatch_email,
+        }
+        
+        dispatches = []
+        for channel, jobs in by_channel.items():
+            handler = handlers.get(channel)
+            if handler is None:
+                logger.error("notification_channel_unknown", channel=channel, count=len(jobs))
+                continue
+            dispatches.append(handler(jobs))
+        
+        sent = 0
+        failures = []
+        for job, result in chain.from_iterable(await asyncio.gather(*dispatches)):
+            metrics_collector.record_notification_sent(job["channel"], result.status)
+            
+            if result.status == "sent":
+                sent += 1
+            elif result.status == "failed":
+                failures.append((job, result.message))
+            else:
+                logger.warning(
+                    "notification_rejected",
+                    channel=job["channel"],
+                    template_id=job.get("template_id"),
+                    reason=result.message
+                )
+        
+        await self._schedule_retries(failures)
+        
+        for lane, entries in entries_by_lane.items():
+            await cache.xack(self.stream_key(lane), self.GROUP, *[entry_id for entry_id, _ in entries])
+        
+        logger.info(
+            "notifications_dispatched",
+            lanes=list(entries_by_lane),
+            entries=sum(len(entries) for entries in entries_by_lane.values()),
+            sent=sent,
+            failed=len(failures)
+        )
+        return sent
+    
+    async def _dispatch_push(self, jobs: List[Dict[str, Any]]) -> List[tuple]:
+        """Send push jobs as FCM multicasts, one per distinct message"""
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for job in jobs:
+            key = (job["title"], job["body"], json.dumps(job["data"], sort_keys=True), job["priority"])
+            groups.setdefault(key, []).append(job)
+        
+        async def send_group(group_jobs: List[Dict[str, Any]]) -> List[tuple]:
+            first = group_jobs[0]
+            try:
+                results = await self.service.push_service.send_push_multicast(
+                    [NotificationRecipient(**job["recipient"]) for job in group_jobs],
+                    first["title"] or "",
+                    first["body"],
+                    first["data"],
+                    NotificationPriority(first["priority"])
+                )
+            except Exception as e:
+                results = [self._failure(job, e) for job in group_jobs]
+            return list(zip(group_jobs, results))
+        
+        batches = await asyncio.gather(*(send_group(group_jobs) for group_jobs in groups.values()))
+        return list(chain.from_iterable(batches))
+    
+    async def _dispatch_sms(self, jobs: List[Dict[str, Any]]) -> List[tuple]:
+        """Send SMS jobs concurrently under the provider's rate limit"""
+        sms_service = self.service.sms_service
+        semaphore = asyncio.Semaphore(settings.SMS_MAX_CONCURRENCY)
+        limiter = self._sms_limiter(sms_service.provider)
+        
+        async def send(job: Dict[str, Any]) -> tuple:
+            async with semaphore:
+                await limiter.acquire(priority=job["priority"] in PRIORITY_LANES)
+                return await self._guarded(job, sms_service.send_sms_notification(
+                    NotificationRecipient(**job["recipient"]),
+                    job["body"],
+                    NotificationPriority(job["priority"])
+                ))
+        
+        return await asyncio.gather(*(send(job) for job in jobs))
+    
+    async def _dispatch_email(self, jobs: List[Dict[str, Any]]) -> List[tuple]:
+        """Send email jobs; concurrency is bounded by the SMTP connection pool"""
+        email_service = self.service.email_service
+        
+        return await asyncio.gather(*(
+            self._guarded(job, email_service.send_email_notification(
+                NotificationRecipient(**job["recipient"]),
+                job["subject"] or "",
+                job["body"],
+                None,
+                NotificationPriority(job["priority"])
+            ))
+            for job in jobs
+        ))
+    
+    def _sms_limiter(self, provider: str) -> AsyncRateLimiter:
+        if provider not in self.sms_limiters:
+            self.sms_limiters[provider] = AsyncRateLimiter(settings.SMS_RATE_LIMIT_PER_SECOND)
+        return self.sms_limiters[provider]
+    
+    async def _guarded(self, job: Dict[str, Any], send: Awaitable[NotificationResult]) -> tuple:
+        try:
+            return job, await send
+        except Exception as e:
+            return job, self._failure(job, e)
+    
+    def _failure(self, job: Dict[str, Any], error: Exception) -> NotificationResult:
+        logger.error("notification_send_error", channel=job["channel"], job_id=job["id"], error=str(error))
+        return NotificationResult(
+            type=NotificationType(job["channel"]),
+            status="failed",
+            message=f"Notification failed: {str(error)}"
+        )
+    
+    def retry_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given attempt number"""
+        delay = min(
+            settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (attempt - 1),
+            settings.NOTIFICATION_RETRY_MAX_SECONDS
+        )
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def _schedule_retries(self, failures: List[tuple]):
+        """Schedule failed jobs for retry in their lane, or dead-letter them once attempts run out"""
+        if not failures:
+            return
+        
+        now = time.time()
+        retries: Dict[str, Dict[str, float]] = {}
+        dead = []
+        
+        for job, error in failures:
+            job = {**job, "attempt": job.get("attempt", 0) + 1, "last_error": error}
+            if job["attempt"] >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                dead.append({"job": json.dumps(job)})
+            else:
+                retries.setdefault(job["priority"], {})[json.dumps(job)] = now + self.retry_delay(job["attempt"])
+        
+        for lane, members in retries.items():
+            await cache.zadd(self.retry_key(lane), members)
+        
+        if dead:
+            await cache.xadd_many(self.DEAD_LETTER_KEY, dead, maxlen=settings.NOTIFICATION_STREAM_MAXLEN)
+            logger.error("notifications_dead_lettered", count=len(dead))
+    
+    async def _promote_due_retries(self, lanes: List[NotificationPriority]) -> int:
+        promoted = 0
+        for lane in lanes:
+            promoted += await cache.eval(
+                PROMOTE_RETRIES_SCRIPT,
+                [self.retry_key(lane), self.stream_key(lane)],
+                [time.time(), settings.NOTIFICATION_BATCH_SIZE, settings.NOTIFICATION_STREAM_MAXLEN]
+            )
+        return promoted
+    
+    async def _sample_backlog(self, lanes: List[NotificationPriority]):
+        """Publish queued plus in-flight entries per lane, for dispatch delay alerts"""
+        now = time.monotonic()
+        if now - self._last_backlog_sample < self.BACKLOG_SAMPLE_SECONDS:
+            return
+        self._last_backlog_sample = now
+        
+        for lane in lanes:
+            for group in await cache.xinfo_groups(self.stream_key(lane)):
+                if group.get("name") == self.GROUP:
+                    # "lag" is only reported by Redis 7+
+                    backlog = (group.get("pending") or 0) + (group.get("lag") or 0)
+                    metrics_collector.update_notification_queue_backlog(lane.value, backlog)
+    
+    async def _read_lane(self, lane: NotificationPriority, consumer: str, count: int) -> List[tuple]:
+        key = self.stream_key(lane)
+        return (await cache.xreadgroup(self.GROUP, consumer, key, count)).get(key, [])
+    
+    async def _read_entries(self, lanes: List[NotificationPriority], consumer: str) -> Dict[str, List[tuple]]:
+        """
+        Read the next batch for a worker pool
+        
+        Each lane gets a share of the batch proportional to its weight, and
+        capacity a lane leaves unused goes to the others in priority order, so
+        higher lanes pre-empt lower ones without starving them. Entries
+        abandoned by dead workers are reclaimed first.
+        
+        Returns:
+            Entries per lane
+        """
+        batch = settings.NOTIFICATION_BATCH_SIZE
+        entries: Dict[str, List[tuple]] = {}
+        
+        now = time.monotonic()
+        if now - self._last_claim.get(consumer, 0.0) >= settings.NOTIFICATION_CLAIM_IDLE_MS / 2000:
+            self._last_claim[consumer] = now
+            for lane in lanes:
+                claimed = await cache.xautoclaim(
+                    self.stream_key(lane),
+                    self.GROUP,
+                    consumer,
+                    settings.NOTIFICATION_CLAIM_IDLE_MS,
+                    batch
+                )
+                if claimed:
+                    entries[lane.value] = claimed
+            
+            if entries:
+                logger.info("notifications_reclaimed", count=sum(len(claimed) for claimed in entries.values()))
+                return entries
+        
+        weights = {lane: settings.NOTIFICATION_LANE_WEIGHTS.get(lane.value, 1) for lane in lanes}
+        total_weight = sum(weights.values()) or 1
+        remaining = batch
+        drained = set()
+        
+        for lane in lanes:
+            if remaining <= 0:
+                break
+            quota = min(remaining, max(1, batch * weights[lane] // total_weight))
+            read = await self._read_lane(lane, consumer, quota)
+            if len(read) < quota:
+                drained.add(lane)
+            if read:
+                entries[lane.value] = read
+                remaining -= len(read)
+        
+        for lane in lanes:
+            if remaining <= 0:
+                break
+            if lane in drained:
+                continue
+            read = await self._read_lane(lane, consumer, remaining)
+            if read:
+                entries.setdefault(lane.value, []).extend(read)
+                remaining -= len(read)
+        
+        if entries:
+            return entries
+        
+        # Nothing queued: wait on all of the pool's lanes at once
+        response = await cache.xreadgroup(
+            self.GROUP,
+            consumer,
+            [self.stream_key(lane) for lane in lanes],
+            batch,
+            settings.NOTIFICATION_BLOCK_MS
+        )
+        return {key.rsplit(":", 1)[1]: read for key, read in response.items()}
+    
+    async def run(self, lanes: List[NotificationPriority], consumer: str):
+        """Consume and deliver queued notifications for a set of lanes until cancelled"""
+        for lane in lanes:
+            await cache.xgroup_create(self.stream_key(lane), self.GROUP)
+        logger.info(
+            "Notification dispatcher started",
+            consumer=consumer,
+            lanes=[lane.value for lane in lanes]
+        )
+        
+        while True:
+            try:
+                await self._promote_due_retries(lanes)
+                await self._sample_backlog(lanes)
+                entries = await self._read_entries(lanes, consumer)
+                if entries:
+                    await self.process_entries(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Notification dispatch failed", consumer=consumer, error=str(e))
+                await asyncio.sleep(1)
+    
+    def start(self):
+        """Start the consumer tasks for each lane pool"""
+        if any(not task.done() for task in self._tasks):
+            return
+        
+        workers = {
+            "priority": settings.NOTIFICATION_PRIORITY_WORKERS,
+            "bulk": settings.NOTIFICATION_BULK_WORKERS,
+        }
+        self._tasks = [
+            asyncio.create_task(self.run(lanes, f"{self.consumer}-{pool}-{index}"))
+            for pool, lanes in LANE_POOLS.items()
+            for index in range(workers[pool])
+        ]
+    
+    async def stop(self):
+        """Stop the consumer tasks"""
+        if not self._tasks:
+            return
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Global notification dispatcher instance
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,200 @@
+"""
+Compiled notification templates
+"""
+import string
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.core.exceptions import APIError, ErrorCodes
+
+_formatter = string.Formatter()
+
+_CONVERSIONS = {None: None, "": None, "s": str, "r": repr, "a": ascii}
+
+
+class TemplateError(APIError):
+    """Invalid notification template"""
+    def __init__(self, message: str = "Invalid notification template"):
+        super().__init__(ErrorCodes.NOTIFICATION_FAILED, message)
+
+
+class CompiledTemplate:
+    """
+    A str.format-style template parsed once into literal and field segments
+    
+    Only simple named fields are supported ("{name}", "{name!r}",
+    "{name:>10}"); attribute access, indexing and positional fields are
+    rejected at compile time. "{{" and "}}" render as literal braces.
+    """
+    
+    __slots__ = ("source", "fields", "_segments")
+    
+    def __init__(self, source: str):
+        self.source = source
+        segments: List[Any] = []
+        fields: List[str] = []
+        
+        try:
+            parsed = list(_formatter.parse(source))
+        except ValueError as e:
+            raise TemplateError(f"Invalid template {source!r}: {e}")
+        
+        for literal, field_name, format_spec, conversion in parsed:
+            if literal:
+                segments.append(literal)
+            if field_name is None:
+                continue
+            
+            if not field_name.isidentifier():
+                raise TemplateError(f"Unsupported template field {{{field_name}}} in {source!r}")
+            if format_spec and "{" in format_spec:
+                raise TemplateError(f"Nested fields are not supported in {source!r}")
+            if conversion not in _CONVERSIONS:
+                raise TemplateError(f"Unknown conversion !{conversion} in {source!r}")
+            
+            placeholder = "{" + field_name
+            if conversion:
+                placeholder += "!" + conversion
+            if format_spec:
+                placeholder += ":" + format_spec
+            placeholder += "}"
+            
+            segments.append((field_name, _CONVERSIONS[conversion], format_spec or "", placeholder))
+            fields.append(field_name)
+        
+        self._segments = tuple(segments)
+        self.fields: FrozenSet[str] = frozenset(fields)
+    
+    def render(self, variables: Dict[str, Any], missing: Optional[List[str]] = None) -> str:
+        """
+        Render the template
+        
+        Args:
+            variables: Template variables
+            missing: If given, names of missing variables are appended to it
+        
+        Returns:
+            Rendered text; missing variables keep their placeholder
+        """
+        if variables.keys() >= self.fields:
+            return self.source.format_map(variables)
+        
+        parts = []
+        for segment in self._segments:
+            if segment.__class__ is str:
+                parts.append(segment)
+                continue
+            
+            name, convert, format_spec, placeholder = segment
+            if name not in variables:
+                if missing is not None:
+                    missing.append(name)
+                parts.append(placeholder)
+                continue
+            
+            value = variables[name]
+            if convert is not None:
+                value = convert(value)
+            parts.append(format(value, format_spec))
+        
+        return "".join(parts)
+    
+    def positional(self, positions: Dict[str, int]) -> str:
+        """
+        Equivalent template with numbered fields
+        
+        Rendering with str.format(*values) skips building a keyword
+        dictionary per call, the bulk of formatting a short template.
+        
+        Args:
+            positions: Argument index of each field
+        """
+        parts = []
+        for segment in self._segments:
+            if segment.__class__ is str:
+                parts.append(segment.replace("{", "{{").replace("}", "}}"))
+            else:
+                name, _, _, placeholder = segment
+                parts.append("{" + str(positions[name]) + placeholder[len(name) + 1:])
+        
+        return "".join(parts)
+
+
+class CompiledNotificationTemplate:
+    """
+    Compiled title, subject and body of a notification template
+    
+    Renders are memoised per distinct set of variable values, so a broadcast
+    that renders the same template for every recipient formats it once.
+    """
+    
+    __slots__ = ("template_id", "parts", "fields", "_key_fields", "_formatters", "_render_values")
+    
+    def __init__(
+        self,
+        template_id: str,
+        parts: Dict[str, Optional[str]],
+        declared: Iterable[str],
+        cache_size: int = 0
+    ):
+        """
+        Compile and validate a template's parts
+        
+        Args:
+            template_id: Template identifier, for error messages
+            parts: Template strings by part name ("title", "subject", "body")
+            declared: Variables the template declares
+            cache_size: Distinct renders to keep; 0 disables caching
+        
+        Raises:
+            TemplateError: If a part can't be compiled or uses an undeclared variable
+        """
+        self.template_id = template_id
+        self.parts = {name: CompiledTemplate(source) for name, source in parts.items() if source}
+        self.fields: FrozenSet[str] = frozenset().union(*(part.fields for part in self.parts.values()))
+        self._key_fields = tuple(sorted(self.fields))
+        
+        undeclared = self.fields - set(declared)
+        if undeclared:
+            raise TemplateError(
+                f"Template {template_id} uses undeclared variables: {', '.join(sorted(undeclared))}"
+            )
+        
+        positions = {name: index for index, name in enumerate(self._key_fields)}
+        self._formatters = tuple(
+            (name, part.positional(positions).format) for name, part in self.parts.items()
+        )
+        
+        # typed so that 1, 1.0 and True don't share a cached render
+        self._render_values = lru_cache(maxsize=cache_size, typed=True)(self._format_values) if cache_size else None
+    
+    def render(self, variables: Dict[str, Any]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Render every part
+        
+        Args:
+            variables: Template variables; unused extras are ignored
+        
+        Returns:
+            Rendered parts and the names of any missing variables
+        """
+        if variables.keys() >= self.fields:
+            values = tuple(map(variables.__getitem__, self._key_fields))
+            if self._render_values is not None:
+                try:
+                    return self._render_values(*values), []
+                except TypeError:
+                    # Unhashable variable values can't be cached
+                    pass
+            return self._format_values(*values), []
+        
+        missing: List[str] = []
+        rendered = {name: part.render(variables, missing) for name, part in self.parts.items()}
+        return rendered, missing
+    
+    def _format_values(self, *values: Any) -> Dict[str, str]:
+        return {name: format_values(*values) for name, format_values in self._formatters}
+    
+    def cache_info(self):
+        """Hit and miss counts of the render cache, or None if it's disabled"""
+        return self._render_values.cache_info() if self._render_values is not None else None
@@ -1,16 +1,13 @@
 """
 OTP delivery services for SMS and email notifications.
 """
-import asyncio
 import logging
-import smtplib
-import ssl
 from typing import Optional
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from concurrent.futures import ThreadPoolExecutor
 
 from app.core.config import settings
+from app.core.smtp import smtp_pool
 
 # settings is imported directly from config
 logger = logging.getLogger(__name__)
@@ -30,29 +27,15 @@ class OTPDeliveryService:
         self.sms_api_key = getattr(settings, 'SMS_API_KEY', None)
         self.sms_api_url = getattr(settings, 'SMS_API_URL', None)
     
-    def _send_email_sync(self, message: MIMEMultipart, to_email: str) -> bool:
+    async def _send_email(self, message: MIMEMultipart, to_email: str, bulk: bool = False) -> bool:
         """
-        Synchronous email sending using smtplib
+        Send an email over a pooled SMTP connection
+        
+        Bulk emails never take the connections reserved for time-sensitive
+        mail such as OTP codes.
         """
         try:
-            # Create SMTP session
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            
-            # Start TLS encryption
-            context = ssl.create_default_context()
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            server.starttls(context=context)
-            
-            # Login
-            server.login(self.smtp_username, self.smtp_password)
-            
-            # Send email
-            text = message.as_string()
-            server.sendmail(self.from_email, to_email, text)
-            
-            # Quit
-            server.quit()
+            await smtp_pool.send_message(message, [to_email], bulk=bulk)
             
             logger.info(f"Email sent successfully to {to_email}")
             return True
@@ -110,15 +93,7 @@ Paniq Security Team
             message.attach(text_part)
             message.attach(html_part)
             
-            # Send email in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                success = await loop.run_in_executor(
-                    executor, 
-                    self._send_email_sync, 
-                    message, 
-                    email
-                )
+            success = await self._send_email(message, email)
             
             return success
             
@@ -224,15 +199,7 @@ Paniq Security Team
             message.attach(text_part)
             message.attach(html_part)
             
-            # Send email in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                success = await loop.run_in_executor(
-                    executor, 
-                    self._send_email_sync, 
-                    message, 
-                    email
-                )
+            success = await self._send_email(message, email)
             
             return success
             
@@ -322,15 +289,7 @@ Paniq Team
             message.attach(text_part)
             message.attach(html_part)
             
-            # Send email in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                success = await loop.run_in_executor(
-                    executor, 
-                    self._send_email_sync, 
-                    message, 
-                    email
-                )
+            success = await self._send_email(message, email)
             
             return success
             
@@ -428,15 +387,7 @@ Paniq Security Team
             message.attach(text_part)
             message.attach(html_part)
             
-            # Send email in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                success = await loop.run_in_executor(
-                    executor, 
-                    self._send_email_sync, 
-                    message, 
-                    email
-                )
+            success = await self._send_email(message, email, bulk=True)
             
             return success
             
@@ -15,7 +15,8 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.models.payment import Invoice, CreditTier, PaymentNotification
 from app.models.security_firm import SecurityFirm
-from app.models.subscription import CreditTransaction
+from app.services.credit_ledger import CreditLedger
+from app.services.credit_pricing import credit_tier_cache
 
 
 class OzowService:
@@ -44,79 +45,15 @@ class OzowService:
 
     async def get_credit_price(self, db: AsyncSession, credits: int) -> Decimal:
         """Get price for specified number of credits"""
-        result = await db.execute(
-            select(CreditTier)
-            .where(
-                CreditTier.min_credits <= credits,
-                CreditTier.max_credits >= credits,
-                CreditTier.is_active == True
-            )
-        )
-        tier = result.scalar_one_or_none()
-        
-        if not tier:
-            raise ValueError(f"No pricing tier found for {credits} credits")
-        
-        return tier.price
+        return await credit_tier_cache.get_price(db, credits)
 
     async def get_credits_for_amount(self, db: AsyncSession, amount: Decimal) -> Tuple[int, Decimal]:
         """Calculate credits based on amount using tier ranges"""
-        
-        # Get all active tiers ordered by price
-        result = await db.execute(
-            select(CreditTier)
-            .where(CreditTier.is_active == True)
-            .order_by(CreditTier.price)
-        )
-        tiers = result.scalars().all()
-        
-        if not tiers:
-            raise ValueError("No credit tiers available")
-        
-        # Find the appropriate tier based on amount
-        selected_tier = None
-        
-        # First, try to find exact price match
-        for tier in tiers:
-            if tier.price == amount:
-                selected_tier = tier
-                break
-        
-        # If no exact match, find the tier where amount falls within the price range
-        if not selected_tier:
-            # Calculate credits based on the tier structure
-            # For amounts between tiers, use proportional calculation
-            for i, tier in enumerate(tiers):
-                if amount <= tier.price:
-                    selected_tier = tier
-                    break
-            
-            # If amount is higher than all tiers, use the highest tier
-            if not selected_tier:
-                selected_tier = tiers[-1]
-        
-        if not selected_tier:
-            raise ValueError(f"Cannot calculate credits for amount R{amount}")
-        
-        # Calculate credits based on the tier
-        # If exact price match, use max credits for that tier
-        if selected_tier.price == amount:
-            credits = selected_tier.max_credits
-        else:
-            # For non-exact amounts, calculate proportionally within the tier range
-            # Use the max credits for the selected tier as base
-            credits = selected_tier.max_credits
-        
-        return credits, amount  # Return the actual amount, not tier price
+        return await credit_tier_cache.get_credits_for_amount(db, amount)
 
     async def get_available_amounts(self, db: AsyncSession) -> List[Decimal]:
         """Get list of available amounts"""
-        result = await db.execute(
-            select(CreditTier.price)
-            .where(CreditTier.is_active == True)
-            .order_by(CreditTier.price)
-        )
-        return [row[0] for row in result.fetchall()]
+        return await credit_tier_cache.get_available_amounts(db)
 
     async def create_invoice(
         self, 
@@ -461,6 +398,25 @@ class OzowService:
                 print(response.text)
                 raise Exception(f"Verification failed: {response.status_code} - {response.text}")
 
+    # Notification fields covered by Ozow's hash, in hashing order
+    WEBHOOK_HASH_FIELDS = [
+        "SiteCode", "TransactionId", "TransactionReference", "Amount", "Status",
+        "Optional1", "Optional2", "Optional3", "Optional4", "Optional5",
+        "CurrencyCode", "IsTest", "StatusMessage"
+    ]
+    
+    def verify_webhook_hash(self, webhook_data: Dict) -> bool:
+        """Check an OZOW notification's Hash field against its fields and our private key"""
+        received = str(webhook_data.get("Hash") or webhook_data.get("HashCheck") or "").lower()
+        if not received:
+            return False
+        
+        input_string = "".join(str(webhook_data.get(field) or "") for field in self.WEBHOOK_HASH_FIELDS)
+        input_string = (input_string + self.private_key).lower()
+        expected = hashlib.sha512(input_string.encode()).hexdigest()
+        
+        return hmac.compare_digest(expected, received)
+    
     async def process_webhook(
         self, 
         db: AsyncSession, 
@@ -469,41 +425,46 @@ class OzowService:
         """Process OZOW webhook notification"""
         
         try:
-            # Extract key fields
-            transaction_id = webhook_data.get("TransactionId")
-            status = webhook_data.get("Status")
-            amount = Decimal(str(webhook_data.get("Amount", "0")))
-            reference = webhook_data.get("TransactionReference")
+            return await self.apply_webhook(db, webhook_data)
+        except Exception as e:
+            # Log error but don't fail the webhook
+            print(f"Webhook processing error: {str(e)}")
+            return False
             
-            # Find invoice by OZOW transaction ID, payment request ID, or reference
-            result = await db.execute(
-                select(Invoice).where(
-                    (Invoice.ozow_transaction_id == transaction_id) |
-                    (Invoice.ozow_payment_request_id == transaction_id) |
-                    (Invoice.ozow_reference == reference)
-                )
+    async def apply_webhook(
+        self, 
+        db: AsyncSession, 
+        webhook_data: Dict
+    ) -> bool:
+        """
+        Record an OZOW notification and apply it to its invoice
+        
+        Returns:
+            False if no invoice matches the notification
+        
+        Raises:
+            Exception: Database errors, so queued processing can retry
+        """
+        # Extract key fields
+        transaction_id = webhook_data.get("TransactionId")
+        status = webhook_data.get("Status")
+        amount = Decimal(str(webhook_data.get("Amount", "0")))
+        reference = webhook_data.get("TransactionReference")
+        
+        # Find invoice by OZOW transaction ID, payment request ID, or reference
+        result = await db.execute(
+            select(Invoice).where(
+                (Invoice.ozow_transaction_id == transaction_id) |
+                (Invoice.ozow_payment_request_id == transaction_id) |
+                (Invoice.ozow_reference == reference)
             )
-            invoice = result.scalar_one_or_none()
-            
-            if not invoice:
-                # Log unknown transaction
-                notification = PaymentNotification(
-                    invoice_id=None,
-                    provider="ozow",
-                    transaction_id=transaction_id,
-                    status=status,
-                    amount=amount,
-                    reference=reference,
-                    raw_data=json.dumps(webhook_data),
-                    processed=False
-                )
-                db.add(notification)
-                await db.commit()
-                return False
+        )
+        invoice = result.scalar_one_or_none()
             
-            # Create notification record
+        if not invoice:
+            # Log unknown transaction
             notification = PaymentNotification(
-                invoice_id=invoice.id,
+                invoice_id=None,
                 provider="ozow",
                 transaction_id=transaction_id,
                 status=status,
@@ -513,54 +474,73 @@ class OzowService:
                 processed=False
             )
             db.add(notification)
+            await db.commit()
+            return False
             
-            # Process successful payment
-            if status.lower() in ["complete", "successful", "paid"]:
-                await self._process_successful_payment(db, invoice, notification)
-            elif status.lower() in ["cancelled", "failed", "error"]:
+        # Create notification record
+        notification = PaymentNotification(
+            invoice_id=invoice.id,
+            provider="ozow",
+            transaction_id=transaction_id,
+            status=status,
+            amount=amount,
+            reference=reference,
+            raw_data=json.dumps(webhook_data),
+            processed=False
+        )
+        db.add(notification)
+        
+        # Process successful payment
+        if status.lower() in ["complete", "successful", "paid"]:
+            await self._process_successful_payment(db, invoice, notification)
+        elif status.lower() in ["cancelled", "failed", "error"]:
+            await db.refresh(invoice, with_for_update=True)
+            # A late failure notice must not undo a completed payment
+            if invoice.status != "paid":
                 invoice.status = "failed"
                 invoice.cancelled_at = datetime.utcnow()
                 invoice.notes = f"Payment {status.lower()}: {webhook_data.get('StatusMessage', '')}"
             
-            notification.processed = True
-            notification.processed_at = datetime.utcnow()
-            
-            await db.commit()
-            return True
+        notification.processed = True
+        notification.processed_at = datetime.utcnow()
             
-        except Exception as e:
-            # Log error but don't fail the webhook
-            print(f"Webhook processing error: {str(e)}")
-            return False
+        await db.commit()
+        return True
 
     async def _process_successful_payment(
         self, 
         db: AsyncSession, 
         invoice: Invoice, 
         notification: PaymentNotification
-    ):
-        """Process successful payment - update invoice and add credits"""
+    ) -> bool:
+        """
+        Process successful payment - update invoice and add credits
+        
+        The invoice row is locked first, so webhooks and the manual
+        process-transaction endpoints handling the same payment take turns,
+        and only the first one credits the firm.
+        
+        Returns:
+            Whether this call marked the invoice paid
+        """
+        await db.refresh(invoice, with_for_update=True)
+        if invoice.status == "paid":
+            return False
         
         # Update invoice status
         invoice.status = "paid"
         invoice.paid_at = datetime.utcnow()
         
-        # Add credits to firm
-        result = await db.execute(
-            select(SecurityFirm).where(SecurityFirm.id == invoice.firm_id)
-        )
-        firm = result.scalar_one()
-        firm.credit_balance += invoice.credits_amount
-        
-        # Create credit transaction record
-        credit_transaction = CreditTransaction(
-            firm_id=invoice.firm_id,
-            transaction_type="purchase",
+        # Add credits to firm; keyed by invoice so a replayed webhook can't credit twice
+        await CreditLedger(db).post(
+            firm_id=str(invoice.firm_id),
             amount=invoice.credits_amount,
+            transaction_type="purchase",
             description=f"Credit purchase via OZOW - Invoice {invoice.invoice_number}",
-            reference_id=str(invoice.id)
+            reference_id=str(invoice.id),
+            idempotency_key=f"ozow:invoice:{invoice.id}"
         )
-        db.add(credit_transaction)
+        return True
 
     async def get_transaction_status(self, db: AsyncSession, transaction_id: str) -> Dict:
         """Get transaction status from OZOW GetTransaction API"""
@@ -647,8 +627,7 @@ class OzowService:
             # Process based on status
             if status == "complete":
                 # Payment was successful
-                if invoice.status != "paid":
-                    await self._process_successful_payment(db, invoice, notification)
+                if invoice.status != "paid" and await self._process_successful_payment(db, invoice, notification):
                     await db.commit()
                     
                     return {
@@ -716,6 +695,10 @@ class OzowService:
     async def initialize_credit_tiers(self, db: AsyncSession):
         """Initialize default credit tiers"""
         
+        # Active tiers are already cached, so tiers exist
+        if await credit_tier_cache.get_tiers(db):
+            return
+        
         # Check if tiers already exist
         result = await db.execute(select(CreditTier))
         existing_tiers = result.scalars().all()
@@ -737,4 +720,5 @@ class OzowService:
             tier = CreditTier(**tier_data)
             db.add(tier)
         
-        await db.commit()
\ No newline at end of file
+        await db.commit()
+        credit_tier_cache.invalidate()
\ No newline at end of file
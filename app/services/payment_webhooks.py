@@ -0,0 +1,264 @@
+"""
+Durable intake and queued processing of payment webhooks
+
+The webhook endpoint only verifies the signature and stores the raw event
+under a unique key, then acknowledges. Redeliveries of the same event hit
+the key and are acknowledged without being stored again. Events are applied
+to invoices and credits by a Celery worker; the event is marked processed in
+the same transaction that applies it, and credits are posted with the
+invoice's ledger idempotency key, so a payment is credited exactly once.
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics_collector
+from app.models.payment import PaymentWebhookEvent
+from app.services.ozow_service import OzowService
+
+logger = structlog.get_logger()
+
+
+class WebhookStatus:
+    PENDING = "pending"
+    PROCESSED = "processed"
+    FAILED = "failed"
+
+
+class InvalidWebhookSignature(Exception):
+    """Webhook signature did not verify"""
+    pass
+
+
+def webhook_event_key(provider: str, webhook_data: Dict) -> str:
+    """
+    Unique key of a webhook event
+    
+    Redeliveries of a notification share the provider's transaction ID and
+    status; a later status change for the same transaction is a new event.
+    """
+    transaction_id = webhook_data.get("TransactionId") or webhook_data.get("TransactionReference")
+    if not transaction_id:
+        payload = json.dumps(webhook_data, sort_keys=True)
+        return f"{provider}:payload:{hashlib.sha256(payload.encode()).hexdigest()}"
+    status = str(webhook_data.get("Status") or "").lower()
+    return f"{provider}:{transaction_id}:{status}"
+
+
+def enqueue_webhook_event(event_id) -> bool:
+    """
+    Queue a stored webhook event for processing
+    
+    A broker outage doesn't fail the intake; the event stays pending and
+    the periodic sweep queues it again.
+    
+    Returns:
+        Whether the task was queued
+    """
+    from app.tasks.payments import process_payment_webhook
+    
+    try:
+        process_payment_webhook.delay(str(event_id))
+        return True
+    except Exception as e:
+        logger.warning("payment_webhook_enqueue_failed", event_id=str(event_id), error=str(e))
+        return False
+
+
+class PaymentWebhookService:
+    """Service for receiving and processing payment webhooks"""
+    
+    provider = "ozow"
+    
+    def __init__(self, db: AsyncSession, ozow_service: Optional[OzowService] = None):
+        self.db = db
+        self.ozow_service = ozow_service or OzowService()
+    
+    async def receive(self, webhook_data: Dict) -> Tuple[str, bool]:
+        """
+        Verify and store an incoming webhook
+        
+        Args:
+            webhook_data: Webhook fields as posted by the provider
+        
+        Returns:
+            Event ID, or the event key for a redelivery, and whether the
+            event was new
+        
+        Raises:
+            InvalidWebhookSignature: If the signature does not verify
+        """
+        if settings.OZOW_VERIFY_WEBHOOK_HASH and not self.ozow_service.verify_webhook_hash(webhook_data):
+            metrics_collector.record_payment_webhook_received(self.provider, "rejected")
+            logger.warning(
+                "payment_webhook_rejected",
+                provider=self.provider,
+                transaction_id=webhook_data.get("TransactionId")
+            )
+            raise InvalidWebhookSignature("Invalid webhook signature")
+        
+        event_key = webhook_event_key(self.provider, webhook_data)
+        result = await self.db.execute(
+            insert(PaymentWebhookEvent)
+            .values(
+                provider=self.provider,
+                event_key=event_key,
+                transaction_id=webhook_data.get("TransactionId"),
+                status=webhook_data.get("Status"),
+                payload=json.dumps(webhook_data),
+                processing_status=WebhookStatus.PENDING,
+                attempts=0
+            )
+            .on_conflict_do_nothing(index_elements=[PaymentWebhookEvent.event_key])
+            .returning(PaymentWebhookEvent.id)
+        )
+        event_id = result.scalar_one_or_none()
+        await self.db.commit()
+        
+        if event_id is None:
+            metrics_collector.record_payment_webhook_received(self.provider, "duplicate")
+            return event_key, False
+        
+        metrics_collector.record_payment_webhook_received(self.provider, "accepted")
+        enqueue_webhook_event(event_id)
+        return str(event_id), True
+    
+    async def process(self, event_id: str) -> Optional[PaymentWebhookEvent]:
+        """
+        Apply a stored webhook event
+        
+        The event row is locked for the whole transaction, so concurrent
+        deliveries of the task are skipped rather than applied twice.
+        
+        Returns:
+            The event, or None if it doesn't exist or another worker holds it
+        
+        Raises:
+            Exception: If applying the event failed; it is marked failed
+        """
+        result = await self.db.execute(
+            select(PaymentWebhookEvent)
+            .where(PaymentWebhookEvent.id == event_id)
+            .with_for_update(skip_locked=True)
+        )
+        event = result.scalar_one_or_none()
+        if not event or event.processing_status == WebhookStatus.PROCESSED:
+            return event
+        
+        started = time.perf_counter()
+        # Committed by apply_webhook together with the invoice and credits
+        event.processing_status = WebhookStatus.PROCESSED
+        event.processed_at = datetime.now(timezone.utc)
+        event.attempts += 1
+        event.last_error = None
+        
+        try:
+            matched = await self.ozow_service.apply_webhook(self.db, json.loads(event.payload))
+        except Exception as e:
+            await self.db.rollback()
+            await self.db.execute(
+                update(PaymentWebhookEvent)
+                .where(PaymentWebhookEvent.id == event_id)
+                .values(
+                    processing_status=WebhookStatus.FAILED,
+                    attempts=PaymentWebhookEvent.attempts + 1,
+                    last_error=str(e)
+                )
+            )
+            await self.db.commit()
+            metrics_collector.record_payment_webhook_processed(
+                self.provider, "failed", time.perf_counter() - started
+            )
+            logger.error("payment_webhook_failed", event_id=str(event_id), error=str(e))
+            raise
+        
+        metrics_collector.record_payment_webhook_processed(
+            self.provider,
+            "applied" if matched else "unmatched",
+            time.perf_counter() - started,
+            (event.processed_at - event.created_at).total_seconds() if event.created_at else None
+        )
+        logger.info(
+            "payment_webhook_processed",
+            event_id=str(event.id),
+            transaction_id=event.transaction_id,
+            status=event.status,
+            matched=matched
+        )
+        return event
+    
+    async def get_retryable_event_ids(self) -> List[str]:
+        """IDs of events never queued, or failed with attempts left"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.PAYMENT_WEBHOOK_SWEEP_DELAY_SECONDS)
+        result = await self.db.execute(
+            select(PaymentWebhookEvent.id).where(
+                and_(
+                    PaymentWebhookEvent.updated_at < cutoff,
+                    or_(
+                        PaymentWebhookEvent.processing_status == WebhookStatus.PENDING,
+                        and_(
+                            PaymentWebhookEvent.processing_status == WebhookStatus.FAILED,
+                            PaymentWebhookEvent.attempts < settings.PAYMENT_WEBHOOK_MAX_ATTEMPTS
+                        )
+                    )
+                )
+            ).order_by(PaymentWebhookEvent.created_at).limit(settings.PAYMENT_WEBHOOK_SWEEP_BATCH_SIZE)
+        )
+        return [str(event_id) for event_id in result.scalars().all()]
+    
+    async def mark_for_replay(
+        self,
+        event_ids: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        limit: int = 1000
+    ) -> List[str]:
+        """
+        Reset stored events to pending so they are processed again
+        
+        Replaying an already applied payment is safe: the paid invoice is
+        skipped and its credits are keyed by invoice.
+        
+        Args:
+            event_ids: Specific events to replay
+            status: Replay events currently in this processing status
+            since: Replay events received at or after this time
+            limit: Maximum number of events to reset
+        
+        Returns:
+            IDs of the events reset
+        """
+        conditions = []
+        if event_ids:
+            conditions.append(PaymentWebhookEvent.id.in_(event_ids))
+        if status:
+            conditions.append(PaymentWebhookEvent.processing_status == status)
+        if since:
+            conditions.append(PaymentWebhookEvent.created_at >= since)
+        if not conditions:
+            raise ValueError("Select events to replay by ID, status or time")
+        
+        selected = (
+            select(PaymentWebhookEvent.id)
+            .where(and_(*conditions))
+            .order_by(PaymentWebhookEvent.created_at)
+            .limit(limit)
+        )
+        result = await self.db.execute(
+            update(PaymentWebhookEvent)
+            .where(PaymentWebhookEvent.id.in_(selected.scalar_subquery()))
+            .values(processing_status=WebhookStatus.PENDING, last_error=None)
+            .returning(PaymentWebhookEvent.id)
+            .execution_options(synchronize_session=False)
+        )
+        replayed = [str(event_id) for event_id in result.scalars().all()]
+        await self.db.commit()
+        return replayed
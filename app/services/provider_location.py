@@ -0,0 +1,323 @@
+"""
+High-rate provider location ingestion
+
+Location uploads carry many GPS points per call. Only the newest point of
+each provider is kept in a Redis hash until the flusher, running at a fixed
+cadence, claims the hash and writes every provider's position with one
+UPDATE ... FROM (VALUES ...) per batch. Each provider row is therefore
+written at most once per flush interval however often it reports.
+Optionally every point is also buffered and appended to the compact
+provider_location_points table.
+"""
+import asyncio
+import json
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+import structlog
+from sqlalchemy import Float, and_, column, func, insert, or_, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.types import DateTime
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.redis import cache
+from app.models.emergency_provider import EmergencyProvider, ProviderLocationPoint
+
+logger = structlog.get_logger()
+
+# Keep a provider's buffered position only if it is newer than the one held.
+# ARGV holds (provider ID, recorded_at epoch seconds, payload) triples.
+_MERGE_LATEST_SCRIPT = """
+local merged = 0
+for i = 1, #ARGV, 3 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    if not current or cjson.decode(current)[3] < tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+        merged = merged + 1
+    end
+end
+return merged
+"""
+
+# Take the buffered positions and up to ARGV[1] trajectory points at once
+_CLAIM_SCRIPT = """
+local latest = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+local trail = redis.call('LRANGE', KEYS[2], 0, tonumber(ARGV[1]) - 1)
+if #trail > 0 then
+    redis.call('LTRIM', KEYS[2], #trail, -1)
+end
+return {latest, trail}
+"""
+
+
+@dataclass(frozen=True)
+class LocationFix:
+    """A GPS point reported by a provider"""
+    provider_id: UUID
+    latitude: float
+    longitude: float
+    recorded_at: datetime
+    accuracy_m: Optional[float] = None
+    
+    @property
+    def timestamp(self) -> float:
+        return self.recorded_at.timestamp()
+    
+    def to_json(self) -> str:
+        return json.dumps([self.latitude, self.longitude, self.timestamp, self.accuracy_m])
+    
+    @classmethod
+    def from_json(cls, provider_id, payload: str) -> "LocationFix":
+        latitude, longitude, timestamp, accuracy_m = json.loads(payload)
+        return cls(
+            provider_id=UUID(str(provider_id)),
+            latitude=latitude,
+            longitude=longitude,
+            recorded_at=datetime.fromtimestamp(timestamp, tz=timezone.utc),
+            accuracy_m=accuracy_m
+        )
+
+
+def latest_fixes(fixes: Sequence[LocationFix]) -> Dict[UUID, LocationFix]:
+    """Newest fix of each provider"""
+    latest: Dict[UUID, LocationFix] = {}
+    for fix in fixes:
+        current = latest.get(fix.provider_id)
+        if current is None or current.recorded_at < fix.recorded_at:
+            latest[fix.provider_id] = fix
+    return latest
+
+
+class ProviderLocationIngestor:
+    """Buffers provider locations and writes them in bulk"""
+    
+    latest_key = "provider_location:latest"
+    trail_key = "provider_location:trail"
+    
+    def __init__(self):
+        self._flusher_task: Optional[asyncio.Task] = None
+    
+    async def get_owned_provider_ids(self, db: AsyncSession, firm_id, provider_ids: Set[UUID]) -> Set[UUID]:
+        """Active providers among provider_ids that belong to the firm"""
+        result = await db.execute(
+            select(EmergencyProvider.id).where(
+                and_(
+                    EmergencyProvider.id.in_(provider_ids),
+                    EmergencyProvider.firm_id == firm_id,
+                    EmergencyProvider.is_active == True
+                )
+            )
+        )
+        return set(result.scalars().all())
+    
+    async def ingest(self, db: AsyncSession, firm_id, fixes: Sequence[LocationFix]) -> Tuple[int, Set[UUID]]:
+        """
+        Accept an upload of location fixes for a firm's providers
+        
+        Fixes dated more than PROVIDER_LOCATION_MAX_CLOCK_SKEW_SECONDS ahead
+        of server time are clamped to it. A fix from the future would
+        otherwise win the newest-wins merge and, once written as the
+        provider's last update, hide every real fix until that time passed.
+        
+        Args:
+            db: Database session
+            firm_id: Firm of the uploading user
+            fixes: Location fixes, in any order
+        
+        Returns:
+            Number of fixes accepted, and the provider IDs rejected because
+            they don't exist or belong to another firm
+        """
+        provider_ids = {fix.provider_id for fix in fixes}
+        owned = await self.get_owned_provider_ids(db, firm_id, provider_ids)
+        now = datetime.now(timezone.utc)
+        latest_allowed = now + timedelta(seconds=settings.PROVIDER_LOCATION_MAX_CLOCK_SKEW_SECONDS)
+        accepted = [
+            fix if fix.recorded_at <= latest_allowed else replace(fix, recorded_at=now)
+            for fix in fixes
+            if fix.provider_id in owned
+        ]
+        
+        if accepted:
+            await self.buffer(accepted)
+        return len(accepted), provider_ids - owned
+    
+    async def buffer(self, fixes: Sequence[LocationFix]):
+        """Keep the newest fix per provider, and every fix if trajectories are on"""
+        client = await cache.get_client()
+        await self._merge_latest(client, fixes)
+        
+        if settings.PROVIDER_TRAJECTORY_ENABLED:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.rpush(self.trail_key, *(self._trail_entry(fix) for fix in fixes))
+                pipe.ltrim(self.trail_key, -settings.PROVIDER_TRAJECTORY_BUFFER_MAXLEN, -1)
+                await pipe.execute()
+    
+    async def _merge_latest(self, client, fixes: Sequence[LocationFix]):
+        args = []
+        for fix in latest_fixes(fixes).values():
+            args.extend([str(fix.provider_id), fix.timestamp, fix.to_json()])
+        await client.eval(_MERGE_LATEST_SCRIPT, 1, self.latest_key, *args)
+    
+    @staticmethod
+    def _trail_entry(fix: LocationFix) -> str:
+        return json.dumps([str(fix.provider_id), fix.to_json()])
+    
+    async def _claim(self) -> Tuple[List[LocationFix], List[LocationFix]]:
+        client = await cache.get_client()
+        latest, trail = await client.eval(
+            _CLAIM_SCRIPT,
+            2,
+            self.latest_key,
+            self.trail_key,
+            settings.PROVIDER_TRAJECTORY_BUFFER_MAXLEN
+        )
+        positions = [LocationFix.from_json(latest[i], latest[i + 1]) for i in range(0, len(latest), 2)]
+        points = [LocationFix.from_json(*json.loads(entry)) for entry in trail]
+        return positions, points
+    
+    async def _restore(self, positions: List[LocationFix], points: List[LocationFix]):
+        """Return claimed fixes to the buffer after a failed write"""
+        try:
+            client = await cache.get_client()
+            if positions:
+                await self._merge_latest(client, positions)
+            if points:
+                await client.lpush(self.trail_key, *(self._trail_entry(fix) for fix in reversed(points)))
+        except Exception as e:
+            logger.error("provider_location_restore_failed", positions=len(positions), points=len(points), error=str(e))
+    
+    async def write_positions(self, db: AsyncSession, positions: Sequence[LocationFix]) -> int:
+        """
+        Write current positions with one bulk UPDATE per batch
+        
+        A position older than the provider's last update (for example one
+        set through the single-provider endpoint) is ignored. Does not
+        commit.
+        
+        Returns:
+            Number of providers updated
+        """
+        updated = 0
+        batch_size = settings.PROVIDER_LOCATION_FLUSH_BATCH_SIZE
+        for start in range(0, len(positions), batch_size):
+            batch = positions[start:start + batch_size]
+            fixes = values(
+                column("id", PG_UUID(as_uuid=True)),
+                column("latitude", Float),
+                column("longitude", Float),
+                column("recorded_at", DateTime(timezone=True)),
+                name="fixes"
+            ).data([(fix.provider_id, fix.latitude, fix.longitude, fix.recorded_at) for fix in batch])
+            
+            result = await db.execute(
+                update(EmergencyProvider)
+                .where(
+                    and_(
+                        EmergencyProvider.id == fixes.c.id,
+                        or_(
+                            EmergencyProvider.last_location_update.is_(None),
+                            EmergencyProvider.last_location_update < fixes.c.recorded_at
+                        )
+                    )
+                )
+                .values(
+                    current_latitude=fixes.c.latitude,
+                    current_longitude=fixes.c.longitude,
+                    current_location=func.ST_SetSRID(func.ST_MakePoint(fixes.c.longitude, fixes.c.latitude), 4326),
+                    last_location_update=fixes.c.recorded_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            updated += result.rowcount or 0
+        return updated
+    
+    async def write_trajectory(self, db: AsyncSession, points: Sequence[LocationFix]):
+        """Append trajectory points without committing"""
+        if points:
+            await db.execute(
+                insert(ProviderLocationPoint),
+                [
+                    {
+                        "provider_id": fix.provider_id,
+                        "recorded_at": fix.recorded_at,
+                        "latitude": fix.latitude,
+                        "longitude": fix.longitude,
+                        "accuracy_m": fix.accuracy_m
+                    }
+                    for fix in points
+                ]
+            )
+    
+    async def flush(self, db: AsyncSession) -> int:
+        """
+        Write the buffered positions and trajectory points
+        
+        Claimed fixes go back to the buffer if the write fails, so they are
+        retried on the next flush.
+        
+        Returns:
+            Number of providers updated
+        """
+        positions, points = await self._claim()
+        if not positions and not points:
+            return 0
+        
+        try:
+            updated = await self.write_positions(db, positions)
+            await self.write_trajectory(db, points)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await self._restore(positions, points)
+            raise
+        
+        logger.debug(
+            "provider_locations_flushed",
+            providers=len(positions),
+            updated=updated,
+            trajectory_points=len(points)
+        )
+        return updated
+    
+    async def run_flusher(self, interval_seconds: float = None):
+        """Periodically flush buffered locations"""
+        if interval_seconds is None:
+            interval_seconds = settings.PROVIDER_LOCATION_FLUSH_SECONDS
+        
+        while True:
+            try:
+                async for db in get_db():
+                    await self.flush(db)
+            except Exception as e:
+                logger.error("provider_location_flush_failed", error=str(e))
+            await asyncio.sleep(interval_seconds)
+    
+    def start_flusher(self):
+        """Start the location flusher background task"""
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_task = asyncio.create_task(self.run_flusher())
+    
+    async def stop_flusher(self):
+        """Stop the flusher, writing what is still buffered"""
+        if self._flusher_task is None:
+            return
+        
+        self._flusher_task.cancel()
+        await asyncio.gather(self._flusher_task, return_exceptions=True)
+        self._flusher_task = None
+        
+        try:
+            async for db in get_db():
+                await self.flush(db)
+        except Exception as e:
+            logger.error("provider_location_flush_failed", error=str(e))
+
+
+# Global provider location ingestor
+provider_location_ingestor = ProviderLocationIngestor()
@@ -1,7 +1,6 @@
 """
 S3 service for file storage operations
 """
-import boto3
 import uuid
 from typing import Optional
 from fastapi import UploadFile
@@ -9,6 +8,7 @@ from botocore.exceptions import ClientError, NoCredentialsError
 import logging
 
 from app.core.config import settings
+from app.services.storage import S3StorageBackend, get_s3_client
 
 logger = logging.getLogger(__name__)
 
@@ -17,16 +17,8 @@ class S3Service:
     """Service for handling S3 file operations"""
     
     def __init__(self):
-        """Initialize S3 client"""
-        if not all([settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY, settings.AWS_S3_BUCKET]):
-            raise ValueError("AWS credentials and S3 bucket must be configured")
-            
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION_NAME
-        )
+        """Initialize with the shared S3 client"""
+        self.s3_client = get_s3_client()
         self.bucket_name = settings.AWS_S3_BUCKET
         
     async def upload_file(
@@ -47,29 +39,24 @@ class S3Service:
             Tuple of (s3_key, file_size)
         """
         try:
-            # Read file content
-            content = await file.read()
-            file_size = len(content)
-            
             # Generate unique S3 key
             file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'bin'
             unique_filename = f"{document_type}_{uuid.uuid4()}.{file_extension}"
             s3_key = f"{key_prefix}/{unique_filename}"
             
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=content,
-                ContentType=file.content_type or 'application/octet-stream',
-                Metadata={
+            # Stream to S3 in parts rather than reading the whole file
+            stored = await S3StorageBackend(self.s3_client, self.bucket_name).save(
+                file,
+                s3_key,
+                content_type=file.content_type,
+                metadata={
                     'original_filename': file.filename,
                     'document_type': document_type
                 }
             )
             
             logger.info(f"Successfully uploaded file to S3: {s3_key}")
-            return s3_key, file_size
+            return stored.path, stored.size
             
         except NoCredentialsError:
             logger.error("AWS credentials not found")
@@ -1,7 +1,6 @@
 """
 Security firm service for registration and management
 """
-import os
 import uuid
 from datetime import datetime
 from typing import List, Optional
@@ -13,8 +12,10 @@ from geoalchemy2.shape import from_shape
 from shapely.geometry import Polygon
 
 from app.models.security_firm import SecurityFirm, CoverageArea, FirmApplication, FirmDocument, FirmUser
-from app.core.config import settings
-from app.services.s3_service import S3Service
+from app.services.credit_ledger import CreditLedger, InsufficientCreditsError
+from app.services.document_processing import enqueue_document_processing
+from app.services.storage import get_storage
+from app.services.cache_warming import CacheChange, emit_cache_change
 # User model not needed for this service
 
 
@@ -123,6 +124,8 @@ class SecurityFirmService:
         await self.db.commit()
         await self.db.refresh(firm)
         
+        self._emit_firm_cache_changes(firm.id)
+        
         return firm
     
     async def create_coverage_area(
@@ -165,6 +168,8 @@ class SecurityFirmService:
         await self.db.commit()
         await self.db.refresh(coverage_area)
         
+        emit_cache_change(CacheChange.COVERAGE_AREAS, firm_id)
+        
         return coverage_area
     
     async def get_coverage_areas(self, firm_id: str, user_id: str, include_inactive: bool = True) -> List[CoverageArea]:
@@ -278,6 +283,8 @@ class SecurityFirmService:
         await self.db.commit()
         await self.db.refresh(coverage_area)
         
+        emit_cache_change(CacheChange.COVERAGE_AREAS, firm_id)
+        
         return coverage_area
     
     async def delete_coverage_area(
@@ -321,6 +328,8 @@ class SecurityFirmService:
         await self.db.delete(coverage_area)
         await self.db.commit()
         
+        emit_cache_change(CacheChange.COVERAGE_AREAS, firm_id)
+        
         return True
     
     async def upload_verification_document(
@@ -339,26 +348,23 @@ class SecurityFirmService:
         
         # TODO: Add authorization check - user should be associated with the firm
         
-        # Create uploads directory if it doesn't exist
-        upload_dir = "uploads/security_firms"
-        os.makedirs(upload_dir, exist_ok=True)
-        
         # Generate unique filename
         file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'bin'
         unique_filename = f"{firm_id}_{uuid.uuid4()}.{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
         
         # Save file
         try:
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
+            stored = await get_storage().save(
+                file,
+                f"security_firms/{unique_filename}",
+                content_type=file.content_type
+            )
         except Exception as e:
             raise ValueError(f"Failed to save file: {str(e)}")
         
         # TODO: Store document reference in database
         # For now, just return the file path
-        return file_path
+        return stored.path
     
     async def get_firm_by_id(self, firm_id: str, user_id: str) -> SecurityFirm:
         """
@@ -414,15 +420,18 @@ class SecurityFirmService:
         """
         Update security firm credit balance
         """
-        firm = await self.db.get(SecurityFirm, firm_id)
-        if not firm:
-            raise ValueError("Security firm not found")
-        
-        firm.credit_balance += credit_amount
-        if firm.credit_balance < 0:
+        try:
+            await CreditLedger(self.db).post(
+                firm_id=firm_id,
+                amount=credit_amount,
+                transaction_type="adjustment",
+                description=f"Credit balance adjustment of {credit_amount} credits"
+            )
+        except InsufficientCreditsError:
             raise ValueError("Insufficient credits")
         
         await self.db.commit()
+        firm = await self.db.get(SecurityFirm, firm_id)
         await self.db.refresh(firm)
         
         return firm
@@ -498,43 +507,32 @@ class SecurityFirmService:
         if firm.verification_status not in ["draft", "submitted"]:
             raise ValueError("Cannot upload documents after application has been processed")
         
-        # Check if we should use S3 or local storage
-        if settings.AWS_S3_BUCKET and settings.AWS_ACCESS_KEY_ID:
-            # Use S3 storage
-            try:
-                s3_service = S3Service()
-                key_prefix = f"security_firms/{firm_id}"
-                s3_key, file_size = await s3_service.upload_file(file, key_prefix, document_type)
-                file_path = s3_key  # Store S3 key as file_path
-            except Exception as e:
-                raise ValueError(f"Failed to upload file to S3: {str(e)}")
-        else:
-            # Use local storage (fallback)
-            upload_dir = f"uploads/security_firms/{firm_id}"
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Generate unique filename
-            file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'bin'
-            unique_filename = f"{document_type}_{uuid.uuid4()}.{file_extension}"
-            file_path = os.path.join(upload_dir, unique_filename)
-            
-            # Save file locally
-            try:
-                content = await file.read()
-                with open(file_path, "wb") as buffer:
-                    buffer.write(content)
-                file_size = len(content)
-            except Exception as e:
-                raise ValueError(f"Failed to save file: {str(e)}")
+        # Stream the file to the configured storage backend (S3 or local disk)
+        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'bin'
+        unique_filename = f"{document_type}_{uuid.uuid4()}.{file_extension}"
+        storage = get_storage()
+        try:
+            stored = await storage.save(
+                file,
+                f"security_firms/{firm_id}/{unique_filename}",
+                content_type=file.content_type,
+                metadata={
+                    'original_filename': file.filename,
+                    'document_type': document_type
+                }
+            )
+        except Exception as e:
+            raise ValueError(f"Failed to upload file to {storage.name} storage: {str(e)}")
         
         # Create document record
         document = FirmDocument(
             firm_id=firm_id,
             document_type=document_type,
             file_name=file.filename,
-            file_path=file_path,
-            file_size=file_size,
+            file_path=stored.path,
+            file_size=stored.size,
             mime_type=file.content_type,
+            checksum_sha256=stored.checksum_sha256,
             uploaded_by=user_id
         )
         
@@ -542,6 +540,9 @@ class SecurityFirmService:
         await self.db.commit()
         await self.db.refresh(document)
         
+        # Content checks run in a worker so the upload returns once the file is stored
+        enqueue_document_processing(document.id)
+        
         return document
     
     async def get_document_by_id(
@@ -706,8 +707,17 @@ class SecurityFirmService:
         await self.db.commit()
         await self.db.refresh(application)
         
+        self._emit_firm_cache_changes(application.firm_id)
+        
         return application
     
+    def _emit_firm_cache_changes(self, firm_id) -> None:
+        """
+        Refresh cached firm data after a verification status change
+        """
+        emit_cache_change(CacheChange.COVERAGE_AREAS, firm_id)
+        emit_cache_change(CacheChange.FIRM_PRODUCTS, firm_id)
+    
     async def _ensure_creator_is_firm_admin(self, application: FirmApplication) -> None:
         """
         Ensure the application creator has firm_admin role when application is approved.
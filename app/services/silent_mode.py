@@ -2,19 +2,38 @@
 Silent mode service for controlling phone ringer settings during call service requests
 """
 import asyncio
-from typing import Dict, Optional, Any, List
+import json
+from typing import Dict, Optional, Any, List, Union
 from uuid import UUID
 from datetime import datetime, timedelta
 from enum import Enum
 from pydantic import BaseModel
 import structlog
 
+from app.core.config import settings
 from app.core.redis import cache
 from app.core.exceptions import APIError, ErrorCodes
 from app.services.websocket import websocket_service, RealtimeUpdate
 
 logger = structlog.get_logger()
 
+_EPOCH = datetime(1970, 1, 1)
+
+# Atomically pop sorted set members whose score is due, so only one worker
+# deactivates a given session.
+_CLAIM_DUE_SESSIONS_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def _expiry_score(moment: datetime) -> float:
+    """Convert a naive UTC datetime to a sorted set score"""
+    return (moment - _EPOCH).total_seconds()
+
 
 class RingerMode(str, Enum):
     """Phone ringer modes"""
@@ -334,8 +353,12 @@ class SilentModeService:
     def __init__(self):
         self.android_controller = AndroidSilentModeController()
         self.ios_controller = IOSSilentModeController()
-        self.active_sessions_key = "silent_mode:active_sessions"
+        # Sorted set of user IDs scored by session expiry (seconds since epoch, UTC)
+        self.active_sessions_key = "silent_mode:expiry"
+        # Hash of user ID -> what is needed to end the session, kept until it is deactivated
+        self.session_registry_key = "silent_mode:sessions"
         self.user_status_key_prefix = "silent_mode:user:"
+        self._sweeper_task: Optional[asyncio.Task] = None
     
     async def activate_silent_mode(self, request: SilentModeRequest) -> SilentModeStatus:
         """
@@ -395,13 +418,8 @@ class SilentModeService:
             # Store status in cache
             await self._store_user_status(status)
             
-            # Add to active sessions for cleanup
-            await self._add_to_active_sessions(request.user_id, expires_at)
-            
-            # Schedule automatic deactivation
-            asyncio.create_task(
-                self._schedule_auto_deactivation(request.user_id, request.duration_minutes)
-            )
+            # Register expiry so the sweeper deactivates the session when due
+            await self._add_to_active_sessions(status)
             
             logger.info(
                 "silent_mode_activated",
@@ -442,8 +460,8 @@ class SilentModeService:
         Raises:
             SilentModeError: If deactivation fails
         """
-        # Get current status
-        status = await self.get_user_status(user_id)
+        # Get current status, falling back to the registry once the status has expired
+        status = await self.get_user_status(user_id) or await self._get_registered_session(user_id)
         if not status or not status.is_active:
             raise SilentModeError("No active silent mode session found")
         
@@ -510,16 +528,7 @@ class SilentModeService:
             if not status_data:
                 return None
             
-            import json
-            data = json.loads(status_data)
-            
-            # Parse datetime fields
-            if data.get("activated_at"):
-                data["activated_at"] = datetime.fromisoformat(data["activated_at"])
-            if data.get("expires_at"):
-                data["expires_at"] = datetime.fromisoformat(data["expires_at"])
-            
-            return SilentModeStatus(**data)
+            return self._parse_status(status_data)
             
         except Exception as e:
             logger.error(
@@ -537,54 +546,180 @@ class SilentModeService:
             List of active SilentModeStatus objects
         """
         try:
-            sessions_data = await cache.get(self.active_sessions_key)
-            if not sessions_data:
-                return []
-            
-            import json
-            sessions = json.loads(sessions_data)
-            
-            active_statuses = []
-            for user_id in sessions.keys():
-                status = await self.get_user_status(UUID(user_id))
-                if status and status.is_active:
-                    active_statuses.append(status)
+            now_score = _expiry_score(datetime.utcnow())
+            user_ids = await cache.zrangebyscore(self.active_sessions_key, now_score, "+inf")
             
-            return active_statuses
+            return [
+                status for status in await self._get_statuses(user_ids)
+                if status.is_active
+            ]
             
         except Exception as e:
             logger.error("get_active_sessions_failed", error=str(e))
             return []
     
-    async def cleanup_expired_sessions(self):
-        """Clean up expired silent mode sessions"""
-        try:
-            active_sessions = await self.get_active_sessions()
-            now = datetime.utcnow()
+    async def claim_due_sessions(self, limit: int = None) -> List[str]:
+        """
+        Atomically claim sessions whose expiry has passed
+        
+        Claimed user IDs are removed from the registry in the same script, so
+        concurrent sweepers on other workers never process the same session.
+        
+        Args:
+            limit: Maximum number of sessions to claim
             
-            for status in active_sessions:
-                if status.expires_at and status.expires_at <= now:
-                    logger.info(
-                        "cleaning_up_expired_session",
-                        user_id=str(status.user_id),
-                        expired_at=status.expires_at.isoformat()
-                    )
-                    
-                    try:
-                        await self.deactivate_silent_mode(
-                            status.user_id,
-                            status.request_id,
-                            status.original_mode or RingerMode.NORMAL
-                        )
-                    except Exception as e:
-                        logger.error(
-                            "cleanup_session_failed",
-                            user_id=str(status.user_id),
-                            error=str(e)
-                        )
+        Returns:
+            List of claimed user IDs
+        """
+        if limit is None:
+            limit = settings.SILENT_MODE_SWEEP_BATCH_SIZE
+        
+        client = await cache.get_client()
+        return await client.eval(
+            _CLAIM_DUE_SESSIONS_SCRIPT,
+            1,
+            self.active_sessions_key,
+            _expiry_score(datetime.utcnow()),
+            limit
+        )
+    
+    async def cleanup_expired_sessions(self) -> int:
+        """
+        Clean up expired silent mode sessions
+        
+        Claims due sessions in batches and deactivates each batch
+        concurrently until no due sessions remain. Sessions are restored
+        from the registry, so they are deactivated even if their status has
+        expired while no sweeper was running.
+        
+        Returns:
+            Number of sessions processed
+        """
+        processed = 0
+        try:
+            while True:
+                user_ids = await self.claim_due_sessions()
+                if not user_ids:
+                    break
+                
+                sessions = await self._get_registered_sessions(user_ids)
+                await asyncio.gather(
+                    *(self._deactivate_expired_session(session) for session in sessions)
+                )
+                processed += len(user_ids)
+                
+                if len(user_ids) < settings.SILENT_MODE_SWEEP_BATCH_SIZE:
+                    break
             
         except Exception as e:
             logger.error("cleanup_expired_sessions_failed", error=str(e))
+        
+        return processed
+    
+    async def run_expiry_sweeper(self, interval_seconds: float = None):
+        """Periodically deactivate expired sessions"""
+        if interval_seconds is None:
+            interval_seconds = settings.SILENT_MODE_SWEEP_INTERVAL_SECONDS
+        
+        while True:
+            await self.cleanup_expired_sessions()
+            await asyncio.sleep(interval_seconds)
+    
+    def start_expiry_sweeper(self):
+        """Start the expiry sweeper background task"""
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self.run_expiry_sweeper())
+    
+    async def stop_expiry_sweeper(self):
+        """Stop the expiry sweeper background task"""
+        if self._sweeper_task is None:
+            return
+        
+        self._sweeper_task.cancel()
+        await asyncio.gather(self._sweeper_task, return_exceptions=True)
+        self._sweeper_task = None
+    
+    async def _deactivate_expired_session(self, status: SilentModeStatus):
+        """Deactivate a single claimed session, returning it to the registry on failure"""
+        if not status.is_active:
+            return
+        
+        logger.info(
+            "cleaning_up_expired_session",
+            user_id=str(status.user_id),
+            expired_at=status.expires_at.isoformat() if status.expires_at else None
+        )
+        
+        try:
+            await self.deactivate_silent_mode(
+                status.user_id,
+                status.request_id,
+                status.original_mode or RingerMode.NORMAL
+            )
+        except Exception as e:
+            logger.error(
+                "cleanup_session_failed",
+                user_id=str(status.user_id),
+                error=str(e)
+            )
+            # Still due, so the next sweep retries it
+            await self._add_to_active_sessions(status)
+    
+    async def _get_statuses(self, user_ids: List[str]) -> List[SilentModeStatus]:
+        """Load statuses for several users in one round trip"""
+        if not user_ids:
+            return []
+        
+        keys = [f"{self.user_status_key_prefix}{user_id}" for user_id in user_ids]
+        statuses = []
+        for user_id, status_data in zip(user_ids, await cache.mget(keys)):
+            if not status_data:
+                continue
+            try:
+                statuses.append(self._parse_status(status_data))
+            except Exception as e:
+                logger.error("parse_user_status_failed", user_id=str(user_id), error=str(e))
+        
+        return statuses
+    
+    async def _get_registered_sessions(self, user_ids: List[str]) -> List[SilentModeStatus]:
+        """Load registry entries for several users in one round trip"""
+        if not user_ids:
+            return []
+        
+        sessions = []
+        for user_id, entry in zip(user_ids, await cache.hmget(self.session_registry_key, user_ids)):
+            if not entry:
+                logger.warning("silent_mode_session_not_registered", user_id=str(user_id))
+                continue
+            try:
+                sessions.append(SilentModeStatus(user_id=user_id, is_active=True, **entry))
+            except Exception as e:
+                logger.error("parse_registered_session_failed", user_id=str(user_id), error=str(e))
+        
+        return sessions
+    
+    async def _get_registered_session(self, user_id: UUID) -> Optional[SilentModeStatus]:
+        """Load the registry entry for a user"""
+        try:
+            sessions = await self._get_registered_sessions([str(user_id)])
+        except Exception as e:
+            logger.error("get_registered_session_failed", user_id=str(user_id), error=str(e))
+            return None
+        return sessions[0] if sessions else None
+    
+    def _parse_status(self, status_data: Union[str, Dict[str, Any]]) -> SilentModeStatus:
+        """Parse a cached status record"""
+        # cache.get decodes JSON itself; MGET returns the raw string
+        data = dict(status_data) if isinstance(status_data, dict) else json.loads(status_data)
+        
+        # Parse datetime fields
+        if data.get("activated_at"):
+            data["activated_at"] = datetime.fromisoformat(data["activated_at"])
+        if data.get("expires_at"):
+            data["expires_at"] = datetime.fromisoformat(data["expires_at"])
+        
+        return SilentModeStatus(**data)
     
     async def _store_user_status(self, status: SilentModeStatus):
         """Store user status in cache"""
@@ -597,7 +732,6 @@ class SilentModeService:
         if data.get("expires_at"):
             data["expires_at"] = data["expires_at"].isoformat()
         
-        import json
         await cache.set(
             cache_key,
             json.dumps(data, default=str),
@@ -609,47 +743,21 @@ class SilentModeService:
         cache_key = f"{self.user_status_key_prefix}{user_id}"
         await cache.delete(cache_key)
     
-    async def _add_to_active_sessions(self, user_id: UUID, expires_at: datetime):
-        """Add user to active sessions list"""
+    async def _add_to_active_sessions(self, status: SilentModeStatus):
+        """Register or move the user's session expiry in the registry"""
+        user_id = str(status.user_id)
+        entry = status.model_dump(mode="json", include={"request_id", "expires_at", "original_mode", "platform"})
         try:
-            sessions_data = await cache.get(self.active_sessions_key)
-            if sessions_data:
-                import json
-                sessions = json.loads(sessions_data)
-            else:
-                sessions = {}
-            
-            sessions[str(user_id)] = expires_at.isoformat()
-            
-            import json
-            await cache.set(
-                self.active_sessions_key,
-                json.dumps(sessions),
-                expire=86400  # 24 hours
-            )
-            
+            await cache.hset(self.session_registry_key, user_id, entry)
+            await cache.zadd(self.active_sessions_key, {user_id: _expiry_score(status.expires_at)})
         except Exception as e:
-            logger.error("add_to_active_sessions_failed", user_id=str(user_id), error=str(e))
+            logger.error("add_to_active_sessions_failed", user_id=user_id, error=str(e))
     
     async def _remove_from_active_sessions(self, user_id: UUID):
-        """Remove user from active sessions list"""
+        """Remove user from the session registry"""
         try:
-            sessions_data = await cache.get(self.active_sessions_key)
-            if not sessions_data:
-                return
-            
-            import json
-            sessions = json.loads(sessions_data)
-            
-            if str(user_id) in sessions:
-                del sessions[str(user_id)]
-                
-                await cache.set(
-                    self.active_sessions_key,
-                    json.dumps(sessions),
-                    expire=86400  # 24 hours
-                )
-            
+            await cache.zrem(self.active_sessions_key, str(user_id))
+            await cache.hdel(self.session_registry_key, str(user_id))
         except Exception as e:
             logger.error("remove_from_active_sessions_failed", user_id=str(user_id), error=str(e))
     
@@ -665,7 +773,7 @@ class SilentModeService:
         
         # Update cache
         await self._store_user_status(status)
-        await self._add_to_active_sessions(user_id, new_expires_at)
+        await self._add_to_active_sessions(status)
         
         logger.info(
             "silent_mode_session_extended",
@@ -675,34 +783,6 @@ class SilentModeService:
         )
         
         return status
-    
-    async def _schedule_auto_deactivation(self, user_id: UUID, delay_minutes: int):
-        """Schedule automatic deactivation of silent mode"""
-        try:
-            # Wait for the specified duration
-            await asyncio.sleep(delay_minutes * 60)
-            
-            # Check if session is still active
-            status = await self.get_user_status(user_id)
-            if status and status.is_active:
-                logger.info(
-                    "auto_deactivating_silent_mode",
-                    user_id=str(user_id),
-                    delay_minutes=delay_minutes
-                )
-                
-                await self.deactivate_silent_mode(
-                    user_id,
-                    status.request_id,
-                    status.original_mode or RingerMode.NORMAL
-                )
-            
-        except Exception as e:
-            logger.error(
-                "auto_deactivation_failed",
-                user_id=str(user_id),
-                error=str(e)
-            )
 
 
 # Global silent mode service instance
@@ -0,0 +1,337 @@
+"""
+Object storage backends
+
+Uploads are streamed in chunks to S3 or local disk, so memory use stays at
+one chunk or one multipart part regardless of the file's size. Blocking
+boto3 and filesystem calls run on a dedicated thread pool instead of the
+event loop, and every stored object gets a SHA-256 checksum.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import AsyncIterator, Dict, List, Optional
+
+import boto3
+import structlog
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# S3 rejects multipart parts smaller than this, except the last one
+MIN_PART_BYTES = 5 * 1024 * 1024
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.STORAGE_EXECUTOR_WORKERS,
+    thread_name_prefix="storage"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking storage call on the storage thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
+    """
+    Shared S3 client
+    
+    boto3 clients are thread-safe, so one client and its connection pool
+    serve every request instead of a new client per service instance.
+    """
+    if not all([settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY, settings.AWS_S3_BUCKET]):
+        raise ValueError("AWS credentials and S3 bucket must be configured")
+    
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION_NAME,
+        config=Config(max_pool_connections=settings.STORAGE_S3_MAX_CONNECTIONS)
+    )
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    """An object written to storage"""
+    path: str  # Stored as FirmDocument.file_path: an S3 key or a local path
+    size: int
+    checksum_sha256: str
+
+
+class StorageBackend(ABC):
+    """Interface of a storage driver"""
+    
+    name: str
+    
+    @abstractmethod
+    async def save(
+        self,
+        file: UploadFile,
+        key: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None
+    ) -> StoredObject:
+        """
+        Stream an uploaded file into storage
+        
+        Args:
+            file: The uploaded file, read from its current position
+            key: Storage key, e.g. "security_firms/{firm_id}/{name}"
+            content_type: MIME type to store with the object
+            metadata: Extra metadata to store with the object
+        
+        Returns:
+            The stored object
+        """
+    
+    @abstractmethod
+    async def open(self, path: str) -> AsyncIterator[bytes]:
+        """Read a stored object in chunks"""
+    
+    @abstractmethod
+    async def delete(self, path: str) -> bool:
+        """Delete a stored object, returning whether it existed"""
+    
+    @abstractmethod
+    async def exists(self, path: str) -> bool:
+        """Whether a stored object exists"""
+
+
+class LocalStorageBackend(StorageBackend):
+    """Driver storing objects on local disk"""
+    
+    name = "local"
+    
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.FILE_STORAGE_PATH
+    
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+    
+    def holds(self, path: str) -> bool:
+        """Whether a stored path is a file under this backend's root"""
+        return os.path.abspath(path).startswith(os.path.abspath(self.root) + os.sep)
+    
+    async def save(
+        self,
+        file: UploadFile,
+        key: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None
+    ) -> StoredObject:
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        await run_blocking(os.makedirs, directory, exist_ok=True)
+        
+        # Write to a temporary file and rename it, so readers never see a partial file
+        fd, tmp_path = await run_blocking(tempfile.mkstemp, dir=directory, prefix=".upload-")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as buffer:
+                while chunk := await file.read(settings.STORAGE_CHUNK_BYTES):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await run_blocking(buffer.write, chunk)
+            await run_blocking(os.replace, tmp_path, path)
+        except BaseException:
+            await run_blocking(_remove_quietly, tmp_path)
+            raise
+        
+        return StoredObject(path=path, size=size, checksum_sha256=digest.hexdigest())
+    
+    async def open(self, path: str) -> AsyncIterator[bytes]:
+        buffer = await run_blocking(open, path, "rb")
+        try:
+            while chunk := await run_blocking(buffer.read, settings.STORAGE_CHUNK_BYTES):
+                yield chunk
+        finally:
+            buffer.close()
+    
+    async def delete(self, path: str) -> bool:
+        return await run_blocking(_remove_quietly, path)
+    
+    async def exists(self, path: str) -> bool:
+        return await run_blocking(os.path.isfile, path)
+
+
+def _remove_quietly(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Driver storing objects in S3
+    
+    Files up to one part are sent with a single PUT. Larger files use a
+    multipart upload, holding one part in memory at a time. S3 verifies the
+    SHA-256 of every request body it receives.
+    """
+    
+    name = "s3"
+    
+    def __init__(self, client=None, bucket: Optional[str] = None):
+        self.client = client or get_s3_client()
+        self.bucket = bucket or settings.AWS_S3_BUCKET
+        self.part_bytes = max(settings.STORAGE_MULTIPART_PART_BYTES, MIN_PART_BYTES)
+    
+    async def _read_part(self, file: UploadFile) -> bytes:
+        chunks = []
+        remaining = self.part_bytes
+        while remaining > 0:
+            chunk = await file.read(min(settings.STORAGE_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+    
+    async def save(
+        self,
+        file: UploadFile,
+        key: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None
+    ) -> StoredObject:
+        extra = {'ContentType': content_type or 'application/octet-stream'}
+        if metadata:
+            extra['Metadata'] = metadata
+        
+        digest = hashlib.sha256()
+        part = await self._read_part(file)
+        digest.update(part)
+        
+        if len(part) < self.part_bytes:
+            await run_blocking(
+                self.client.put_object,
+                Bucket=self.bucket,
+                Key=key,
+                Body=part,
+                ChecksumSHA256=_b64_sha256(part),
+                **extra
+            )
+            return StoredObject(path=key, size=len(part), checksum_sha256=digest.hexdigest())
+        
+        upload = await run_blocking(
+            self.client.create_multipart_upload,
+            Bucket=self.bucket,
+            Key=key,
+            ChecksumAlgorithm='SHA256',
+            **extra
+        )
+        upload_id = upload['UploadId']
+        parts: List[Dict] = []
+        size = 0
+        try:
+            while part:
+                checksum = _b64_sha256(part)
+                response = await run_blocking(
+                    self.client.upload_part,
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=len(parts) + 1,
+                    Body=part,
+                    ChecksumSHA256=checksum
+                )
+                parts.append({
+                    'PartNumber': len(parts) + 1,
+                    'ETag': response['ETag'],
+                    'ChecksumSHA256': checksum
+                })
+                size += len(part)
+                
+                part = await self._read_part(file)
+                digest.update(part)
+            
+            await run_blocking(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            logger.warning("s3_multipart_upload_aborted", key=key, parts=len(parts))
+            await run_blocking(
+                self.client.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id
+            )
+            raise
+        
+        return StoredObject(path=key, size=size, checksum_sha256=digest.hexdigest())
+    
+    async def open(self, path: str) -> AsyncIterator[bytes]:
+        response = await run_blocking(self.client.get_object, Bucket=self.bucket, Key=path)
+        body = response['Body']
+        try:
+            while chunk := await run_blocking(body.read, settings.STORAGE_CHUNK_BYTES):
+                yield chunk
+        finally:
+            body.close()
+    
+    async def delete(self, path: str) -> bool:
+        await run_blocking(self.client.delete_object, Bucket=self.bucket, Key=path)
+        return True
+    
+    async def exists(self, path: str) -> bool:
+        try:
+            await run_blocking(self.client.head_object, Bucket=self.bucket, Key=path)
+            return True
+        except ClientError:
+            return False
+
+
+def _b64_sha256(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> StorageBackend:
+    """
+    Configured storage backend
+    
+    STORAGE_BACKEND "auto" uses S3 when a bucket and credentials are
+    configured and local disk otherwise.
+    """
+    backend = settings.STORAGE_BACKEND
+    if backend == "auto":
+        backend = "s3" if settings.AWS_S3_BUCKET and settings.AWS_ACCESS_KEY_ID else "local"
+    
+    if backend == "s3":
+        return S3StorageBackend()
+    if backend == "local":
+        return LocalStorageBackend()
+    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
+
+
+def storage_for(path: str) -> StorageBackend:
+    """
+    Backend holding a stored object
+    
+    Paths under the local storage root are on local disk, whatever the
+    configured backend; anything else belongs to the configured backend.
+    """
+    local = LocalStorageBackend()
+    return local if local.holds(path) else get_storage()
@@ -3,7 +3,7 @@ Subscription product management service
 """
 from typing import List, Optional, Dict, Any
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, desc, func
 from sqlalchemy.orm import selectinload
@@ -13,7 +13,56 @@ from app.models.security_firm import SecurityFirm, CoverageArea
 from app.models.subscription import SubscriptionProduct, CreditTransaction, StoredSubscription
 from app.models.user import RegisteredUser, UserGroup
 from app.services.credit import CreditService, InsufficientCreditsError
-from app.core.cache import cache_result, cache_invalidate, invalidate_user_cache, invalidate_firm_cache
+from app.core.cache import LocalTTLCache, cache_result, cache_invalidate, invalidate_user_cache, invalidate_firm_cache
+from app.core.config import settings
+from app.services.cache_warming import CacheChange, emit_cache_change
+from app.services.subscription_expiry import track_active_subscription
+
+# group_id -> (subscription_expires_at, subscription_id) for groups with an
+# active subscription. Status is computed from the expiry on every read, so
+# an entry never outlives its subscription; inactive groups are not cached,
+# so a subscription applied in another process is seen immediately.
+subscription_status_cache = LocalTTLCache(ttl_seconds=settings.SUBSCRIPTION_STATUS_CACHE_SECONDS)
+
+
+def subscription_status(
+    group_id,
+    expires_at: Optional[datetime],
+    subscription_id=None,
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Subscription status of a group from its expiry
+    
+    Args:
+        group_id: User group ID
+        expires_at: The group's subscription_expires_at
+        subscription_id: The group's subscription_id
+        now: Evaluation time, defaults to the current UTC time
+        
+    Returns:
+        Subscription status information
+    """
+    is_active = False
+    is_expired = True
+    days_remaining = 0
+    
+    if expires_at:
+        if now is None:
+            now = datetime.now(timezone.utc) if expires_at.tzinfo else datetime.utcnow()
+        is_expired = expires_at <= now
+        is_active = not is_expired
+        if is_active:
+            days_remaining = (expires_at - now).days
+    
+    return {
+        "group_id": str(group_id),
+        "is_active": is_active,
+        "is_expired": is_expired,
+        "expires_at": expires_at.isoformat() if expires_at else None,
+        "days_remaining": days_remaining,
+        "subscription_id": str(subscription_id) if subscription_id else None
+    }
 
 
 class SubscriptionService:
@@ -79,6 +128,8 @@ class SubscriptionService:
         await self.db.commit()
         await self.db.refresh(product)
         
+        emit_cache_change(CacheChange.FIRM_PRODUCTS, product.firm_id)
+        
         return product
     
     @cache_result(expire=3600, key_prefix="product_by_id")
@@ -195,6 +246,8 @@ class SubscriptionService:
         await self.db.commit()
         await self.db.refresh(product)
         
+        emit_cache_change(CacheChange.FIRM_PRODUCTS, product.firm_id)
+        
         return product
     
     async def activate_product(self, product_id: str) -> SubscriptionProduct:
@@ -216,6 +269,8 @@ class SubscriptionService:
         await self.db.commit()
         await self.db.refresh(product)
         
+        emit_cache_change(CacheChange.FIRM_PRODUCTS, product.firm_id)
+        
         return product
     
     async def deactivate_product(self, product_id: str) -> SubscriptionProduct:
@@ -237,6 +292,8 @@ class SubscriptionService:
         await self.db.commit()
         await self.db.refresh(product)
         
+        emit_cache_change(CacheChange.FIRM_PRODUCTS, product.firm_id)
+        
         return product
     
     async def delete_product(self, product_id: str) -> bool:
@@ -268,9 +325,12 @@ class SubscriptionService:
                 f"This product has {len(existing_subscriptions)} subscription(s) associated with it."
             )
         
+        firm_id = product.firm_id
         await self.db.delete(product)
         await self.db.commit()
         
+        emit_cache_change(CacheChange.FIRM_PRODUCTS, firm_id)
+        
         return True
     
     async def get_product_statistics(self, product_id: str) -> Dict[str, Any]:
@@ -456,8 +516,11 @@ class SubscriptionService:
         if not coverage_valid:
             raise ValueError("Group location is outside the security firm's coverage area")
         
+        # Lock the group so the expiry scheduler can't expire it mid-renewal
+        await self.db.refresh(group, with_for_update=True)
+        
         # Check if group already has an active subscription
-        if group.subscription_expires_at and group.subscription_expires_at > datetime.utcnow():
+        if subscription_status(group.id, group.subscription_expires_at)["is_active"]:
             # Extend existing subscription by 1 month
             group.subscription_expires_at = group.subscription_expires_at + timedelta(days=30)
         else:
@@ -471,11 +534,14 @@ class SubscriptionService:
         
         # Update group subscription reference
         group.subscription_id = subscription_id
+        await track_active_subscription(self.db, group, product.firm_id)
         
         await self.db.commit()
+        subscription_status_cache.delete(str(group_id))
         
         # Invalidate user-related cache
         await invalidate_user_cache(user_id)
+        emit_cache_change(CacheChange.USER_GROUPS, user_id)
         
         return True
     
@@ -557,39 +623,73 @@ class SubscriptionService:
         
         return alternative_firms
     
-    async def validate_subscription_status(self, group_id: str) -> Dict[str, Any]:
+    async def validate_subscription_status(
+        self,
+        group_id: str,
+        group: Optional[UserGroup] = None
+    ) -> Dict[str, Any]:
         """
         Validate subscription status for a group
         
         Args:
             group_id: User group ID
+            group: The group, if the caller has already loaded it
             
         Returns:
             Subscription status information
         """
-        group = await self.db.get(UserGroup, group_id)
-        if not group:
-            raise ValueError("User group not found")
+        if group is None:
+            statuses = await self.get_subscription_statuses([group_id])
+            if str(group_id) not in statuses:
+                raise ValueError("User group not found")
+            return statuses[str(group_id)]
         
-        now = datetime.utcnow()
-        is_active = False
-        is_expired = True
-        days_remaining = 0
+        return self._evaluate(group)
+    
+    async def get_subscription_statuses(self, group_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Subscription status of many groups
         
-        if group.subscription_expires_at:
-            is_expired = group.subscription_expires_at <= now
-            is_active = not is_expired
-            if is_active:
-                days_remaining = (group.subscription_expires_at - now).days
+        Groups with a cached active subscription are evaluated without a
+        query; the rest are loaded together in one query.
         
-        return {
-            "group_id": str(group.id),
-            "is_active": is_active,
-            "is_expired": is_expired,
-            "expires_at": group.subscription_expires_at.isoformat() if group.subscription_expires_at else None,
-            "days_remaining": days_remaining,
-            "subscription_id": str(group.subscription_id) if group.subscription_id else None
-        }
+        Args:
+            group_ids: User group IDs
+            
+        Returns:
+            Status information keyed by group ID; missing groups are omitted
+        """
+        statuses = {}
+        missing = []
+        for group_id in dict.fromkeys(str(group_id) for group_id in group_ids):
+            cached = subscription_status_cache.get(group_id)
+            status = subscription_status(group_id, *cached) if cached else None
+            if status and status["is_active"]:
+                statuses[group_id] = status
+            else:
+                missing.append(group_id)
+        
+        if missing:
+            result = await self.db.execute(
+                select(
+                    UserGroup.id,
+                    UserGroup.subscription_expires_at,
+                    UserGroup.subscription_id
+                ).where(UserGroup.id.in_(missing))
+            )
+            for group_id, expires_at, subscription_id in result.all():
+                statuses[str(group_id)] = self._evaluate_row(group_id, expires_at, subscription_id)
+        
+        return statuses
+    
+    def _evaluate(self, group: UserGroup) -> Dict[str, Any]:
+        return self._evaluate_row(group.id, group.subscription_expires_at, group.subscription_id)
+    
+    def _evaluate_row(self, group_id, expires_at, subscription_id) -> Dict[str, Any]:
+        status = subscription_status(group_id, expires_at, subscription_id)
+        if status["is_active"]:
+            subscription_status_cache.set(str(group_id), (expires_at, subscription_id))
+        return status
     
     async def get_group_active_subscriptions(self, user_id: str) -> List[Dict[str, Any]]:
         """
@@ -616,13 +716,12 @@ class SubscriptionService:
         
         active_subscriptions = []
         for group in groups:
-            subscription_status = await self.validate_subscription_status(str(group.id))
             active_subscriptions.append({
                 "group_id": str(group.id),
                 "group_name": group.name,
                 "group_address": group.address,
                 "mobile_numbers_count": len(group.mobile_numbers),
-                **subscription_status
+                **self._evaluate(group)
             })
         
         return active_subscriptions
\ No newline at end of file
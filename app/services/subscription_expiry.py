@@ -0,0 +1,303 @@
+"""
+Subscription expiry scheduler
+
+Groups counted as active carry the firm of their subscription in
+subscription_firm_id, and a partial index over subscription_expires_at on
+those groups is the scheduler's due queue. Each run takes the time bucket
+that has just closed and, in batches, expires the groups due in it and
+sends renewal reminders for groups expiring within the reminder window.
+Active subscription counts per firm are maintained as groups are activated
+and expired, so metrics read firm_subscription_counts instead of scanning
+user_groups; a daily reconcile recounts them from the due queue.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import structlog
+from sqlalchemy import and_, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.subscription import FirmSubscriptionCount
+from app.models.user import RegisteredUser, UserGroup, UserGroupMembership
+from app.services.notification import (
+    NotificationPriority,
+    NotificationRecipient,
+    NotificationRequest,
+    notification_service
+)
+
+logger = structlog.get_logger()
+
+
+def bucket_start(now: datetime) -> datetime:
+    """Start of the expiry bucket containing now"""
+    width = settings.SUBSCRIPTION_EXPIRY_BUCKET_SECONDS
+    return datetime.fromtimestamp(now.timestamp() // width * width, tz=timezone.utc)
+
+
+async def adjust_active_count(db: AsyncSession, firm_id, delta: int):
+    """Add delta to a firm's active subscription count without committing"""
+    stmt = insert(FirmSubscriptionCount).values(firm_id=firm_id, active_count=max(delta, 0))
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[FirmSubscriptionCount.firm_id],
+            set_={
+                "active_count": func.greatest(FirmSubscriptionCount.active_count + delta, 0),
+                "updated_at": func.now()
+            }
+        )
+    )
+
+
+async def track_active_subscription(db: AsyncSession, group: UserGroup, firm_id):
+    """
+    Count a group as active for a firm after a subscription is applied
+    
+    The caller must hold the group's row lock and commits. A renewal with
+    the same firm keeps the existing count; switching firms moves it.
+    
+    Args:
+        db: Database session
+        group: The group the subscription was applied to
+        firm_id: Firm of the applied subscription
+    """
+    if group.subscription_firm_id is None or str(group.subscription_firm_id) != str(firm_id):
+        if group.subscription_firm_id is not None:
+            await adjust_active_count(db, group.subscription_firm_id, -1)
+        await adjust_active_count(db, firm_id, 1)
+        group.subscription_firm_id = firm_id
+    
+    # The reminder belongs to the previous expiry
+    group.subscription_reminder_sent_at = None
+
+
+class SubscriptionExpiryScheduler:
+    """Processes subscription expiries and renewal reminders in batches"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def run(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Process the buckets closed before now
+        
+        Returns:
+            Number of groups expired and reminders sent
+        """
+        cutoff = bucket_start(now or datetime.now(timezone.utc))
+        return {
+            "expired": await self.process_expiries(cutoff),
+            "reminded": await self.process_reminders(cutoff)
+        }
+    
+    async def process_expiries(self, cutoff: datetime) -> int:
+        """
+        Stop counting groups whose subscription expired before cutoff
+        
+        Each batch is one transaction; rows locked by a concurrent run or a
+        renewal in progress are skipped and picked up by the next run.
+        
+        Returns:
+            Number of groups expired
+        """
+        expired = 0
+        while True:
+            result = await self.db.execute(
+                select(UserGroup.id, UserGroup.subscription_firm_id)
+                .where(
+                    and_(
+                        UserGroup.subscription_firm_id.isnot(None),
+                        UserGroup.subscription_expires_at <= cutoff
+                    )
+                )
+                .order_by(UserGroup.subscription_expires_at)
+                .limit(settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            
+            await self.db.execute(
+                update(UserGroup)
+                .where(UserGroup.id.in_([group_id for group_id, _ in rows]))
+                .values(subscription_firm_id=None)
+                .execution_options(synchronize_session=False)
+            )
+            for firm_id, count in Counter(firm_id for _, firm_id in rows).items():
+                await adjust_active_count(self.db, firm_id, -count)
+            await self.db.commit()
+            
+            expired += len(rows)
+            if len(rows) < settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE:
+                break
+        
+        if expired:
+            logger.info("subscriptions_expired", count=expired, cutoff=cutoff.isoformat())
+        return expired
+    
+    async def process_reminders(self, cutoff: datetime) -> int:
+        """
+        Remind members of groups expiring within the reminder window
+        
+        Groups are marked reminded before the notifications are queued, so
+        a reminder is sent at most once per expiry.
+        
+        Returns:
+            Number of groups reminded
+        """
+        window_end = cutoff + timedelta(days=settings.SUBSCRIPTION_REMINDER_DAYS)
+        reminded = 0
+        while True:
+            result = await self.db.execute(
+                select(UserGroup.id, UserGroup.name, UserGroup.subscription_expires_at)
+                .where(
+                    and_(
+                        UserGroup.subscription_firm_id.isnot(None),
+                        UserGroup.subscription_expires_at > cutoff,
+                        UserGroup.subscription_expires_at <= window_end,
+                        UserGroup.subscription_reminder_sent_at.is_(None)
+                    )
+                )
+                .order_by(UserGroup.subscription_expires_at)
+                .limit(settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            groups = result.all()
+            if not groups:
+                break
+            
+            recipients = await self._get_recipients([group_id for group_id, _, _ in groups])
+            await self.db.execute(
+                update(UserGroup)
+                .where(UserGroup.id.in_([group_id for group_id, _, _ in groups]))
+                .values(subscription_reminder_sent_at=cutoff)
+                .execution_options(synchronize_session=False)
+            )
+            await self.db.commit()
+            
+            for group_id, name, expires_at in groups:
+                await self._send_reminder(name, expires_at, cutoff, recipients.get(group_id, []))
+            
+            reminded += len(groups)
+            if len(groups) < settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE:
+                break
+        
+        if reminded:
+            logger.info("subscription_reminders_sent", count=reminded, window_end=window_end.isoformat())
+        return reminded
+    
+    async def _get_recipients(self, group_ids: List) -> Dict[object, List[NotificationRecipient]]:
+        """Active members of each group, loaded in one query"""
+        result = await self.db.execute(
+            select(UserGroupMembership.group_id, RegisteredUser.id, RegisteredUser.phone)
+            .join(RegisteredUser, RegisteredUser.id == UserGroupMembership.user_id)
+            .where(
+                and_(
+                    UserGroupMembership.group_id.in_(group_ids),
+                    UserGroupMembership.is_active == True
+                )
+            )
+        )
+        recipients: Dict[object, List[NotificationRecipient]] = {}
+        for group_id, user_id, phone in result.all():
+            recipients.setdefault(group_id, []).append(
+                NotificationRecipient(user_id=user_id, phone_number=phone)
+            )
+        return recipients
+    
+    async def _send_reminder(
+        self,
+        group_name: str,
+        expires_at: datetime,
+        now: datetime,
+        recipients: List[NotificationRecipient]
+    ):
+        if not recipients:
+            return
+        
+        try:
+            await notification_service.enqueue_notification(NotificationRequest(
+                template_id="subscription_expiring_sms",
+                recipients=recipients,
+                variables={
+                    "group_name": group_name,
+                    "days_remaining": max((expires_at - now).days, 0),
+                    "expires_on": expires_at.strftime("%Y-%m-%d")
+                },
+                priority=NotificationPriority.NORMAL
+            ))
+        except Exception as e:
+            logger.error("subscription_reminder_failed", group_name=group_name, error=str(e))
+    
+    async def reconcile_counts(self) -> Dict[str, int]:
+        """
+        Recount active subscriptions per firm from the due queue
+        
+        Groups with an unexpired subscription that are not yet attributed
+        to a firm (applied before the scheduler existed) are attributed
+        first, through their stored subscription's product.
+        
+        Returns:
+            Number of groups attributed and of firm counts corrected
+        """
+        # Activations and expiries wait on the count rows until the recount
+        # commits, so it sees either all or none of each change
+        attributed = await self.db.execute(
+            text("""
+                UPDATE user_groups ug
+                SET subscription_firm_id = sp.firm_id
+                FROM stored_subscriptions ss
+                JOIN subscription_products sp ON sp.id = ss.product_id
+                WHERE ss.id = ug.subscription_id
+                  AND ug.subscription_firm_id IS NULL
+                  AND ug.subscription_expires_at > NOW()
+            """)
+        )
+        
+        result = await self.db.execute(
+            select(FirmSubscriptionCount.firm_id, FirmSubscriptionCount.active_count)
+            .with_for_update()
+        )
+        maintained = {firm_id: count for firm_id, count in result.all()}
+        
+        result = await self.db.execute(
+            select(UserGroup.subscription_firm_id, func.count())
+            .where(UserGroup.subscription_firm_id.isnot(None))
+            .group_by(UserGroup.subscription_firm_id)
+        )
+        actual = {firm_id: count for firm_id, count in result.all()}
+        
+        corrected = 0
+        for firm_id in actual.keys() | maintained.keys():
+            count = actual.get(firm_id, 0)
+            if maintained.get(firm_id) == count:
+                continue
+            corrected += 1
+            logger.warning(
+                "subscription_count_drift",
+                firm_id=str(firm_id),
+                maintained=maintained.get(firm_id),
+                actual=count
+            )
+            stmt = insert(FirmSubscriptionCount).values(firm_id=firm_id, active_count=count)
+            await self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[FirmSubscriptionCount.firm_id],
+                    set_={"active_count": count, "updated_at": func.now()}
+                )
+            )
+        await self.db.commit()
+        
+        return {"attributed": attributed.rowcount or 0, "corrected": corrected}
+
+
+async def get_active_subscription_counts(db: AsyncSession) -> Dict[str, int]:
+    """Maintained active subscription count of every firm"""
+    result = await db.execute(
+        select(FirmSubscriptionCount.firm_id, FirmSubscriptionCount.active_count)
+    )
+    return {str(firm_id): count for firm_id, count in result.all()}
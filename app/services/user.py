@@ -15,6 +15,7 @@ from app.models.user import RegisteredUser, UserGroup, GroupMobileNumber
 from app.core.redis import cache
 from app.core.cache import cache_result, cache_invalidate, invalidate_user_cache, CacheKey
 from app.services.otp_delivery import OTPDeliveryService
+from app.services.cache_warming import CacheChange, emit_cache_change
 from passlib.context import CryptContext
 
 
@@ -231,6 +232,7 @@ class UserService:
         
         # Invalidate user groups cache
         await invalidate_user_cache(user_id)
+        emit_cache_change(CacheChange.USER_GROUPS, user_id)
         
         return group
     
@@ -280,6 +282,8 @@ class UserService:
         
         await self.db.delete(group)
         await self.db.commit()
+        
+        emit_cache_change(CacheChange.USER_GROUPS, user_id)
     
     async def add_mobile_number_to_group(
         self,
@@ -1 +1,14 @@
-# Background tasks
\ No newline at end of file
+# Background tasks
+from typing import Any, Awaitable, Callable
+
+from app.core.database import get_db
+
+
+async def with_session(work: Callable[[Any], Awaitable[Any]]) -> Any:
+    """Run work with a database session from the shared pool"""
+    sessions = get_db()
+    try:
+        async for db in sessions:
+            return await work(db)
+    finally:
+        await sessions.aclose()
@@ -0,0 +1,26 @@
+"""
+Background tasks for credit accounting
+"""
+from app.core.async_runner import async_runner
+from app.core.celery import celery_app
+from app.services.credit_ledger import CreditLedger
+from app.tasks import with_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.tasks.credits.reconcile_credit_balances")
+def reconcile_credit_balances():
+    """Snapshot firm credit balances and check them against the ledger"""
+    try:
+        result = async_runner.run(with_session(lambda db: CreditLedger(db).reconcile()))
+        
+        if result["drifted"]:
+            logger.warning(f"Credit balances drifted from the ledger for {result['drifted']} firms")
+        logger.info(f"Reconciled credit balances for {result['firms']} firms")
+        return {"status": "success", **result}
+    
+    except Exception as e:
+        logger.error(f"Error reconciling credit balances: {e}")
+        return {"status": "error", "message": str(e)}
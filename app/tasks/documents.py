@@ -0,0 +1,50 @@
+"""
+Background tasks for processing uploaded documents
+
+Validation and inspection read the whole stored file, so they run in Celery
+worker processes rather than in the upload request.
+"""
+from app.core.async_runner import async_runner
+from app.core.celery import celery_app
+from app.services.document_processing import DocumentProcessingService
+from app.tasks import with_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, name="app.tasks.documents.process_document", max_retries=3)
+def process_document(self, document_id: str):
+    """Validate and inspect an uploaded document"""
+    try:
+        document = async_runner.run(
+            with_session(lambda db: DocumentProcessingService(db).process(document_id))
+        )
+        if document is None:
+            logger.warning(f"Document {document_id} not found for processing")
+            return {"status": "missing", "document_id": document_id}
+        
+        return {"status": document.processing_status, "document_id": document_id}
+    
+    except Exception as e:
+        logger.error(f"Error processing document {document_id}: {e}")
+        raise self.retry(exc=e, countdown=60)
+
+
+@celery_app.task(name="app.tasks.documents.requeue_stale_documents")
+def requeue_stale_documents():
+    """Queue documents whose processing was never queued or never finished"""
+    try:
+        document_ids = async_runner.run(
+            with_session(lambda db: DocumentProcessingService(db).get_stale_document_ids())
+        )
+        for document_id in document_ids:
+            process_document.delay(document_id)
+        
+        if document_ids:
+            logger.info(f"Re-queued {len(document_ids)} documents for processing")
+        return {"status": "success", "requeued": len(document_ids)}
+    
+    except Exception as e:
+        logger.error(f"Error re-queueing documents: {e}")
+        return {"status": "error", "message": str(e)}
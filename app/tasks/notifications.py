@@ -1,32 +1,85 @@
 """
 Background tasks for notifications
+
+Tasks hand messages to the notification dispatcher's Redis stream, where
+they are batched, rate limited and retried alongside API-queued notifications.
 """
+import json
+from typing import Optional
+
+import redis
 from celery import current_task
 from app.core.celery import celery_app
+from app.core.config import settings
+from app.services.notification import NotificationPriority, NotificationRecipient, NotificationType
+from app.services.notification_dispatch import NotificationDispatcher, build_job
 import structlog
 
 logger = structlog.get_logger()
 
+_redis_client: Optional[redis.Redis] = None
+
+
+def _enqueue(job: dict) -> str:
+    """Append a job to its priority lane's dispatch stream"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    
+    return _redis_client.xadd(
+        NotificationDispatcher.stream_key(job["priority"]),
+        {"job": json.dumps(job)},
+        maxlen=settings.NOTIFICATION_STREAM_MAXLEN,
+        approximate=True
+    )
+
 
 @celery_app.task(bind=True)
-def send_sms_task(self, phone: str, message: str):
-    """Send SMS notification in background"""
+def send_sms_task(self, phone: str, message: str, priority: str = NotificationPriority.NORMAL.value):
+    """Queue SMS notification for delivery"""
     try:
-        # SMS sending logic will be implemented later
-        logger.info("SMS task queued", phone=phone, task_id=self.request.id)
-        return {"status": "queued", "phone": phone}
+        recipient = NotificationRecipient(phone_number=phone)
+        entry_id = _enqueue(build_job(
+            NotificationType.SMS,
+            recipient.model_dump(mode="json"),
+            message,
+            priority=priority
+        ))
+        logger.info("SMS task queued", phone=phone, task_id=self.request.id, entry_id=entry_id)
+        return {"status": "queued", "phone": phone, "entry_id": entry_id}
     except Exception as exc:
         logger.error("SMS task failed", error=str(exc), phone=phone)
         raise self.retry(exc=exc, countdown=60, max_retries=3)
 
 
 @celery_app.task(bind=True)
-def send_push_notification_task(self, user_id: str, title: str, body: str, data: dict = None):
-    """Send push notification in background"""
+def send_push_notification_task(
+    self,
+    user_id: str,
+    title: str,
+    body: str,
+    data: dict = None,
+    push_token: str = None,
+    platform: str = None,
+    priority: str = NotificationPriority.NORMAL.value
+):
+    """Queue push notification for delivery"""
+    if not push_token:
+        logger.warning("Push notification task has no push token", user_id=user_id, task_id=self.request.id)
+        return {"status": "rejected", "user_id": user_id}
+    
     try:
-        # Push notification logic will be implemented later
-        logger.info("Push notification task queued", user_id=user_id, task_id=self.request.id)
-        return {"status": "queued", "user_id": user_id}
+        recipient = NotificationRecipient(user_id=user_id, push_token=push_token, platform=platform)
+        entry_id = _enqueue(build_job(
+            NotificationType.PUSH,
+            recipient.model_dump(mode="json"),
+            body,
+            title=title,
+            data=data,
+            priority=priority
+        ))
+        logger.info("Push notification task queued", user_id=user_id, task_id=self.request.id, entry_id=entry_id)
+        return {"status": "queued", "user_id": user_id, "entry_id": entry_id}
     except Exception as exc:
         logger.error("Push notification task failed", error=str(exc), user_id=user_id)
-        raise self.retry(exc=exc, countdown=60, max_retries=3)
\ No newline at end of file
+        raise self.retry(exc=exc, countdown=60, max_retries=3)
@@ -0,0 +1,47 @@
+"""
+Background tasks for processing stored payment webhooks
+"""
+from app.core.async_runner import async_runner
+from app.core.celery import celery_app
+from app.services.payment_webhooks import PaymentWebhookService
+from app.tasks import with_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, name="app.tasks.payments.process_payment_webhook", max_retries=3)
+def process_payment_webhook(self, event_id: str):
+    """Apply a stored payment webhook event"""
+    try:
+        event = async_runner.run(
+            with_session(lambda db: PaymentWebhookService(db).process(event_id))
+        )
+        if event is None:
+            logger.info(f"Payment webhook {event_id} missing or being processed elsewhere")
+            return {"status": "skipped", "event_id": event_id}
+        
+        return {"status": event.processing_status, "event_id": event_id}
+    
+    except Exception as e:
+        logger.error(f"Error processing payment webhook {event_id}: {e}")
+        raise self.retry(exc=e, countdown=30 * (self.request.retries + 1))
+
+
+@celery_app.task(name="app.tasks.payments.requeue_payment_webhooks")
+def requeue_payment_webhooks():
+    """Queue payment webhooks that were never queued or failed with attempts left"""
+    try:
+        event_ids = async_runner.run(
+            with_session(lambda db: PaymentWebhookService(db).get_retryable_event_ids())
+        )
+        for event_id in event_ids:
+            process_payment_webhook.delay(event_id)
+        
+        if event_ids:
+            logger.info(f"Re-queued {len(event_ids)} payment webhooks")
+        return {"status": "success", "requeued": len(event_ids)}
+    
+    except Exception as e:
+        logger.error(f"Error re-queueing payment webhooks: {e}")
+        return {"status": "error", "message": str(e)}
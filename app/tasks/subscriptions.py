@@ -0,0 +1,41 @@
+"""
+Background tasks for subscription expiry
+"""
+from app.core.async_runner import async_runner
+from app.core.celery import celery_app
+from app.services.subscription_expiry import SubscriptionExpiryScheduler
+from app.tasks import with_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.tasks.subscriptions.process_subscription_expiries")
+def process_subscription_expiries():
+    """Expire subscriptions and send renewal reminders for the closed bucket"""
+    try:
+        result = async_runner.run(with_session(lambda db: SubscriptionExpiryScheduler(db).run()))
+        
+        if result["expired"] or result["reminded"]:
+            logger.info(f"Expired {result['expired']} subscriptions, reminded {result['reminded']} groups")
+        return {"status": "success", **result}
+    
+    except Exception as e:
+        logger.error(f"Error processing subscription expiries: {e}")
+        return {"status": "error", "message": str(e)}
+
+
+@celery_app.task(name="app.tasks.subscriptions.reconcile_subscription_counts")
+def reconcile_subscription_counts():
+    """Recount maintained active subscription counts per firm"""
+    try:
+        result = async_runner.run(with_session(lambda db: SubscriptionExpiryScheduler(db).reconcile_counts()))
+        
+        if result["corrected"]:
+            logger.warning(f"Corrected active subscription counts for {result['corrected']} firms")
+        logger.info(f"Reconciled subscription counts, attributed {result['attributed']} groups")
+        return {"status": "success", **result}
+    
+    except Exception as e:
+        logger.error(f"Error reconciling subscription counts: {e}")
+        return {"status": "error", "message": str(e)}
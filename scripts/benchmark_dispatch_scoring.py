@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark dispatch candidate scoring
+
+Scores and ranks a batch of candidate providers for one request the way
+find_nearest_providers used to (a haversine and travel time per provider in
+Python, then a sort) and with the vectorized dispatch scorer against a
+learned speed profile. Candidates are spread around Johannesburg across a
+handful of provinces.
+
+Usage:
+    python scripts/benchmark_dispatch_scoring.py [--candidates 1000 3000 5000] [--runs 20]
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.dispatch_scoring import SpeedProfile, dispatch_scorer
+from app.services.emergency_provider import EmergencyProviderService
+
+REQUEST = (-26.2041, 28.0473)
+PROVINCES = ["Gauteng", "North West", "Mpumalanga", "Free State", "Limpopo"]
+LIMIT = 10
+
+
+def build_candidates(count: int, rng: random.Random) -> dict:
+    """Candidate positions, regions and coverage radii as parallel lists"""
+    return {
+        "latitudes": [REQUEST[0] + rng.uniform(-1.5, 1.5) for _ in range(count)],
+        "longitudes": [REQUEST[1] + rng.uniform(-1.5, 1.5) for _ in range(count)],
+        "regions": [rng.choice(PROVINCES) for _ in range(count)],
+        "coverage": [rng.choice([25.0, 50.0, 100.0, 200.0]) for _ in range(count)],
+    }
+
+
+def build_profile(rng: random.Random) -> SpeedProfile:
+    """A profile with arrivals for every province and hour"""
+    return SpeedProfile.from_samples(
+        (province, hour, 200 * speed, 200.0, 50)
+        for province in PROVINCES
+        for hour in range(24)
+        for speed in [rng.uniform(25, 70)]
+    )
+
+
+def legacy_rank(service: EmergencyProviderService, candidates: dict) -> list:
+    """Per-provider loop from before vectorized scoring"""
+    scored = []
+    for lat, lon, coverage in zip(candidates["latitudes"], candidates["longitudes"], candidates["coverage"]):
+        distance = service.calculate_distance(REQUEST[0], REQUEST[1], lat, lon)
+        if distance <= 100.0 and distance <= coverage:
+            scored.append((distance, service.estimate_travel_time(distance)))
+    scored.sort(key=lambda item: item[0])
+    return scored[:LIMIT]
+
+
+def vectorized_rank(profile: SpeedProfile, candidates: dict):
+    scores = dispatch_scorer.score(
+        profile,
+        REQUEST[0], REQUEST[1],
+        candidates["latitudes"],
+        candidates["longitudes"],
+        candidates["regions"],
+        coverage_radius_km=candidates["coverage"],
+        max_distance_km=100.0
+    )
+    return scores.ranked(LIMIT, by="eta")
+
+
+def time_runs(rank, runs: int) -> list:
+    rank()  # Warm up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rank()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1000, 3000, 5000], help="Candidates per request")
+    parser.add_argument("--runs", type=int, default=20, help="Requests timed per variant")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(42)
+    service = EmergencyProviderService(db=None)
+    profile = build_profile(rng)
+
+    print(f"{'candidates':>10} {'variant':<11} {'median ms':>10} {'best ms':>10} {'speedup':>8}")
+    for count in args.candidates:
+        candidates = build_candidates(count, rng)
+        variants = {
+            "loop": lambda: legacy_rank(service, candidates),
+            "vectorized": lambda: vectorized_rank(profile, candidates),
+        }
+
+        loop_median = None
+        for variant, rank in variants.items():
+            timings = time_runs(rank, args.runs)
+            median = statistics.median(timings)
+            if loop_median is None:
+                loop_median = median
+            print(
+                f"{count:>10} {variant:<11} {median * 1e3:>10.2f} {min(timings) * 1e3:>10.2f} "
+                f"{loop_median / median:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
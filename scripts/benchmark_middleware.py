@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request middleware overhead
+
+Compares a bare app, the legacy BaseHTTPMiddleware stack (metrics, request
+logging, security headers) and the fused RequestPipelineMiddleware by
+driving each ASGI app directly, without a server or network in the way.
+
+Usage:
+    python scripts/benchmark_middleware.py [--requests 5000] [--routes 200] [--with-logging]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi import FastAPI
+
+from app.core.middleware import (
+    RequestLoggingMiddleware,
+    RequestPipelineMiddleware,
+    SecurityHeadersMiddleware
+)
+from app.core.metrics_middleware import MetricsMiddleware
+
+
+def build_app(variant: str, route_count: int) -> FastAPI:
+    """Create an app with the given middleware variant and a realistic route table"""
+    app = FastAPI()
+
+    for i in range(route_count):
+        async def handler(item_id: str):
+            return {"item_id": item_id}
+        app.add_api_route(f"/api/v1/resource{i}/{{item_id}}", handler, methods=["GET"])
+
+    @app.get("/api/v1/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    if variant == "legacy":
+        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(RequestLoggingMiddleware)
+        app.add_middleware(MetricsMiddleware)
+    elif variant == "pipeline":
+        app.add_middleware(RequestPipelineMiddleware)
+
+    return app
+
+
+async def run_requests(app: FastAPI, paths: list, count: int) -> list:
+    """Send requests straight through the ASGI callable and time each one"""
+    timings = []
+
+    for i in range(count):
+        path = paths[i % len(paths)]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"user-agent", b"benchmark")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+
+        request_sent = False
+        response_done = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Later calls are disconnect listeners; release them once the response is sent
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done.set()
+
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per variant")
+    parser.add_argument("--routes", type=int, default=200, help="Parameterised routes registered")
+    parser.add_argument("--with-logging", action="store_true", help="Keep request logging enabled")
+    args = parser.parse_args()
+
+    if not args.with_logging:
+        # Measure middleware work rather than log I/O
+        logging.disable(logging.INFO)
+
+    paths = ["/api/v1/ping"] + [f"/api/v1/resource{i}/abc-{i}" for i in range(0, args.routes, 7)]
+    results = {}
+
+    for variant in ("bare", "legacy", "pipeline"):
+        app = build_app(variant, args.routes)
+        await run_requests(app, paths, min(500, args.requests))  # Warm up
+        timings = await run_requests(app, paths, args.requests)
+        results[variant] = timings
+
+    bare_median = statistics.median(results["bare"])
+    print(f"{'variant':<10} {'median us':>10} {'p95 us':>10} {'overhead us':>12}")
+    for variant, timings in results.items():
+        median = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[18]
+        print(f"{variant:<10} {median * 1e6:>10.1f} {p95 * 1e6:>10.1f} {(median - bare_median) * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
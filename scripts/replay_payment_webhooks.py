@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Replay stored payment webhooks
+
+Resets selected webhook events to pending and processes them again, either
+by queueing them for the Celery workers or inline in this process. Replays
+are safe for payments that were already applied: paid invoices are skipped
+and credits are keyed by invoice.
+
+Usage:
+    python scripts/replay_payment_webhooks.py --status failed
+    python scripts/replay_payment_webhooks.py --since 2025-01-31T08:00:00 --inline
+    python scripts/replay_payment_webhooks.py <event-id> [<event-id> ...]
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.database import get_db
+from app.services.payment_webhooks import PaymentWebhookService, WebhookStatus, enqueue_webhook_event
+
+
+async def replay(args: argparse.Namespace) -> int:
+    async for db in get_db():
+        service = PaymentWebhookService(db)
+        event_ids = await service.mark_for_replay(
+            event_ids=args.event_ids or None,
+            status=args.status,
+            since=datetime.fromisoformat(args.since) if args.since else None,
+            limit=args.limit
+        )
+        print(f"Reset {len(event_ids)} webhook events to pending")
+        
+        failed = 0
+        for event_id in event_ids:
+            if not args.inline:
+                if not enqueue_webhook_event(event_id):
+                    failed += 1
+                continue
+            
+            try:
+                event = await service.process(event_id)
+                print(f"{event_id}: {event.processing_status if event else 'skipped'}")
+            except Exception as e:
+                failed += 1
+                print(f"{event_id}: failed - {e}")
+        
+        if args.inline:
+            print(f"Processed {len(event_ids) - failed} events, {failed} failed")
+        else:
+            print(f"Queued {len(event_ids) - failed} events, {failed} left for the periodic sweep")
+        return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("event_ids", nargs="*", help="Webhook event IDs to replay")
+    parser.add_argument(
+        "--status",
+        choices=[WebhookStatus.PENDING, WebhookStatus.PROCESSED, WebhookStatus.FAILED],
+        help="Replay events in this processing status"
+    )
+    parser.add_argument("--since", help="Replay events received at or after this ISO timestamp")
+    parser.add_argument("--limit", type=int, default=1000, help="Maximum events to replay")
+    parser.add_argument("--inline", action="store_true", help="Process here instead of queueing for workers")
+    args = parser.parse_args()
+    
+    if not (args.event_ids or args.status or args.since):
+        parser.error("give event IDs, --status or --since")
+    
+    sys.exit(asyncio.run(replay(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Shared fixtures for unit tests
+"""
+import pytest
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+from app.services.credit import InsufficientCreditsError
+from app.services.credit_ledger import LedgerPosting
+from app.models.subscription import CreditTransaction
+
+
+@pytest.fixture
+def ledger_post_to():
+    """Factory for a CreditLedger.post fake that applies movements to an in-memory firm"""
+    def post_to(firm):
+        async def post(firm_id, amount, transaction_type, description, reference_id=None, idempotency_key=None):
+            if firm is None:
+                raise ValueError("Security firm not found")
+            if firm.credit_balance + amount < 0:
+                raise InsufficientCreditsError(
+                    f"Insufficient credits. Current balance: {firm.credit_balance}, Required: {-amount}"
+                )
+            firm.credit_balance += amount
+            transaction = CreditTransaction(
+                id=uuid4(),
+                firm_id=firm_id,
+                transaction_type=transaction_type,
+                amount=amount,
+                description=description,
+                reference_id=reference_id,
+                balance_after=firm.credit_balance,
+                idempotency_key=idempotency_key
+            )
+            return LedgerPosting(transaction, firm.credit_balance)
+        return AsyncMock(side_effect=post)
+    return post_to
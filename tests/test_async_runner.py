@@ -0,0 +1,88 @@
+"""
+Unit tests for the persistent async runner
+"""
+import asyncio
+
+import pytest
+
+from app.core.async_runner import AsyncRunner
+
+
+@pytest.fixture
+def runner():
+    runner = AsyncRunner(name="test-runner")
+    yield runner
+    runner.stop()
+
+
+class TestAsyncRunner:
+    """Test running coroutines on a long-lived loop"""
+    
+    def test_runs_coroutines_on_one_loop(self, runner):
+        async def current_loop():
+            return asyncio.get_running_loop()
+        
+        first = runner.run(current_loop())
+        second = runner.run(current_loop())
+        
+        assert first is second
+        assert first.is_running()
+    
+    def test_loop_resources_survive_between_runs(self, runner):
+        """Objects bound to the loop, like pooled connections, are reusable"""
+        async def make_queue():
+            return asyncio.Queue()
+        
+        queue = runner.run(make_queue())
+        runner.run(queue.put("item"))
+        
+        assert runner.run(queue.get()) == "item"
+    
+    def test_exceptions_propagate(self, runner):
+        async def fail():
+            raise ValueError("boom")
+        
+        with pytest.raises(ValueError, match="boom"):
+            runner.run(fail())
+    
+    def test_timeout_cancels_coroutine(self, runner):
+        cancelled = []
+        
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        
+        with pytest.raises(TimeoutError):
+            runner.run(slow(), timeout=0.05)
+        
+        runner.run(asyncio.sleep(0.05))
+        assert cancelled == [True]
+    
+    def test_run_from_own_loop_is_rejected(self, runner):
+        async def nested():
+            runner.run(asyncio.sleep(0))
+        
+        with pytest.raises(RuntimeError):
+            runner.run(nested())
+    
+    def test_stop_then_restart(self, runner):
+        async def current_loop():
+            return asyncio.get_running_loop()
+        
+        first = runner.run(current_loop())
+        runner.stop()
+        
+        assert first.is_closed()
+        assert runner.run(current_loop()) is not first
+    
+    def test_new_loop_after_fork(self, runner, monkeypatch):
+        async def current_loop():
+            return asyncio.get_running_loop()
+        
+        parent_loop = runner.run(current_loop())
+        monkeypatch.setattr("app.core.async_runner.os.getpid", lambda: -1)
+        
+        assert runner.run(current_loop()) is not parent_loop
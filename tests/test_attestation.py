@@ -10,7 +10,8 @@ from app.services.attestation import (
     AppAttestationService,
     GooglePlayIntegrityService,
     AppleAppAttestService,
-    AttestationError
+    AttestationError,
+    _digest
 )
 
 
@@ -283,4 +284,172 @@ class TestAppAttestationService:
         # Different data should produce different hash
         request_data["timestamp"] = "2024-01-01T00:01:00Z"
         hash3 = service.create_client_data_hash(request_data)
-        assert hash1 != hash3
\ No newline at end of file
+        assert hash1 != hash3
+
+class FakeRedisCache:
+    """In-memory stand-in for the Redis cache service"""
+    
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+    
+    async def set_if_absent(self, key, value, expire):
+        if key in self.values:
+            return False
+        self.values[key] = value
+        return True
+    
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+    
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+        return 1
+    
+    async def hdel(self, key, *fields):
+        removed = 0
+        for field in fields:
+            removed += self.hashes.get(key, {}).pop(field, None) is not None
+        return removed
+    
+    async def expire(self, key, seconds):
+        return True
+    
+    async def delete(self, key):
+        self.values.pop(key, None)
+        return self.hashes.pop(key, None) is not None
+
+
+class TestAttestationVerdictCache:
+    """Test cached verdicts, nonce tracking and revocation"""
+    
+    @pytest.fixture
+    def fake_cache(self):
+        fake = FakeRedisCache()
+        with patch('app.services.attestation.cache', fake):
+            yield fake
+    
+    @pytest.fixture
+    def service(self, fake_cache):
+        return AppAttestationService()
+    
+    @pytest.mark.asyncio
+    async def test_android_verdict_reused_for_same_token(self, service):
+        """Test a cached verdict skips re-verification"""
+        with patch.object(service, 'verify_android_integrity', new_callable=AsyncMock) as mock_verify:
+            mock_verify.return_value = True
+            
+            assert await service.check_android_request("token", device_id="device-1") is True
+            assert await service.check_android_request("token", device_id="device-1") is True
+            
+            mock_verify.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_verdict_shared_through_redis(self, service):
+        """Test a verdict stored by one worker is honoured by another"""
+        other_worker = AppAttestationService()
+        
+        with patch.object(service, 'verify_android_integrity', new_callable=AsyncMock) as mock_verify, \
+             patch.object(other_worker, 'verify_android_integrity', new_callable=AsyncMock) as other_verify:
+            mock_verify.return_value = True
+            
+            await service.check_android_request("token", device_id="device-1")
+            assert await other_worker.check_android_request("token", device_id="device-1") is True
+            
+            other_verify.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_ios_assertion_always_verified(self, service):
+        """Test a cached verdict for the key never stands in for the assertion"""
+        with patch.object(service, 'verify_ios_attestation', new_callable=AsyncMock) as mock_attest, \
+             patch.object(service, 'verify_ios_assertion', new_callable=AsyncMock) as mock_verify:
+            mock_attest.return_value = True
+            mock_verify.side_effect = [True, False]
+            
+            await service.check_ios_attestation_request("attestation", "key_123", "challenge", "device-1")
+            assert await service.check_ios_assertion_request("assertion", "key_123", "hash", "device-1") is True
+            assert await service.check_ios_assertion_request("forged", "key_123", "hash", "device-1") is False
+            
+            assert mock_verify.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_failed_verification_not_cached(self, service):
+        """Test failed verifications are never cached"""
+        with patch.object(service, 'verify_android_integrity', new_callable=AsyncMock) as mock_verify:
+            mock_verify.return_value = False
+            
+            assert await service.check_android_request("token") is False
+            assert await service.check_android_request("token") is False
+            
+            assert mock_verify.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_nonce_replay_rejected(self, service):
+        """Test a nonce can only be used once"""
+        with patch.object(service, 'verify_android_integrity', new_callable=AsyncMock) as mock_verify:
+            mock_verify.return_value = True
+            
+            await service.check_android_request("token", "nonce-1")
+            
+            with pytest.raises(AttestationError):
+                await service.check_android_request("token", "nonce-1")
+            
+            mock_verify.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_ios_challenge_single_use(self, service):
+        """Test an attestation challenge cannot be replayed"""
+        with patch.object(service, 'verify_ios_attestation', new_callable=AsyncMock) as mock_verify:
+            mock_verify.return_value = True
+            
+            await service.check_ios_attestation_request("attestation", "key_123", "challenge")
+            
+            with pytest.raises(AttestationError):
+                await service.check_ios_attestation_request("attestation", "key_123", "challenge")
+    
+    @pytest.mark.asyncio
+    async def test_nonce_store_failure_rejects_request(self, service, fake_cache):
+        """Test nonce tracking fails closed when Redis is unavailable"""
+        fake_cache.set_if_absent = AsyncMock(side_effect=ConnectionError("redis down"))
+        
+        with patch.object(service, 'verify_android_integrity', new_callable=AsyncMock) as mock_verify:
+            with pytest.raises(AttestationError):
+                await service.check_android_request("token", "nonce-1")
+            
+            mock_verify.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_verdict_lookup_failure_falls_back_to_verification(self, service, fake_cache):
+        """Test verdict cache errors fall back to full verification"""
+        fake_cache.hget = AsyncMock(side_effect=ConnectionError("redis down"))
+        
+        with patch.object(service, 'verify_android_integrity', new_callable=AsyncMock) as mock_verify:
+            mock_verify.return_value = True
+            
+            assert await service.check_android_request("token") is True
+            mock_verify.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_revoke_forces_reverification(self, service):
+        """Test revoked verdicts are verified again"""
+        with patch.object(service, 'verify_android_integrity', new_callable=AsyncMock) as mock_verify:
+            mock_verify.return_value = True
+            
+            await service.check_android_request("token", device_id="device-1")
+            await service.revoke_verdicts("android", device_id="device-1")
+            await service.check_android_request("token", device_id="device-1")
+            
+            assert mock_verify.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_revoke_single_key(self, service):
+        """Test revoking one key leaves other keys on the device cached"""
+        with patch.object(service, 'verify_ios_attestation', new_callable=AsyncMock) as mock_verify:
+            mock_verify.return_value = True
+            
+            await service.check_ios_attestation_request("attestation", "key_1", "challenge-1", "device-1")
+            await service.check_ios_attestation_request("attestation", "key_2", "challenge-2", "device-1")
+            await service.revoke_verdicts("ios", device_id="device-1", key_id="key_1")
+            
+            assert await service.verdicts.get("ios", _digest("key_1"), "device-1") is None
+            assert await service.verdicts.get("ios", _digest("key_2"), "device-1") is not None
@@ -584,5 +584,96 @@ class TestCacheErrorHandling:
         assert result == 0
 
 
+class TestIncrementalCacheWarming:
+    """Test change-driven cache warming"""
+    
+    @pytest.fixture
+    def warming_service(self):
+        """Create a fresh cache warming service"""
+        from app.services.cache_warming import CacheWarmingService
+        return CacheWarmingService()
+    
+    def test_emit_change_without_consumer_is_noop(self, warming_service):
+        """Test that events are dropped when no consumer is running"""
+        from app.services.cache_warming import CacheChange
+        
+        warming_service.emit_change(CacheChange.USER_GROUPS, "user-1")
+        
+        assert dict(warming_service._pending_changes) == {}
+    
+    def test_emit_unknown_change_raises(self, warming_service):
+        """Test that unknown change kinds are rejected"""
+        with pytest.raises(ValueError):
+            warming_service.emit_change("unknown", "id")
+    
+    @pytest.mark.asyncio
+    async def test_changes_are_coalesced(self, warming_service):
+        """Test that bursts of events result in one refresh per entity"""
+        from app.services.cache_warming import CacheChange
+        
+        refreshed = []
+        
+        async def fake_refresh(changes):
+            refreshed.append(changes)
+        
+        warming_service.refresh_changed = fake_refresh
+        warming_service._change_signal = asyncio.Event()
+        warming_service._background_tasks["changes"] = asyncio.create_task(
+            warming_service.process_changes(debounce_seconds=0.01)
+        )
+        
+        try:
+            for _ in range(5):
+                warming_service.emit_change(CacheChange.COVERAGE_AREAS, "firm-1")
+            warming_service.emit_change(CacheChange.USER_GROUPS, "user-1")
+            await asyncio.sleep(0.05)
+        finally:
+            await warming_service.stop()
+        
+        assert refreshed == [{
+            CacheChange.COVERAGE_AREAS: {"firm-1"},
+            CacheChange.USER_GROUPS: {"user-1"}
+        }]
+    
+    @pytest.mark.asyncio
+    async def test_refresh_changed_rebuilds_active_products_once(self, warming_service):
+        """Test that product changes rebuild the global list once per batch"""
+        from app.services.cache_warming import CacheChange
+        
+        mock_db = AsyncMock()
+        
+        async def fake_get_db():
+            yield mock_db
+        
+        warming_service.change_handlers[CacheChange.FIRM_PRODUCTS] = AsyncMock()
+        warming_service._warm_active_products = AsyncMock()
+        
+        with patch("app.services.cache_warming.get_db", fake_get_db):
+            await warming_service.refresh_changed({
+                CacheChange.FIRM_PRODUCTS: {"firm-1", "firm-2"}
+            })
+        
+        assert warming_service.change_handlers[CacheChange.FIRM_PRODUCTS].await_count == 2
+        warming_service._warm_active_products.assert_awaited_once_with(mock_db)
+    
+    @pytest.mark.asyncio
+    async def test_lazy_startup_skips_warming(self, warming_service):
+        """Test that lazy startup mode does not warm caches up front"""
+        warming_service.warm_critical_data_on_startup = AsyncMock()
+        
+        await warming_service.start("lazy")
+        try:
+            assert "startup" not in warming_service._background_tasks
+            warming_service.warm_critical_data_on_startup.assert_not_awaited()
+        finally:
+            await warming_service.stop()
+    
+    @pytest.mark.asyncio
+    async def test_invalid_startup_mode(self, warming_service):
+        """Test that unknown startup modes are rejected"""
+        with pytest.raises(ValueError):
+            await warming_service.start("sometimes")
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Unit tests for the credit ledger
+"""
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, Mock
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.models.subscription import CreditBalanceSnapshot, CreditTransaction
+from app.services.credit_ledger import CreditLedger, InsufficientCreditsError
+
+
+def scalar(value):
+    return Mock(scalar_one_or_none=Mock(return_value=value))
+
+
+def make_db(*results):
+    db = Mock()
+    db.execute = AsyncMock(side_effect=list(results))
+    db.flush = AsyncMock()
+    db.commit = AsyncMock()
+    
+    @asynccontextmanager
+    async def begin_nested():
+        yield
+    
+    db.begin_nested = begin_nested
+    return db
+
+
+def posted(amount: int, balance: int, key: str) -> CreditTransaction:
+    return CreditTransaction(
+        id=uuid4(),
+        firm_id=uuid4(),
+        transaction_type="purchase",
+        amount=amount,
+        description="Credit purchase",
+        balance_after=balance,
+        idempotency_key=key
+    )
+
+
+class TestPost:
+    """Test posting credit movements"""
+    
+    @pytest.mark.asyncio
+    async def test_credit_records_balance_after(self):
+        db = make_db(scalar(None), scalar(150))
+        
+        posting = await CreditLedger(db).post("firm-1", 50, "purchase", "Credit purchase", idempotency_key="payment:1")
+        
+        assert posting.balance == 150
+        assert not posting.replayed
+        assert posting.transaction.amount == 50
+        assert posting.transaction.balance_after == 150
+        db.add.assert_called_once_with(posting.transaction)
+        db.commit.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_debit_is_guarded_in_the_update(self):
+        db = make_db(scalar(70))
+        
+        posting = await CreditLedger(db).post("firm-1", -30, "deduction", "Product creation")
+        
+        statement = str(db.execute.call_args_list[0].args[0])
+        assert "credit_balance >=" in statement
+        assert posting.balance == 70
+    
+    @pytest.mark.asyncio
+    async def test_insufficient_balance(self):
+        db = make_db(scalar(None), scalar(20))
+        
+        with pytest.raises(InsufficientCreditsError, match="Current balance: 20, Required: 50"):
+            await CreditLedger(db).post("firm-1", -50, "deduction", "Product creation")
+        
+        db.add.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_firm_not_found(self):
+        db = make_db(scalar(None), scalar(None))
+        
+        with pytest.raises(ValueError, match="Security firm not found"):
+            await CreditLedger(db).post("missing", 50, "purchase", "Credit purchase")
+    
+    @pytest.mark.asyncio
+    async def test_replayed_key_is_not_applied_again(self):
+        existing = posted(50, 150, "ozow:invoice:1")
+        db = make_db(scalar(existing))
+        
+        posting = await CreditLedger(db).post("firm-1", 50, "purchase", "Credit purchase", idempotency_key="ozow:invoice:1")
+        
+        assert posting.replayed
+        assert posting.transaction is existing
+        assert posting.balance == 150
+        assert db.execute.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_replay_returns_winning_entry(self):
+        existing = posted(50, 150, "ozow:invoice:1")
+        db = make_db(scalar(None), scalar(150), scalar(existing))
+        db.flush.side_effect = IntegrityError("INSERT", {}, Exception("duplicate key"))
+        
+        posting = await CreditLedger(db).post("firm-1", 50, "purchase", "Credit purchase", idempotency_key="ozow:invoice:1")
+        
+        assert posting.replayed
+        assert posting.transaction is existing
+
+
+class TestSnapshot:
+    """Test reconciling balances against the ledger"""
+    
+    @pytest.mark.asyncio
+    async def test_drift_against_previous_snapshot(self):
+        firm_id = uuid4()
+        previous = CreditBalanceSnapshot(firm_id=firm_id, balance=100, delta=0, entries=0, drift=0)
+        claimed = Mock()
+        claimed.scalars.return_value.all.return_value = [50, -30]
+        db = make_db(scalar(125), scalar(previous), claimed)
+        
+        snapshot = await CreditLedger(db).snapshot(firm_id)
+        
+        assert (snapshot.balance, snapshot.delta, snapshot.entries) == (125, 20, 2)
+        assert snapshot.drift == 5
+    
+    @pytest.mark.asyncio
+    async def test_first_snapshot_has_no_drift(self):
+        claimed = Mock()
+        claimed.scalars.return_value.all.return_value = [100]
+        db = make_db(scalar(100), scalar(None), claimed)
+        
+        snapshot = await CreditLedger(db).snapshot(uuid4())
+        
+        assert snapshot.delta == 100
+        assert not snapshot.drift
@@ -0,0 +1,94 @@
+"""
+Unit tests for cached credit tier pricing
+"""
+from decimal import Decimal
+from unittest.mock import AsyncMock, Mock
+from uuid import uuid4
+
+import pytest
+
+from app.models.payment import CreditTier
+from app.services.credit_pricing import CreditTierCache
+
+TIERS = [
+    (0, 50, "100.00"),
+    (51, 100, "150.00"),
+    (101, 500, "600.00"),
+    (501, 1000, "1000.00"),
+]
+
+
+def make_db(tiers=TIERS):
+    rows = [
+        CreditTier(id=uuid4(), name=f"Tier {low}", min_credits=low, max_credits=high, price=Decimal(price), is_active=True)
+        for low, high, price in reversed(tiers)
+    ]
+    result = Mock()
+    result.scalars.return_value.all.return_value = rows
+    db = Mock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+class TestCreditTierCache:
+    """Test tier lookups against the in-memory table"""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("credits,price", [(0, "100.00"), (50, "100.00"), (51, "150.00"), (750, "1000.00"), (1000, "1000.00")])
+    async def test_price_for_credits(self, credits, price):
+        assert await CreditTierCache().get_price(make_db(), credits) == Decimal(price)
+    
+    @pytest.mark.asyncio
+    async def test_credits_outside_tiers(self):
+        with pytest.raises(ValueError, match="No pricing tier found for 1001 credits"):
+            await CreditTierCache().get_price(make_db(), 1001)
+    
+    @pytest.mark.asyncio
+    async def test_gap_between_tiers(self):
+        with pytest.raises(ValueError):
+            await CreditTierCache().get_price(make_db([(0, 50, "100.00"), (60, 100, "150.00")]), 55)
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("amount,credits", [
+        ("150.00", 100),  # Exact price
+        ("120.00", 100),  # Between prices
+        ("10.00", 50),  # Below every price
+        ("5000.00", 1000),  # Above every price
+    ])
+    async def test_credits_for_amount(self, amount, credits):
+        assert await CreditTierCache().get_credits_for_amount(make_db(), Decimal(amount)) == (credits, Decimal(amount))
+    
+    @pytest.mark.asyncio
+    async def test_no_tiers(self):
+        with pytest.raises(ValueError, match="No credit tiers available"):
+            await CreditTierCache().get_credits_for_amount(make_db([]), Decimal("100"))
+    
+    @pytest.mark.asyncio
+    async def test_available_amounts_sorted(self):
+        amounts = await CreditTierCache().get_available_amounts(make_db())
+        
+        assert amounts == [Decimal("100.00"), Decimal("150.00"), Decimal("600.00"), Decimal("1000.00")]
+    
+    @pytest.mark.asyncio
+    async def test_table_loaded_once_until_invalidated(self):
+        cache = CreditTierCache()
+        db = make_db()
+        
+        await cache.get_price(db, 10)
+        await cache.get_credits_for_amount(db, Decimal("600"))
+        assert db.execute.await_count == 1
+        
+        cache.invalidate()
+        await cache.get_price(db, 10)
+        assert db.execute.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_table_reloaded_after_ttl(self, monkeypatch):
+        cache = CreditTierCache()
+        db = make_db()
+        
+        await cache.get_tiers(db)
+        monkeypatch.setattr("app.services.credit_pricing.settings.CREDIT_TIER_CACHE_TTL_SECONDS", 0)
+        await cache.get_tiers(db)
+        
+        assert db.execute.await_count == 2
@@ -39,13 +39,12 @@ class TestCreditService:
         )
     
     @pytest.mark.asyncio
-    async def test_purchase_credits_success(self, credit_service, mock_db, sample_firm):
+    async def test_purchase_credits_success(self, credit_service, mock_db, sample_firm, ledger_post_to):
         """Test successful credit purchase"""
         # Setup
         mock_db.get.return_value = sample_firm
         mock_db.commit = AsyncMock()
-        mock_db.refresh = AsyncMock()
-        mock_db.add = AsyncMock()
+        credit_service.ledger.post = ledger_post_to(sample_firm)
         
         payment_data = {
             "method": "card",
@@ -77,8 +76,8 @@ class TestCreditService:
         assert "transaction_id" in result
         assert "payment_reference" in result
         
-        # Verify database operations
-        mock_db.add.assert_called_once()
+        # Verify the purchase was posted once per payment
+        assert credit_service.ledger.post.call_args.kwargs["idempotency_key"] == "payment:pay_123456"
         mock_db.commit.assert_called_once()
         assert sample_firm.credit_balance == 150
     
@@ -139,13 +138,11 @@ class TestCreditService:
                 )
     
     @pytest.mark.asyncio
-    async def test_deduct_credits_success(self, credit_service, mock_db, sample_firm):
+    async def test_deduct_credits_success(self, credit_service, mock_db, sample_firm, ledger_post_to):
         """Test successful credit deduction"""
         # Setup
-        mock_db.get.return_value = sample_firm
         mock_db.commit = AsyncMock()
-        mock_db.refresh = AsyncMock()
-        mock_db.add = AsyncMock()
+        credit_service.ledger.post = ledger_post_to(sample_firm)
         
         # Execute
         result = await credit_service.deduct_credits(
@@ -162,16 +159,16 @@ class TestCreditService:
         assert result["description"] == "Product creation"
         
         # Verify database operations
-        mock_db.add.assert_called_once()
+        assert credit_service.ledger.post.call_args.kwargs["amount"] == -30
         mock_db.commit.assert_called_once()
         assert sample_firm.credit_balance == 70
     
     @pytest.mark.asyncio
-    async def test_deduct_credits_insufficient_balance(self, credit_service, mock_db, sample_firm):
+    async def test_deduct_credits_insufficient_balance(self, credit_service, mock_db, sample_firm, ledger_post_to):
         """Test credit deduction with insufficient balance"""
         # Setup
         sample_firm.credit_balance = 20
-        mock_db.get.return_value = sample_firm
+        credit_service.ledger.post = ledger_post_to(sample_firm)
         
         # Execute & Verify
         with pytest.raises(InsufficientCreditsError, match="Insufficient credits"):
@@ -180,6 +177,9 @@ class TestCreditService:
                 amount=50,
                 description="Product creation"
             )
+        
+        mock_db.commit.assert_not_called()
+        assert sample_firm.credit_balance == 20
     
     @pytest.mark.asyncio
     async def test_get_credit_balance_success(self, credit_service, mock_db, sample_firm):
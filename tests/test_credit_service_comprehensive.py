@@ -74,16 +74,15 @@ class TestCreditService:
         }
     
     @pytest.mark.asyncio
-    async def test_purchase_credits_success_card(self, service, mock_db, approved_firm, valid_card_payment):
+    async def test_purchase_credits_success_card(self, service, mock_db, approved_firm, valid_card_payment, ledger_post_to):
         """Test successful credit purchase with card payment"""
         firm_id = str(approved_firm.id)
         amount = 50
         
         # Mock database operations
         mock_db.get.return_value = approved_firm
-        mock_db.add = MagicMock()
         mock_db.commit = AsyncMock()
-        mock_db.refresh = AsyncMock()
+        service.ledger.post = ledger_post_to(approved_firm)
         
         # Mock successful payment processing
         with patch.object(service, '_process_payment') as mock_payment:
@@ -104,20 +103,19 @@ class TestCreditService:
             # Verify firm balance was updated
             assert approved_firm.credit_balance == 150
             
-            # Verify transaction was created
-            mock_db.add.assert_called_once()
+            # Verify the purchase was posted once per payment
+            assert service.ledger.post.call_args.kwargs["idempotency_key"] == "payment:card_123456789"
             mock_db.commit.assert_called_once()
     
     @pytest.mark.asyncio
-    async def test_purchase_credits_success_bank_transfer(self, service, mock_db, approved_firm, valid_bank_payment):
+    async def test_purchase_credits_success_bank_transfer(self, service, mock_db, approved_firm, valid_bank_payment, ledger_post_to):
         """Test successful credit purchase with bank transfer"""
         firm_id = str(approved_firm.id)
         amount = 100
         
         mock_db.get.return_value = approved_firm
-        mock_db.add = MagicMock()
         mock_db.commit = AsyncMock()
-        mock_db.refresh = AsyncMock()
+        service.ledger.post = ledger_post_to(approved_firm)
         
         with patch.object(service, '_process_payment') as mock_payment:
             mock_payment.return_value = {
@@ -172,7 +170,7 @@ class TestCreditService:
                 await service.purchase_credits(firm_id, amount, valid_card_payment)
     
     @pytest.mark.asyncio
-    async def test_deduct_credits_success(self, service, mock_db, approved_firm):
+    async def test_deduct_credits_success(self, service, mock_db, approved_firm, ledger_post_to):
         """Test successful credit deduction"""
         firm_id = str(approved_firm.id)
         amount = 30
@@ -180,9 +178,8 @@ class TestCreditService:
         reference_id = "product_123"
         
         mock_db.get.return_value = approved_firm
-        mock_db.add = MagicMock()
         mock_db.commit = AsyncMock()
-        mock_db.refresh = AsyncMock()
+        service.ledger.post = ledger_post_to(approved_firm)
         
         result = await service.deduct_credits(firm_id, amount, description, reference_id)
         
@@ -195,30 +192,30 @@ class TestCreditService:
         # Verify firm balance was updated
         assert approved_firm.credit_balance == 70
         
-        # Verify transaction was created
-        mock_db.add.assert_called_once()
+        # Verify the deduction was posted
+        assert service.ledger.post.call_args.kwargs["amount"] == -amount
         mock_db.commit.assert_called_once()
     
     @pytest.mark.asyncio
-    async def test_deduct_credits_insufficient_balance(self, service, mock_db, approved_firm):
+    async def test_deduct_credits_insufficient_balance(self, service, mock_db, approved_firm, ledger_post_to):
         """Test credit deduction with insufficient balance"""
         firm_id = str(approved_firm.id)
         amount = 150  # More than available balance (100)
         description = "Expensive product"
         
-        mock_db.get.return_value = approved_firm
+        service.ledger.post = ledger_post_to(approved_firm)
         
         with pytest.raises(InsufficientCreditsError, match="Insufficient credits"):
             await service.deduct_credits(firm_id, amount, description)
     
     @pytest.mark.asyncio
-    async def test_deduct_credits_firm_not_found(self, service, mock_db):
+    async def test_deduct_credits_firm_not_found(self, service, mock_db, ledger_post_to):
         """Test credit deduction with non-existent firm"""
         firm_id = str(uuid4())
         amount = 30
         description = "Test deduction"
         
-        mock_db.get.return_value = None
+        service.ledger.post = ledger_post_to(None)
         
         with pytest.raises(ValueError, match="Security firm not found"):
             await service.deduct_credits(firm_id, amount, description)
@@ -460,15 +457,14 @@ class TestCreditServiceIntegration:
         return firm
     
     @pytest.mark.asyncio
-    async def test_purchase_and_deduct_credits_workflow(self, service, mock_db, firm_with_credits):
+    async def test_purchase_and_deduct_credits_workflow(self, service, mock_db, firm_with_credits, ledger_post_to):
         """Test complete workflow of purchasing and then deducting credits"""
         firm_id = str(firm_with_credits.id)
         
         # Setup mock database
         mock_db.get.return_value = firm_with_credits
-        mock_db.add = MagicMock()
         mock_db.commit = AsyncMock()
-        mock_db.refresh = AsyncMock()
+        service.ledger.post = ledger_post_to(firm_with_credits)
         
         # Mock successful payment
         with patch.object(service, '_process_payment') as mock_payment:
@@ -503,14 +499,13 @@ class TestCreditServiceIntegration:
             assert final_balance == 250
     
     @pytest.mark.asyncio
-    async def test_multiple_deductions_until_insufficient(self, service, mock_db, firm_with_credits):
+    async def test_multiple_deductions_until_insufficient(self, service, mock_db, firm_with_credits, ledger_post_to):
         """Test multiple deductions until insufficient credits"""
         firm_id = str(firm_with_credits.id)
         
         mock_db.get.return_value = firm_with_credits
-        mock_db.add = MagicMock()
         mock_db.commit = AsyncMock()
-        mock_db.refresh = AsyncMock()
+        service.ledger.post = ledger_post_to(firm_with_credits)
         
         # First deduction - should succeed
         result1 = await service.deduct_credits(firm_id, 100, "First product")
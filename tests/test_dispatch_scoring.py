@@ -0,0 +1,170 @@
+"""
+Unit tests for dispatch distance and ETA scoring
+"""
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock, patch
+from uuid import uuid4
+
+import numpy as np
+import pytest
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+
+from app.models.emergency import PanicRequest
+from app.models.emergency_provider import EmergencyProvider, ProviderStatus, ProviderType
+from app.services.dispatch_scoring import DispatchScorer, SpeedProfile, haversine_km
+from app.services.emergency_provider import EmergencyProviderService
+
+JOHANNESBURG = (-26.2041, 28.0473)
+PRETORIA = (-25.7479, 28.2293)
+NOON = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def profile(*samples):
+    """Profile from (region, hour, km/h, arrivals) samples of one hour of travel each"""
+    return SpeedProfile.from_samples(
+        (region, hour, speed * arrivals, float(arrivals), arrivals)
+        for region, hour, speed, arrivals in samples
+    )
+
+
+def provider(latitude, longitude, province=None, coverage_radius_km=50.0):
+    return EmergencyProvider(
+        id=uuid4(),
+        current_latitude=latitude,
+        current_longitude=longitude,
+        province=province,
+        coverage_radius_km=coverage_radius_km,
+        status=ProviderStatus.AVAILABLE
+    )
+
+
+class TestSpeedProfile:
+    """Test learning and looking up speeds"""
+    
+    def test_haversine_distance(self):
+        distance = haversine_km(*JOHANNESBURG, [PRETORIA[0], JOHANNESBURG[0]], [PRETORIA[1], JOHANNESBURG[1]])
+        
+        assert distance[0] == pytest.approx(54.0, abs=1.0)
+        assert distance[1] == 0.0
+    
+    def test_defaults_match_fixed_speeds_without_arrivals(self):
+        service = EmergencyProviderService(db=None)
+        distances = np.array([5.0, 30.0, 120.0])
+        
+        speeds = SpeedProfile().speed_kmh(np.zeros(3, dtype=np.intp), 12, distances)
+        
+        assert list(distances / speeds * 60) == [service.estimate_travel_time(d) for d in distances]
+    
+    def test_region_hour_speed_learned(self):
+        learned = profile(("Gauteng", 12, 30.0, 10), ("Limpopo", 12, 90.0, 10))
+        
+        rows = learned.region_rows(["Gauteng", "Limpopo"])
+        
+        assert list(learned.speed_kmh(rows, 12, np.array([5.0, 5.0]))) == [30.0, 90.0]
+    
+    def test_sparse_cells_fall_back_to_all_regions(self):
+        learned = profile(("Gauteng", 8, 20.0, 2), ("Limpopo", 8, 80.0, 8))
+        
+        rows = learned.region_rows(["Gauteng", "Western Cape", None])
+        speeds = learned.speed_kmh(rows, 8, np.full(3, 5.0))
+        
+        # Gauteng alone is too sparse; all regions average 10 arrivals
+        assert list(speeds) == [pytest.approx(68.0)] * 3
+        assert learned.speed_kmh(rows, 9, np.full(3, 5.0))[0] == 40.0
+    
+    def test_learned_speeds_clamped(self):
+        learned = profile(("Gauteng", 3, 900.0, 10))
+        
+        assert learned.speed_kmh(learned.region_rows(["Gauteng"]), 3, np.array([5.0]))[0] == 130.0
+
+
+class TestDispatchScorer:
+    """Test scoring and ranking candidates"""
+    
+    def test_rank_by_eta_prefers_faster_region(self):
+        learned = profile(("Gauteng", 12, 20.0, 10), ("North West", 12, 100.0, 10))
+        scores = DispatchScorer().score(
+            learned,
+            *JOHANNESBURG,
+            [JOHANNESBURG[0] + 0.05, JOHANNESBURG[0] + 0.1],
+            [JOHANNESBURG[1], JOHANNESBURG[1]],
+            ["Gauteng", "North West"],
+            at=NOON
+        )
+        
+        assert list(scores.ranked(by="distance")) == [0, 1]
+        assert list(scores.ranked(by="eta")) == [1, 0]
+    
+    def test_ineligible_candidates_excluded_and_limited(self):
+        scores = DispatchScorer().score(
+            SpeedProfile(),
+            *JOHANNESBURG,
+            [PRETORIA[0], -26.21, -26.22, -26.23],
+            [PRETORIA[1], 28.0473, 28.0473, 28.0473],
+            [None] * 4,
+            at=NOON,
+            coverage_radius_km=[50.0, 50.0, 1.0, 50.0],
+            max_distance_km=100.0
+        )
+        
+        assert list(scores.eligible) == [False, True, False, True]
+        assert list(scores.ranked(limit=1)) == [1]
+    
+    @pytest.mark.asyncio
+    async def test_profile_learned_once_until_expired(self, monkeypatch):
+        db = Mock()
+        db.execute = AsyncMock(return_value=Mock(all=Mock(return_value=[("Gauteng", 12, 300.0, 10.0, 10)])))
+        scorer = DispatchScorer()
+        
+        first = await scorer.get_profile(db)
+        assert await scorer.get_profile(db) is first
+        assert first.speeds[first.regions["Gauteng"], 12] == 30.0
+        
+        monkeypatch.setattr("app.services.dispatch_scoring.settings.DISPATCH_SPEED_PROFILE_TTL_SECONDS", 0)
+        await scorer.get_profile(db)
+        assert db.execute.await_count == 2
+
+
+class TestProviderServiceScoring:
+    """Test the provider service using dispatch scores"""
+    
+    @pytest.mark.asyncio
+    async def test_find_nearest_providers_ranked(self):
+        near = provider(-26.21, 28.05)
+        far = provider(*PRETORIA, coverage_radius_km=100.0)
+        out_of_range = provider(*PRETORIA)
+        db = Mock()
+        db.execute = AsyncMock(return_value=Mock(scalars=Mock(return_value=Mock(all=Mock(return_value=[far, out_of_range, near])))))
+        
+        with patch("app.services.emergency_provider.dispatch_scorer", DispatchScorer()) as scorer:
+            scorer.get_profile = AsyncMock(return_value=SpeedProfile())
+            results = await EmergencyProviderService(db).find_nearest_providers(
+                *JOHANNESBURG, ProviderType.AMBULANCE
+            )
+        
+        assert [r["provider"] for r in results] == [near, far]
+        assert results[1]["distance_km"] == pytest.approx(54.0, abs=1.0)
+        query = str(db.execute.await_args.args[0])
+        assert "ST_DWithin" in query
+        assert "IS NULL" not in query
+    
+    @pytest.mark.asyncio
+    async def test_assignment_records_distance_and_eta(self):
+        assigned = provider(*PRETORIA)
+        request = PanicRequest(id=uuid4(), location=from_shape(Point(JOHANNESBURG[1], JOHANNESBURG[0]), srid=4326))
+        db = Mock()
+        db.execute = AsyncMock(return_value=Mock(scalar_one_or_none=Mock(return_value=request)))
+        db.commit = AsyncMock()
+        db.refresh = AsyncMock()
+        service = EmergencyProviderService(db)
+        service.get_provider_by_id = AsyncMock(return_value=assigned)
+        
+        with patch("app.services.emergency_provider.dispatch_scorer", DispatchScorer()) as scorer:
+            scorer.get_profile = AsyncMock(return_value=SpeedProfile())
+            assignment = await service.assign_provider_to_request(assigned.id, request.id)
+        
+        assert assignment.distance_km == pytest.approx(54.0, abs=1.0)
+        assert assignment.estimated_duration_minutes == pytest.approx(assignment.distance_km / 80 * 60)
+        assert assignment.estimated_arrival_time > datetime.now(timezone.utc)
+        assert assigned.status == ProviderStatus.BUSY
@@ -0,0 +1,159 @@
+"""
+Unit tests for document delivery
+"""
+import io
+import time
+from datetime import datetime
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.api.v1.firm_applications import build_document_response
+from fastapi.responses import StreamingResponse
+
+from app.services.document_delivery import DocumentDeliveryService, SignedURLCache, content_disposition
+
+
+def client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, "GetObject")
+
+
+def make_document(file_path: str, mime_type: str = "application/pdf"):
+    return Mock(
+        id=uuid4(),
+        document_type="registration_certificate",
+        file_name="certificate.pdf",
+        file_size=1024,
+        file_path=file_path,
+        mime_type=mime_type,
+        uploaded_by=uuid4(),
+        is_verified=False,
+        verified_by=None,
+        verified_at=None,
+        processing_status="ready",
+        processing_error=None,
+        page_count=2,
+        created_at=datetime(2024, 3, 1),
+        updated_at=datetime(2024, 3, 1)
+    )
+
+
+@pytest.fixture
+def s3_client():
+    client = Mock()
+    client.generate_presigned_url.side_effect = lambda operation, Params, ExpiresIn: (
+        f"https://bucket.s3/{Params['Key']}?disposition={Params.get('ResponseContentDisposition')}"
+    )
+    with patch("app.services.document_delivery.get_s3_client", return_value=client):
+        yield client
+
+
+class TestSignedURLCache:
+    """Test presigned URL reuse"""
+    
+    def test_entry_reused_until_refresh_margin(self):
+        cache = SignedURLCache(max_size=10, refresh_margin=60)
+        cache.put(("a", "attachment"), "url-a", time.time() + 3600)
+        cache.put(("b", "attachment"), "url-b", time.time() + 30)
+        
+        assert cache.get(("a", "attachment"))[0] == "url-a"
+        assert cache.get(("b", "attachment")) is None
+        assert len(cache) == 1
+    
+    def test_least_recently_used_evicted(self):
+        cache = SignedURLCache(max_size=2, refresh_margin=0)
+        expires_at = time.time() + 3600
+        cache.put(("a", "attachment"), "url-a", expires_at)
+        cache.put(("b", "attachment"), "url-b", expires_at)
+        cache.get(("a", "attachment"))
+        cache.put(("c", "attachment"), "url-c", expires_at)
+        
+        assert cache.get(("b", "attachment")) is None
+        assert cache.get(("a", "attachment"))[0] == "url-a"
+
+
+class TestDocumentDeliveryService:
+    """Test document links and streaming"""
+    
+    def test_s3_links_signed_once(self, s3_client):
+        service = DocumentDeliveryService()
+        
+        first = service.get_link("firms/1/cert.pdf", "/content", "cert.pdf", "application/pdf")
+        second = service.get_link("firms/1/cert.pdf", "/content", "cert.pdf", "application/pdf")
+        
+        assert first == second
+        assert 'attachment; filename="cert.pdf"' in first.download_url
+        assert "disposition=inline" in first.preview_url
+        assert first.expires_at is not None
+        assert s3_client.generate_presigned_url.call_count == 2
+    
+    def test_no_preview_for_unrenderable_types(self, s3_client):
+        link = DocumentDeliveryService().get_link("firms/1/data.zip", "/content", mime_type="application/zip")
+        
+        assert link.preview_url is None
+    
+    def test_local_files_use_content_route(self, s3_client):
+        link = DocumentDeliveryService().get_link("uploads/firm/logo.png", "/content", mime_type="image/png")
+        
+        assert link.download_url == "/content"
+        assert link.preview_url == "/content?inline=true"
+        assert link.expires_at is None
+        s3_client.generate_presigned_url.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_stream_reads_in_chunks(self, s3_client):
+        body = Mock(wraps=io.BytesIO(b"x" * 10))
+        s3_client.get_object.return_value = {"Body": body}
+        
+        with patch("app.services.document_delivery.settings.DOCUMENT_STREAM_CHUNK_BYTES", 4):
+            chunks = [chunk async for chunk in await DocumentDeliveryService().stream("firms/1/cert.pdf")]
+        
+        assert chunks == [b"xxxx", b"xxxx", b"xx"]
+        body.close.assert_called_once()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("code,error", [("NoSuchKey", FileNotFoundError), ("AccessDenied", PermissionError)])
+    async def test_stream_maps_storage_errors(self, s3_client, code, error):
+        s3_client.get_object.side_effect = client_error(code)
+        
+        with pytest.raises(error):
+            await DocumentDeliveryService().stream("firms/1/cert.pdf")
+    
+    def test_content_disposition_quotes_non_latin_names(self):
+        disposition = content_disposition('报告 "final".pdf')
+        
+        assert disposition == (
+            'attachment; filename="__ _final_.pdf"; '
+            "filename*=UTF-8''%E6%8A%A5%E5%91%8A%20%22final%22.pdf"
+        )
+        # Starlette encodes headers as latin-1
+        response = StreamingResponse(iter([]), headers={"Content-Disposition": disposition})
+        assert response.headers["content-disposition"] == disposition
+    
+    def test_content_disposition_inline(self):
+        assert content_disposition("cert.pdf", inline=True) == "inline"
+
+
+class TestDocumentResponse:
+    """Test application document responses carry links, not content"""
+    
+    def test_document_response_has_links(self, s3_client):
+        document = make_document("firms/1/cert.pdf")
+        
+        response = build_document_response("app-1", document)
+        
+        assert response.download_url.startswith("https://bucket.s3/firms/1/cert.pdf")
+        assert response.preview_url is not None
+        assert response.url_expires_at is not None
+        assert "content_base64" not in response.model_dump()
+    
+    def test_link_failure_leaves_links_empty(self):
+        document = make_document("firms/2/unsigned.pdf")
+        
+        with patch("app.services.document_delivery.get_s3_client", side_effect=ValueError("not configured")):
+            response = build_document_response("app-1", document)
+        
+        assert response.download_url is None
+        assert response.id == str(document.id)
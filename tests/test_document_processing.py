@@ -0,0 +1,164 @@
+"""
+Unit tests for background document processing
+"""
+import hashlib
+from unittest.mock import AsyncMock, Mock, patch
+from uuid import uuid4
+
+import pytest
+
+from app.models.security_firm import FirmDocument
+from app.services.document_processing import (
+    DocumentInspector,
+    DocumentProcessingService,
+    ProcessingStatus,
+    enqueue_document_processing,
+    normalize_mime_type
+)
+from app.services.storage import LocalStorageBackend
+
+PDF = (
+    b"%PDF-1.4\n"
+    b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+    b"2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >> endobj\n"
+    b"3 0 obj << /Type /Page /Parent 2 0 R >> endobj\n"
+    b"4 0 obj << /Type/Page /Parent 2 0 R >> endobj\n"
+    b"%%EOF\n"
+)
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+def inspect(content: bytes, chunk_size: int) -> DocumentInspector:
+    inspector = DocumentInspector()
+    for i in range(0, len(content), chunk_size):
+        inspector.feed(content[i:i + chunk_size])
+    return inspector
+
+
+def make_document(path: str, mime_type: str, checksum: str = None) -> FirmDocument:
+    return FirmDocument(
+        id=uuid4(),
+        firm_id=uuid4(),
+        document_type="registration_certificate",
+        file_name="certificate",
+        file_path=path,
+        file_size=0,
+        mime_type=mime_type,
+        checksum_sha256=checksum,
+        uploaded_by=uuid4(),
+        processing_status=ProcessingStatus.PENDING
+    )
+
+
+def make_db(document: FirmDocument, duplicate_id=None):
+    db = Mock()
+    db.get = AsyncMock(return_value=document)
+    db.commit = AsyncMock()
+    db.execute = AsyncMock(return_value=Mock(scalar_one_or_none=Mock(return_value=duplicate_id)))
+    return db
+
+
+def stored_file(tmp_path, content: bytes) -> str:
+    path = tmp_path / "document.bin"
+    path.write_bytes(content)
+    return str(path)
+
+
+class TestDocumentInspector:
+    """Test incremental content inspection"""
+    
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+    def test_pdf_pages_counted_across_chunks(self, chunk_size):
+        inspector = inspect(PDF, chunk_size)
+        
+        assert inspector.mime_type == "application/pdf"
+        assert inspector.page_count() == 2
+        assert inspector.size == len(PDF)
+        assert inspector.checksum_sha256 == hashlib.sha256(PDF).hexdigest()
+    
+    def test_page_object_at_end_of_content(self):
+        assert inspect(b"%PDF-1.4 /Type /Page", 5).page_count() == 1
+    
+    def test_images(self):
+        assert inspect(PNG, 4).mime_type == "image/png"
+        assert inspect(PNG, 4).page_count() == 1
+        assert inspect(b"\xff\xd8\xff\xe0" + b"\x00" * 16, 8).mime_type == "image/jpeg"
+    
+    def test_unknown_content(self):
+        inspector = inspect(b"MZ\x90\x00 not a document", 8)
+        
+        assert inspector.mime_type is None
+        assert inspector.page_count() is None
+    
+    def test_normalize_mime_type(self):
+        assert normalize_mime_type("image/jpg") == "image/jpeg"
+        assert normalize_mime_type("Application/PDF; charset=binary") == "application/pdf"
+
+
+class TestDocumentProcessingService:
+    """Test processing stored documents"""
+    
+    @pytest.fixture(autouse=True)
+    def local_storage(self):
+        with patch("app.services.document_processing.storage_for", return_value=LocalStorageBackend()):
+            yield
+    
+    @pytest.mark.asyncio
+    async def test_valid_document_ready(self, tmp_path):
+        duplicate_id = uuid4()
+        document = make_document(stored_file(tmp_path, PDF), "application/pdf", hashlib.sha256(PDF).hexdigest())
+        db = make_db(document, duplicate_id)
+        
+        await DocumentProcessingService(db).process(str(document.id))
+        
+        assert document.processing_status == ProcessingStatus.READY
+        assert document.detected_mime_type == "application/pdf"
+        assert document.page_count == 2
+        assert document.duplicate_of_id == duplicate_id
+        assert document.processed_at is not None
+    
+    @pytest.mark.asyncio
+    async def test_content_not_matching_declared_type_rejected(self, tmp_path):
+        document = make_document(stored_file(tmp_path, PNG), "application/pdf")
+        
+        await DocumentProcessingService(make_db(document)).process(str(document.id))
+        
+        assert document.processing_status == ProcessingStatus.REJECTED
+        assert "image/png" in document.processing_error
+        assert document.checksum_sha256 == hashlib.sha256(PNG).hexdigest()
+    
+    @pytest.mark.asyncio
+    async def test_checksum_mismatch_rejected(self, tmp_path):
+        document = make_document(stored_file(tmp_path, PDF), "application/pdf", "0" * 64)
+        
+        await DocumentProcessingService(make_db(document)).process(str(document.id))
+        
+        assert document.processing_status == ProcessingStatus.REJECTED
+        assert "checksum" in document.processing_error
+    
+    @pytest.mark.asyncio
+    async def test_processed_documents_skipped(self, tmp_path):
+        document = make_document(stored_file(tmp_path, PDF), "application/pdf")
+        document.processing_status = ProcessingStatus.READY
+        db = make_db(document)
+        
+        await DocumentProcessingService(db).process(str(document.id))
+        
+        db.commit.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_unreadable_file_marked_failed(self, tmp_path):
+        document = make_document(str(tmp_path / "missing.pdf"), "application/pdf")
+        
+        with pytest.raises(FileNotFoundError):
+            await DocumentProcessingService(make_db(document)).process(str(document.id))
+        
+        assert document.processing_status == ProcessingStatus.FAILED
+
+
+class TestEnqueue:
+    """Test queueing documents for processing"""
+    
+    def test_broker_failure_does_not_raise(self):
+        with patch("app.tasks.documents.process_document.delay", side_effect=ConnectionError("broker down")):
+            assert enqueue_document_processing(uuid4()) is False
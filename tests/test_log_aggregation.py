@@ -18,6 +18,7 @@ from app.services.log_aggregation import (
     LogSearchFilter
 )
 from app.core.logging import LogLevel, SecurityEventType, BusinessEventType
+from app.core.log_index import write_segment_index
 
 
 @pytest.fixture
@@ -257,6 +258,42 @@ class TestLogAggregationService:
         assert result.total_count == 3
         assert len(result.entries) == 3
     
+    @pytest.mark.asyncio
+    async def test_search_indexed_segments(self, log_aggregation_service, sample_log_entries, temp_log_dir):
+        """Test that indexed segments return the same matches as a full scan"""
+        log_file = temp_log_dir / "application.log.1"
+        with open(log_file, 'w') as f:
+            for entry in sample_log_entries:
+                f.write(json.dumps(entry) + '\n')
+        write_segment_index(log_file)
+        
+        result = await log_aggregation_service.search_logs(LogSearchQuery(user_id="user-789", limit=10))
+        assert result.total_count == 1
+        assert result.entries[0].message == "Subscription purchased"
+        
+        result = await log_aggregation_service.search_logs(LogSearchQuery(level=LogLevel.ERROR, limit=10))
+        assert result.total_count == 0  # errors are routed to errors.log
+        
+        result = await log_aggregation_service.search_logs(LogSearchQuery(request_id="req-123", limit=10))
+        assert result.total_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_search_skips_non_matching_indexed_segment(self, log_aggregation_service, sample_log_entries, temp_log_dir):
+        """Test that a segment whose index rules out the query is never opened"""
+        log_file = temp_log_dir / "application.log.1"
+        with open(log_file, 'w') as f:
+            for entry in sample_log_entries:
+                f.write(json.dumps(entry) + '\n')
+        write_segment_index(log_file)
+        
+        with patch('app.services.log_aggregation.iter_segment_lines') as mock_iter:
+            result = await log_aggregation_service.search_logs(
+                LogSearchQuery(request_id="req-missing", limit=10)
+            )
+        
+        assert result.total_count == 0
+        mock_iter.assert_not_called()
+    
     def test_parse_log_entry(self, log_aggregation_service, sample_log_entries):
         """Test log entry parsing"""
         log_data = sample_log_entries[0]
@@ -383,6 +420,83 @@ class TestLogAggregationService:
         with pytest.raises(ValueError, match="Unsupported export format"):
             await log_aggregation_service.export_logs(query, "xml")
     
+    @pytest.mark.asyncio
+    async def test_search_merges_files_in_order(self, log_aggregation_service, sample_log_entries, temp_log_dir):
+        """Test entries from several files are merged by timestamp"""
+        with open(temp_log_dir / "application.log", 'w') as f:
+            f.write(json.dumps(sample_log_entries[0]) + '\n')
+            f.write(json.dumps(sample_log_entries[2]) + '\n')
+        with open(temp_log_dir / "business.log", 'w') as f:
+            f.write(json.dumps(sample_log_entries[1]) + '\n')
+        
+        result = await log_aggregation_service.search_logs(LogSearchQuery(limit=2, sort_order="desc"))
+        assert result.total_count == 3
+        assert [e.message for e in result.entries] == [
+            "Subscription purchased", "Failed to process panic request"
+        ]
+        
+        result = await log_aggregation_service.search_logs(LogSearchQuery(limit=10, sort_order="asc"))
+        assert [e.message for e in result.entries] == [
+            "User login successful", "Failed to process panic request", "Subscription purchased"
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_stream_logs_stops_at_limit(self, log_aggregation_service, temp_log_dir):
+        """Test streaming stops reading once the page is filled"""
+        now = datetime.now(timezone.utc)
+        with open(temp_log_dir / "application.log", 'w') as f:
+            for i in range(100):
+                f.write(json.dumps({
+                    "timestamp": (now + timedelta(seconds=i)).isoformat(),
+                    "level": "info",
+                    "message": f"entry {i}"
+                }) + '\n')
+        
+        parsed = []
+        original_parse = log_aggregation_service._parse_log_entry
+        
+        def counting_parse(log_data):
+            parsed.append(log_data)
+            return original_parse(log_data)
+        
+        log_aggregation_service._parse_log_entry = counting_parse
+        
+        batches = [
+            batch async for batch in log_aggregation_service.stream_logs(
+                LogSearchQuery(limit=5, offset=2, sort_order="asc"), batch_size=2
+            )
+        ]
+        
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert [e.message for batch in batches for e in batch] == [f"entry {i}" for i in range(2, 7)]
+        assert len(parsed) < 100
+    
+    @pytest.mark.asyncio
+    async def test_stream_export_formats(self, log_aggregation_service, sample_log_entries, temp_log_dir):
+        """Test streamed NDJSON, JSON and CSV exports"""
+        with open(temp_log_dir / "application.log", 'w') as f:
+            for entry in sample_log_entries:
+                f.write(json.dumps(entry) + '\n')
+        
+        query = LogSearchQuery(limit=10)
+        
+        ndjson = "".join([chunk async for chunk in log_aggregation_service.stream_export(query, "ndjson")])
+        records = [json.loads(line) for line in ndjson.splitlines()]
+        assert len(records) == 3
+        assert records[0]["subscription_id"] == "sub-123"
+        
+        exported = "".join([chunk async for chunk in log_aggregation_service.stream_export(query, "json")])
+        assert len(json.loads(exported)) == 3
+        
+        csv_data = "".join([chunk async for chunk in log_aggregation_service.stream_export(query, "csv")])
+        lines = csv_data.strip().splitlines()
+        assert lines[0].startswith("timestamp,level,logger")
+        assert len(lines) == 4
+        
+        with pytest.raises(ValueError):
+            async for _ in log_aggregation_service.stream_export(query, "xml"):
+                pass
+    
     def test_get_relevant_log_files_security(self, log_aggregation_service, temp_log_dir):
         """Test getting relevant log files for security events"""
         # Create various log files
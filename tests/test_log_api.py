@@ -17,6 +17,12 @@ from app.core.logging import LogLevel, SecurityEventType
 client = TestClient(app)
 
 
+async def stream_chunks(*chunks):
+    """Async generator standing in for a streamed export"""
+    for chunk in chunks:
+        yield chunk
+
+
 @pytest.fixture
 def mock_current_user():
     """Mock current user with admin role"""
@@ -275,7 +281,7 @@ class TestLogExportAPI:
     
     @patch('app.api.v1.logs.get_current_user')
     @patch('app.api.v1.logs.require_admin_role')
-    @patch('app.api.v1.logs.log_aggregation_service.export_logs')
+    @patch('app.api.v1.logs.log_aggregation_service.stream_export')
     def test_export_logs_json(self, mock_export, mock_admin, mock_user, mock_current_user):
         """Test log export in JSON format"""
         mock_user.return_value = mock_current_user
@@ -290,7 +296,7 @@ class TestLogExportAPI:
                 "user_id": "user-123"
             }
         ])
-        mock_export.return_value = export_data
+        mock_export.side_effect = lambda query, format: stream_chunks(export_data)
         
         # Make request
         response = client.post(
@@ -312,7 +318,7 @@ class TestLogExportAPI:
     
     @patch('app.api.v1.logs.get_current_user')
     @patch('app.api.v1.logs.require_admin_role')
-    @patch('app.api.v1.logs.log_aggregation_service.export_logs')
+    @patch('app.api.v1.logs.log_aggregation_service.stream_export')
     def test_export_logs_csv(self, mock_export, mock_admin, mock_user, mock_current_user):
         """Test log export in CSV format"""
         mock_user.return_value = mock_current_user
@@ -320,7 +326,7 @@ class TestLogExportAPI:
         
         # Mock CSV export result
         csv_data = "timestamp,level,message,user_id\n2024-01-01T12:00:00Z,info,Test message,user-123"
-        mock_export.return_value = csv_data
+        mock_export.side_effect = lambda query, format: stream_chunks(csv_data)
         
         # Make request
         response = client.post(
@@ -0,0 +1,193 @@
+"""
+Unit tests for log segment indexes
+"""
+import pytest
+import json
+import gzip
+import tempfile
+import shutil
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from app.core.log_index import (
+    BloomFilter,
+    SegmentIndex,
+    build_segment_index,
+    index_path_for,
+    iter_segment_lines,
+    load_segment_index,
+    relocate_segment_index,
+    shift_segment_indexes,
+    write_segment_index
+)
+from app.core.logging import BatchedRotatingFileHandler
+
+
+@pytest.fixture
+def temp_log_dir():
+    """Fixture for temporary log directory"""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir
+    if temp_dir.exists():
+        shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def base_time():
+    return datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def write_entries(path: Path, base_time: datetime, count: int, opener=open):
+    """Write one entry per minute, alternating levels and users"""
+    with opener(path, 'wt') as f:
+        for i in range(count):
+            f.write(json.dumps({
+                "timestamp": (base_time + timedelta(minutes=i)).isoformat(),
+                "level": "error" if i % 10 == 0 else "info",
+                "message": f"entry {i}",
+                "request_id": f"req-{i}",
+                "user_id": f"user-{i % 5}",
+                "client_ip": "10.0.0.1",
+                "event_type": "login_success" if i < 10 else None
+            }) + '\n')
+
+
+class TestBloomFilter:
+    """Test bloom filter behaviour"""
+    
+    def test_membership(self):
+        """Test added values are always reported present"""
+        bloom = BloomFilter.for_capacity(100, 0.01)
+        for i in range(100):
+            bloom.add(f"value-{i}")
+        
+        assert all(f"value-{i}" in bloom for i in range(100))
+        false_positives = sum(f"other-{i}" in bloom for i in range(1000))
+        assert false_positives < 50
+    
+    def test_round_trip(self):
+        """Test serialisation preserves contents"""
+        bloom = BloomFilter.for_capacity(10, 0.01)
+        bloom.add("req-1")
+        
+        restored = BloomFilter.from_dict(json.loads(json.dumps(bloom.to_dict())))
+        assert "req-1" in restored
+        assert restored.size_bits == bloom.size_bits
+
+
+class TestSegmentIndex:
+    """Test building, loading and querying segment indexes"""
+    
+    def test_build_segment_index(self, temp_log_dir, base_time):
+        """Test blocks summarise their lines"""
+        segment = temp_log_dir / "application.log.1"
+        write_entries(segment, base_time, 25)
+        
+        index = build_segment_index(segment, block_lines=10)
+        
+        assert index.entries == 25
+        assert [block.lines for block in index.blocks] == [10, 10, 5]
+        assert index.min_ts == base_time.timestamp()
+        assert index.max_ts == (base_time + timedelta(minutes=24)).timestamp()
+        assert index.blocks[0].event_types == ["login_success"]
+        assert index.blocks[1].event_types == []
+    
+    def test_matching_blocks(self, temp_log_dir, base_time):
+        """Test filters prune blocks"""
+        segment = temp_log_dir / "application.log.1"
+        write_entries(segment, base_time, 25)
+        index = build_segment_index(segment, block_lines=10)
+        
+        assert len(index.matching_blocks(request_id="req-15")) >= 1
+        assert 1 in [index.blocks.index(b) for b in index.matching_blocks(request_id="req-15")]
+        assert index.matching_blocks(event_type="login_success") == [index.blocks[0]]
+        assert index.matching_blocks(level="critical") == []
+        assert index.matching_blocks(start_time=base_time + timedelta(hours=1)) == []
+        assert index.matching_blocks(end_time=base_time + timedelta(minutes=5)) == [index.blocks[0]]
+        # Naive datetimes are treated as UTC
+        assert index.matching_blocks(start_time=datetime(2024, 1, 1, 0, 20)) == [index.blocks[2]]
+    
+    def test_seek_to_blocks(self, temp_log_dir, base_time):
+        """Test only the selected blocks are read"""
+        segment = temp_log_dir / "application.log.1"
+        write_entries(segment, base_time, 25)
+        index = build_segment_index(segment, block_lines=10)
+        
+        lines = list(iter_segment_lines(segment, [index.blocks[2]]))
+        assert [json.loads(line)["message"] for line in lines] == [f"entry {i}" for i in range(20, 25)]
+    
+    def test_load_rejects_stale_index(self, temp_log_dir, base_time):
+        """Test an index is ignored once its segment changes"""
+        segment = temp_log_dir / "application.log.1"
+        write_entries(segment, base_time, 5)
+        write_segment_index(segment)
+        
+        assert isinstance(load_segment_index(segment), SegmentIndex)
+        
+        with open(segment, 'a') as f:
+            f.write('{"message": "late"}\n')
+        
+        assert load_segment_index(segment) is None
+    
+    def test_relocate_to_compressed_segment(self, temp_log_dir, base_time):
+        """Test compressing a segment keeps its index usable"""
+        segment = temp_log_dir / "application.log.1"
+        write_entries(segment, base_time, 25)
+        write_segment_index(segment)
+        
+        compressed = temp_log_dir / "application.log.1.gz"
+        with open(segment, 'rb') as f_in, gzip.open(compressed, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        relocate_segment_index(segment, compressed)
+        segment.unlink()
+        
+        index = load_segment_index(compressed)
+        assert index is not None
+        assert not index_path_for(segment).exists()
+        
+        blocks = index.matching_blocks(request_id="req-24")
+        messages = [json.loads(line)["message"] for line in iter_segment_lines(compressed, blocks)]
+        assert "entry 24" in messages
+    
+    def test_shift_segment_indexes(self, temp_log_dir, base_time):
+        """Test sidecars follow RotatingFileHandler's renames"""
+        base = temp_log_dir / "application.log"
+        for i in (1, 2):
+            segment = temp_log_dir / f"application.log.{i}"
+            write_entries(segment, base_time, i)
+            write_segment_index(segment)
+        
+        shift_segment_indexes(str(base), backup_count=3)
+        
+        assert not index_path_for(temp_log_dir / "application.log.1").exists()
+        with open(index_path_for(temp_log_dir / "application.log.2")) as f:
+            assert json.load(f)["entries"] == 1
+        with open(index_path_for(temp_log_dir / "application.log.3")) as f:
+            assert json.load(f)["entries"] == 2
+
+
+class TestRolloverIndexing:
+    """Test indexes are written when log files rotate"""
+    
+    def test_rollover_writes_index(self, temp_log_dir):
+        """Test the rotated segment gets a valid sidecar index"""
+        log_file = temp_log_dir / "application.log"
+        handler = BatchedRotatingFileHandler(str(log_file), maxBytes=400, backupCount=2)
+        try:
+            lines = [
+                json.dumps({
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "level": "info",
+                    "request_id": f"req-{i}"
+                })
+                for i in range(10)
+            ]
+            handler.write_batch(lines)
+        finally:
+            handler.close()
+        
+        index = load_segment_index(temp_log_dir / "application.log.1")
+        assert index is not None
+        assert index.entries > 0
+        # Sidecars live outside the log globs used by search and retention
+        assert not list(temp_log_dir.glob("application.log*.json"))
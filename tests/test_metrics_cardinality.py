@@ -0,0 +1,85 @@
+"""
+Unit tests for bounded-cardinality metrics
+"""
+from prometheus_client import CollectorRegistry, Counter
+
+from app.core.metrics import (
+    CardinalityCollector,
+    LabelBudget,
+    MetricsCollector,
+    metrics_label_overflow_total
+)
+
+
+def overflow_count(metric: str, label: str) -> float:
+    return metrics_label_overflow_total.labels(metric=metric, label=label)._value.get()
+
+
+class TestLabelBudget:
+    """Test label value limits"""
+    
+    def test_values_within_limit_kept(self):
+        budget = LabelBudget("test_metric", "firm_id", limit=2, overflow_buckets=4)
+        
+        assert budget.resolve("a") == "a"
+        assert budget.resolve("b") == "b"
+        assert budget.resolve("a") == "a"
+        assert len(budget) == 2
+    
+    def test_overflow_values_share_stable_buckets(self):
+        budget = LabelBudget("test_overflow_metric", "firm_id", limit=1, overflow_buckets=4)
+        budget.resolve("kept")
+        before = overflow_count("test_overflow_metric", "firm_id")
+        
+        buckets = {budget.resolve(f"firm-{i}") for i in range(100)}
+        
+        assert buckets <= {f"overflow_{i}" for i in range(4)}
+        assert budget.resolve("firm-7") == budget.resolve("firm-7")
+        assert len(budget) == 1
+        assert overflow_count("test_overflow_metric", "firm_id") - before == 102
+    
+    def test_overflow_without_buckets_is_dropped(self):
+        budget = LabelBudget("test_gauge_metric", "zone_id", limit=1)
+        budget.resolve("kept")
+        
+        assert budget.resolve("other") is None
+
+
+class TestCardinalityCollector:
+    """Test series count reporting"""
+    
+    def test_series_counts(self):
+        registry = CollectorRegistry()
+        counter = Counter("widgets_total", "Widgets", ["kind"], registry=registry)
+        Counter("unlabelled_total", "Unlabelled", registry=registry)
+        for kind in ("a", "b", "c"):
+            counter.labels(kind=kind).inc()
+        
+        collector = CardinalityCollector(registry)
+        
+        assert collector.series_counts() == {"widgets": 3}
+        family = next(collector.collect())
+        assert [(sample.labels, sample.value) for sample in family.samples] == [({"metric": "widgets"}, 3)]
+
+
+class TestBoundedCollector:
+    """Test MetricsCollector keeps IDs out of labels"""
+    
+    def test_prank_flags_have_no_user_series(self):
+        collector = MetricsCollector()
+        
+        for i in range(5):
+            collector.record_prank_flag(f"user-{i}", "firm-cardinality")
+        
+        metrics = collector.get_metrics()
+        assert 'prank_flags_total{firm_id="firm-cardinality"} 5.0' in metrics
+        assert "user-0" not in metrics
+    
+    def test_series_counts_reported(self):
+        collector = MetricsCollector()
+        collector.record_credit_transaction("purchase", "firm-series")
+        
+        counts = collector.get_series_counts()
+        
+        assert counts["credit_transactions"] >= 1
+        assert "metrics_series" in collector.get_metrics()
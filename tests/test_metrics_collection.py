@@ -34,6 +34,7 @@ class TestMetricsCollector:
         metrics = self.collector.get_metrics()
         assert "http_requests_total" in metrics
         assert "http_request_duration_seconds" in metrics
+        assert 'http_request_duration_seconds_bucket{endpoint="/api/v1/users",le="0.02",method="GET"}' in metrics
         assert 'method="GET"' in metrics
         assert 'endpoint="/api/v1/users"' in metrics
         assert 'status_code="200"' in metrics
@@ -101,8 +102,11 @@ class TestMetricsCollector:
         metrics = self.collector.get_metrics()
         assert "prank_flags_total" in metrics
         assert "user_fines_total" in metrics
-        assert 'user_id="user123"' in metrics
         assert 'firm_id="firm456"' in metrics
+        
+        # User IDs are exemplars rather than labels
+        assert 'user_id="user123"' not in metrics
+        assert '# {user_id="user123"}' in self.collector.get_metrics(openmetrics=True)
     
     def test_system_health_metrics(self):
         """Test system health metrics"""
@@ -302,6 +306,30 @@ class TestMetricsMiddleware:
             call_args = mock_record.call_args
             assert call_args[1]['status_code'] == 500
     
+    @pytest.mark.asyncio
+    async def test_dispatch_prefers_route_template(self):
+        """Test the matched route's template is used as the endpoint label"""
+        request = Mock(spec=Request)
+        request.method = "GET"
+        request.url.path = "/api/v1/emergency/requests/123e4567-e89b-12d3-a456-426614174000/status"
+        request.scope = {"route": Mock(path_format="/api/v1/emergency/requests/{request_id}/status")}
+        request.headers = {}
+        
+        response = Mock(spec=Response)
+        response.status_code = 200
+        response.headers = {"content-length": "42"}
+        
+        async def mock_call_next(req):
+            return response
+        
+        with patch.object(metrics_collector, 'record_http_request') as mock_record:
+            await self.middleware.dispatch(request, mock_call_next)
+        
+        call_args = mock_record.call_args[1]
+        assert call_args['endpoint'] == "/api/v1/emergency/requests/{request_id}/status"
+        assert call_args['request_size'] is None
+        assert call_args['response_size'] == 42
+    
     def test_get_endpoint_pattern(self):
         """Test endpoint pattern extraction"""
         # Test API endpoint with ID
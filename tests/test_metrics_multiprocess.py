@@ -0,0 +1,107 @@
+"""
+Unit tests for multiprocess metrics exposition and dead worker cleanup
+"""
+import os
+import subprocess
+
+import pytest
+from prometheus_client import generate_latest
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+
+from app.core import metrics_multiprocess
+from app.core.metrics import MetricsCollector
+
+
+REQUESTS_KEY = mmap_key("requests", "requests_total", ["kind"], ["panic"], "Requests")
+CONNECTIONS_KEY = mmap_key("connections", "connections", [], [], "Connections")
+UPDATED_KEY = mmap_key("updated", "updated", [], [], "Updated")
+
+
+@pytest.fixture
+def multiproc_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_multiprocess, "MULTIPROC_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def write_values(directory, name, *entries):
+    values = MmapedDict(os.path.join(str(directory), name))
+    for key, value, timestamp in entries:
+        values.write_value(key, value, timestamp)
+    values.close()
+
+
+def read_values(directory, name):
+    return {
+        key: (value, timestamp)
+        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(os.path.join(str(directory), name))
+    }
+
+
+class TestDeadWorkerCleanup:
+    """Test folding dead workers' files into archives"""
+    
+    def test_counters_folded_into_archive(self, multiproc_dir, dead_pid):
+        write_values(multiproc_dir, "counter_archive.db", (REQUESTS_KEY, 2.0, 0.0))
+        write_values(multiproc_dir, f"counter_{dead_pid}.db", (REQUESTS_KEY, 3.0, 0.0))
+        
+        assert metrics_multiprocess.cleanup_dead_workers() == 1
+        
+        assert not (multiproc_dir / f"counter_{dead_pid}.db").exists()
+        assert read_values(multiproc_dir, "counter_archive.db")[REQUESTS_KEY][0] == 5.0
+        
+        exposition = generate_latest(metrics_multiprocess.build_exposition_registry()).decode()
+        assert 'requests_total{kind="panic"} 5.0' in exposition
+    
+    def test_live_gauges_removed_and_most_recent_kept(self, multiproc_dir, dead_pid):
+        write_values(multiproc_dir, f"gauge_livesum_{dead_pid}.db", (CONNECTIONS_KEY, 4.0, 0.0))
+        write_values(multiproc_dir, "gauge_mostrecent_archive.db", (UPDATED_KEY, 1.0, 200.0))
+        write_values(multiproc_dir, f"gauge_mostrecent_{dead_pid}.db", (UPDATED_KEY, 7.0, 100.0))
+        
+        metrics_multiprocess.cleanup_dead_workers()
+        
+        assert not (multiproc_dir / f"gauge_livesum_{dead_pid}.db").exists()
+        assert not (multiproc_dir / f"gauge_mostrecent_{dead_pid}.db").exists()
+        assert read_values(multiproc_dir, "gauge_mostrecent_archive.db")[UPDATED_KEY] == (1.0, 200.0)
+    
+    def test_running_workers_untouched(self, multiproc_dir):
+        write_values(multiproc_dir, f"counter_{os.getpid()}.db", (REQUESTS_KEY, 3.0, 0.0))
+        
+        assert metrics_multiprocess.cleanup_dead_workers() == 0
+        assert (multiproc_dir / f"counter_{os.getpid()}.db").exists()
+        assert not (multiproc_dir / "counter_archive.db").exists()
+    
+    def test_single_process_mode_is_a_no_op(self, monkeypatch):
+        monkeypatch.setattr(metrics_multiprocess, "MULTIPROC_DIR", None)
+        
+        assert metrics_multiprocess.cleanup_dead_workers() == 0
+        metrics_multiprocess.mark_worker_dead()
+
+
+class TestExpositionCache:
+    """Test reuse of generated exposition output"""
+    
+    def test_output_reused_within_interval(self, monkeypatch):
+        monkeypatch.setattr("app.core.metrics.settings.METRICS_EXPOSITION_CACHE_SECONDS", 60.0)
+        collector = MetricsCollector()
+        
+        first = collector.get_metrics()
+        collector.record_notification_sent("cache-test", "success")
+        
+        assert collector.get_metrics() is first
+        assert "cache-test" in collector.get_metrics(openmetrics=True)
+    
+    def test_cache_disabled(self, monkeypatch):
+        monkeypatch.setattr("app.core.metrics.settings.METRICS_EXPOSITION_CACHE_SECONDS", 0)
+        collector = MetricsCollector()
+        
+        collector.get_metrics()
+        collector.record_notification_sent("uncached-test", "success")
+        
+        assert "uncached-test" in collector.get_metrics()
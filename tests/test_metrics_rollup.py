@@ -0,0 +1,184 @@
+"""
+Unit tests for performance rollups
+"""
+import math
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, Mock
+from uuid import uuid4
+
+import pytest
+
+from app.models.metrics import RequestRollupKey
+from app.services.metrics_rollup import (
+    UNKNOWN_ZONE,
+    PerformanceRollupService,
+    bucket_start,
+    histogram_bound,
+    histogram_quantile
+)
+
+
+def make_db():
+    """AsyncSession stand-in whose savepoints roll back on error"""
+    db = MagicMock()
+    db.execute = AsyncMock()
+    db.flush = AsyncMock()
+    
+    @asynccontextmanager
+    async def begin_nested():
+        yield
+    
+    db.begin_nested = begin_nested
+    return db
+
+
+def executed_params(db):
+    return [call.args[1] for call in db.execute.call_args_list if len(call.args) > 1]
+
+
+class TestRollupHelpers:
+    """Test bucketing and histogram helpers"""
+    
+    def test_bucket_start_floors_to_bucket(self):
+        start = bucket_start(datetime(2024, 3, 1, 10, 44, 59, tzinfo=timezone.utc))
+        
+        assert start == datetime(2024, 3, 1, 10, 30, tzinfo=timezone.utc)
+    
+    def test_bucket_start_treats_naive_as_utc(self):
+        naive = datetime(2024, 3, 1, 10, 7)
+        aware = datetime(2024, 3, 1, 12, 7, tzinfo=timezone(timedelta(hours=2)))
+        
+        assert bucket_start(naive) == bucket_start(aware) == datetime(2024, 3, 1, 10, 0, tzinfo=timezone.utc)
+    
+    @pytest.mark.parametrize("seconds,bound", [(0, 30.0), (30, 30.0), (30.5, 60.0), (3600, 3600.0), (3601, math.inf)])
+    def test_histogram_bound(self, seconds, bound):
+        assert histogram_bound(seconds) == bound
+    
+    def test_histogram_quantile_interpolates(self):
+        counts = [(30.0, 0), (60.0, 10), (120.0, 10)]
+        
+        assert histogram_quantile(0.5, counts) == 60.0
+        assert histogram_quantile(0.75, counts) == 90.0
+        assert histogram_quantile(0.5, []) is None
+    
+    def test_histogram_quantile_overflow_returns_largest_bound(self):
+        assert histogram_quantile(0.99, [(60.0, 1), (math.inf, 9)]) == 60.0
+
+
+class TestPerformanceRollupService:
+    """Test recording and reading rollups"""
+    
+    @pytest.mark.asyncio
+    async def test_record_submission_resolves_zone_once(self):
+        db = make_db()
+        zone = Mock(id=uuid4())
+        zone.name = "Sandton"
+        db.execute.side_effect = [Mock(first=Mock(return_value=zone)), Mock()]
+        service = PerformanceRollupService(db)
+        
+        recorded = await service.record_submission(
+            uuid4(), uuid4(), "security", -26.1, 28.05, datetime(2024, 3, 1, 10, 20)
+        )
+        
+        assert recorded
+        key = db.add.call_args.args[0]
+        assert isinstance(key, RequestRollupKey)
+        assert (key.zone_id, key.zone_name) == (zone.id, "Sandton")
+        upsert = executed_params(db)[-1]
+        assert upsert["submitted"] == 1
+        assert upsert["zone_name"] == "Sandton"
+        assert upsert["bucket_start"] == datetime(2024, 3, 1, 10, 15, tzinfo=timezone.utc)
+    
+    @pytest.mark.asyncio
+    async def test_record_submission_outside_zones_uses_unknown(self):
+        db = make_db()
+        db.execute.side_effect = [Mock(first=Mock(return_value=None)), Mock()]
+        
+        await PerformanceRollupService(db).record_submission(uuid4(), uuid4(), "fire", 0.0, 0.0)
+        
+        assert db.add.call_args.args[0].zone_name == UNKNOWN_ZONE
+    
+    @pytest.mark.asyncio
+    async def test_record_submission_failure_is_contained(self):
+        db = make_db()
+        db.execute.side_effect = Exception("relation does not exist")
+        
+        assert await PerformanceRollupService(db).record_submission(uuid4(), uuid4(), "fire", 0.0, 0.0) is False
+    
+    @pytest.mark.asyncio
+    async def test_record_acceptance_adds_duration_to_submission_bucket(self):
+        db = make_db()
+        key = RequestRollupKey(
+            request_id=uuid4(),
+            firm_id=uuid4(),
+            zone_name="Sandton",
+            service_type="security",
+            submitted_at=datetime(2024, 3, 1, 10, 14, tzinfo=timezone.utc)
+        )
+        db.execute.side_effect = [Mock(scalar_one_or_none=Mock(return_value=key)), Mock(), Mock()]
+        
+        recorded = await PerformanceRollupService(db).record_acceptance(key.request_id, datetime(2024, 3, 1, 10, 16))
+        
+        assert recorded
+        rollup, histogram = executed_params(db)
+        assert rollup["accepted"] == 1
+        assert rollup["response_time"] == 120.0
+        assert rollup["bucket_start"] == datetime(2024, 3, 1, 10, 0, tzinfo=timezone.utc)
+        assert (histogram["metric"], histogram["upper_bound"]) == ("response", 120.0)
+    
+    @pytest.mark.asyncio
+    async def test_record_completion_counts_pranks(self):
+        db = make_db()
+        key = RequestRollupKey(
+            request_id=uuid4(),
+            firm_id=uuid4(),
+            zone_name="Sandton",
+            service_type="security",
+            submitted_at=datetime(2024, 3, 1, 10, 0)
+        )
+        db.execute.side_effect = [Mock(scalar_one_or_none=Mock(return_value=key)), Mock(), Mock()]
+        
+        await PerformanceRollupService(db).record_completion(key.request_id, datetime(2024, 3, 1, 10, 20), is_prank=True)
+        
+        rollup, histogram = executed_params(db)
+        assert (rollup["completed"], rollup["pranks"], rollup["completion_time"]) == (1, 1, 1200.0)
+        assert (histogram["metric"], histogram["upper_bound"]) == ("completion", 1800.0)
+    
+    @pytest.mark.asyncio
+    async def test_transition_without_key_is_skipped(self):
+        db = make_db()
+        db.execute.return_value = Mock(scalar_one_or_none=Mock(return_value=None))
+        
+        assert await PerformanceRollupService(db).record_acceptance(uuid4()) is False
+        assert db.execute.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_summarize(self):
+        db = make_db()
+        db.execute.return_value = [Mock(
+            zone_name="Sandton",
+            service_type="security",
+            zone_id="zone-1",
+            submitted=10,
+            accepted=4,
+            response_time_sum=600.0,
+            completed=5,
+            completion_time_sum=5000.0,
+            pranks=3
+        )]
+        
+        summaries = await PerformanceRollupService(db).summarize(datetime.utcnow(), firm_id="firm-1")
+        
+        summary = summaries[0]
+        assert summary.key == {"zone_name": "Sandton", "service_type": "security"}
+        assert summary.avg_response_time == 150.0
+        assert summary.avg_completion_time == 1000.0
+        assert summary.completion_rate == 50.0
+        assert summary.prank_rate == 30.0
+        assert db.execute.call_args.args[1]["firm_id"] == "firm-1"
+    
+    @pytest.mark.asyncio
+    async def test_summarize_rejects_unknown_columns(self):
+        with pytest.raises(ValueError):
+            await PerformanceRollupService(make_db()).summarize(datetime.utcnow(), group_by=("location",))
@@ -20,7 +20,7 @@ class TestMetricsTasks:
     
     def test_update_all_metrics_success(self):
         """Test successful metrics update task"""
-        with patch('app.tasks.metrics.get_db') as mock_get_db, \
+        with patch('app.tasks.get_db') as mock_get_db, \
              patch('app.tasks.metrics.metrics_service') as mock_service:
             
             # Mock async generator for database session
@@ -37,7 +37,7 @@ class TestMetricsTasks:
     
     def test_update_all_metrics_error(self):
         """Test metrics update task with error"""
-        with patch('app.tasks.metrics.get_db') as mock_get_db:
+        with patch('app.tasks.get_db') as mock_get_db:
             mock_get_db.side_effect = Exception("Database connection failed")
             
             result = update_all_metrics()
@@ -47,7 +47,7 @@ class TestMetricsTasks:
     
     def test_update_performance_metrics_success(self):
         """Test successful performance metrics update"""
-        with patch('app.tasks.metrics.get_db') as mock_get_db, \
+        with patch('app.tasks.get_db') as mock_get_db, \
              patch('app.tasks.metrics.metrics_service') as mock_service:
             
             # Mock async generator for database session
@@ -64,7 +64,7 @@ class TestMetricsTasks:
     
     def test_update_performance_metrics_error(self):
         """Test performance metrics update with error"""
-        with patch('app.tasks.metrics.get_db') as mock_get_db:
+        with patch('app.tasks.get_db') as mock_get_db:
             mock_get_db.side_effect = Exception("Performance update failed")
             
             result = update_performance_metrics()
@@ -241,6 +241,14 @@ class TestMetricsTasks:
 class TestCeleryConfiguration:
     """Test Celery configuration for metrics tasks"""
     
+    def test_metrics_tasks_share_the_celery_app(self):
+        """Test metrics tasks are registered on the application's Celery app"""
+        from app.core.celery import celery_app as core_app
+        from app.tasks.metrics import celery_app
+        
+        assert celery_app is core_app
+        assert "app.tasks.metrics.record_panic_request_metrics" in core_app.tasks
+    
     def test_celery_app_configuration(self):
         """Test Celery app is properly configured"""
         from app.tasks.metrics import celery_app
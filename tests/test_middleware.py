@@ -2,11 +2,18 @@
 Test middleware functionality
 """
 import pytest
-from fastapi import FastAPI, Request
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.responses import StreamingResponse
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
 
-from app.core.middleware import MobileAttestationMiddleware, RequestLoggingMiddleware
+from app.core.middleware import (
+    MobileAttestationMiddleware,
+    RequestLoggingMiddleware,
+    RequestPipelineMiddleware,
+    RoutePatternResolver
+)
+from app.core.rate_limiter import MobileAuthRateLimiter
 from app.services.attestation import AttestationError
 
 
@@ -185,4 +192,127 @@ class TestRequestLoggingMiddleware:
         
         process_time = float(response.headers["X-Process-Time"])
         assert process_time >= 0
-        assert process_time < 1.0  # Should be very fast for simple endpoint
\ No newline at end of file
+        assert process_time < 1.0  # Should be very fast for simple endpoint
+
+class TestRequestPipelineMiddleware:
+    """Test the fused ASGI request pipeline"""
+    
+    @pytest.fixture
+    def app(self):
+        """Create test FastAPI app with the request pipeline"""
+        app = FastAPI()
+        app.add_middleware(RequestPipelineMiddleware, attestation=True, rate_limiting=True)
+        
+        @app.get("/api/v1/users/{user_id}")
+        async def get_user(user_id: str):
+            return {"user_id": user_id}
+        
+        @app.get("/api/v1/mobile/test")
+        async def mobile_endpoint(request: Request):
+            return {"verified": getattr(request.state, "attestation_verified", False)}
+        
+        @app.get("/stream")
+        async def stream_endpoint(background_tasks: BackgroundTasks):
+            async def chunks():
+                for i in range(3):
+                    yield f"chunk-{i}\n"
+            
+            background_tasks.add_task(completed_tasks.append, "done")
+            return StreamingResponse(chunks(), background=background_tasks)
+        
+        @app.post("/api/v1/auth/mobile/login")
+        async def mobile_login(payload: dict):
+            return payload
+        
+        completed_tasks = []
+        app.state.completed_tasks = completed_tasks
+        return app
+    
+    @pytest.fixture
+    def client(self, app):
+        with patch.object(MobileAuthRateLimiter, "check_global_rate_limits", AsyncMock(return_value={"allowed": True})), \
+             patch.object(MobileAuthRateLimiter, "check_endpoint_rate_limit", AsyncMock(return_value={"allowed": True})):
+            yield TestClient(app)
+    
+    def test_adds_request_and_security_headers(self, client):
+        """Test request ID, timing and security headers are added"""
+        response = client.get("/api/v1/users/123")
+        
+        assert response.status_code == 200
+        assert len(response.headers["X-Request-ID"]) == 36
+        assert float(response.headers["X-Process-Time"]) >= 0
+        assert response.headers["X-Frame-Options"] == "DENY"
+        assert response.headers["X-Content-Type-Options"] == "nosniff"
+    
+    def test_streaming_and_background_tasks(self, app, client):
+        """Test streamed bodies pass through and background tasks still run"""
+        response = client.get("/stream")
+        
+        assert response.text == "chunk-0\nchunk-1\nchunk-2\n"
+        assert app.state.completed_tasks == ["done"]
+    
+    def test_records_route_template_metrics(self, client):
+        """Test metrics are labelled with the route template, not the raw path"""
+        with patch('app.core.middleware.metrics_collector.record_http_request') as mock_record:
+            client.get("/api/v1/users/4f1c2a")
+            client.get("/does-not-exist")
+        
+        endpoints = [call.kwargs["endpoint"] for call in mock_record.call_args_list]
+        assert endpoints == ["/api/v1/users/{user_id}", "unmatched"]
+        assert mock_record.call_args_list[1].kwargs["status_code"] == 404
+    
+    def test_records_sizes_and_in_flight(self, client):
+        """Test body sizes are recorded and in-flight requests are balanced per route"""
+        with patch('app.core.middleware.metrics_collector.record_http_request') as mock_record, \
+             patch('app.core.middleware.metrics_collector.update_http_in_flight') as mock_in_flight:
+            response = client.post("/api/v1/auth/mobile/login", json={"email": "a@b.c"})
+        
+        recorded = mock_record.call_args.kwargs
+        assert recorded["endpoint"] == "/api/v1/auth/mobile/login"
+        assert recorded["request_size"] == len(b'{"email": "a@b.c"}')
+        assert recorded["response_size"] == len(response.content)
+        assert [call.args for call in mock_in_flight.call_args_list] == [
+            ("POST", "/api/v1/auth/mobile/login", 1),
+            ("POST", "/api/v1/auth/mobile/login", -1)
+        ]
+    
+    def test_streamed_response_size(self, client):
+        """Test streamed bodies are measured across chunks"""
+        with patch('app.core.middleware.metrics_collector.record_http_request') as mock_record:
+            client.get("/stream")
+        
+        assert mock_record.call_args.kwargs["response_size"] == len("chunk-0\nchunk-1\nchunk-2\n")
+    
+    def test_attestation_gate(self, client):
+        """Test mobile endpoints are gated when attestation is required"""
+        with patch('app.core.middleware.settings.REQUIRE_MOBILE_ATTESTATION', True):
+            response = client.get("/api/v1/mobile/test")
+            assert response.status_code == 401
+            assert "platform" in response.json()["details"]["reason"].lower()
+            assert "X-Request-ID" in response.headers
+        
+        with patch('app.core.middleware.settings.REQUIRE_MOBILE_ATTESTATION', False):
+            response = client.get("/api/v1/mobile/test")
+            assert response.status_code == 200
+            assert response.json() == {"verified": True}
+    
+    def test_rate_limit_rejects_and_replays_body(self, client):
+        """Test rate limited requests get a 429 and allowed ones keep their body"""
+        response = client.post("/api/v1/auth/mobile/login", json={"email": "a@b.c"})
+        assert response.status_code == 200
+        assert response.json() == {"email": "a@b.c"}
+        
+        limited = {"allowed": False, "retry_after": 30, "limit": 60, "window": 60}
+        with patch.object(MobileAuthRateLimiter, "check_global_rate_limits", AsyncMock(return_value=limited)):
+            response = client.post("/api/v1/auth/mobile/login", json={"email": "a@b.c"})
+        
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "30"
+    
+    def test_route_pattern_resolver(self, app):
+        """Test static, parameterised and unknown paths resolve correctly"""
+        resolver = RoutePatternResolver(app.routes)
+        
+        assert resolver.resolve("/stream") == "/stream"
+        assert resolver.resolve("/api/v1/users/abc") == "/api/v1/users/{user_id}"
+        assert resolver.resolve("/api/v1/users/abc/extra") == RoutePatternResolver.UNMATCHED
@@ -0,0 +1,392 @@
+"""
+Test durable, batched notification dispatch
+"""
+import asyncio
+import json
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.smtp import SMTPConnectionPool
+from app.services.notification import (
+    NotificationPriority,
+    NotificationRecipient,
+    NotificationRequest,
+    NotificationResult,
+    NotificationService,
+    NotificationType,
+    PushNotificationService
+)
+from app.services.notification_dispatch import (
+    AsyncRateLimiter,
+    NotificationDispatcher,
+    build_job
+)
+
+
+class FakeStreamCache:
+    """In-memory stand-in for the Redis stream and sorted set helpers"""
+    
+    def __init__(self):
+        self.streams = {}
+        self.zsets = {}
+        self.acked = []
+    
+    async def xadd_many(self, key, entries, maxlen=None):
+        stream = self.streams.setdefault(key, [])
+        ids = []
+        for fields in entries:
+            entry_id = f"{len(stream) + 1}-0"
+            stream.append((entry_id, fields))
+            ids.append(entry_id)
+        return ids
+    
+    async def xack(self, key, group, *entry_ids):
+        self.acked.extend(entry_ids)
+        return len(entry_ids)
+    
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+    
+    async def xreadgroup(self, group, consumer, keys, count, block_ms=None):
+        if isinstance(keys, str):
+            keys = [keys]
+        result = {}
+        for key in keys:
+            stream = self.streams.get(key, [])
+            taken, self.streams[key] = stream[:count], stream[count:]
+            if taken:
+                result[key] = taken
+                count -= len(taken)
+        return result
+    
+    async def xautoclaim(self, key, group, consumer, min_idle_ms, count):
+        return []
+
+
+@pytest.fixture
+def fake_cache():
+    fake = FakeStreamCache()
+    with patch('app.services.notification_dispatch.cache', fake):
+        yield fake
+
+
+@pytest.fixture
+def dispatcher(fake_cache):
+    return NotificationDispatcher(NotificationService())
+
+
+def push_entries(count, title="Help is on the way"):
+    return [
+        (f"{i}-0", {"job": json.dumps(build_job(
+            NotificationType.PUSH,
+            {"push_token": f"token-{i}", "platform": "android"},
+            "Body",
+            title=title,
+            priority=NotificationPriority.HIGH
+        ))})
+        for i in range(count)
+    ]
+
+
+class TestNotificationEnqueue:
+    """Test queuing notifications"""
+    
+    @pytest.mark.asyncio
+    async def test_enqueue_returns_pending_results(self, dispatcher, fake_cache):
+        """Test one job is queued per reachable recipient"""
+        request = NotificationRequest(
+            template_id="emergency_request_confirmed_sms",
+            recipients=[
+                NotificationRecipient(user_id=uuid4(), phone_number="+27820000001"),
+                NotificationRecipient(user_id=uuid4())
+            ],
+            variables={"request_id": "123", "service_type": "security"}
+        )
+        
+        results = await dispatcher.enqueue(request)
+        
+        assert [result.status for result in results] == ["pending", "rejected"]
+        assert results[0].external_id == "1-0"
+        
+        job = json.loads(fake_cache.streams[dispatcher.stream_key("normal")][0][1]["job"])
+        assert job["channel"] == "sms"
+        assert job["recipient"]["phone_number"] == "+27820000001"
+        assert "security request #123" in job["body"]
+    
+    @pytest.mark.asyncio
+    async def test_enqueue_notification_falls_back_to_direct_send(self):
+        """Test notifications are sent directly when the queue is unavailable"""
+        service = NotificationService()
+        request = NotificationRequest(
+            template_id="agent_assignment",
+            recipients=[NotificationRecipient(push_token="token", platform="android")],
+            variables={"service_type": "security", "address": "1 Main St", "description": ""}
+        )
+        
+        with patch(
+            'app.services.notification_dispatch.notification_dispatcher.enqueue',
+            new_callable=AsyncMock,
+            side_effect=ConnectionError("redis down")
+        ):
+            results = await service.enqueue_notification(request)
+        
+        assert len(results) == 1
+        assert results[0].status == "sent"
+
+
+class TestPriorityLanes:
+    """Test priority lane routing and scheduling"""
+    
+    @pytest.mark.asyncio
+    async def test_enqueue_routes_to_priority_lane(self, dispatcher, fake_cache):
+        """Test notifications are queued on their priority's stream"""
+        request = NotificationRequest(
+            template_id="provider_arrived",
+            recipients=[NotificationRecipient(push_token="token", platform="ios")],
+            variables={"vehicle_description": "white van", "license_plate": "ABC123"},
+            priority=NotificationPriority.URGENT
+        )
+        
+        await dispatcher.enqueue(request)
+        
+        assert list(fake_cache.streams) == [dispatcher.stream_key(NotificationPriority.URGENT)]
+    
+    @pytest.mark.asyncio
+    async def test_read_shares_batch_by_lane_weight(self, dispatcher, fake_cache):
+        """Test busy lanes split a batch by weight"""
+        lanes = [NotificationPriority.URGENT, NotificationPriority.HIGH]
+        for lane in lanes:
+            await fake_cache.xadd_many(dispatcher.stream_key(lane), [{"job": "{}"}] * 20)
+        
+        with patch.object(settings, 'NOTIFICATION_BATCH_SIZE', 10), \
+             patch.object(settings, 'NOTIFICATION_LANE_WEIGHTS', {"urgent": 4, "high": 1}):
+            entries = await dispatcher._read_entries(lanes, "worker")
+        
+        assert len(entries["urgent"]) == 8
+        assert len(entries["high"]) == 2
+    
+    @pytest.mark.asyncio
+    async def test_unused_lane_capacity_goes_to_other_lanes(self, dispatcher, fake_cache):
+        """Test a quiet lane's share is given to busier lanes"""
+        lanes = [NotificationPriority.URGENT, NotificationPriority.HIGH]
+        await fake_cache.xadd_many(dispatcher.stream_key("urgent"), [{"job": "{}"}])
+        await fake_cache.xadd_many(dispatcher.stream_key("high"), [{"job": "{}"}] * 20)
+        
+        with patch.object(settings, 'NOTIFICATION_BATCH_SIZE', 10), \
+             patch.object(settings, 'NOTIFICATION_LANE_WEIGHTS', {"urgent": 4, "high": 1}):
+            entries = await dispatcher._read_entries(lanes, "worker")
+        
+        assert len(entries["urgent"]) == 1
+        assert len(entries["high"]) == 9
+    
+    @pytest.mark.asyncio
+    async def test_queue_latency_recorded_per_lane(self, dispatcher, fake_cache):
+        """Test lane latency is measured from the stream entry time"""
+        entry_id = f"{int((time.time() - 2) * 1000)}-0"
+        job = build_job(NotificationType.SMS, {"phone_number": "+27820000001"}, "Body")
+        
+        with patch('app.services.notification_dispatch.metrics_collector') as mock_metrics:
+            await dispatcher.process_entries({"urgent": [(entry_id, {"job": json.dumps(job)})]})
+        
+        lane, latency = mock_metrics.record_notification_queue_latency.call_args[0]
+        assert lane == "urgent"
+        assert 1.9 <= latency < 5
+    
+    @pytest.mark.asyncio
+    async def test_rate_limiter_serves_priority_first(self):
+        """Test priority callers take tokens ahead of waiting bulk callers"""
+        limiter = AsyncRateLimiter(rate_per_second=20, burst=1)
+        await limiter.acquire()
+        order = []
+        
+        async def call(name, priority):
+            await limiter.acquire(priority=priority)
+            order.append(name)
+        
+        await asyncio.gather(call("bulk", False), call("urgent", True))
+        
+        assert order == ["urgent", "bulk"]
+    
+    @pytest.mark.asyncio
+    async def test_bulk_email_cannot_use_reserved_connections(self):
+        """Test bulk sends leave SMTP connections free for priority mail"""
+        in_flight = 0
+        peak = 0
+        
+        async def slow_send(*args, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+        
+        def new_client(**kwargs):
+            client = MagicMock()
+            client.connect = AsyncMock()
+            client.send_message = AsyncMock(side_effect=slow_send)
+            client.is_connected = True
+            return client
+        
+        with patch('app.core.smtp.aiosmtplib.SMTP', side_effect=new_client), \
+             patch.object(settings, 'SMTP_POOL_PRIORITY_RESERVED', 1):
+            pool = SMTPConnectionPool(size=3)
+            await asyncio.gather(*(pool.send_message(MagicMock(), bulk=True) for _ in range(4)))
+        
+        assert peak == 2
+
+
+class TestNotificationDispatcher:
+    """Test batched delivery of queued notifications"""
+    
+    @pytest.mark.asyncio
+    async def test_push_jobs_sent_as_one_multicast(self, dispatcher, fake_cache):
+        """Test identical push messages share a multicast and entries are acked"""
+        entries = push_entries(3)
+        
+        with patch.object(
+            dispatcher.service.push_service, 'send_push_multicast', new_callable=AsyncMock
+        ) as mock_multicast:
+            mock_multicast.return_value = [
+                NotificationResult(type=NotificationType.PUSH, status="sent") for _ in entries
+            ]
+            
+            sent = await dispatcher.process_entries({"high": entries})
+        
+        assert sent == 3
+        mock_multicast.assert_called_once()
+        assert len(mock_multicast.call_args[0][0]) == 3
+        assert fake_cache.acked == ["0-0", "1-0", "2-0"]
+    
+    @pytest.mark.asyncio
+    async def test_failed_send_scheduled_for_retry(self, dispatcher, fake_cache):
+        """Test transient failures are retried with backoff"""
+        entries = push_entries(1)
+        
+        with patch.object(
+            dispatcher.service.push_service, 'send_push_multicast', new_callable=AsyncMock
+        ) as mock_multicast:
+            mock_multicast.return_value = [
+                NotificationResult(type=NotificationType.PUSH, status="failed", message="timeout")
+            ]
+            
+            await dispatcher.process_entries({"high": entries})
+        
+        retries = fake_cache.zsets[dispatcher.retry_key("high")]
+        assert len(retries) == 1
+        
+        member, due = next(iter(retries.items()))
+        job = json.loads(member)
+        assert job["attempt"] == 1
+        assert job["last_error"] == "timeout"
+        assert due > time.time()
+        assert fake_cache.acked == ["0-0"]
+    
+    @pytest.mark.asyncio
+    async def test_rejected_send_not_retried(self, dispatcher, fake_cache):
+        """Test permanent failures are not retried"""
+        with patch.object(
+            dispatcher.service.push_service, 'send_push_multicast', new_callable=AsyncMock
+        ) as mock_multicast:
+            mock_multicast.return_value = [
+                NotificationResult(type=NotificationType.PUSH, status="rejected", message="NotRegistered")
+            ]
+            
+            await dispatcher.process_entries({"high": push_entries(1)})
+        
+        assert not fake_cache.zsets
+        assert dispatcher.DEAD_LETTER_KEY not in fake_cache.streams
+    
+    @pytest.mark.asyncio
+    async def test_exhausted_job_dead_lettered(self, dispatcher, fake_cache):
+        """Test jobs are dead-lettered after the last attempt"""
+        job = build_job(NotificationType.SMS, {"phone_number": "+27820000001"}, "Body")
+        job["attempt"] = settings.NOTIFICATION_MAX_ATTEMPTS - 1
+        
+        with patch.object(
+            dispatcher.service.sms_service, 'send_sms_notification',
+            new_callable=AsyncMock, side_effect=ConnectionError("provider down")
+        ):
+            await dispatcher.process_entries({"normal": [("1-0", {"job": json.dumps(job)})]})
+        
+        dead = fake_cache.streams[dispatcher.DEAD_LETTER_KEY]
+        assert len(dead) == 1
+        assert json.loads(dead[0][1]["job"])["attempt"] == settings.NOTIFICATION_MAX_ATTEMPTS
+        assert not fake_cache.zsets
+    
+    def test_retry_delay_backs_off_and_caps(self, dispatcher):
+        """Test retry delays grow exponentially up to the maximum"""
+        base = settings.NOTIFICATION_RETRY_BASE_SECONDS
+        
+        assert base * 0.5 <= dispatcher.retry_delay(1) <= base
+        assert base * 2 <= dispatcher.retry_delay(3) <= base * 4
+        assert dispatcher.retry_delay(50) <= settings.NOTIFICATION_RETRY_MAX_SECONDS
+    
+    @pytest.mark.asyncio
+    async def test_rate_limiter_spaces_calls(self):
+        """Test the token bucket holds calls to the configured rate"""
+        limiter = AsyncRateLimiter(rate_per_second=50, burst=1)
+        
+        start = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+        
+        assert time.monotonic() - start >= 0.07
+
+
+class TestPushMulticast:
+    """Test FCM multicast batching"""
+    
+    @pytest.mark.asyncio
+    async def test_multicast_batches_and_maps_results(self):
+        """Test tokens are split into batches and results keep recipient order"""
+        service = PushNotificationService()
+        service.fcm_server_key = "server-key"
+        recipients = [
+            NotificationRecipient(push_token=f"token-{i}", platform="android") for i in range(5)
+        ] + [NotificationRecipient(platform="android")]
+        
+        def fcm_response(url, json=None, headers=None):
+            response = MagicMock()
+            response.json.return_value = {"results": [
+                {"error": "NotRegistered"} if token == "token-1" else {"message_id": f"id-{token}"}
+                for token in json["registration_ids"]
+            ]}
+            return response
+        
+        client = MagicMock()
+        client.post = AsyncMock(side_effect=fcm_response)
+        
+        with patch.object(settings, 'FCM_MULTICAST_BATCH_SIZE', 2), \
+             patch.object(service, '_get_http_client', return_value=client):
+            results = await service.send_push_multicast(recipients, "Title", "Body")
+        
+        assert client.post.call_count == 3
+        assert [result.status for result in results] == [
+            "sent", "rejected", "sent", "sent", "sent", "rejected"
+        ]
+        assert results[4].external_id == "id-token-4"
+
+
+class TestSMTPConnectionPool:
+    """Test pooled SMTP connections"""
+    
+    @pytest.mark.asyncio
+    async def test_connection_reused_across_messages(self):
+        """Test connect and login happen once for several messages"""
+        client = MagicMock()
+        client.connect = AsyncMock()
+        client.send_message = AsyncMock()
+        client.is_connected = True
+        
+        with patch('app.core.smtp.aiosmtplib.SMTP', return_value=client) as mock_smtp:
+            pool = SMTPConnectionPool(size=2)
+            for _ in range(3):
+                await pool.send_message(MagicMock(), ["user@example.com"])
+        
+        mock_smtp.assert_called_once()
+        client.connect.assert_called_once()
+        assert client.send_message.call_count == 3
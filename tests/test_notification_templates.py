@@ -0,0 +1,135 @@
+"""
+Unit tests for compiled notification templates
+"""
+import pytest
+
+from app.services.notification import (
+    NotificationTemplate,
+    NotificationTemplateManager,
+    NotificationType
+)
+from app.services.notification_templates import (
+    CompiledNotificationTemplate,
+    CompiledTemplate,
+    TemplateError
+)
+
+
+class TestCompiledTemplate:
+    """Test template compilation and rendering"""
+    
+    def test_fields_and_render(self):
+        template = CompiledTemplate("Hello {name}, order {order_id} is ready")
+        
+        assert template.fields == {"name", "order_id"}
+        assert template.render({"name": "John", "order_id": 42}) == "Hello John, order 42 is ready"
+    
+    def test_format_spec_conversion_and_escaped_braces(self):
+        template = CompiledTemplate("{{id}} {name!r} {eta:>3}")
+        
+        assert template.render({"name": "x", "eta": 5}) == "{id} 'x'   5"
+        assert template.positional({"name": 1, "eta": 0}).format(5, "x") == "{id} 'x'   5"
+    
+    def test_missing_variable_keeps_placeholder(self):
+        template = CompiledTemplate("Hello {name}, ETA {eta:>3} min")
+        missing = []
+        
+        assert template.render({"name": "John"}, missing) == "Hello John, ETA {eta:>3} min"
+        assert missing == ["eta"]
+    
+    @pytest.mark.parametrize("source", ["{0}", "{}", "{user.name}", "{items[0]}", "{name:{width}}", "unclosed {name"])
+    def test_unsupported_fields_rejected(self, source):
+        with pytest.raises(TemplateError):
+            CompiledTemplate(source)
+
+
+class TestCompiledNotificationTemplate:
+    """Test declared variables and the render cache"""
+    
+    def test_undeclared_variable_rejected(self):
+        with pytest.raises(TemplateError, match="eta"):
+            CompiledNotificationTemplate("t", {"title": "Update", "body": "ETA {eta}"}, ["distance"])
+    
+    def test_declared_but_unused_variables_allowed(self):
+        compiled = CompiledNotificationTemplate("t", {"body": "ETA {eta}"}, ["eta", "distance"])
+        
+        assert compiled.fields == {"eta"}
+    
+    def test_identical_variables_render_once(self):
+        compiled = CompiledNotificationTemplate(
+            "t", {"title": "Alert {area}", "subject": None, "body": "{area}: {message}"}, ["area", "message"], cache_size=16
+        )
+        variables = {"area": "Sandton", "message": "Road closed", "user_id": "ignored"}
+        
+        for _ in range(100):
+            rendered, missing = compiled.render(dict(variables))
+        
+        assert rendered == {"title": "Alert Sandton", "body": "Sandton: Road closed"}
+        assert missing == []
+        assert compiled.cache_info().misses == 1
+        assert compiled.cache_info().hits == 99
+    
+    def test_cache_distinguishes_value_types(self):
+        compiled = CompiledNotificationTemplate("t", {"body": "{count}"}, ["count"], cache_size=16)
+        
+        assert compiled.render({"count": 1})[0]["body"] == "1"
+        assert compiled.render({"count": 1.0})[0]["body"] == "1.0"
+        assert compiled.render({"count": True})[0]["body"] == "True"
+    
+    def test_unhashable_values_bypass_cache(self):
+        compiled = CompiledNotificationTemplate("t", {"body": "{items}"}, ["items"], cache_size=16)
+        
+        rendered, _ = compiled.render({"items": ["a", "b"]})
+        
+        assert rendered["body"] == "['a', 'b']"
+        assert compiled.cache_info().currsize == 0
+
+
+class TestTemplateManagerCompilation:
+    """Test NotificationTemplateManager's use of compiled templates"""
+    
+    @pytest.fixture
+    def manager(self):
+        return NotificationTemplateManager()
+    
+    def test_add_template_validates_variables(self, manager):
+        template = NotificationTemplate(
+            id="bad",
+            name="Bad",
+            type=NotificationType.PUSH,
+            body="Hello {name}",
+            variables=[]
+        )
+        
+        with pytest.raises(TemplateError):
+            manager.add_template(template)
+        assert manager.get_template("bad") is None
+    
+    def test_partial_render_keeps_placeholders(self, manager):
+        rendered = manager.render_template("emergency_request_confirmed", {"request_id": "12345"})
+        
+        assert rendered["body"] == (
+            "Your {service_type} emergency request #12345 has been received and is being processed."
+        )
+    
+    def test_updated_template_replaces_cached_renders(self, manager):
+        variables = {"eta": 5, "distance": 2}
+        assert manager.render_template("location_update", variables)["body"].endswith("5 minutes.")
+        
+        manager.add_template(NotificationTemplate(
+            id="location_update",
+            name="Location Update",
+            type=NotificationType.PUSH,
+            title="Updated ETA",
+            body="ETA {eta} min ({distance} km)",
+            variables=["eta", "distance"]
+        ))
+        
+        assert manager.render_template("location_update", variables)["body"] == "ETA 5 min (2 km)"
+    
+    def test_rendered_output_is_not_shared(self, manager):
+        variables = {"request_id": "1", "service_type": "security"}
+        first = manager.render_template("emergency_request_confirmed", variables)
+        first["body"] = "changed"
+        
+        assert manager.render_template("emergency_request_confirmed", variables)["body"] != "changed"
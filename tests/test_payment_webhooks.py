@@ -0,0 +1,189 @@
+"""
+Unit tests for payment webhook intake and processing
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock, patch
+from uuid import uuid4
+
+import pytest
+
+from app.models.payment import Invoice, PaymentWebhookEvent
+from app.services.ozow_service import OzowService
+from app.services.payment_webhooks import (
+    InvalidWebhookSignature,
+    PaymentWebhookService,
+    WebhookStatus,
+    webhook_event_key
+)
+
+
+def signed(ozow: OzowService, **fields) -> dict:
+    data = {
+        "SiteCode": ozow.site_code,
+        "TransactionId": "txn-1",
+        "TransactionReference": "TXN-INV-1",
+        "Amount": "150.00",
+        "Status": "Complete",
+        "CurrencyCode": "ZAR",
+        "IsTest": "true",
+        "StatusMessage": "",
+        **fields
+    }
+    values = "".join(str(data.get(field) or "") for field in OzowService.WEBHOOK_HASH_FIELDS)
+    data["Hash"] = hashlib.sha512((values + ozow.private_key).lower().encode()).hexdigest()
+    return data
+
+
+def scalar(value):
+    return Mock(scalar_one_or_none=Mock(return_value=value))
+
+
+def make_db(*results):
+    db = Mock()
+    db.execute = AsyncMock(side_effect=list(results))
+    db.commit = AsyncMock()
+    db.rollback = AsyncMock()
+    db.refresh = AsyncMock()
+    return db
+
+
+def stored_event(data: dict, status: str = WebhookStatus.PENDING) -> PaymentWebhookEvent:
+    return PaymentWebhookEvent(
+        id=uuid4(),
+        provider="ozow",
+        event_key=webhook_event_key("ozow", data),
+        transaction_id=data["TransactionId"],
+        status=data["Status"],
+        payload=json.dumps(data),
+        processing_status=status,
+        attempts=0,
+        created_at=datetime.now(timezone.utc)
+    )
+
+
+class TestWebhookSignature:
+    """Test OZOW notification hash verification"""
+    
+    def test_valid_hash(self):
+        ozow = OzowService()
+        
+        assert ozow.verify_webhook_hash(signed(ozow))
+    
+    def test_tampered_amount(self):
+        ozow = OzowService()
+        data = signed(ozow)
+        data["Amount"] = "1500.00"
+        
+        assert not ozow.verify_webhook_hash(data)
+    
+    def test_missing_hash(self):
+        assert not OzowService().verify_webhook_hash({"TransactionId": "txn-1"})
+    
+    def test_event_key_shared_by_redeliveries(self):
+        ozow = OzowService()
+        
+        assert webhook_event_key("ozow", signed(ozow)) == webhook_event_key("ozow", signed(ozow))
+        assert webhook_event_key("ozow", signed(ozow)) != webhook_event_key("ozow", signed(ozow, Status="Cancelled"))
+
+
+class TestWebhookIntake:
+    """Test verifying and storing incoming webhooks"""
+    
+    @pytest.mark.asyncio
+    async def test_new_event_stored_and_queued(self):
+        event_id = uuid4()
+        db = make_db(scalar(event_id))
+        service = PaymentWebhookService(db)
+        
+        with patch("app.services.payment_webhooks.enqueue_webhook_event") as enqueue:
+            assert await service.receive(signed(service.ozow_service)) == (str(event_id), True)
+        
+        enqueue.assert_called_once_with(event_id)
+        db.commit.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_redelivery_acknowledged_without_queueing(self):
+        db = make_db(scalar(None))
+        service = PaymentWebhookService(db)
+        data = signed(service.ozow_service)
+        
+        with patch("app.services.payment_webhooks.enqueue_webhook_event") as enqueue:
+            assert await service.receive(data) == (webhook_event_key("ozow", data), False)
+        
+        enqueue.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_invalid_signature_not_stored(self):
+        db = make_db()
+        service = PaymentWebhookService(db)
+        data = signed(service.ozow_service)
+        data["Hash"] = "0" * 128
+        
+        with pytest.raises(InvalidWebhookSignature):
+            await service.receive(data)
+        
+        db.execute.assert_not_called()
+
+
+class TestWebhookProcessing:
+    """Test applying stored webhook events"""
+    
+    @pytest.mark.asyncio
+    async def test_event_applied_and_marked_processed(self):
+        event = stored_event(signed(OzowService()))
+        db = make_db(scalar(event))
+        service = PaymentWebhookService(db)
+        service.ozow_service.apply_webhook = AsyncMock(return_value=True)
+        
+        assert await service.process(str(event.id)) is event
+        
+        service.ozow_service.apply_webhook.assert_awaited_once_with(db, json.loads(event.payload))
+        assert event.processing_status == WebhookStatus.PROCESSED
+        assert event.attempts == 1
+    
+    @pytest.mark.asyncio
+    async def test_processed_event_not_applied_again(self):
+        event = stored_event(signed(OzowService()), WebhookStatus.PROCESSED)
+        service = PaymentWebhookService(make_db(scalar(event)))
+        service.ozow_service.apply_webhook = AsyncMock()
+        
+        await service.process(str(event.id))
+        
+        service.ozow_service.apply_webhook.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_failure_rolled_back_and_recorded(self):
+        event = stored_event(signed(OzowService()))
+        db = make_db(scalar(event), Mock())
+        service = PaymentWebhookService(db)
+        service.ozow_service.apply_webhook = AsyncMock(side_effect=RuntimeError("deadlock detected"))
+        
+        with pytest.raises(RuntimeError):
+            await service.process(str(event.id))
+        
+        db.rollback.assert_awaited_once()
+        failure = db.execute.call_args_list[1].args[0].compile().params
+        assert failure["processing_status"] == WebhookStatus.FAILED
+        assert failure["last_error"] == "deadlock detected"
+        db.commit.assert_awaited_once()
+
+
+class TestSuccessfulPayment:
+    """Test crediting a paid invoice"""
+    
+    @pytest.mark.asyncio
+    async def test_paid_invoice_not_credited_again(self):
+        invoice = Invoice(id=uuid4(), firm_id=uuid4(), invoice_number="INV-1", credits_amount=100, status="pending")
+        db = make_db()
+        
+        async def paid_elsewhere(obj, with_for_update=False):
+            obj.status = "paid"
+        db.refresh.side_effect = paid_elsewhere
+        
+        with patch("app.services.ozow_service.CreditLedger") as ledger:
+            assert await OzowService()._process_successful_payment(db, invoice, None) is False
+        
+        db.refresh.assert_awaited_once_with(invoice, with_for_update=True)
+        ledger.assert_not_called()
@@ -0,0 +1,167 @@
+"""
+Unit tests for provider location ingestion
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.provider_location import LocationFix, ProviderLocationIngestor, latest_fixes
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def fix(provider_id, seconds=0, latitude=-26.2, longitude=28.04):
+    return LocationFix(provider_id, latitude, longitude, NOW + timedelta(seconds=seconds))
+
+
+def redis_client(*eval_results):
+    client = Mock()
+    client.eval = AsyncMock(side_effect=list(eval_results))
+    client.lpush = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    client.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    client.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    return client, pipe
+
+
+class TestCoalescing:
+    """Test keeping only the newest fix per provider"""
+    
+    def test_latest_fix_per_provider(self):
+        a, b = uuid4(), uuid4()
+        
+        latest = latest_fixes([fix(a, 5), fix(b, 1), fix(a, 10), fix(a, 2)])
+        
+        assert latest[a].recorded_at == NOW + timedelta(seconds=10)
+        assert latest[b].recorded_at == NOW + timedelta(seconds=1)
+    
+    def test_fix_round_trips_through_buffer_payload(self):
+        original = LocationFix(uuid4(), -33.9, 18.4, NOW, accuracy_m=4.5)
+        
+        assert LocationFix.from_json(str(original.provider_id), original.to_json()) == original
+    
+    @pytest.mark.asyncio
+    async def test_buffer_merges_one_entry_per_provider(self):
+        a, b = uuid4(), uuid4()
+        client, pipe = redis_client(2)
+        
+        with patch("app.services.provider_location.cache") as cache:
+            cache.get_client = AsyncMock(return_value=client)
+            await ProviderLocationIngestor().buffer([fix(a, 1), fix(a, 3), fix(b, 2)])
+        
+        args = client.eval.await_args.args[3:]
+        assert sorted(args[0::3]) == sorted([str(a), str(b)])
+        assert json.loads(args[args.index(str(a)) + 2])[2] == (NOW + timedelta(seconds=3)).timestamp()
+        client.pipeline.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_buffer_keeps_trajectory_when_enabled(self, monkeypatch):
+        monkeypatch.setattr("app.services.provider_location.settings.PROVIDER_TRAJECTORY_ENABLED", True)
+        client, pipe = redis_client(1)
+        provider_id = uuid4()
+        
+        with patch("app.services.provider_location.cache") as cache:
+            cache.get_client = AsyncMock(return_value=client)
+            await ProviderLocationIngestor().buffer([fix(provider_id, 1), fix(provider_id, 2)])
+        
+        assert len(pipe.rpush.call_args.args[1:]) == 2
+    
+    @pytest.mark.asyncio
+    async def test_points_for_other_firms_rejected(self):
+        own, foreign = uuid4(), uuid4()
+        ingestor = ProviderLocationIngestor()
+        ingestor.get_owned_provider_ids = AsyncMock(return_value={own})
+        ingestor.buffer = AsyncMock()
+        
+        accepted, rejected = await ingestor.ingest(Mock(), uuid4(), [fix(own), fix(foreign), fix(own, 1)])
+        
+        assert (accepted, rejected) == (2, {foreign})
+        assert {f.provider_id for f in ingestor.buffer.await_args.args[0]} == {own}
+    
+    @pytest.mark.asyncio
+    async def test_future_fixes_clamped_to_server_time(self):
+        provider_id = uuid4()
+        now = datetime.now(timezone.utc)
+        ingestor = ProviderLocationIngestor()
+        ingestor.get_owned_provider_ids = AsyncMock(return_value={provider_id})
+        ingestor.buffer = AsyncMock()
+        
+        await ingestor.ingest(Mock(), uuid4(), [
+            LocationFix(provider_id, -26.2, 28.04, now + timedelta(seconds=10)),
+            LocationFix(provider_id, -26.2, 28.04, now + timedelta(days=365))
+        ])
+        
+        within_skew, future = ingestor.buffer.await_args.args[0]
+        assert within_skew.recorded_at == now + timedelta(seconds=10)
+        assert now <= future.recorded_at <= datetime.now(timezone.utc)
+
+
+class TestFlush:
+    """Test writing buffered locations"""
+    
+    @pytest.mark.asyncio
+    async def test_positions_written_in_bulk_batches(self, monkeypatch):
+        monkeypatch.setattr("app.services.provider_location.settings.PROVIDER_LOCATION_FLUSH_BATCH_SIZE", 2)
+        db = Mock()
+        db.execute = AsyncMock(return_value=Mock(rowcount=2))
+        
+        updated = await ProviderLocationIngestor().write_positions(db, [fix(uuid4()) for _ in range(3)])
+        
+        assert db.execute.await_count == 2
+        sql = str(db.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+        assert "FROM (VALUES" in sql
+        assert "ST_MakePoint" in sql
+        assert "last_location_update < fixes.recorded_at" in sql
+        assert updated == 4
+    
+    @pytest.mark.asyncio
+    async def test_flush_claims_and_commits(self):
+        provider_id = uuid4()
+        position = fix(provider_id, 7)
+        client, _ = redis_client([[str(provider_id), position.to_json()], []])
+        db = Mock()
+        db.execute = AsyncMock(return_value=Mock(rowcount=1))
+        db.commit = AsyncMock()
+        
+        with patch("app.services.provider_location.cache") as cache:
+            cache.get_client = AsyncMock(return_value=client)
+            assert await ProviderLocationIngestor().flush(db) == 1
+        
+        db.commit.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_failed_write_restores_buffer(self):
+        provider_id = uuid4()
+        position = fix(provider_id, 7)
+        point = fix(provider_id, 3)
+        trail = json.dumps([str(provider_id), point.to_json()])
+        client, _ = redis_client([[str(provider_id), position.to_json()], [trail]], 1)
+        db = Mock()
+        db.execute = AsyncMock(side_effect=RuntimeError("connection lost"))
+        db.rollback = AsyncMock()
+        
+        with patch("app.services.provider_location.cache") as cache:
+            cache.get_client = AsyncMock(return_value=client)
+            with pytest.raises(RuntimeError):
+                await ProviderLocationIngestor().flush(db)
+        
+        db.rollback.assert_awaited_once()
+        assert client.eval.await_args.args[3:] == (str(provider_id), position.timestamp, position.to_json())
+        client.lpush.assert_awaited_once_with("provider_location:trail", trail)
+    
+    @pytest.mark.asyncio
+    async def test_empty_buffer_skips_database(self):
+        client, _ = redis_client([[], []])
+        db = Mock()
+        db.execute = AsyncMock()
+        
+        with patch("app.services.provider_location.cache") as cache:
+            cache.get_client = AsyncMock(return_value=client)
+            assert await ProviderLocationIngestor().flush(db) == 0
+        
+        db.execute.assert_not_called()
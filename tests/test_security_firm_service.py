@@ -9,6 +9,8 @@ from geoalchemy2.shape import from_shape
 from shapely.geometry import Polygon
 
 from app.services.security_firm import SecurityFirmService
+from app.services.credit_ledger import InsufficientCreditsError
+from app.services.storage import LocalStorageBackend
 from app.models.security_firm import SecurityFirm, CoverageArea
 
 
@@ -358,7 +360,7 @@ class TestCreditManagement:
     async def test_update_credit_balance_add_credits(self, security_firm_service, mock_db, sample_firm):
         """Test adding credits to firm balance"""
         # Mock firm with initial balance
-        sample_firm.credit_balance = 100
+        sample_firm.credit_balance = 150
         mock_db.get = AsyncMock(return_value=sample_firm)
         mock_db.commit = AsyncMock()
         mock_db.refresh = AsyncMock()
@@ -367,10 +369,14 @@ class TestCreditManagement:
         credit_amount = 50
         
         # Call the method
-        result = await security_firm_service.update_credit_balance(firm_id, credit_amount)
+        with patch("app.services.security_firm.CreditLedger") as mock_ledger:
+            mock_ledger.return_value.post = AsyncMock()
+            result = await security_firm_service.update_credit_balance(firm_id, credit_amount)
         
         # Assertions
-        assert sample_firm.credit_balance == 150
+        kwargs = mock_ledger.return_value.post.call_args.kwargs
+        assert (kwargs["firm_id"], kwargs["amount"], kwargs["transaction_type"]) == (firm_id, 50, "adjustment")
+        assert result is sample_firm
         mock_db.get.assert_called_once_with(SecurityFirm, firm_id)
         mock_db.commit.assert_called_once()
         mock_db.refresh.assert_called_once()
@@ -379,7 +385,7 @@ class TestCreditManagement:
     async def test_update_credit_balance_deduct_credits(self, security_firm_service, mock_db, sample_firm):
         """Test deducting credits from firm balance"""
         # Mock firm with sufficient balance
-        sample_firm.credit_balance = 100
+        sample_firm.credit_balance = 70
         mock_db.get = AsyncMock(return_value=sample_firm)
         mock_db.commit = AsyncMock()
         mock_db.refresh = AsyncMock()
@@ -388,65 +394,67 @@ class TestCreditManagement:
         credit_amount = -30
         
         # Call the method
-        result = await security_firm_service.update_credit_balance(firm_id, credit_amount)
+        with patch("app.services.security_firm.CreditLedger") as mock_ledger:
+            mock_ledger.return_value.post = AsyncMock()
+            result = await security_firm_service.update_credit_balance(firm_id, credit_amount)
         
         # Assertions
-        assert sample_firm.credit_balance == 70
+        assert mock_ledger.return_value.post.call_args.kwargs["amount"] == -30
+        assert result.credit_balance == 70
         mock_db.commit.assert_called_once()
     
     @pytest.mark.asyncio
-    async def test_update_credit_balance_insufficient_credits(self, security_firm_service, mock_db, sample_firm):
+    async def test_update_credit_balance_insufficient_credits(self, security_firm_service, mock_db):
         """Test deducting more credits than available"""
-        # Mock firm with insufficient balance
-        sample_firm.credit_balance = 10
-        mock_db.get = AsyncMock(return_value=sample_firm)
+        mock_db.commit = AsyncMock()
         
         firm_id = "123e4567-e89b-12d3-a456-426614174000"
         credit_amount = -50  # More than available
         
         # Call the method and expect ValueError
-        with pytest.raises(ValueError, match="Insufficient credits"):
-            await security_firm_service.update_credit_balance(firm_id, credit_amount)
+        with patch("app.services.security_firm.CreditLedger") as mock_ledger:
+            mock_ledger.return_value.post = AsyncMock(side_effect=InsufficientCreditsError("Insufficient credits"))
+            with pytest.raises(ValueError, match="Insufficient credits"):
+                await security_firm_service.update_credit_balance(firm_id, credit_amount)
+        
+        mock_db.commit.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_update_credit_balance_firm_not_found(self, security_firm_service, mock_db):
         """Test updating credits for non-existent firm"""
-        # Mock database get to return None
-        mock_db.get = AsyncMock(return_value=None)
-        
         firm_id = "nonexistent-id"
         credit_amount = 50
         
         # Call the method and expect ValueError
-        with pytest.raises(ValueError, match="not found"):
-            await security_firm_service.update_credit_balance(firm_id, credit_amount)
+        with patch("app.services.security_firm.CreditLedger") as mock_ledger:
+            mock_ledger.return_value.post = AsyncMock(side_effect=ValueError("Security firm not found"))
+            with pytest.raises(ValueError, match="not found"):
+                await security_firm_service.update_credit_balance(firm_id, credit_amount)
 
 
 class TestDocumentUpload:
     """Test document upload functionality"""
     
     @pytest.mark.asyncio
-    async def test_upload_verification_document_success(self, security_firm_service, mock_db, sample_firm):
+    async def test_upload_verification_document_success(self, security_firm_service, mock_db, sample_firm, tmp_path):
         """Test successful document upload"""
         # Mock firm
         mock_db.get = AsyncMock(return_value=sample_firm)
         
-        # Mock file
+        # Mock file, read in chunks until empty
         mock_file = Mock()
         mock_file.filename = "test_document.pdf"
-        mock_file.read = AsyncMock(return_value=b"fake pdf content")
+        mock_file.content_type = "application/pdf"
+        mock_file.read = AsyncMock(side_effect=[b"fake pdf content", b""])
         
         firm_id = "123e4567-e89b-12d3-a456-426614174000"
         user_id = "user123"
         
-        # Mock file operations
-        with patch('os.makedirs') as mock_makedirs, \
-             patch('builtins.open', create=True) as mock_open, \
+        storage = LocalStorageBackend(root=str(tmp_path / "uploads"))
+        with patch('app.services.security_firm.get_storage', return_value=storage), \
              patch('uuid.uuid4') as mock_uuid:
             
             mock_uuid.return_value = "unique-id"
-            mock_file_handle = Mock()
-            mock_open.return_value.__enter__.return_value = mock_file_handle
             
             # Call the method
             result = await security_firm_service.upload_verification_document(
@@ -458,8 +466,8 @@ class TestDocumentUpload:
             # Assertions
             assert "uploads/security_firms" in result
             assert "unique-id.pdf" in result
-            mock_makedirs.assert_called_once()
-            mock_file_handle.write.assert_called_once_with(b"fake pdf content")
+            with open(result, "rb") as stored_file:
+                assert stored_file.read() == b"fake pdf content"
     
     @pytest.mark.asyncio
     async def test_upload_verification_document_firm_not_found(self, security_firm_service, mock_db):
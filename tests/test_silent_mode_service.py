@@ -425,15 +425,17 @@ class TestSilentModeService:
             original_mode=RingerMode.NORMAL
         )
         
-        with patch.object(service, 'get_active_sessions', return_value=[expired_status]):
-            with patch.object(service, 'deactivate_silent_mode') as mock_deactivate:
-                await service.cleanup_expired_sessions()
-                
-                mock_deactivate.assert_called_once_with(
-                    user_id,
-                    expired_status.request_id,
-                    RingerMode.NORMAL
-                )
+        with patch.object(service, 'claim_due_sessions', return_value=[str(user_id)]):
+            with patch.object(service, '_get_registered_sessions', return_value=[expired_status]):
+                with patch.object(service, 'deactivate_silent_mode') as mock_deactivate:
+                    processed = await service.cleanup_expired_sessions()
+                    
+                    assert processed == 1
+                    mock_deactivate.assert_called_once_with(
+                        user_id,
+                        expired_status.request_id,
+                        RingerMode.NORMAL
+                    )
     
     @pytest.mark.asyncio
     async def test_extend_silent_mode_session(self, service):
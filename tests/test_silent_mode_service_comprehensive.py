@@ -587,26 +587,26 @@ class TestSilentModeService:
         user1_id = uuid4()
         user2_id = uuid4()
         
-        # Mock active sessions data
-        sessions_data = {
-            str(user1_id): "2024-01-01T12:30:00",
-            str(user2_id): "2024-01-01T13:00:00"
-        }
-        
-        mock_cache.get.return_value = json.dumps(sessions_data)
-        
-        # Mock individual status lookups
         status1 = SilentModeStatus(user_id=user1_id, is_active=True, platform=Platform.ANDROID)
         status2 = SilentModeStatus(user_id=user2_id, is_active=True, platform=Platform.IOS)
         
-        with patch.object(service, 'get_user_status') as mock_get_status:
-            mock_get_status.side_effect = [status1, status2]
-            
-            result = await service.get_active_sessions()
-            
-            assert len(result) == 2
-            assert result[0].user_id == user1_id
-            assert result[1].user_id == user2_id
+        # Registry range query returns unexpired user IDs, statuses come from one MGET
+        mock_cache.zrangebyscore = AsyncMock(return_value=[str(user1_id), str(user2_id)])
+        mock_cache.mget = AsyncMock(return_value=[
+            status1.model_dump_json(),
+            status2.model_dump_json()
+        ])
+        
+        result = await service.get_active_sessions()
+        
+        assert len(result) == 2
+        assert result[0].user_id == user1_id
+        assert result[1].user_id == user2_id
+        mock_cache.mget.assert_called_once_with([
+            f"silent_mode:user:{user1_id}",
+            f"silent_mode:user:{user2_id}"
+        ])
+        mock_cache.get.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_cleanup_expired_sessions(self, service):
@@ -622,9 +622,11 @@ class TestSilentModeService:
             platform=Platform.ANDROID
         )
         
-        with patch.object(service, 'get_active_sessions') as mock_get_sessions, \
+        with patch.object(service, 'claim_due_sessions') as mock_claim, \
+             patch.object(service, '_get_registered_sessions') as mock_get_sessions, \
              patch.object(service, 'deactivate_silent_mode') as mock_deactivate:
             
+            mock_claim.return_value = [str(user_id)]
             mock_get_sessions.return_value = [expired_status]
             mock_deactivate.return_value = expired_status
             
@@ -637,6 +639,50 @@ class TestSilentModeService:
                 RingerMode.NORMAL  # Default restore mode
             )
     
+    @pytest.mark.asyncio
+    async def test_cleanup_expired_sessions_processes_batches(self, service):
+        """Test that cleanup keeps claiming until the due set is drained"""
+        statuses = [
+            SilentModeStatus(user_id=uuid4(), request_id=uuid4(), is_active=True, platform=Platform.IOS)
+            for _ in range(3)
+        ]
+        
+        with patch('app.services.silent_mode.settings') as mock_settings, \
+             patch.object(service, 'claim_due_sessions') as mock_claim, \
+             patch.object(service, '_get_registered_sessions') as mock_get_sessions, \
+             patch.object(service, 'deactivate_silent_mode') as mock_deactivate:
+            
+            mock_settings.SILENT_MODE_SWEEP_BATCH_SIZE = 2
+            mock_claim.side_effect = [
+                [str(s.user_id) for s in statuses[:2]],
+                [str(statuses[2].user_id)]
+            ]
+            mock_get_sessions.side_effect = [statuses[:2], statuses[2:]]
+            
+            processed = await service.cleanup_expired_sessions()
+            
+            assert processed == 3
+            assert mock_claim.call_count == 2
+            assert mock_deactivate.call_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_claim_due_sessions(self, service):
+        """Test that due sessions are claimed atomically through a script"""
+        user_id = str(uuid4())
+        client = AsyncMock()
+        client.eval.return_value = [user_id]
+        
+        with patch('app.services.silent_mode.cache') as mock_cache:
+            mock_cache.get_client = AsyncMock(return_value=client)
+            
+            claimed = await service.claim_due_sessions(limit=50)
+        
+        assert claimed == [user_id]
+        args = client.eval.call_args.args
+        assert args[1] == 1
+        assert args[2] == service.active_sessions_key
+        assert args[4] == 50
+    
     @pytest.mark.asyncio
     async def test_extend_silent_mode_session(self, service, mock_cache):
         """Test extending silent mode session"""
@@ -671,39 +717,17 @@ class TestSilentModeService:
             mock_add.assert_called_once()
     
     @pytest.mark.asyncio
-    async def test_schedule_auto_deactivation(self, service):
-        """Test scheduling automatic deactivation"""
-        user_id = uuid4()
-        delay_minutes = 0.01  # Very short delay for testing
-        
-        # Mock active status that should be deactivated
-        active_status = SilentModeStatus(
-            user_id=user_id,
-            request_id=uuid4(),
-            is_active=True,
-            platform=Platform.ANDROID
-        )
-        
-        with patch.object(service, 'get_user_status') as mock_get_status, \
-             patch.object(service, 'deactivate_silent_mode') as mock_deactivate:
-            
-            mock_get_status.return_value = active_status
-            mock_deactivate.return_value = active_status
+    async def test_expiry_sweeper_start_stop(self, service):
+        """Test that the sweeper runs cleanup and can be stopped"""
+        with patch.object(service, 'cleanup_expired_sessions') as mock_cleanup:
+            mock_cleanup.return_value = 0
             
-            # Start auto-deactivation task
-            task = asyncio.create_task(
-                service._schedule_auto_deactivation(user_id, delay_minutes)
-            )
-            
-            # Wait for task to complete
-            await task
+            service.start_expiry_sweeper()
+            await asyncio.sleep(0)
+            await service.stop_expiry_sweeper()
             
-            # Verify deactivation was called
-            mock_deactivate.assert_called_once_with(
-                user_id,
-                active_status.request_id,
-                RingerMode.NORMAL
-            )
+            mock_cleanup.assert_called()
+            assert service._sweeper_task is None
 
 
 class TestSilentModeServiceIntegration:
@@ -733,10 +757,42 @@ class TestSilentModeServiceIntegration:
         async def mock_delete(key):
             cache_data.pop(key, None)
         
+        async def mock_mget(keys):
+            return [cache_data.get(key) for key in keys]
+        
+        async def mock_zadd(key, mapping):
+            cache_data.setdefault(key, {}).update(mapping)
+        
+        async def mock_zrem(key, *members):
+            for member in members:
+                cache_data.get(key, {}).pop(member, None)
+        
+        async def mock_zrangebyscore(key, min_score, max_score, start=None, num=None):
+            members = sorted(cache_data.get(key, {}).items(), key=lambda item: item[1])
+            return [member for member, score in members if score >= min_score]
+        
+        async def mock_hset(key, field, value):
+            cache_data.setdefault(key, {})[field] = value
+        
+        async def mock_hmget(key, fields):
+            return [cache_data.get(key, {}).get(field) for field in fields]
+        
+        async def mock_hdel(key, *fields):
+            for field in fields:
+                cache_data.get(key, {}).pop(field, None)
+        
         with patch('app.services.silent_mode.cache') as mock:
+            mock.data = cache_data
             mock.get = mock_get
             mock.set = mock_set
             mock.delete = mock_delete
+            mock.mget = mock_mget
+            mock.zadd = mock_zadd
+            mock.zrem = mock_zrem
+            mock.zrangebyscore = mock_zrangebyscore
+            mock.hset = mock_hset
+            mock.hmget = mock_hmget
+            mock.hdel = mock_hdel
             yield mock
     
     @pytest.mark.asyncio
@@ -825,6 +881,45 @@ class TestSilentModeServiceIntegration:
         remaining_sessions = await service.get_active_sessions()
         assert len(remaining_sessions) == 1
         assert remaining_sessions[0].user_id == user2_id
+    
+    @pytest.mark.asyncio
+    async def test_sweeper_restores_session_after_status_expired(self, service, mock_cache):
+        """Test a due session is deactivated from the registry once its status is gone"""
+        user_id = uuid4()
+        request = SilentModeRequest(
+            user_id=user_id,
+            request_id=uuid4(),
+            platform=Platform.IOS,
+            restore_mode=RingerMode.VIBRATE
+        )
+        await service.activate_silent_mode(request)
+        
+        # Status key expired while no sweeper was running; the session is overdue
+        await mock_cache.delete(f"silent_mode:user:{user_id}")
+        mock_cache.data[service.active_sessions_key][str(user_id)] = 0
+        
+        with patch.object(service, 'claim_due_sessions', side_effect=[[str(user_id)], []]), \
+             patch.object(service.ios_controller, 'deactivate_silent_mode', new_callable=AsyncMock) as mock_restore:
+            assert await service.cleanup_expired_sessions() == 1
+        
+        mock_restore.assert_called_once_with(user_id, request.request_id, RingerMode.VIBRATE)
+        assert mock_cache.data[service.session_registry_key] == {}
+    
+    @pytest.mark.asyncio
+    async def test_failed_deactivation_returned_to_registry(self, service, mock_cache):
+        """Test a claimed session whose deactivation fails is retried by the next sweep"""
+        user_id = uuid4()
+        await service.activate_silent_mode(
+            SilentModeRequest(user_id=user_id, request_id=uuid4(), platform=Platform.ANDROID)
+        )
+        mock_cache.data[service.active_sessions_key].pop(str(user_id))  # Claimed
+        
+        with patch.object(service, 'claim_due_sessions', side_effect=[[str(user_id)], []]), \
+             patch.object(service.android_controller, 'deactivate_silent_mode', side_effect=SilentModeError("offline")):
+            await service.cleanup_expired_sessions()
+        
+        assert str(user_id) in mock_cache.data[service.active_sessions_key]
+        assert str(user_id) in mock_cache.data[service.session_registry_key]
 
 
 class TestSilentModeError:
@@ -0,0 +1,114 @@
+"""
+Unit tests for object storage backends
+"""
+import hashlib
+import io
+from unittest.mock import Mock
+
+import pytest
+from fastapi import UploadFile
+
+from app.services.storage import LocalStorageBackend, S3StorageBackend, storage_for
+
+
+def upload(content: bytes, filename: str = "certificate.pdf") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename)
+
+
+def s3_backend(part_bytes: int) -> S3StorageBackend:
+    client = Mock()
+    client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    client.upload_part.side_effect = lambda **kwargs: {"ETag": f"etag-{kwargs['PartNumber']}"}
+    backend = S3StorageBackend(client=client, bucket="documents")
+    backend.part_bytes = part_bytes
+    return backend
+
+
+class TestLocalStorageBackend:
+    """Test the local disk driver"""
+    
+    @pytest.mark.asyncio
+    async def test_save_and_open_round_trip(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("app.services.storage.settings.STORAGE_CHUNK_BYTES", 4)
+        backend = LocalStorageBackend(root=str(tmp_path))
+        content = b"0123456789"
+        
+        stored = await backend.save(upload(content), "security_firms/firm-1/doc.pdf")
+        
+        assert stored.path == str(tmp_path / "security_firms" / "firm-1" / "doc.pdf")
+        assert stored.size == 10
+        assert stored.checksum_sha256 == hashlib.sha256(content).hexdigest()
+        assert [chunk async for chunk in backend.open(stored.path)] == [b"0123", b"4567", b"89"]
+        assert list((tmp_path / "security_firms" / "firm-1").iterdir()) == [tmp_path / "security_firms" / "firm-1" / "doc.pdf"]
+    
+    @pytest.mark.asyncio
+    async def test_delete_and_exists(self, tmp_path):
+        backend = LocalStorageBackend(root=str(tmp_path))
+        stored = await backend.save(upload(b"content"), "doc.pdf")
+        
+        assert await backend.exists(stored.path)
+        assert await backend.delete(stored.path)
+        assert not await backend.exists(stored.path)
+        assert not await backend.delete(stored.path)
+    
+    @pytest.mark.asyncio
+    async def test_keys_cannot_escape_root(self, tmp_path):
+        backend = LocalStorageBackend(root=str(tmp_path / "uploads"))
+        
+        with pytest.raises(ValueError):
+            await backend.save(upload(b"content"), "../outside.pdf")
+    
+    @pytest.mark.asyncio
+    async def test_saved_paths_held_under_any_root(self, tmp_path, monkeypatch):
+        root = tmp_path / "data" / "uploads"
+        monkeypatch.setattr("app.services.storage.settings.FILE_STORAGE_PATH", str(root))
+        stored = await LocalStorageBackend().save(upload(b"content"), "security_firms/firm-1/doc.pdf")
+        
+        assert LocalStorageBackend().holds(stored.path)
+        assert not LocalStorageBackend().holds("security_firms/firm-1/doc.pdf")
+        assert not LocalStorageBackend().holds(str(tmp_path / "data" / "uploads-old" / "doc.pdf"))
+        assert isinstance(storage_for(stored.path), LocalStorageBackend)
+
+
+class TestS3StorageBackend:
+    """Test the S3 driver"""
+    
+    @pytest.mark.asyncio
+    async def test_small_file_uses_single_put(self):
+        backend = s3_backend(part_bytes=8)
+        
+        stored = await backend.save(upload(b"small"), "firms/doc.pdf", content_type="application/pdf")
+        
+        kwargs = backend.client.put_object.call_args.kwargs
+        assert kwargs["Body"] == b"small"
+        assert kwargs["ContentType"] == "application/pdf"
+        assert kwargs["ChecksumSHA256"]
+        assert (stored.path, stored.size) == ("firms/doc.pdf", 5)
+        backend.client.create_multipart_upload.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_large_file_uses_multipart_upload(self):
+        backend = s3_backend(part_bytes=4)
+        content = b"0123456789"
+        
+        stored = await backend.save(upload(content), "firms/doc.pdf")
+        
+        bodies = [call.kwargs["Body"] for call in backend.client.upload_part.call_args_list]
+        assert bodies == [b"0123", b"4567", b"89"]
+        parts = backend.client.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]
+        assert [(part["PartNumber"], part["ETag"]) for part in parts] == [(1, "etag-1"), (2, "etag-2"), (3, "etag-3")]
+        assert stored.size == 10
+        assert stored.checksum_sha256 == hashlib.sha256(content).hexdigest()
+    
+    @pytest.mark.asyncio
+    async def test_failed_multipart_upload_is_aborted(self):
+        backend = s3_backend(part_bytes=4)
+        backend.client.upload_part.side_effect = [{"ETag": "etag-1"}, Exception("connection reset")]
+        
+        with pytest.raises(Exception, match="connection reset"):
+            await backend.save(upload(b"0123456789"), "firms/doc.pdf")
+        
+        backend.client.abort_multipart_upload.assert_called_once_with(
+            Bucket="documents", Key="firms/doc.pdf", UploadId="upload-1"
+        )
+        backend.client.complete_multipart_upload.assert_not_called()
@@ -3,6 +3,8 @@ Unit tests for structured logging functionality
 """
 import pytest
 import json
+import os
+import threading
 import tempfile
 import shutil
 from datetime import datetime, timedelta
@@ -24,7 +26,11 @@ from app.core.logging import (
     filter_sensitive_data,
     add_timestamp,
     add_service_context,
-    JSONFormatter
+    sample_log_events,
+    JSONFormatter,
+    LogPipeline,
+    BatchedRotatingFileHandler,
+    get_log_pipeline_stats
 )
 
 
@@ -169,6 +175,43 @@ class TestLogProcessors:
         assert filtered["user_data"]["name"] == "John Doe"  # Safe field unchanged
         assert filtered["safe_field"] == "safe_value"
     
+    def test_filter_sensitive_data_without_changes(self):
+        """Test that events without sensitive data are not copied"""
+        nested = {"name": "John Doe"}
+        event_dict = {"event": "request_completed", "status_code": 200, "details": nested}
+        
+        filtered = filter_sensitive_data(None, None, event_dict)
+        
+        assert filtered is event_dict
+        assert filtered["details"] is nested
+    
+    def test_filter_sensitive_data_does_not_mutate_input(self):
+        """Test that nested caller data is left untouched"""
+        nested = {"password": "secret123"}
+        event_dict = {"event": "login", "payload": nested}
+        
+        filtered = filter_sensitive_data(None, None, event_dict)
+        
+        assert filtered["payload"]["password"] == "***"
+        assert nested["password"] == "secret123"
+    
+    @patch('app.core.logging.settings')
+    def test_sample_log_events(self, mock_settings):
+        """Test sampling of request_started and debug events"""
+        import structlog
+        
+        mock_settings.LOG_REQUEST_SAMPLE_RATE = 0.0
+        mock_settings.LOG_DEBUG_SAMPLE_RATE = 1.0
+        
+        with pytest.raises(structlog.DropEvent):
+            sample_log_events(None, "info", {"event": "request_started"})
+        
+        # Debug events at full rate and other events are always kept
+        assert sample_log_events(None, "debug", {"event": "cache_hit"}) == {"event": "cache_hit"}
+        assert sample_log_events(None, "info", {"event": "request_completed"}) == {
+            "event": "request_completed"
+        }
+    
     def test_add_timestamp(self):
         """Test timestamp addition"""
         event_dict = {"message": "test"}
@@ -246,6 +289,155 @@ class TestJSONFormatter:
         assert "ValueError: Test exception" in data["exception"]
 
 
+class TestLogPipeline:
+    """Test the queue-backed log pipeline"""
+    
+    @staticmethod
+    def _record(name="test_logger", level=None, msg="Test message"):
+        import logging
+        return logging.LogRecord(
+            name=name,
+            level=level or logging.INFO,
+            pathname="test.py",
+            lineno=10,
+            msg=msg,
+            args=(),
+            exc_info=None
+        )
+    
+    def test_records_are_routed_and_batched(self, tmp_path):
+        """Test that records reach only their route's handlers"""
+        import logging
+        
+        app_handler = BatchedRotatingFileHandler(tmp_path / "application.log", delay=True)
+        error_handler = BatchedRotatingFileHandler(tmp_path / "errors.log", delay=True)
+        error_handler.setLevel(logging.ERROR)
+        security_handler = BatchedRotatingFileHandler(tmp_path / "security.log", delay=True)
+        
+        pipeline = LogPipeline(
+            routes={
+                "application": [app_handler, error_handler],
+                "security": [security_handler],
+            }
+        )
+        pipeline.start()
+        
+        app_logger = logging.getLogger("pipeline_test_app")
+        app_logger.propagate = False
+        security_logger = logging.getLogger("pipeline_test_security")
+        security_logger.propagate = False
+        app_logger.addHandler(pipeline.handler("application"))
+        security_logger.addHandler(pipeline.handler("security"))
+        
+        try:
+            app_logger.warning("warning %s", "one")
+            app_logger.error("failure")
+            security_logger.warning("login_failure")
+        finally:
+            pipeline.stop()
+            for handler in (app_handler, error_handler, security_handler):
+                handler.close()
+        
+        app_lines = (tmp_path / "application.log").read_text().splitlines()
+        error_lines = (tmp_path / "errors.log").read_text().splitlines()
+        security_lines = (tmp_path / "security.log").read_text().splitlines()
+        
+        assert [json.loads(line)["message"] for line in app_lines] == ["warning one", "failure"]
+        assert [json.loads(line)["message"] for line in error_lines] == ["failure"]
+        assert [json.loads(line)["message"] for line in security_lines] == ["login_failure"]
+        assert pipeline.stats()["written_records"] == 3
+    
+    def test_full_queue_drops_records(self):
+        """Test that a full queue drops records instead of blocking"""
+        pipeline = LogPipeline(routes={"application": []}, max_size=1)
+        handler = pipeline.handler("application")
+        
+        # Listener not started, so the queue fills up
+        handler.handle(self._record())
+        handler.handle(self._record())
+        
+        stats = pipeline.stats()
+        assert stats["queue_depth"] == 1
+        assert stats["dropped_records"] == 1
+    
+    def test_rotating_handler_rolls_over(self, tmp_path):
+        """Test that batched writes respect the size limit"""
+        handler = BatchedRotatingFileHandler(
+            tmp_path / "application.log", maxBytes=20, backupCount=2, delay=True
+        )
+        try:
+            handler.write_batch(["a" * 15, "b" * 15, "c" * 15])
+        finally:
+            handler.close()
+        
+        assert (tmp_path / "application.log").read_text() == "c" * 15 + "\n"
+        assert (tmp_path / "application.log.1").read_text() == "b" * 15 + "\n"
+        assert (tmp_path / "application.log.2").read_text() == "a" * 15 + "\n"
+    
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+    def test_forked_child_writes_its_records(self, tmp_path, monkeypatch):
+        """Test that a forked child, e.g. a Celery prefork worker, gets a running pipeline"""
+        import logging
+        
+        handler = BatchedRotatingFileHandler(tmp_path / "application.log", delay=True)
+        pipeline = LogPipeline(routes={"application": [handler]})
+        pipeline.start()
+        monkeypatch.setattr("app.core.logging._log_pipeline", pipeline)
+        
+        fork_logger = logging.getLogger("pipeline_test_fork")
+        fork_logger.propagate = False
+        fork_logger.addHandler(pipeline.handler("application"))
+        
+        pid = os.fork()
+        if pid == 0:
+            try:
+                fork_logger.warning("from child")
+                pipeline.stop()
+                handler.close()
+            finally:
+                os._exit(0)
+        
+        os.waitpid(pid, 0)
+        pipeline.stop()
+        handler.close()
+        
+        lines = (tmp_path / "application.log").read_text().splitlines()
+        assert [json.loads(line)["message"] for line in lines] == ["from child"]
+    
+    def test_rollover_indexes_off_the_writer_thread(self, tmp_path):
+        """Test that writes continue while the closed segment is being indexed"""
+        indexing = threading.Event()
+        release = threading.Event()
+        indexed = threading.Event()
+        
+        def slow_index(segment):
+            indexing.set()
+            release.wait(5)
+            indexed.set()
+        
+        handler = BatchedRotatingFileHandler(
+            tmp_path / "application.log", maxBytes=20, backupCount=2, delay=True
+        )
+        with patch("app.core.logging.write_segment_index", side_effect=slow_index) as mock_index:
+            try:
+                handler.write_batch(["a" * 15, "b" * 15])
+                assert indexing.wait(5)
+                handler.write_batch(["c"])
+                assert not indexed.is_set()
+            finally:
+                release.set()
+                handler.close()
+        
+        mock_index.assert_called_once_with(tmp_path / "application.log.1")
+        assert (tmp_path / "application.log").read_text() == "b" * 15 + "\nc\n"
+    
+    def test_pipeline_stats_available(self):
+        """Test that global pipeline stats are exposed"""
+        stats = get_log_pipeline_stats()
+        
+        assert set(stats) >= {"queue_depth", "dropped_records", "sampled_records", "written_records"}
+
+
 class TestLogRetentionManager:
     """Test log retention manager"""
     
@@ -334,10 +526,17 @@ def temp_log_dir():
 class TestLogSetup:
     """Test log setup and configuration"""
     
+    @pytest.fixture
+    def restore_logging(self):
+        """Reconfigure logging with real settings after the test"""
+        yield
+        setup_logging()
+    
     @patch('app.core.logging.settings')
     @patch('structlog.configure')
     @patch('logging.basicConfig')
-    def test_setup_logging(self, mock_basic_config, mock_structlog_configure, mock_settings):
+    def test_setup_logging(self, mock_basic_config, mock_structlog_configure, mock_settings,
+                           restore_logging):
         """Test logging setup"""
         # Mock settings
         mock_settings.LOG_DIR = "/tmp/test_logs"
@@ -345,6 +544,8 @@ class TestLogSetup:
         mock_settings.LOG_MAX_FILE_SIZE_MB = 50
         mock_settings.LOG_MAX_BACKUP_COUNT = 10
         mock_settings.SECURITY_LOG_MAX_BACKUP_COUNT = 20
+        mock_settings.LOG_QUEUE_MAX_SIZE = 100
+        mock_settings.LOG_BATCH_SIZE = 10
         
         with patch('app.core.logging.Path') as mock_path:
             mock_log_dir = MagicMock()
@@ -358,8 +559,15 @@ class TestLogSetup:
             # Verify structlog configuration
             mock_structlog_configure.assert_called_once()
             
-            # Verify basic logging configuration
-            mock_basic_config.assert_called_once()
+            # Records are handed to the log pipeline instead of written inline
+            import logging
+            from app.core.logging import LogQueueHandler
+            assert any(
+                isinstance(handler, LogQueueHandler)
+                for handler in logging.getLogger().handlers
+            )
+            assert get_log_pipeline_stats()["queue_capacity"] == 100
+            mock_basic_config.assert_not_called()
     
     def test_log_levels(self):
         """Test log level enumeration"""
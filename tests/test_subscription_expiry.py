@@ -0,0 +1,144 @@
+"""
+Unit tests for the subscription expiry scheduler
+"""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, Mock, call, patch
+from uuid import uuid4
+
+import pytest
+
+from app.models.user import UserGroup
+from app.services.subscription_expiry import (
+    SubscriptionExpiryScheduler,
+    bucket_start,
+    track_active_subscription
+)
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def rows(*values):
+    return Mock(all=Mock(return_value=list(values)))
+
+
+def make_db(*results):
+    db = Mock()
+    db.execute = AsyncMock(side_effect=list(results))
+    db.commit = AsyncMock()
+    return db
+
+
+class TestTrackActiveSubscription:
+    """Test maintaining firm counts when subscriptions are applied"""
+    
+    @pytest.mark.asyncio
+    async def test_new_subscription_counted(self):
+        firm_id = uuid4()
+        group = UserGroup(id=uuid4())
+        db = Mock()
+        
+        with patch("app.services.subscription_expiry.adjust_active_count", new=AsyncMock()) as adjust:
+            await track_active_subscription(db, group, firm_id)
+        
+        adjust.assert_awaited_once_with(db, firm_id, 1)
+        assert group.subscription_firm_id == firm_id
+    
+    @pytest.mark.asyncio
+    async def test_renewal_with_same_firm_not_counted_again(self):
+        firm_id = uuid4()
+        group = UserGroup(id=uuid4(), subscription_firm_id=firm_id, subscription_reminder_sent_at=NOW)
+        
+        with patch("app.services.subscription_expiry.adjust_active_count", new=AsyncMock()) as adjust:
+            await track_active_subscription(Mock(), group, str(firm_id))
+        
+        adjust.assert_not_called()
+        assert group.subscription_reminder_sent_at is None
+    
+    @pytest.mark.asyncio
+    async def test_switching_firm_moves_count(self):
+        old_firm, new_firm = uuid4(), uuid4()
+        group = UserGroup(id=uuid4(), subscription_firm_id=old_firm)
+        db = Mock()
+        
+        with patch("app.services.subscription_expiry.adjust_active_count", new=AsyncMock()) as adjust:
+            await track_active_subscription(db, group, new_firm)
+        
+        assert adjust.await_args_list == [call(db, old_firm, -1), call(db, new_firm, 1)]
+
+
+class TestSubscriptionExpiryScheduler:
+    """Test batched expiry and reminder processing"""
+    
+    def test_bucket_start(self):
+        assert bucket_start(NOW + timedelta(seconds=37)) == NOW
+    
+    @pytest.mark.asyncio
+    async def test_expiries_uncounted_per_firm(self):
+        firm_a, firm_b = uuid4(), uuid4()
+        db = make_db(rows((uuid4(), firm_a), (uuid4(), firm_a), (uuid4(), firm_b)), Mock())
+        
+        with patch("app.services.subscription_expiry.adjust_active_count", new=AsyncMock()) as adjust:
+            assert await SubscriptionExpiryScheduler(db).process_expiries(NOW) == 3
+        
+        assert sorted(adjust.await_args_list, key=lambda c: c.args[2]) == [call(db, firm_a, -2), call(db, firm_b, -1)]
+        cleared = db.execute.call_args_list[1].args[0].compile().params
+        assert cleared["subscription_firm_id"] is None
+        db.commit.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_expiries_processed_in_batches(self, monkeypatch):
+        monkeypatch.setattr("app.services.subscription_expiry.settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE", 2)
+        firm_id = uuid4()
+        db = make_db(
+            rows((uuid4(), firm_id), (uuid4(), firm_id)), Mock(),
+            rows((uuid4(), firm_id)), Mock()
+        )
+        
+        with patch("app.services.subscription_expiry.adjust_active_count", new=AsyncMock()):
+            assert await SubscriptionExpiryScheduler(db).process_expiries(NOW) == 3
+        
+        assert db.commit.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_nothing_due(self):
+        db = make_db(rows())
+        
+        assert await SubscriptionExpiryScheduler(db).process_expiries(NOW) == 0
+        db.commit.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_reminders_sent_once_marked(self):
+        group_id, user_id = uuid4(), uuid4()
+        db = make_db(
+            rows((group_id, "Home", NOW + timedelta(days=3))),
+            rows((group_id, user_id, "+27820000000")),
+            Mock()
+        )
+        
+        async def marked_first(request):
+            db.commit.assert_awaited_once()
+        
+        with patch("app.services.subscription_expiry.notification_service") as notifications:
+            notifications.enqueue_notification = AsyncMock(side_effect=marked_first)
+            assert await SubscriptionExpiryScheduler(db).process_reminders(NOW) == 1
+        
+        request = notifications.enqueue_notification.await_args.args[0]
+        assert request.template_id == "subscription_expiring_sms"
+        assert request.recipients[0].phone_number == "+27820000000"
+        assert request.variables["days_remaining"] == 3
+    
+    @pytest.mark.asyncio
+    async def test_reconcile_corrects_drift(self):
+        firm_a, firm_b = uuid4(), uuid4()
+        db = make_db(
+            Mock(rowcount=1),
+            rows((firm_a, 4), (firm_b, 2)),
+            rows((firm_a, 4), (firm_b, 1)),
+            Mock()
+        )
+        
+        assert await SubscriptionExpiryScheduler(db).reconcile_counts() == {"attributed": 1, "corrected": 1}
+        
+        corrected = db.execute.call_args_list[3].args[0].compile().params
+        assert corrected["firm_id"] == firm_b
+        assert corrected["active_count"] == 1
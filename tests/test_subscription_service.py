@@ -4,14 +4,21 @@ Unit tests for subscription service
 import pytest
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
-from app.services.subscription import SubscriptionService
+from app.services.subscription import SubscriptionService, subscription_status_cache
 from app.services.credit import InsufficientCreditsError
 from app.models.security_firm import SecurityFirm
 from app.models.subscription import SubscriptionProduct, StoredSubscription
 
 
+def group_rows(*groups):
+    """Result of the batched subscription status query"""
+    return Mock(all=Mock(return_value=[
+        (group.id, group.subscription_expires_at, group.subscription_id) for group in groups
+    ]))
+
+
 class TestSubscriptionService:
     """Test cases for SubscriptionService"""
     
@@ -402,6 +409,12 @@ class TestSubscriptionPurchaseAndApplication:
         """Subscription service instance with mocked database"""
         return SubscriptionService(mock_db)
     
+    @pytest.fixture(autouse=True)
+    def clear_status_cache(self):
+        subscription_status_cache.clear()
+        yield
+        subscription_status_cache.clear()
+    
     @pytest.fixture
     def sample_user(self):
         from app.models.user import RegisteredUser
@@ -679,7 +692,7 @@ class TestSubscriptionPurchaseAndApplication:
         sample_user_group.subscription_expires_at = datetime.utcnow() + timedelta(days=15)
         sample_user_group.subscription_id = "subscription-123"
         
-        mock_db.get.return_value = sample_user_group
+        mock_db.execute.return_value = group_rows(sample_user_group)
         
         status = await subscription_service.validate_subscription_status("group-123")
         
@@ -698,7 +711,7 @@ class TestSubscriptionPurchaseAndApplication:
         sample_user_group.subscription_expires_at = datetime.utcnow() - timedelta(days=5)
         sample_user_group.subscription_id = "subscription-123"
         
-        mock_db.get.return_value = sample_user_group
+        mock_db.execute.return_value = group_rows(sample_user_group)
         
         status = await subscription_service.validate_subscription_status("group-123")
         
@@ -713,7 +726,7 @@ class TestSubscriptionPurchaseAndApplication:
         sample_user_group.subscription_expires_at = None
         sample_user_group.subscription_id = None
         
-        mock_db.get.return_value = sample_user_group
+        mock_db.execute.return_value = group_rows(sample_user_group)
         
         status = await subscription_service.validate_subscription_status("group-123")
         
@@ -723,6 +736,52 @@ class TestSubscriptionPurchaseAndApplication:
         assert status["days_remaining"] == 0
         assert status["subscription_id"] is None
     
+    @pytest.mark.asyncio
+    async def test_validate_subscription_status_group_not_found(self, subscription_service, mock_db):
+        """Test validating status of a missing group"""
+        mock_db.execute.return_value = group_rows()
+        
+        with pytest.raises(ValueError, match="User group not found"):
+            await subscription_service.validate_subscription_status("missing")
+    
+    @pytest.mark.asyncio
+    async def test_get_subscription_statuses_batched_and_cached(self, subscription_service, mock_db):
+        """Test evaluating many groups with one query and caching active ones"""
+        from datetime import datetime, timedelta
+        from app.models.user import UserGroup
+        
+        active = UserGroup(id="group-1", subscription_expires_at=datetime.utcnow() + timedelta(days=10), subscription_id="sub-1")
+        expired = UserGroup(id="group-2", subscription_expires_at=datetime.utcnow() - timedelta(days=1))
+        mock_db.execute.return_value = group_rows(active, expired)
+        
+        statuses = await subscription_service.get_subscription_statuses(["group-1", "group-2", "group-1"])
+        
+        assert statuses["group-1"]["is_active"] is True
+        assert statuses["group-2"]["is_expired"] is True
+        assert mock_db.execute.await_count == 1
+        
+        # Only the expired group is queried again
+        mock_db.execute.return_value = group_rows(expired)
+        statuses = await subscription_service.get_subscription_statuses(["group-1", "group-2"])
+        
+        assert statuses["group-1"]["subscription_id"] == "sub-1"
+        assert mock_db.execute.await_count == 2
+        assert "group-1" not in str(mock_db.execute.call_args.args[0].compile().params)
+    
+    @pytest.mark.asyncio
+    async def test_validate_subscription_status_from_loaded_group(self, subscription_service, mock_db):
+        """Test evaluating an already loaded group without querying"""
+        from datetime import datetime, timedelta
+        from app.models.user import UserGroup
+        
+        group = UserGroup(id="group-123", subscription_expires_at=datetime.utcnow() + timedelta(days=3))
+        
+        status = await subscription_service.validate_subscription_status("group-123", group=group)
+        
+        assert status["is_active"] is True
+        mock_db.execute.assert_not_called()
+        mock_db.get.assert_not_called()
+    
     @pytest.mark.asyncio
     async def test_get_alternative_firms_for_location(self, subscription_service, mock_db, sample_security_firm, sample_coverage_area):
         """Test getting alternative firms for a location"""